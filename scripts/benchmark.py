@@ -0,0 +1,1447 @@
+"""
+Benchmark hiệu năng cho các thành phần của pipeline HWT905 (không cần cảm biến thật).
+
+Chạy từ thư mục gốc của dự án:
+    PYTHONPATH=. python scripts/benchmark.py framer --packets 200000
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import struct
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from queue import Empty, Queue
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.records import AccSample, ProcessedSample, to_mqtt_point
+from src.sensors.hwt905_constants import DATA_HEADER_BYTE, DATA_PACKET_LENGTH, PACKET_TYPE_ACC
+from src.sensors.hwt905_data_decoder import HWT905DataDecoder, SUPPORTED_READ_MODES
+from src.sensors.decoders import decode_packet_block, decode_packet_fast
+from src.sensors.hwt905_protocol import create_data_packet, is_valid_data_packet
+from src.sensors.packet_framer import PacketFramer
+from src.sensors.packet_router import PacketRouter
+
+
+# ==============================================================================
+# Tiện ích tạo dữ liệu giả lập
+# ==============================================================================
+def generate_stream(n_packets: int, garbage_ratio: float = 0.01,
+                    corrupt_ratio: float = 0.01, seed: int = 1234) -> bytes:
+    """Tạo luồng byte gồm các gói ACC, chèn ngẫu nhiên byte rác và gói sai checksum."""
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(n_packets):
+        payload = struct.pack('<hhhh', rng.randint(-2000, 2000), rng.randint(-2000, 2000),
+                              rng.randint(0, 4000), 2500)
+        packet = create_data_packet(PACKET_TYPE_ACC, payload)
+        if rng.random() < corrupt_ratio:
+            packet = packet[:-1] + bytes([(packet[-1] + 1) & 0xFF])
+        parts.append(packet)
+        if rng.random() < garbage_ratio:
+            parts.append(bytes(rng.randint(0, 0x54) for _ in range(rng.randint(1, 5))))
+    return b''.join(parts)
+
+
+class ReplaySerial:
+    """Đối tượng giống serial.Serial, trả dữ liệu có sẵn theo từng đoạn (chunk)."""
+
+    def __init__(self, data: bytes, chunk_sizes: List[int]):
+        self._data = data
+        self._pos = 0
+        self._chunks = chunk_sizes
+        self._chunk_idx = 0
+        self.is_open = True
+
+    @property
+    def in_waiting(self) -> int:
+        chunk = self._chunks[self._chunk_idx % len(self._chunks)]
+        return min(chunk, len(self._data) - self._pos)
+
+    def _advance(self, n: int) -> bytes:
+        data = self._data[self._pos:self._pos + n]
+        self._pos += len(data)
+        self._chunk_idx += 1
+        return data
+
+    def read(self, n: int) -> bytes:
+        return self._advance(n)
+
+    def readinto(self, b) -> int:
+        data = self._advance(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def exhausted(self) -> bool:
+        return self._pos >= len(self._data)
+
+
+class LegacyPacketReader:
+    """Bản sao thuật toán read_raw_packet cũ (nối bytes và cắt lại buffer) để so sánh."""
+
+    def __init__(self, ser):
+        self.ser = ser
+        self._packet_buffer = b''
+
+    def read_raw_packet(self) -> Optional[bytes]:
+        if self.ser.in_waiting > 0:
+            self._packet_buffer += self.ser.read(self.ser.in_waiting)
+        while True:
+            if len(self._packet_buffer) < DATA_PACKET_LENGTH:
+                return None
+            header_index = self._packet_buffer.find(bytes([DATA_HEADER_BYTE]))
+            if header_index == -1:
+                self._packet_buffer = b''
+                return None
+            if header_index > 0:
+                self._packet_buffer = self._packet_buffer[header_index:]
+                continue
+            potential_packet = self._packet_buffer[:DATA_PACKET_LENGTH]
+            if is_valid_data_packet(potential_packet):
+                self._packet_buffer = self._packet_buffer[DATA_PACKET_LENGTH:]
+                return potential_packet
+            self._packet_buffer = self._packet_buffer[1:]
+
+
+class FramerPacketReader:
+    """Cách đọc mới: readinto vào ring buffer của PacketFramer."""
+
+    def __init__(self, ser):
+        self.ser = ser
+        self.framer = PacketFramer()
+
+    def read_raw_packet(self) -> Optional[bytes]:
+        self.framer.fill_from(self.ser)
+        return self.framer.next_packet()
+
+
+def _drain(reader, ser: ReplaySerial) -> int:
+    """Đọc đến khi hết dữ liệu, trả về số gói tin hợp lệ."""
+    count = 0
+    idle = 0
+    while idle < 2:
+        if reader.read_raw_packet() is not None:
+            count += 1
+            idle = 0
+        elif ser.exhausted():
+            idle += 1
+    return count
+
+
+def _measure(name: str, factory: Callable, data: bytes, chunks: List[int]):
+    ser = ReplaySerial(data, chunks)
+    reader = factory(ser)
+    start = time.perf_counter()
+    count = _drain(reader, ser)
+    elapsed = time.perf_counter() - start
+
+    # Đo bộ nhớ trong một lần chạy riêng để tracemalloc không làm sai lệch thời gian
+    ser = ReplaySerial(data, chunks)
+    reader = factory(ser)
+    tracemalloc.start()
+    _drain(reader, ser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<10} {count:>10d} gói  {count / elapsed:>12,.0f} gói/s  "
+          f"{elapsed * 1e6 / max(count, 1):>7.2f} µs/gói  peak={peak / 1024:>8.1f} KiB")
+
+
+def bench_framer(args):
+    data = generate_stream(args.packets)
+    chunks = [random.Random(42).randint(args.min_chunk, args.max_chunk) for _ in range(1024)]
+    print(f"Luồng {len(data)} bytes, đoạn đọc {args.min_chunk}-{args.max_chunk} bytes")
+    _measure("legacy", LegacyPacketReader, data, chunks)
+    _measure("framer", FramerPacketReader, data, chunks)
+
+
+def _run_handoff(packets: List[bytes], batches: List[List[bytes]], batch_mode: bool):
+    """Đo thời gian chuyển các gói tin từ luồng đọc sang luồng giải mã qua Queue."""
+    q = Queue(maxsize=8192)
+    total = len(packets)
+
+    def consumer():
+        received = 0
+        while received < total:
+            item = q.get()
+            received += len(item) if isinstance(item, list) else 1
+            q.task_done()
+
+    t = threading.Thread(target=consumer)
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    t.start()
+    if batch_mode:
+        for batch in batches:
+            q.put(batch)
+    else:
+        for packet in packets:
+            q.put(packet)
+    t.join()
+    return time.perf_counter() - start, time.process_time() - cpu_start
+
+
+def bench_handoff(args):
+    data = generate_stream(args.packets, garbage_ratio=0, corrupt_ratio=0)
+    framer = PacketFramer(capacity=len(data) + 1)
+    framer.feed(data)
+    packets = framer.drain()
+    batches = [packets[i:i + args.batch] for i in range(0, len(packets), args.batch)]
+    for name, batch_mode in (("per-packet", False), ("batch", True)):
+        elapsed, cpu = _run_handoff(packets, batches, batch_mode)
+        ops = len(batches) if batch_mode else len(packets)
+        print(f"{name:<10} {ops:>8d} lần put()  {len(packets) / elapsed:>12,.0f} gói/s  "
+              f"CPU {cpu * 1e6 / len(packets):>6.2f} µs/gói")
+
+
+def bench_validate(args):
+    import src.sensors.packet_framer as packet_framer_module
+
+    data = generate_stream(args.packets)
+    chunk = args.chunk
+    print(f"Luồng {len(data)} bytes, nạp từng đoạn {chunk} bytes rồi drain()")
+    results = {}
+    default_threshold = packet_framer_module.VECTORIZED_DRAIN_MIN_BYTES
+    for name, threshold in (("sequential", float('inf')), ("numpy", 0)):
+        packet_framer_module.VECTORIZED_DRAIN_MIN_BYTES = threshold
+        framer = PacketFramer(capacity=chunk + 64)
+        packets = []
+        start = time.perf_counter()
+        for pos in range(0, len(data), chunk):
+            framer.feed(data[pos:pos + chunk])
+            packets.extend(framer.drain())
+        elapsed = time.perf_counter() - start
+        results[name] = (packets, framer.get_stats())
+        print(f"{name:<10} {len(packets):>10d} gói  {len(packets) / elapsed:>12,.0f} gói/s  "
+              f"{len(data) / elapsed / 1e6:>6.2f} MB/s  (921600 baud = 0.09 MB/s)")
+    packet_framer_module.VECTORIZED_DRAIN_MIN_BYTES = default_threshold
+    same = results["sequential"] == results["numpy"]
+    print(f"Kết quả và bộ đếm giống nhau: {same}")
+
+
+def bench_decode(args):
+    data = generate_stream(args.packets, garbage_ratio=0, corrupt_ratio=0)
+    framer = PacketFramer(capacity=len(data) + 1)
+    framer.feed(data)
+    packets = framer.drain()
+    decoder = HWT905DataDecoder()
+
+    start = time.perf_counter()
+    for packet in packets:
+        decoder.decode_raw_packet(packet)
+    elapsed = time.perf_counter() - start
+    print(f"{'dict':<10} {len(packets) / elapsed:>12,.0f} gói/s  {elapsed * 1e6 / len(packets):>6.2f} µs/gói")
+
+    start = time.perf_counter()
+    for packet in packets:
+        decode_packet_fast(packet)
+    elapsed = time.perf_counter() - start
+    print(f"{'struct':<10} {len(packets) / elapsed:>12,.0f} gói/s  {elapsed * 1e6 / len(packets):>6.2f} µs/gói")
+
+    for block_size in (args.block, len(packets)):
+        blocks = [b''.join(packets[i:i + block_size]) for i in range(0, len(packets), block_size)]
+        start = time.perf_counter()
+        for block in blocks:
+            decode_packet_block(block)
+        elapsed = time.perf_counter() - start
+        print(f"{'batch/' + str(block_size):<10} {len(packets) / elapsed:>12,.0f} gói/s  "
+              f"{elapsed * 1e6 / len(packets):>6.2f} µs/gói")
+
+
+def bench_routing(args):
+    rng = random.Random(7)
+    packet_types = [PACKET_TYPE_ACC] + [0x50, 0x52, 0x53, 0x54, 0x59][:args.extra_types]
+    data = b''.join(create_data_packet(packet_type, bytes(rng.randint(0, 255) for _ in range(8)))
+                    for _ in range(args.packets // len(packet_types)) for packet_type in packet_types)
+    decoder = HWT905DataDecoder()
+    print(f"{len(packet_types)} loại gói đang bật, chỉ ACC được xử lý")
+
+    # Cách cũ: giải mã mọi gói thành dict rồi bỏ các gói không phải gia tốc
+    framer = PacketFramer(capacity=len(data) + 1)
+    framer.feed(data)
+    start = time.perf_counter()
+    kept = 0
+    for packet in framer.drain():
+        if decoder.decode_raw_packet(packet).get("type") == PACKET_TYPE_ACC:
+            kept += 1
+    legacy = time.perf_counter() - start
+
+    # Định tuyến: framer bỏ loại gói không đăng ký, chỉ gói ACC được giải mã
+    router = PacketRouter()
+    target = Queue()
+    router.subscribe(PACKET_TYPE_ACC, target, blocking=True)
+    framer = PacketFramer(capacity=len(data) + 1)
+    framer.set_type_filter(router.type_mask)
+    framer.feed(data)
+    start = time.perf_counter()
+    router.route_batch(framer.drain())
+    routed_kept = 0
+    for packet in target.get():
+        decoder.decode_raw_packet_fast(packet)
+        routed_kept += 1
+    routed = time.perf_counter() - start
+
+    total = len(data) // DATA_PACKET_LENGTH
+    for name, elapsed, count in (("decode-all", legacy, kept), ("routed", routed, routed_kept)):
+        print(f"{name:<10} {count:>8d} gói ACC  {elapsed * 1e6 / total:>6.2f} µs/gói nhận được")
+
+
+def _legacy_sample_chain(i: int, values: List[float]):
+    """Các dict mà pipeline cũ tạo cho một mẫu: hàng đợi giải mã, kết quả xử lý, bản sao native, payload MQTT."""
+    acc_data = {'acc_x': values[0], 'acc_y': values[1], 'acc_z': values[2]}
+    decoded_item = (float(i), acc_data)
+    processed = dict(zip(ProcessedSample._fields[1:], values[:18]))
+    processed['ts'] = float(i)
+    native = {key: value for key, value in processed.items()}
+    mqtt_payload = {name: native.get(name) for name in
+                    ('ts', 'disp_x', 'disp_y', 'disp_z', 'dominant_freq_x', 'dominant_freq_y', 'dominant_freq_z')}
+    return decoded_item, processed, native, mqtt_payload
+
+
+def _record_sample_chain(i: int, values: List[float]):
+    """Các bản ghi pipeline mới tạo cho một mẫu; dict MQTT chỉ tạo khi tuần tự hóa."""
+    return AccSample(float(i), values[0], values[1], values[2]), ProcessedSample(float(i), *values[:18])
+
+
+def bench_records(args):
+    rng = random.Random(3)
+    # Giá trị float riêng cho mỗi mẫu, tạo trước để không tính vào bộ nhớ đo được
+    values = [[rng.random() for _ in range(18)] for _ in range(args.samples)]
+    for name, build in (("dict", _legacy_sample_chain), ("record", _record_sample_chain)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        in_flight = [build(i, values[i]) for i in range(args.samples)]
+        elapsed = time.perf_counter() - start
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<10} {current / args.samples:>8.0f} bytes/mẫu  {elapsed * 1e6 / args.samples:>6.2f} µs/mẫu (có tracemalloc)")
+        del in_flight
+
+    sample = _record_sample_chain(0, values[0])[1]
+    start = time.perf_counter()
+    for _ in range(args.samples):
+        to_mqtt_point(sample)
+    elapsed = time.perf_counter() - start
+    print(f"{'to_mqtt':<10} {elapsed * 1e6 / args.samples:>6.2f} µs/điểm khi tuần tự hóa")
+
+
+def bench_capture(args):
+    import shutil
+    import tempfile
+    from src.storage.raw_capture import RawCaptureWriter
+    from src.storage.storage_manager import StorageManager
+
+    data = generate_stream(args.packets, garbage_ratio=0, corrupt_ratio=0)
+    framer = PacketFramer(capacity=len(data) + 1)
+    framer.feed(data)
+    packets = framer.drain()
+    records = [decode_packet_fast(packet) for packet in packets]
+    t0 = time.time()
+    base_dir = tempfile.mkdtemp(prefix='hwt905_capture_')
+    try:
+        # Cách cũ: mỗi mẫu gia tốc là một dòng CSV (định dạng + flush cho mỗi dòng)
+        manager = StorageManager({'base_dir': base_dir, 'max_file_size_mb': 1024}, data_type='decoded',
+                                 fields_to_write=['acc_x', 'acc_y', 'acc_z'])
+        start = time.perf_counter()
+        for i, record in enumerate(records):
+            manager.store_and_prepare_for_transmission(
+                AccSample(t0 + i * 0.005, record.acc_x, record.acc_y, record.acc_z), t0 + i * 0.005)
+        manager.close()
+        csv_elapsed = time.perf_counter() - start
+        csv_bytes = sum(f.stat().st_size for f in manager.data_storage.data_dir.iterdir())
+
+        # Dữ liệu thô: các gói của mỗi lần đọc được nối vào block, chỉ mục mỗi giây
+        writer = RawCaptureWriter(base_data_dir=base_dir)
+        start = time.perf_counter()
+        for i in range(0, len(packets), args.batch):
+            writer.write_packets(packets[i:i + args.batch], t0 + i * 0.005)
+        writer.close()
+        raw_elapsed = time.perf_counter() - start
+        raw_bytes = sum(f.stat().st_size for f in writer.data_dir.iterdir())
+    finally:
+        shutil.rmtree(base_dir)
+
+    for name, elapsed, size in (("csv", csv_elapsed, csv_bytes), ("raw", raw_elapsed, raw_bytes)):
+        print(f"{name:<6} {elapsed * 1e6 / len(packets):>7.2f} µs/mẫu  {size / len(packets):>6.1f} bytes/mẫu  "
+              f"tổng {size / 1024:>9.1f} KiB")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+def _run_reader(mode: str, seconds: float, rate_hz: float, args) -> dict:
+    """
+    Chạy vòng lặp đọc giống SerialReaderThread trên một cặp pty.
+    rate_hz = 0 nghĩa là không gửi dữ liệu (đo CPU lúc nhàn rỗi).
+    """
+    import serial  # Chỉ cần cho benchmark này
+
+    master_fd, slave_fd = os.openpty()
+    ser = serial.Serial(os.ttyname(slave_fd), 115200, timeout=0.1)
+    decoder = HWT905DataDecoder(read_mode=mode, read_min_chunk_bytes=args.min_chunk,
+                                read_latency_ms=args.latency_ms)
+    decoder.set_ser_instance(ser)
+
+    running = threading.Event()
+    running.set()
+    send_times = {}
+    latencies = []
+    result = {}
+
+    def reader():
+        cpu_start = time.thread_time()
+        wakeups = 0
+        while running.is_set():
+            wakeups += 1
+            packets = decoder.read_raw_packets()
+            if packets:
+                now = time.perf_counter()
+                for packet in packets:
+                    seq = struct.unpack_from('<H', packet, 8)[0]
+                    sent = send_times.pop(seq, None)
+                    if sent is not None:
+                        latencies.append(now - sent)
+            elif not decoder.is_event_driven:
+                time.sleep(0.0001)
+        result['cpu'] = time.thread_time() - cpu_start
+        result['wakeups'] = wakeups
+
+    t = threading.Thread(target=reader)
+    t.start()
+    start = time.perf_counter()
+    seq = 0
+    if rate_hz > 0:
+        period = 1.0 / rate_hz
+        next_send = start
+        while time.perf_counter() - start < seconds:
+            payload = struct.pack('<hhhH', 100, -100, 2048, seq & 0xFFFF)
+            send_times[seq & 0xFFFF] = time.perf_counter()
+            os.write(master_fd, create_data_packet(PACKET_TYPE_ACC, payload))
+            seq += 1
+            next_send += period
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    else:
+        time.sleep(seconds)
+    # Cho luồng đọc nhận nốt dữ liệu còn lại
+    time.sleep(args.latency_ms / 1000.0 * 2)
+    running.clear()
+    os.write(master_fd, b'\x00' * args.min_chunk)  # Đánh thức lệnh đọc đang chặn
+    t.join()
+    elapsed = time.perf_counter() - start
+    ser.close()
+    os.close(master_fd)
+    os.close(slave_fd)
+
+    result.update({'elapsed': elapsed, 'sent': seq, 'received': len(latencies),
+                   'p50_ms': _percentile(latencies, 50) * 1000,
+                   'p99_ms': _percentile(latencies, 99) * 1000})
+    return result
+
+
+def bench_reader(args):
+    print(f"pty, {args.rate:.0f} Hz, min_chunk={args.min_chunk} B, latency={args.latency_ms} ms, "
+          f"{args.seconds:.1f} s mỗi lần đo")
+    for mode in SUPPORTED_READ_MODES:
+        idle = _run_reader(mode, args.seconds, 0, args)
+        busy = _run_reader(mode, args.seconds, args.rate, args)
+        print(f"{mode:<6} nhàn rỗi: CPU {idle['cpu'] / idle['elapsed'] * 100:>6.2f}%  "
+              f"{idle['wakeups'] / idle['elapsed']:>8,.0f} lần đọc/s | "
+              f"{args.rate:.0f} Hz: CPU {busy['cpu'] / busy['elapsed'] * 100:>6.2f}%  "
+              f"{busy['wakeups'] / busy['elapsed']:>8,.0f} lần đọc/s  "
+              f"nhận {busy['received']}/{busy['sent']}  "
+              f"p50 {busy['p50_ms']:.2f} ms  p99 {busy['p99_ms']:.2f} ms")
+
+
+def _start_emulator(link: str, rate_hz: float, types: str) -> subprocess.Popen:
+    """Chạy bộ giả lập HWT905 trong tiến trình riêng và đợi tới khi symlink của pty sẵn sàng."""
+    emulator = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__), 'hwt905_emulator.py'),
+         '--link', link, '--rate', str(rate_hz), '--types', types],
+        env={**os.environ, 'PYTHONPATH': os.path.dirname(os.path.dirname(os.path.abspath(__file__)))})
+    deadline = time.monotonic() + 10.0
+    while not os.path.islink(link):
+        if time.monotonic() > deadline or emulator.poll() is not None:
+            emulator.terminate()
+            raise RuntimeError("Bộ giả lập không khởi động được")
+        time.sleep(0.05)
+    return emulator
+
+
+def bench_pipeline(args):
+    """
+    Chạy chuỗi reader -> decoder -> processor thật trên bộ giả lập HWT905 (tiến trình riêng),
+    đo số mẫu tới hàng đợi MQTT, độ trễ từ lúc giải mã và CPU của tiến trình pipeline.
+    """
+    # Các luồng pipeline cần toàn bộ phụ thuộc của ứng dụng (paho-mqtt...)
+    from src.core.async_data_manager import SerialReaderThread, DecoderThread, ProcessorThread
+    from src.core.connection_manager import SensorConnectionManager
+    from src.processing.data_processor import SensorDataProcessor
+
+    link = f"/tmp/ttyHWT905bench{os.getpid()}"
+    emulator = _start_emulator(link, args.rate, args.types)
+    try:
+        running = threading.Event()
+        running.set()
+        raw_q, decoded_q, mqtt_q = Queue(maxsize=8192), Queue(maxsize=8192), Queue(maxsize=8192)
+        connection = SensorConnectionManager({'uart_port_pattern': link, 'baud_rate': 115200})
+        decoder = HWT905DataDecoder(read_mode=args.read_mode)
+        processor = SensorDataProcessor(dt_sensor=1.0 / args.rate, gravity_g=9.80665)
+        threads = [
+            SerialReaderThread(connection, decoder, raw_q, running, batch_mode=not args.no_batch),
+            DecoderThread(decoder, raw_q, decoded_q, running),
+            ProcessorThread(decoded_q, running, processor, mqtt_queue=mqtt_q),
+        ]
+        for thread in threads:
+            thread.start()
+
+        latencies = []
+        # Bỏ qua giai đoạn kết nối và làm ấm RLS/FFT
+        warmup_end = time.time() + args.warmup
+        measure_start = cpu_start = None
+        max_depth = 0
+        while True:
+            now = time.time()
+            if measure_start is None and now >= warmup_end:
+                measure_start, cpu_start = now, time.process_time()
+                latencies.clear()
+            if measure_start is not None and now - measure_start >= args.seconds:
+                break
+            try:
+                sample = mqtt_q.get(timeout=0.5)
+            except Empty:
+                continue
+            if sample is not None:
+                latencies.append(time.time() - sample.ts)
+            max_depth = max(max_depth, raw_q.qsize(), decoded_q.qsize(), mqtt_q.qsize())
+        cpu = time.process_time() - cpu_start
+        elapsed = time.time() - measure_start
+        running.clear()
+        # Luồng đọc tự đóng cổng khi thoát vòng lặp
+        threads[0].join(timeout=2.0)
+    finally:
+        emulator.terminate()
+        emulator.wait()
+
+    print(f"{args.rate:.0f} Hz ({args.types}), read_mode={args.read_mode}, batch={not args.no_batch}: "
+          f"{len(latencies) / elapsed:,.0f} mẫu/s tới hàng đợi MQTT  CPU {cpu / elapsed * 100:.1f}%  "
+          f"độ trễ p50 {_percentile(latencies, 50) * 1000:.2f} ms  p99 {_percentile(latencies, 99) * 1000:.2f} ms  "
+          f"hàng đợi sâu nhất {max_depth}")
+
+
+def _run_multisensor(n_sensors: int, args) -> Tuple[float, float]:
+    """Chạy n_sensors cảm biến giả lập qua pipeline chung; trả về (mẫu/s tổng, CPU %)."""
+    from src.core.async_data_manager import SerialReaderThread, DecoderThread, ProcessorThread
+    from src.core.connection_manager import SensorConnectionManager
+    from src.processing.data_processor import SensorDataProcessor, SensorProcessorPool
+
+    links = [f"/tmp/ttyHWT905bench{os.getpid()}_{i}" for i in range(n_sensors)]
+    emulators = []
+    try:
+        for link in links:
+            emulators.append(_start_emulator(link, args.rate, 'acc'))
+
+        running = threading.Event()
+        running.set()
+        decoded_q, mqtt_q = Queue(maxsize=8192), Queue(maxsize=8192)
+        readers, threads = [], []
+        for link in links:
+            raw_q = Queue(maxsize=8192)
+            connection = SensorConnectionManager({'uart_port_pattern': link, 'baud_rate': 115200})
+            decoder = HWT905DataDecoder(read_mode=args.read_mode)
+            sensor_id = os.path.basename(link)
+            readers.append(SerialReaderThread(connection, decoder, raw_q, running, batch_mode=True,
+                                              sensor_id=sensor_id))
+            threads.append(DecoderThread(decoder, raw_q, decoded_q, running, sensor_id=sensor_id))
+        output_q = decoded_q
+        if not args.no_process:
+            pool = SensorProcessorPool(lambda: SensorDataProcessor(dt_sensor=1.0 / args.rate, gravity_g=9.80665))
+            threads.append(ProcessorThread(decoded_q, running, pool, mqtt_queue=mqtt_q,
+                                           producer_count=n_sensors))
+            output_q = mqtt_q
+        for thread in readers + threads:
+            thread.start()
+
+        warmup_end = time.time() + args.warmup
+        measure_start = cpu_start = None
+        count = 0
+        while True:
+            now = time.time()
+            if measure_start is None and now >= warmup_end:
+                measure_start, cpu_start = now, time.process_time()
+                count = 0
+            if measure_start is not None and now - measure_start >= args.seconds:
+                break
+            try:
+                sample = output_q.get(timeout=0.5)
+            except Empty:
+                continue
+            if sample is not None:
+                count += 1
+        cpu = time.process_time() - cpu_start
+        elapsed = time.time() - measure_start
+        running.clear()
+        # Luồng đọc tự đóng cổng khi thoát vòng lặp
+        for reader in readers:
+            reader.join(timeout=2.0)
+    finally:
+        for emulator in emulators:
+            emulator.terminate()
+            emulator.wait()
+    return count / elapsed, cpu / elapsed * 100
+
+
+def bench_multisensor(args):
+    """
+    Tăng dần số cảm biến giả lập (mỗi cảm biến một luồng đọc + giải mã, dùng chung luồng xử lý),
+    đo số mẫu/s tổng và CPU trên mỗi cảm biến của tiến trình pipeline.
+    """
+    for n_sensors in range(1, args.max_sensors + 1):
+        rate, cpu = _run_multisensor(n_sensors, args)
+        print(f"{n_sensors} cảm biến x {args.rate:.0f} Hz, xử lý={not args.no_process}: "
+              f"{rate:,.0f} mẫu/s tổng ({rate / (n_sensors * args.rate) * 100:.0f}% dự kiến)  "
+              f"CPU {cpu:.1f}%  CPU/cảm biến {cpu / n_sensors:.1f}%")
+
+
+def _time_to_first_sample(sensor_config: dict) -> Tuple[float, float]:
+    """Kết nối bằng SensorConnectionManager và đọc tới gói đầu tiên; trả về (thời gian kết nối, tới mẫu đầu)."""
+    from src.core.connection_manager import SensorConnectionManager
+
+    connection = SensorConnectionManager(sensor_config)
+    ser = connection.establish_connection()
+    decoder = HWT905DataDecoder(read_mode='event')
+    decoder.set_ser_instance(ser)
+    while not decoder.read_raw_packets():
+        pass
+    connection.record_first_sample()
+    stats = connection.get_stats()
+    connection.close_connection()
+    return stats['last_connect_time_s'], stats['last_time_to_first_sample_s']
+
+
+def bench_reconnect(args):
+    """
+    Đo thời gian tới mẫu đầu tiên khi dò cảm biến giữa nhiều cổng không phản hồi:
+    thử tuần tự như cũ, thử song song, và thử trước cổng/baudrate tốt gần nhất đã lưu.
+    """
+    import pty
+    import tempfile
+
+    prefix = f"/tmp/ttyHWTbench{os.getpid()}_"
+    decoys = []
+    for i in range(args.decoys):
+        master, slave = pty.openpty()
+        link = f"{prefix}a{i}"
+        os.symlink(os.ttyname(slave), link)
+        decoys.append((master, slave, link))
+    # Tên cổng của cảm biến xếp sau các cổng không phản hồi: trường hợp xấu nhất khi dò tuần tự
+    emulator = _start_emulator(f"{prefix}z", args.rate, 'acc')
+    state_file = os.path.join(tempfile.mkdtemp(), 'connection_state.json')
+    try:
+        base_config = {'uart_port_pattern': f"{prefix}*", 'baud_rate': 115200, 'reconnect_delay_s': 1}
+        runs = [
+            ("tuần tự", dict(base_config)),
+            ("song song", dict(base_config, parallel_probe=True)),
+            ("cổng đã lưu", dict(base_config, parallel_probe=True, connection_state_file=state_file)),
+        ]
+        # Lần kết nối đầu tiên ghi file trạng thái cho trường hợp "cổng đã lưu"
+        _time_to_first_sample(runs[2][1])
+        for name, sensor_config in runs:
+            connect_s, first_sample_s = _time_to_first_sample(sensor_config)
+            print(f"{args.decoys} cổng không phản hồi, {name:>12}: kết nối {connect_s:6.2f} s  "
+                  f"tới mẫu đầu tiên {first_sample_s:6.2f} s")
+    finally:
+        emulator.terminate()
+        emulator.wait()
+        for master, slave, link in decoys:
+            os.unlink(link)
+            os.close(master)
+            os.close(slave)
+
+
+def bench_baud(args):
+    """
+    So sánh dò baudrate chủ động (gửi lệnh đọc thanh ghi ở từng baudrate) với dò thụ động
+    (nghe luồng gói) trên bộ giả lập có giả lập sai baudrate; đo thời gian và số lệnh cảm biến nhận.
+    """
+    from src.core.connection_manager import SensorConnectionManager
+    from src.sensors.hwt905_emulator import HWT905Emulator
+
+    for mode in ('active', 'passive'):
+        link = f"/tmp/ttyHWTbench{os.getpid()}"
+        with HWT905Emulator(link_path=link, rate_hz=args.rate, baudrate=args.sensor_baud,
+                            emulate_baud=True) as emulator:
+            connection = SensorConnectionManager({'uart_port_pattern': link, 'baud_rate': 115200,
+                                                  'baud_detection': mode,
+                                                  'default_output_rate_hz': args.rate})
+            start = time.perf_counter()
+            ser = connection.establish_connection()
+            elapsed = time.perf_counter() - start
+            baudrate = ser.baudrate
+            connection.close_connection()
+            commands = emulator.get_stats()['commands_received']
+        print(f"{mode:>8}: cảm biến {args.sensor_baud} bps, tìm thấy {baudrate} bps sau {elapsed:.2f} s, "
+              f"cảm biến nhận {commands} lệnh")
+
+
+def _timestamp_jitter(timestamps: List[float], dt: float) -> str:
+    steps = [b - a for a, b in zip(timestamps, timestamps[1:])]
+    errors = [abs(step - dt) * 1000 for step in steps]
+    return (f"{len(timestamps)} mẫu  |Δt - dt| p50 {_percentile(errors, 50):.3f} ms  "
+            f"p99 {_percentile(errors, 99):.3f} ms  max {max(errors, default=float('nan')):.3f} ms  "
+            f"bước lùi/bằng 0: {sum(step <= 0 for step in steps)}")
+
+
+def bench_timestamps(args):
+    """
+    So sánh timestamp theo giờ máy (HostTimestamper) với TimestampEngine:
+    1. Mô phỏng: luồng 200 Hz có độ trễ đọc ngẫu nhiên và một khoảng mất mẫu, so với giờ thật.
+    2. Pipeline reader -> decoder trên bộ giả lập (pty), đo jitter của Δt giữa các mẫu.
+    """
+    from src.core.async_data_manager import SerialReaderThread, DecoderThread
+    from src.core.connection_manager import SensorConnectionManager
+    from src.core.timestamp_engine import HostTimestamper, TimestampEngine, SUPPORTED_TIMESTAMP_MODES
+    from src.sensors.hwt905_constants import PACKET_TYPE_TIME
+    from src.sensors.hwt905_emulator import HWT905Emulator
+
+    dt = 1.0 / args.rate
+    rng = random.Random(1)
+    n_samples = int(args.seconds * args.rate)
+    gap_start, gap_length = n_samples // 2, args.gap_samples
+    engine = TimestampEngine(args.rate)
+    host = HostTimestamper(args.rate)
+    true_ts, host_ts, engine_ts = [], [], []
+    start = 1_700_000_000.0
+    for first in range(0, n_samples, args.chunk):
+        indices = [i for i in range(first, min(first + args.chunk, n_samples))
+                   if not gap_start <= i < gap_start + gap_length]
+        if not indices:
+            continue
+        arrival = start + indices[-1] * dt + 0.001 + rng.expovariate(1 / 0.003)
+        true_ts += [start + i * dt for i in indices]
+        host_ts += host.stamp(len(indices), arrival).tolist()
+        engine_ts += engine.stamp(len(indices), arrival).tolist()
+    for name, values in (('host (rải theo dt)', host_ts), ('TimestampEngine', engine_ts)):
+        errors = [abs(v - t) * 1000 for v, t in zip(values, true_ts)]
+        offsets = [v - t for v, t in zip(values, true_ts)]
+        mean = sum(offsets) / len(offsets)
+        spread = [abs(o - mean) * 1000 for o in offsets]
+        print(f"mô phỏng {name:<20}: sai số tuyệt đối p50 {_percentile(errors, 50):.2f} ms, "
+              f"độ lệch quanh trung bình p99 {_percentile(spread, 99):.3f} ms")
+    stats = engine.get_stats()
+    print(f"  mất {gap_length} mẫu -> phát hiện {stats['gap_count']} khoảng, ~{stats['missing_samples']} mẫu")
+
+    for mode in SUPPORTED_TIMESTAMP_MODES:
+        link = f"/tmp/ttyHWTbench{os.getpid()}"
+        with HWT905Emulator(link_path=link, rate_hz=args.rate, packet_types=(PACKET_TYPE_TIME, PACKET_TYPE_ACC)):
+            running = threading.Event()
+            running.set()
+            raw_q, decoded_q = Queue(maxsize=8192), Queue(maxsize=65536)
+            router = PacketRouter()
+            router.subscribe(PACKET_TYPE_ACC, raw_q, blocking=True)
+            if mode == 'sensor_time':
+                router.subscribe(PACKET_TYPE_TIME, raw_q, blocking=True)
+            engine = TimestampEngine(args.rate) if mode != 'host' else None
+            decoder = HWT905DataDecoder(read_mode='event', read_min_chunk_bytes=44)
+            connection = SensorConnectionManager({'uart_port_pattern': link, 'baud_rate': 115200})
+            reader = SerialReaderThread(connection, decoder, raw_q, running, batch_mode=True,
+                                        packet_router=router, stamp_arrival=engine is not None)
+            decoder_thread = DecoderThread(decoder, raw_q, decoded_q, running, timestamp_engine=engine,
+                                           sample_rate_hz=args.rate)
+            reader.start()
+            decoder_thread.start()
+            time.sleep(args.warmup)
+            while not decoded_q.empty():
+                decoded_q.get_nowait()
+            time.sleep(args.seconds)
+            running.clear()
+            reader.join(timeout=2.0)
+            decoder_thread.join(timeout=2.0)
+            timestamps = []
+            while not decoded_q.empty():
+                sample = decoded_q.get_nowait()
+                if sample is not None:
+                    timestamps.append(sample.ts)
+        print(f"pipeline {mode:<11}: {_timestamp_jitter(timestamps, dt)}")
+
+
+class _CountingQueue(Queue):
+    """Queue đếm số lần put() thành công."""
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.puts = 0
+
+    def _put(self, item):
+        self.puts += 1
+        super()._put(item)
+
+
+def _run_block_pipeline(block_mode: bool, args) -> dict:
+    from src.core.async_data_manager import SerialReaderThread, DecoderThread, ProcessorThread
+    from src.core.connection_manager import SensorConnectionManager
+    from src.processing.data_processor import SensorDataProcessor
+    from src.sensors.hwt905_emulator import HWT905Emulator
+
+    link = f"/tmp/ttyHWTbench{os.getpid()}"
+    latency_s = args.latency_ms / 1000.0
+    with HWT905Emulator(link_path=link, rate_hz=args.rate):
+        running = threading.Event()
+        running.set()
+        raw_q, decoded_q, mqtt_q = _CountingQueue(8192), _CountingQueue(8192), _CountingQueue(8192)
+        connection = SensorConnectionManager({'uart_port_pattern': link, 'baud_rate': 115200})
+        decoder = HWT905DataDecoder(read_mode='event', read_min_chunk_bytes=44)
+        processor = SensorDataProcessor(dt_sensor=1.0 / args.rate, gravity_g=9.80665)
+        threads = [
+            SerialReaderThread(connection, decoder, raw_q, running, batch_mode=True,
+                               block_packets=args.block_size if block_mode else 0,
+                               block_max_latency_s=latency_s),
+            DecoderThread(decoder, raw_q, decoded_q, running, block_mode=block_mode),
+            ProcessorThread(decoded_q, running, processor, mqtt_queue=mqtt_q),
+        ]
+        for thread in threads:
+            thread.start()
+
+        latencies = []
+        samples = 0
+        measure_start = None
+        warmup_end = time.time() + args.warmup
+        while True:
+            now = time.time()
+            if measure_start is None and now >= warmup_end:
+                measure_start, cpu_start = now, time.process_time()
+                puts_start = [q.puts for q in (raw_q, decoded_q, mqtt_q)]
+                latencies.clear()
+                samples = 0
+            if measure_start is not None and now - measure_start >= args.seconds:
+                break
+            try:
+                item = mqtt_q.get(timeout=0.5)
+            except Empty:
+                continue
+            received = time.time()
+            for sample in (item if isinstance(item, list) else [item]):
+                latencies.append(received - sample.ts)
+                samples += 1
+        cpu = time.process_time() - cpu_start
+        elapsed = time.time() - measure_start
+        puts = sum(q.puts for q in (raw_q, decoded_q, mqtt_q)) - sum(puts_start)
+        running.clear()
+        threads[0].join(timeout=2.0)
+    return {'samples': samples / elapsed, 'puts': puts / elapsed, 'cpu': cpu / elapsed * 100,
+            'p50': _percentile(latencies, 50) * 1000, 'p99': _percentile(latencies, 99) * 1000}
+
+
+def bench_blocks(args):
+    """
+    So sánh pipeline reader -> decoder -> processor chuyển từng mẫu với chế độ khối
+    trên bộ giả lập HWT905: số lần put() vào hàng đợi, CPU và độ trễ tới hàng đợi MQTT.
+    """
+    print(f"{args.rate:.0f} Hz, khối {args.block_size} mẫu / {args.latency_ms:.0f} ms, {args.seconds:.0f} s mỗi lần đo")
+    for block_mode in (False, True):
+        result = _run_block_pipeline(block_mode, args)
+        print(f"{'khối' if block_mode else 'từng mẫu':>9}: {result['samples']:,.0f} mẫu/s  "
+              f"{result['puts']:,.0f} put()/s  CPU {result['cpu']:.1f}%  "
+              f"độ trễ p50 {result['p50']:.1f} ms  p99 {result['p99']:.1f} ms")
+
+
+def _transfer(mode: str, chunks: List['np.ndarray'], capacity: int) -> float:
+    """Chuyển các đoạn mẫu từ một luồng ghi sang một luồng đọc; trả về số giây."""
+    from src.core.records import AccBlock
+    from src.core.sample_ring import SampleRing
+
+    if mode == 'ring':
+        ring = SampleRing(capacity)
+    else:
+        queue = Queue(maxsize=capacity if mode == 'queue/mẫu' else max(1, capacity // len(chunks[0])))
+    received = [0]
+
+    def consumer():
+        if mode == 'ring':
+            while True:
+                block = ring.read(256, timeout=1.0)
+                if block is None:
+                    if ring.exhausted:
+                        return
+                    continue
+                received[0] += len(block.data)
+        else:
+            while True:
+                item = queue.get()
+                if item is None:
+                    return
+                received[0] += len(item.data) if isinstance(item, AccBlock) else 1
+
+    thread = threading.Thread(target=consumer)
+    start = time.perf_counter()
+    thread.start()
+    for chunk in chunks:
+        if mode == 'ring':
+            ring.write(chunk)
+        elif mode == 'queue/khối':
+            queue.put(AccBlock(chunk))
+        else:
+            for ts, acc_x, acc_y, acc_z in chunk.tolist():
+                queue.put(AccSample(ts, acc_x, acc_y, acc_z))
+    if mode == 'ring':
+        ring.close()
+    else:
+        queue.put(None)
+    thread.join()
+    assert received[0] == sum(len(chunk) for chunk in chunks)
+    return time.perf_counter() - start
+
+
+def _full_memory(mode: str, chunks: List['np.ndarray'], capacity: int) -> int:
+    """Bộ nhớ cấp phát (tracemalloc) khi hàng đợi/vòng chứa đầy capacity mẫu, bên đọc bị chậm."""
+    from src.core.records import AccBlock
+    from src.core.sample_ring import SampleRing
+
+    tracemalloc.start()
+    if mode == 'ring':
+        ring = SampleRing(capacity)
+    else:
+        queue = Queue()
+    stored = 0
+    for chunk in chunks:
+        if stored + len(chunk) > capacity:
+            break
+        if mode == 'ring':
+            ring.write(chunk)
+        elif mode == 'queue/khối':
+            queue.put(AccBlock(chunk.copy()))
+        else:
+            for ts, acc_x, acc_y, acc_z in chunk.tolist():
+                queue.put(AccSample(ts, acc_x, acc_y, acc_z))
+        stored += len(chunk)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def bench_ring(args):
+    """
+    So sánh chuyển mẫu đã giải mã giữa hai luồng: Queue từng AccSample, Queue từng AccBlock
+    và SampleRing (mảng NumPy cấp phát sẵn): thông lượng và bộ nhớ khi đầy.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(1)
+    n_chunks = args.samples // args.chunk
+    chunks = [rng.standard_normal((args.chunk, 4)) for _ in range(n_chunks)]
+    print(f"{n_chunks * args.chunk:,} mẫu, {args.chunk} mẫu mỗi lần ghi, dung lượng {args.capacity} mẫu")
+    for mode in ('queue/mẫu', 'queue/khối', 'ring'):
+        elapsed = _transfer(mode, chunks, args.capacity)
+        memory = _full_memory(mode, chunks, args.capacity)
+        print(f"{mode:>10}: {n_chunks * args.chunk / elapsed:>12,.0f} mẫu/s  "
+              f"bộ nhớ khi đầy {memory / 1024:>9,.1f} KiB")
+
+
+class _StampingQueue(Queue):
+    """Queue ghi lại thời điểm mỗi lần put() (để đo khoảng ngắt của luồng đọc)."""
+
+    def __init__(self, maxsize: int = 0):
+        super().__init__(maxsize)
+        self.put_times: List[float] = []
+
+    def _put(self, item):
+        self.put_times.append(time.perf_counter())
+        super()._put(item)
+
+
+def _process_cpu_seconds(pid: int) -> float:
+    """Tổng thời gian CPU (user + system) của một tiến trình khác, đọc từ /proc (Linux)."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def _run_execution(execution: str, args) -> dict:
+    from src.core.async_data_manager import SerialReaderThread, DecoderThread, ProcessorThread
+    from src.core.connection_manager import SensorConnectionManager
+    from src.core.process_pipeline import (
+        PROCESSED_ROW_WIDTH, ProcessedRingQueue, ProcessingProcess, create_processing_stage
+    )
+    from src.core.sample_ring import RingSignal, SampleRing
+    from src.core.shared_ring import SharedRing, SharedRingSignal
+    from src.sensors.hwt905_emulator import HWT905Emulator
+    from src.utils.common import load_config
+
+    app_config = load_config()
+    app_config["processing"]["dt_sensor_actual"] = 1.0 / args.rate
+    app_config["data_storage"] = {"enabled": False}
+
+    link = f"/tmp/ttyHWTbench{os.getpid()}"
+    running = threading.Event()
+    running.set()
+    raw_q = _StampingQueue(8192)
+    process = None
+    shared_rings: List[SharedRing] = []
+    with HWT905Emulator(link_path=link, rate_hz=args.rate):
+        connection = SensorConnectionManager({'uart_port_pattern': link, 'baud_rate': 115200})
+        decoder = HWT905DataDecoder(read_mode='event', read_min_chunk_bytes=44)
+        threads = [SerialReaderThread(connection, decoder, raw_q, running, batch_mode=True)]
+        if execution == 'processes':
+            process_running = multiprocessing.Event()
+            process_running.set()
+            signal = SharedRingSignal()
+            sample_ring = SharedRing(args.ring_capacity, read_signal=signal)
+            processed_ring = SharedRing(args.ring_capacity, width=PROCESSED_ROW_WIDTH)
+            shared_rings = [sample_ring, processed_ring]
+            output = ProcessedRingQueue(processed_ring, [''])
+            process = ProcessingProcess(app_config, [sample_ring], signal, process_running,
+                                        processed_ring=processed_ring, ring_read_rows=args.block_size)
+            process.start()
+        else:
+            signal = RingSignal()
+            sample_ring = SampleRing(args.ring_capacity, read_signal=signal)
+            output = Queue(8192)
+            processor, _ = create_processing_stage(app_config, multi_sensor=False)
+            threads.append(ProcessorThread(None, running, processor, mqtt_queue=output,
+                                           sample_rings=[sample_ring], ring_signal=signal,
+                                           ring_read_rows=args.block_size))
+        threads.append(DecoderThread(decoder, raw_q, None, running, sample_ring=sample_ring))
+        for thread in threads:
+            thread.start()
+
+        latencies = []
+        samples = 0
+        measure_start = None
+        warmup_end = time.time() + args.warmup
+        while True:
+            now = time.time()
+            if measure_start is None and now >= warmup_end:
+                measure_start = now
+                cpu_start = time.process_time()
+                child_cpu_start = _process_cpu_seconds(process.pid) if process else 0.0
+                puts_start = len(raw_q.put_times)
+                latencies.clear()
+                samples = 0
+            if measure_start is not None and now - measure_start >= args.seconds:
+                break
+            try:
+                item = output.get(timeout=0.5)
+            except Empty:
+                continue
+            received = time.time()
+            for sample in (item if isinstance(item, list) else [item]):
+                latencies.append(received - sample.ts)
+                samples += 1
+        elapsed = time.time() - measure_start
+        cpu = time.process_time() - cpu_start
+        child_cpu = _process_cpu_seconds(process.pid) - child_cpu_start if process else 0.0
+        put_times = raw_q.put_times[puts_start:]
+        gaps = [b - a for a, b in zip(put_times, put_times[1:])]
+        running.clear()
+        threads[0].join(timeout=2.0)
+        if process:
+            threads[-1].join(timeout=2.0)
+            process_running.clear()
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+            for ring in shared_rings:
+                ring.unlink()
+    return {'samples': samples / elapsed, 'main_cpu': cpu / elapsed * 100, 'child_cpu': child_cpu / elapsed * 100,
+            'p50': _percentile(latencies, 50) * 1000, 'p99': _percentile(latencies, 99) * 1000,
+            'gap_p99': _percentile(gaps, 99) * 1000, 'gap_max': max(gaps, default=0.0) * 1000}
+
+
+def bench_processes(args):
+    """
+    So sánh chạy xử lý (RLS/FFT) trong luồng của tiến trình đọc với tiến trình riêng nối bằng
+    SharedRing, trên bộ giả lập HWT905: khoảng ngắt giữa các lần luồng đọc chuyển dữ liệu,
+    CPU của từng tiến trình và độ trễ tới đầu ra của bộ xử lý.
+    """
+    print(f"{args.rate:.0f} Hz, {args.seconds:.0f} s mỗi lần đo")
+    for execution in ('threads', 'processes'):
+        result = _run_execution(execution, args)
+        cpu = f"CPU đọc {result['main_cpu']:.1f}%"
+        if execution == 'processes':
+            cpu += f" + xử lý {result['child_cpu']:.1f}%"
+        print(f"{execution:>9}: {result['samples']:,.0f} mẫu/s  {cpu}  "
+              f"ngắt đọc p99 {result['gap_p99']:.1f} ms, max {result['gap_max']:.1f} ms  "
+              f"độ trễ p50 {result['p50']:.1f} ms  p99 {result['p99']:.1f} ms")
+
+
+def _run_backpressure(policy: str, args) -> dict:
+    from src.core.backpressure import PolicyQueue
+
+    queue = PolicyQueue(args.maxsize, policy, args.high_watermark, args.low_watermark,
+                        args.decimate_n, name=policy)
+    delivered = [0]
+    slow_until = time.perf_counter() + args.slow_seconds
+
+    def consumer():
+        while True:
+            item = queue.get()
+            if item is None:
+                return
+            delivered[0] += len(item)
+            # Tầng sau chậm hơn tốc độ đến trong slow_seconds giây đầu, sau đó theo kịp
+            if time.perf_counter() < slow_until:
+                time.sleep(args.consumer_ms / 1000)
+
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    packet = bytes(DATA_PACKET_LENGTH)
+    interval = args.chunk / args.rate
+    n_puts = int(args.seconds * args.rate / args.chunk)
+    longest_put = 0.0
+    next_put = time.perf_counter()
+    for _ in range(n_puts):
+        delay = next_put - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        started = time.perf_counter()
+        queue.put([packet] * args.chunk)
+        longest_put = max(longest_put, time.perf_counter() - started)
+        next_put += interval
+    queue.put(None)
+    thread.join()
+    stats = queue.get_stats()
+    stats['sent'] = n_puts * args.chunk
+    stats['delivered'] = delivered[0]
+    stats['longest_put'] = longest_put
+    return stats
+
+
+def bench_backpressure(args):
+    """
+    Luồng đọc giả lập đưa gói vào PolicyQueue với tốc độ cố định, tầng sau chậm hơn trong
+    slow_seconds giây: so sánh thời gian luồng đọc bị chặn (nguy cơ tràn bộ đệm UART) với số mẫu
+    bị bỏ của từng chính sách.
+    """
+    from src.core.backpressure import SUPPORTED_QUEUE_POLICIES
+
+    print(f"{args.rate:.0f} gói/s, {args.chunk} gói mỗi put, maxsize {args.maxsize}, "
+          f"tầng sau chậm {args.consumer_ms} ms/phần tử trong {args.slow_seconds:.0f}/{args.seconds:.0f} s")
+    for policy in SUPPORTED_QUEUE_POLICIES:
+        r = _run_backpressure(policy, args)
+        print(f"{policy:>11}: luồng đọc bị chặn {r['blocked_time_s'] * 1000:>8.1f} ms "
+              f"(put lâu nhất {r['longest_put'] * 1000:>7.1f} ms)  "
+              f"bỏ {r['dropped_samples']:>6,}/{r['sent']:,} gói  nhận {r['delivered']:>6,}  "
+              f"quá tải {r['overload_episodes']} lần, {r['overload_time_s']:.1f} s")
+
+
+def bench_metrics(args):
+    """
+    Chi phí của số liệu Prometheus: thời gian mỗi lần LatencyHistogram.observe_since() trên
+    đường nóng (so với vòng lặp rỗng) và thời gian một lần scrape (nếu có prometheus_client).
+    """
+    from src.core.metrics import LatencyHistogram, PipelineMetrics
+
+    histogram = LatencyHistogram()
+    now = time.time()
+    timestamps = [now - random.random() * 0.05 for _ in range(args.observations)]
+    start = time.perf_counter()
+    for ts in timestamps:
+        pass
+    baseline = time.perf_counter() - start
+    start = time.perf_counter()
+    for ts in timestamps:
+        histogram.observe_since(ts)
+    elapsed = time.perf_counter() - start
+    per_call = (elapsed - baseline) / args.observations * 1e9
+    print(f"observe_since: {per_call:.0f} ns/lần "
+          f"(một lần mỗi phần tử hàng đợi; ở {args.rate:.0f} phần tử/s: "
+          f"{per_call * args.rate / 1e9 * 100:.4f}% một lõi mỗi tầng)")
+
+    try:
+        from prometheus_client import CollectorRegistry, generate_latest
+    except ImportError:
+        print("scrape: chưa cài prometheus_client, bỏ qua")
+        return
+    from src.core.backpressure import PolicyQueue
+
+    class _Stage(threading.Thread):
+        raw_packet_count = decoded_packet_count = processed_packet_count = sent_packet_count = 0
+
+    metrics = PipelineMetrics()
+    stage_threads = []
+    for stage in ('read', 'decode', 'process', 'publish'):
+        thread = _Stage(name=stage, target=time.sleep, args=(1.0,))
+        thread.start()
+        stage_threads.append(thread)
+        metrics.add_stage(stage, thread)
+        metrics.add_queue(PolicyQueue(name=stage))
+        histogram = metrics.latency_histogram(stage)
+        for ts in timestamps[:1000]:
+            histogram.observe_since(ts)
+    registry = CollectorRegistry()
+    registry.register(metrics)
+    start = time.perf_counter()
+    for _ in range(args.scrapes):
+        body = generate_latest(registry)
+    elapsed = time.perf_counter() - start
+    for thread in stage_threads:
+        thread.join()
+    print(f"scrape: {elapsed / args.scrapes * 1000:.2f} ms/lần ({len(body):,} byte), "
+          f"chạy trên luồng HTTP của prometheus_client")
+
+
+class LegacyFrameIntegrator:
+    """Cách tích phân cũ của RLSIntegrator.process_frame: np.roll và cumsum lại toàn bộ cửa sổ mỗi frame."""
+
+    def __init__(self, calc_frame_size: int, dt: float, warmup_frames: int = 5):
+        self.acc_buffer = np.zeros(calc_frame_size)
+        self.dt = dt
+        self.warmup_frames = warmup_frames
+        self.frame_count = 0
+
+    def process_frame(self, acc_frame: 'np.ndarray'):
+        frame_len = len(acc_frame)
+        self.frame_count += 1
+        self.acc_buffer = np.roll(self.acc_buffer, -frame_len)
+        self.acc_buffer[-frame_len:] = acc_frame
+        if self.frame_count < self.warmup_frames:
+            return np.zeros(frame_len), np.zeros(frame_len), np.zeros(frame_len)
+        # Bản cũ tính tích phân vận tốc ba lần (khối lệnh bị lặp)
+        for _ in range(3):
+            integral_kernel_acc = (self.acc_buffer[:-1] + self.acc_buffer[1:]) * self.dt / 2
+            vel_raw_buffer = np.zeros_like(self.acc_buffer)
+            vel_raw_buffer[1:] = np.cumsum(integral_kernel_acc)
+        vel_detrended_buffer = vel_raw_buffer - np.mean(vel_raw_buffer)
+        integral_kernel_vel = (vel_detrended_buffer[:-1] + vel_detrended_buffer[1:]) * self.dt / 2
+        disp_raw_buffer = np.zeros_like(vel_detrended_buffer)
+        disp_raw_buffer[1:] = np.cumsum(integral_kernel_vel)
+        disp_detrended_buffer = disp_raw_buffer - disp_raw_buffer[0]
+        return disp_detrended_buffer[-frame_len:], vel_detrended_buffer[-frame_len:], acc_frame
+
+
+def bench_integrator(args):
+    """
+    Thời gian mỗi frame của RLSIntegrator (tăng dần) so với cách tính lại toàn bộ cửa sổ,
+    khi tăng rls_calc_frame_multiplier; đồng thời kiểm tra hai cách cho cùng kết quả.
+    """
+    from src.processing.algorithms.rls_integrator import RLSIntegrator
+
+    dt = 1.0 / args.rate
+    rng = np.random.default_rng(7)
+    t = np.arange(args.frames * args.frame_size) * dt
+    # Dao động 2 Hz + nhiễu + độ lệch nhỏ (gây trôi vận tốc khi tích phân)
+    acc = 0.5 * np.sin(2 * np.pi * 2.0 * t) + 0.05 * rng.standard_normal(len(t)) + 0.01
+    frames = acc.reshape(args.frames, args.frame_size)
+    print(f"{args.frames} frame x {args.frame_size} mẫu, dt={dt * 1000:.1f} ms")
+    print(f"{'multiplier':>10} {'cửa sổ':>8} {'cũ µs/frame':>12} {'mới µs/frame':>13} {'sai lệch tối đa':>16}")
+    for multiplier in args.multipliers:
+        legacy = LegacyFrameIntegrator(args.frame_size * multiplier, dt)
+        incremental = RLSIntegrator(sample_frame_size=args.frame_size, calc_frame_multiplier=multiplier, dt=dt)
+        start = time.perf_counter()
+        legacy_out = [legacy.process_frame(frame)[:2] for frame in frames]
+        legacy_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        incremental_out = [incremental.process_frame(frame)[:2] for frame in frames]
+        incremental_elapsed = time.perf_counter() - start
+        max_error = max(float(np.max(np.abs(new - old)))
+                        for new_pair, old_pair in zip(incremental_out, legacy_out)
+                        for new, old in zip(new_pair, old_pair))
+        print(f"{multiplier:>10d} {args.frame_size * multiplier:>8d} "
+              f"{legacy_elapsed / args.frames * 1e6:>12.1f} {incremental_elapsed / args.frames * 1e6:>13.1f} "
+              f"{max_error:>16.2e}")
+
+
+def bench_processor(args):
+    """
+    Thời gian mỗi mẫu của SensorDataProcessor với các chu kỳ tính lại khác nhau: mặc định
+    (tích hợp RLS và 3 FFT ở mọi mẫu), tích hợp mỗi frame, thêm FFT mỗi --fft-hop-s giây,
+    thêm chỉ trả về 1 trên --output-every mẫu; từng mẫu (process_sample) và theo khối
+    --block mẫu (process_arrays).
+    """
+    from src.processing.data_processor import SensorDataProcessor
+
+    dt = 1.0 / args.rate
+    rng = np.random.default_rng(5)
+    t = np.arange(args.samples) * dt
+    acc = np.column_stack([t, 0.05 * np.sin(2 * np.pi * 3.0 * t), 0.02 * rng.standard_normal(args.samples),
+                           1.0 + 0.01 * rng.standard_normal(args.samples)])
+    fft_hop = max(1, round(args.fft_hop_s / dt))
+    configs = (
+        ("mọi mẫu", 1, 1, 1),
+        ("tích hợp/frame", args.frame_size, 1, 1),
+        (f"+ FFT/{args.fft_hop_s:g} s", args.frame_size, fft_hop, 1),
+        (f"+ 1/{args.output_every} kết quả", args.frame_size, fft_hop, args.output_every),
+    )
+    print(f"{args.samples:,} mẫu ở {args.rate:.0f} Hz, frame {args.frame_size}, "
+          f"cửa sổ RLS {args.frame_size * args.multiplier}, FFT {args.fft_points} điểm")
+    def create():
+        return SensorDataProcessor(dt_sensor=dt, gravity_g=9.80665, acc_filter_type='low_pass', acc_filter_param=0.1,
+                                   rls_sample_frame_size=args.frame_size, rls_calc_frame_multiplier=args.multiplier,
+                                   fft_n_points=args.fft_points, integration_hop=integration_hop, fft_hop=hop,
+                                   output_every=output_every)
+
+    print(f"{'':<22} {'từng mẫu':>14} {f'khối {args.block}':>14}")
+    for name, integration_hop, hop, output_every in configs:
+        processor = create()
+        start = time.perf_counter()
+        outputs = sum(processor.process_sample(AccSample(*row)) is not None for row in acc.tolist())
+        elapsed = time.perf_counter() - start
+        processor = create()
+        start = time.perf_counter()
+        for offset in range(0, args.samples, args.block):
+            processor.process_arrays(acc[offset:offset + args.block, 0], acc[offset:offset + args.block, 1:4])
+        block_elapsed = time.perf_counter() - start
+        print(f"{name:<22} {elapsed * 1e6 / args.samples:>8.1f} µs/mẫu {block_elapsed * 1e6 / args.samples:>8.1f} µs/mẫu  "
+              f"{outputs:>7,d} kết quả  CPU {elapsed / (args.samples * dt) * 100:>5.1f}% → "
+              f"{block_elapsed / (args.samples * dt) * 100:>5.1f}% ở {args.rate:.0f} Hz")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pipeline HWT905')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('framer', help='So sánh read_raw_packet cũ với PacketFramer')
+    p.add_argument('--packets', type=int, default=100000)
+    p.add_argument('--min-chunk', type=int, default=11)
+    p.add_argument('--max-chunk', type=int, default=1024)
+    p.set_defaults(func=bench_framer)
+
+    p = sub.add_parser('handoff', help='So sánh put() từng gói với put() theo batch giữa hai luồng')
+    p.add_argument('--packets', type=int, default=200000)
+    p.add_argument('--batch', type=int, default=20, help='Số gói trung bình mỗi lần đọc serial')
+    p.set_defaults(func=bench_handoff)
+
+    p = sub.add_parser('validate', help='So sánh drain() tuần tự với kiểm tra checksum bằng NumPy')
+    p.add_argument('--packets', type=int, default=200000)
+    p.add_argument('--chunk', type=int, default=4096, help='Kích thước mỗi đoạn nạp vào framer (bytes)')
+    p.set_defaults(func=bench_validate)
+
+    p = sub.add_parser('decode', help='So sánh giải mã từng gói (dict, struct) với giải mã theo lô (NumPy)')
+    p.add_argument('--packets', type=int, default=100000)
+    p.add_argument('--block', type=int, default=64, help='Số gói mỗi khối')
+    p.set_defaults(func=bench_decode)
+
+    p = sub.add_parser('routing', help='So sánh giải mã mọi gói với định tuyến theo loại gói')
+    p.add_argument('--packets', type=int, default=120000)
+    p.add_argument('--extra-types', type=int, default=5, help='Số loại gói không phải ACC đang bật (0-5)')
+    p.set_defaults(func=bench_routing)
+
+    p = sub.add_parser('records', help='So sánh bộ nhớ mỗi mẫu giữa chuỗi dict cũ và bản ghi NamedTuple')
+    p.add_argument('--samples', type=int, default=100000)
+    p.set_defaults(func=bench_records)
+
+    p = sub.add_parser('capture', help='So sánh ghi CSV gia tốc đã giải mã với ghi dữ liệu thô có chỉ mục')
+    p.add_argument('--packets', type=int, default=100000)
+    p.add_argument('--batch', type=int, default=20, help='Số gói mỗi lần đọc serial')
+    p.set_defaults(func=bench_capture)
+
+    p = sub.add_parser('reader', help='So sánh CPU và độ trễ đọc giữa chế độ poll và event (dùng pty)')
+    p.add_argument('--seconds', type=float, default=3.0)
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số gửi gói ACC (Hz)')
+    p.add_argument('--min-chunk', type=int, default=11)
+    p.add_argument('--latency-ms', type=float, default=20.0)
+    p.set_defaults(func=bench_reader)
+
+    p = sub.add_parser('pipeline', help='Chạy reader -> decoder -> processor trên bộ giả lập HWT905 (pty)')
+    p.add_argument('--seconds', type=float, default=10.0)
+    p.add_argument('--warmup', type=float, default=3.0, help='Thời gian bỏ qua trước khi đo (giây)')
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số gói của bộ giả lập (Hz)')
+    p.add_argument('--types', default='acc', help='Các loại gói bộ giả lập phát ra')
+    p.add_argument('--read-mode', choices=SUPPORTED_READ_MODES, default='event')
+    p.add_argument('--no-batch', action='store_true', help='Đọc và chuyển từng gói thay vì theo batch')
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser('multisensor', help='Tăng dần số cảm biến giả lập, đo thông lượng tổng và CPU mỗi cảm biến')
+    p.add_argument('--max-sensors', type=int, default=4)
+    p.add_argument('--seconds', type=float, default=5.0)
+    p.add_argument('--warmup', type=float, default=2.0, help='Thời gian bỏ qua trước khi đo (giây)')
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số gói của mỗi bộ giả lập (Hz)')
+    p.add_argument('--read-mode', choices=SUPPORTED_READ_MODES, default='event')
+    p.add_argument('--no-process', action='store_true', help='Chỉ đo đọc + giải mã, không chạy bộ xử lý')
+    p.set_defaults(func=bench_multisensor)
+
+    p = sub.add_parser('reconnect', help='So sánh thời gian tới mẫu đầu tiên: dò tuần tự, song song, cổng đã lưu')
+    p.add_argument('--decoys', type=int, default=3, help='Số cổng pty không phản hồi')
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số gói của bộ giả lập (Hz)')
+    p.set_defaults(func=bench_reconnect)
+
+    p = sub.add_parser('baud', help='So sánh dò baudrate chủ động (gửi lệnh) với thụ động (nghe luồng gói)')
+    p.add_argument('--sensor-baud', type=int, default=9600, help='Baudrate thật của cảm biến giả lập')
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số gói của bộ giả lập (Hz)')
+    p.set_defaults(func=bench_baud)
+
+    p = sub.add_parser('timestamps', help='So sánh timestamp time.time() với TimestampEngine (jitter, mất mẫu)')
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số gói (Hz)')
+    p.add_argument('--seconds', type=float, default=5.0)
+    p.add_argument('--warmup', type=float, default=1.0)
+    p.add_argument('--chunk', type=int, default=4, help='Số mẫu mỗi lần đọc trong phần mô phỏng')
+    p.add_argument('--gap-samples', type=int, default=50, help='Số mẫu bị mất trong phần mô phỏng')
+    p.set_defaults(func=bench_timestamps)
+
+    p = sub.add_parser('blocks', help='So sánh chuyển từng mẫu với chế độ khối giữa các luồng pipeline')
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số gói (Hz)')
+    p.add_argument('--block-size', type=int, default=20)
+    p.add_argument('--latency-ms', type=float, default=50.0, help='Thời gian gom tối đa của khối thiếu')
+    p.add_argument('--seconds', type=float, default=5.0)
+    p.add_argument('--warmup', type=float, default=3.0, help='Bỏ qua giai đoạn kết nối và làm ấm RLS/FFT')
+    p.set_defaults(func=bench_blocks)
+
+    p = sub.add_parser('ring', help='So sánh Queue (từng mẫu, từng khối) với SampleRing giữa hai luồng')
+    p.add_argument('--samples', type=int, default=200000)
+    p.add_argument('--chunk', type=int, default=4, help='Số mẫu mỗi lần ghi (một lần đọc serial)')
+    p.add_argument('--capacity', type=int, default=8192, help='Dung lượng hàng đợi/vòng (mẫu)')
+    p.set_defaults(func=bench_ring)
+
+    p = sub.add_parser('processes', help='So sánh xử lý trong luồng với xử lý ở tiến trình riêng (shared_memory)')
+    p.add_argument('--rate', type=float, default=1000.0, help='Tần số gói (Hz)')
+    p.add_argument('--block-size', type=int, default=20, help='Số mẫu tối đa mỗi lần xử lý')
+    p.add_argument('--ring-capacity', type=int, default=8192)
+    p.add_argument('--seconds', type=float, default=5.0)
+    p.add_argument('--warmup', type=float, default=3.0, help='Bỏ qua giai đoạn kết nối và làm ấm RLS/FFT')
+    p.set_defaults(func=bench_processes)
+
+    p = sub.add_parser('backpressure', help='So sánh các chính sách chống nghẽn của hàng đợi khi tầng sau chậm')
+    p.add_argument('--rate', type=float, default=1000.0, help='Tần số gói (Hz)')
+    p.add_argument('--chunk', type=int, default=4, help='Số gói mỗi lần put (một lần đọc serial)')
+    p.add_argument('--maxsize', type=int, default=256)
+    p.add_argument('--high-watermark', type=float, default=0.8)
+    p.add_argument('--low-watermark', type=float, default=0.5)
+    p.add_argument('--decimate-n', type=int, default=2)
+    p.add_argument('--consumer-ms', type=float, default=12.0, help='Thời gian xử lý mỗi phần tử khi tầng sau chậm')
+    p.add_argument('--seconds', type=float, default=4.0)
+    p.add_argument('--slow-seconds', type=float, default=2.0)
+    p.set_defaults(func=bench_backpressure)
+
+    p = sub.add_parser('metrics', help='Đo chi phí ghi histogram độ trễ và chi phí một lần scrape Prometheus')
+    p.add_argument('--observations', type=int, default=500000)
+    p.add_argument('--rate', type=float, default=1000.0, help='Số phần tử hàng đợi mỗi giây của một tầng')
+    p.add_argument('--scrapes', type=int, default=200)
+    p.set_defaults(func=bench_metrics)
+
+    p = sub.add_parser('integrator', help='So sánh RLSIntegrator tăng dần với tính lại toàn bộ cửa sổ mỗi frame')
+    p.add_argument('--frames', type=int, default=5000)
+    p.add_argument('--frame-size', type=int, default=20)
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số lấy mẫu (Hz)')
+    p.add_argument('--multipliers', type=int, nargs='+', default=[10, 100, 1000])
+    p.set_defaults(func=bench_integrator)
+
+    p = sub.add_parser('processor', help='So sánh chi phí SensorDataProcessor theo chu kỳ tích hợp, FFT và tỉ lệ kết quả')
+    p.add_argument('--samples', type=int, default=4000)
+    p.add_argument('--rate', type=float, default=200.0, help='Tần số lấy mẫu (Hz)')
+    p.add_argument('--frame-size', type=int, default=20)
+    p.add_argument('--multiplier', type=int, default=100)
+    p.add_argument('--fft-points', type=int, default=512)
+    p.add_argument('--fft-hop-s', type=float, default=0.5)
+    p.add_argument('--output-every', type=int, default=10)
+    p.add_argument('--block', type=int, default=100, help='Số mẫu mỗi lần gọi process_arrays')
+    p.set_defaults(func=bench_processor)
+
+    args = parser.parse_args()
+    # Tắt log để chỉ đo chi phí xử lý
+    logging.disable(logging.CRITICAL)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Chạy bộ giả lập cảm biến HWT905 trên pty để thử pipeline mà không cần phần cứng.
+
+Chạy từ thư mục gốc của dự án:
+    PYTHONPATH=. python scripts/hwt905_emulator.py --link /tmp/ttyHWT905 --rate 200
+rồi đặt SENSOR_UART_PORT_PATTERN=/tmp/ttyHWT905* cho scripts/main.py.
+"""
+import argparse
+import logging
+import signal
+import threading
+
+from src.sensors.hwt905_emulator import HWT905Emulator
+from src.sensors.packet_router import parse_packet_type_keys
+
+logger = logging.getLogger(__name__)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Bộ giả lập cảm biến HWT905 trên pseudo-terminal')
+    parser.add_argument('--link', default='/tmp/ttyHWT905',
+                        help='Symlink tới pty, dùng cho uart_port_pattern (mặc định: /tmp/ttyHWT905)')
+    parser.add_argument('--rate', type=float, default=200.0, help='Số gói mỗi giây cho mỗi loại gói')
+    parser.add_argument('--types', default='acc',
+                        help='Các loại gói phát ra, phân cách bằng dấu phẩy (ví dụ acc,gyro,angle,time)')
+    parser.add_argument('--noise', type=float, default=0.01, help='Độ lệch chuẩn nhiễu gia tốc (g)')
+    parser.add_argument('--amplitude', type=float, default=0.05, help='Biên độ dao động hình sin (g)')
+    parser.add_argument('--freq', type=float, default=2.0, help='Tần số dao động hình sin (Hz)')
+    parser.add_argument('--garbage', type=float, default=0.0, help='Xác suất chèn byte rác trước mỗi gói')
+    parser.add_argument('--checksum-errors', type=float, default=0.0, help='Xác suất gói bị sai checksum')
+    parser.add_argument('--replay', default=None, help='File dữ liệu thô để phát lại')
+    parser.add_argument('--no-loop', action='store_true', help='Không phát lại từ đầu khi hết file')
+    parser.add_argument('--seed', type=int, default=None, help='Hạt giống ngẫu nhiên')
+    parser.add_argument('--baud', type=int, default=115200, help='Baudrate ban đầu của cảm biến (bps)')
+    parser.add_argument('--emulate-baud', action='store_true',
+                        help='Phát byte vỡ khung và bỏ qua lệnh khi bên đọc mở cổng sai baudrate')
+    parser.add_argument('--debug', action='store_true', help='Log các lệnh cấu hình nhận được')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    emulator = HWT905Emulator(
+        link_path=args.link, rate_hz=args.rate, packet_types=parse_packet_type_keys(args.types.split(',')),
+        noise_g=args.noise, signal_amplitude_g=args.amplitude, signal_freq_hz=args.freq,
+        garbage_ratio=args.garbage, checksum_error_ratio=args.checksum_errors,
+        replay_path=args.replay, replay_loop=not args.no_loop, seed=args.seed,
+        baudrate=args.baud, emulate_baud=args.emulate_baud
+    )
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    with emulator:
+        while not stop.wait(5.0):
+            logger.info(f"Thống kê: {emulator.get_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,17 +5,35 @@ import threading
 import signal
 import sys
 import argparse
+import multiprocessing
+import os
 from queue import Queue
-from typing import Optional
+from typing import Dict, List, Optional
 
 # Import các module và lớp cần thiết
 from src.utils.common import load_config
 from src.utils.logger_setup import setup_logging
-from src.core.connection_manager import SensorConnectionManager
+from src.core.connection_manager import SensorConnectionManager, discover_sensor_ports
 from src.sensors.hwt905_data_decoder import HWT905DataDecoder
-from src.processing.data_processor import SensorDataProcessor
+from src.sensors.hwt905_constants import PACKET_TYPE_ACC, PACKET_TYPE_TIME
+from src.sensors.packet_router import PacketRouter, parse_packet_type_keys
+from src.sensors.decoders import PACKET_TYPE_NAMES, PACKET_RECORDS
 from src.storage.storage_manager import StorageManager
-from src.core.async_data_manager import SerialReaderThread, DecoderThread, ProcessorThread, MqttPublisherThread
+from src.storage.raw_capture import RawCaptureWriter
+from src.core.timestamp_engine import TimestampEngine, SUPPORTED_TIMESTAMP_MODES
+from src.core.sample_ring import RingSignal, SampleRing, SUPPORTED_TRANSPORTS
+from src.core.shared_ring import SharedRing, SharedRingSignal
+from src.core.backpressure import PolicyQueue, create_policy_queue
+from src.core.process_monitor import start_process_monitor
+from src.core.metrics import PipelineMetrics, start_metrics_server
+from src.core.tracing import SampleTracer, create_sample_tracer
+from src.core.process_pipeline import (
+    PROCESSED_ROW_WIDTH, SUPPORTED_EXECUTION_MODES, ProcessingProcess, PublisherProcess,
+    create_processing_stage
+)
+from src.core.async_data_manager import (
+    SerialReaderThread, DecoderThread, AuxPacketSinkThread, ProcessorThread, MqttPublisherThread
+)
 from src.services import cleanup_manager
 
 # Cờ để điều khiển vòng lặp chính
@@ -44,6 +62,9 @@ def parse_arguments():
                         help='Kích thước batch (chỉ áp dụng cho mode batch)')
     parser.add_argument('--schedule-interval', type=int, default=None,
                         help='Khoảng thời gian gửi định kỳ (giây, chỉ áp dụng cho mode scheduled)')
+    parser.add_argument('--execution', choices=list(SUPPORTED_EXECUTION_MODES), default=None,
+                        help='Chạy pipeline trong một tiến trình (threads) hoặc tách xử lý và gửi MQTT '
+                             'ra tiến trình riêng (processes); mặc định theo PROCESS_CONTROL_EXECUTION')
     
     # Tùy chọn debug
     parser.add_argument('--debug', action='store_true',
@@ -64,6 +85,198 @@ def signal_handler(signum, frame):
     except Exception as e:
         logger.error(f"Lỗi khi dừng cleanup service: {e}")
 
+class SensorPipeline:
+    """Các thành phần đọc/giải mã/lưu trữ riêng của một cảm biến."""
+
+    def __init__(self, sensor_id: str, connection_manager: SensorConnectionManager,
+                 threads: List[threading.Thread], raw_capture: Optional[RawCaptureWriter],
+                 storage_managers: List[StorageManager], queues: List[PolicyQueue]):
+        self.sensor_id = sensor_id
+        self.connection_manager = connection_manager
+        self.threads = threads
+        self.raw_capture = raw_capture
+        self.storage_managers = storage_managers
+        self.queues = queues
+
+    def close(self):
+        self.connection_manager.close_connection() # Đảm bảo kết nối cuối cùng được đóng
+        if self.raw_capture:
+            self.raw_capture.close()
+        for storage_manager in self.storage_managers:
+            storage_manager.close()
+
+
+def build_sensor_pipeline(port: Optional[str], app_config: dict, storage_config: dict,
+                          decoded_data_queue: Queue, logger: logging.Logger,
+                          sample_ring: Optional[SampleRing] = None,
+                          metrics: Optional[PipelineMetrics] = None,
+                          tracer: Optional[SampleTracer] = None) -> SensorPipeline:
+    """
+    Tạo kết nối, bảng định tuyến, luồng đọc và luồng giải mã cho một cảm biến.
+
+    Args:
+        port: Cổng của cảm biến ở chế độ nhiều cảm biến; None để dò theo uart_port_pattern như cũ.
+        decoded_data_queue: Hàng đợi mẫu đã giải mã, dùng chung cho mọi cảm biến.
+        sample_ring: Vòng SPSC riêng của cảm biến, dùng thay cho decoded_data_queue (transport=ring).
+        metrics: Nếu có, các luồng, hàng đợi và framer của cảm biến được đăng ký vào số liệu Prometheus.
+        tracer: Nếu có, luồng đọc và giải mã ghi các mốc của mẫu được truy vết.
+    """
+    sensor_config = app_config["sensor"]
+    process_control_config = app_config.get("process_control", {})
+    decoding_enabled = process_control_config.get("decoding", True)
+    sensor_id = os.path.basename(port) if port else ""
+    if port:
+        sensor_config = dict(sensor_config, uart_port_pattern=port)
+
+    # ConnectionManager sẽ được quản lý bởi SerialReaderThread
+    connection_manager = SensorConnectionManager(
+        sensor_config=sensor_config,
+        debug=(logger.level <= logging.DEBUG)
+    )
+    
+    # DataDecoder không cần ser_instance lúc khởi tạo nữa, ReaderThread sẽ cung cấp sau
+    data_decoder = HWT905DataDecoder(
+        debug=(logger.level <= logging.DEBUG),
+        read_mode=sensor_config.get("read_mode", "poll"),
+        read_min_chunk_bytes=sensor_config.get("read_min_chunk_bytes", 11),
+        read_latency_ms=sensor_config.get("read_latency_ms", 20.0)
+    )
+
+    # Các trình quản lý lưu trữ riêng của cảm biến (nếu được bật)
+    storage_managers: List[StorageManager] = []
+    raw_capture: Optional[RawCaptureWriter] = None
+    if storage_config.get("enabled", False) and storage_config.get("raw_capture", False):
+        logger.info("Khởi tạo RawCaptureWriter cho dữ liệu thô.")
+        raw_capture = RawCaptureWriter(
+            base_data_dir=storage_config.get("base_dir", "data"),
+            sub_dir=f"raw_data/{sensor_id}" if sensor_id else "raw_data",
+            session_prefix=storage_config.get("session_prefix", "session"),
+            max_segment_mb=storage_config.get("raw_segment_mb", 64.0),
+            index_interval_s=storage_config.get("raw_index_interval_s", 1.0)
+        )
+
+    decoded_storage_manager: Optional[StorageManager] = None
+    if decoding_enabled and storage_config.get("enabled", False) and storage_config.get("decoded_csv", True):
+        logger.info("Khởi tạo StorageManager cho dữ liệu DECODED.")
+        decoded_storage_manager = StorageManager(
+            storage_config,
+            data_type="decoded",
+            fields_to_write=['acc_x', 'acc_y', 'acc_z'],
+            sensor_id=sensor_id
+        )
+        storage_managers.append(decoded_storage_manager)
+
+    # Bảng định tuyến gói tin: gia tốc vào pipeline chính, các loại phụ vào luồng lưu riêng,
+    # các loại còn lại bị framer bỏ trước khi giải mã
+    queues_config = app_config.get("queues", {})
+    queue_suffix = f"/{sensor_id}" if sensor_id else ""
+    raw_data_queue = create_policy_queue(queues_config.get("raw"), name=f"raw{queue_suffix}")
+    queues = [raw_data_queue]
+    packet_router = PacketRouter()
+    packet_router.subscribe(PACKET_TYPE_ACC, raw_data_queue, blocking=True)
+
+    # Timestamp theo chỉ số mẫu (hiệu chỉnh theo lần đọc serial hoặc gói TIME của cảm biến)
+    timestamp_mode = sensor_config.get("timestamp_mode", "host")
+    if timestamp_mode not in SUPPORTED_TIMESTAMP_MODES:
+        raise ValueError(f"timestamp_mode không hợp lệ: {timestamp_mode}. Hỗ trợ: {SUPPORTED_TIMESTAMP_MODES}")
+    timestamp_engine: Optional[TimestampEngine] = None
+    if timestamp_mode != "host":
+        timestamp_engine = TimestampEngine(
+            rate_hz=sensor_config["default_output_rate_hz"],
+            gap_threshold_s=sensor_config.get("timestamp_gap_s", 0.1),
+            sensor_id=sensor_id
+        )
+        if timestamp_mode == "sensor_time":
+            # Gói TIME đi cùng hàng đợi với gói ACC để giữ thứ tự trong mỗi chu kỳ xuất
+            packet_router.subscribe(PACKET_TYPE_TIME, raw_data_queue, blocking=True)
+        if raw_data_queue.policy == "decimate":
+            logger.warning("Chính sách decimate trên hàng đợi raw làm lệch timestamp theo chỉ số mẫu "
+                           f"(timestamp_mode={timestamp_mode}); nên dùng drop_oldest/drop_newest.")
+
+    aux_storage_managers: Dict[int, StorageManager] = {}
+    aux_packet_types = parse_packet_type_keys(process_control_config.get("aux_packet_types", []))
+    aux_queue: Optional[Queue] = None
+    if aux_packet_types:
+        if storage_config.get("enabled", False):
+            aux_queue = create_policy_queue(queues_config.get("aux"), name=f"aux{queue_suffix}")
+            queues.append(aux_queue)
+            for packet_type in aux_packet_types:
+                if packet_type == PACKET_TYPE_ACC:
+                    continue
+                if packet_type == PACKET_TYPE_TIME and timestamp_mode == "sensor_time":
+                    logger.warning("Gói TIME được dùng để dựng timestamp (timestamp_mode=sensor_time), "
+                                   "không lưu riêng như gói phụ.")
+                    continue
+                aux_storage_managers[packet_type] = StorageManager(
+                    storage_config,
+                    data_type=PACKET_TYPE_NAMES[packet_type].lower(),
+                    fields_to_write=list(PACKET_RECORDS[packet_type]._fields),
+                    sensor_id=sensor_id
+                )
+                packet_router.subscribe(packet_type, aux_queue)
+            storage_managers.extend(aux_storage_managers.values())
+        else:
+            logger.warning("Đã cấu hình gói phụ nhưng lưu trữ đang tắt. Các gói phụ sẽ bị bỏ qua.")
+
+    # Chế độ khối: luồng đọc gom khối block_size gói (khối thiếu sau block_max_latency_ms),
+    # các tầng sau chuyển nguyên khối
+    block_mode = process_control_config.get("block_mode", False)
+    block_size = process_control_config.get("block_size", 20)
+    block_max_latency_s = process_control_config.get("block_max_latency_ms", 50.0) / 1000.0
+
+    # Luồng 1: Tự quản lý kết nối và đọc dữ liệu
+    reader_thread = SerialReaderThread(
+        connection_manager=connection_manager,
+        data_decoder=data_decoder,
+        raw_data_queue=raw_data_queue,
+        running_flag=_running_flag,
+        batch_mode=sensor_config.get("batch_read", False),
+        packet_router=packet_router,
+        raw_capture=raw_capture,
+        sensor_id=sensor_id,
+        # Số liệu và truy vết cần arrival_ts để nối lần đọc serial với mẫu đã giải mã
+        stamp_arrival=timestamp_engine is not None or metrics is not None or tracer is not None,
+        block_packets=block_size if block_mode else 0,
+        block_max_latency_s=block_max_latency_s,
+        tracer=tracer
+    )
+    
+    # Luồng 2: Giải mã
+    decoder_thread = DecoderThread(
+        data_decoder=data_decoder,
+        raw_data_queue=raw_data_queue,
+        decoded_data_queue=decoded_data_queue,
+        running_flag=_running_flag,
+        decoded_storage_manager=decoded_storage_manager,
+        sensor_id=sensor_id,
+        timestamp_engine=timestamp_engine,
+        sample_rate_hz=sensor_config["default_output_rate_hz"],
+        block_mode=block_mode,
+        sample_ring=sample_ring,
+        latency_histogram=metrics.latency_histogram("decode", sensor_id) if metrics else None,
+        tracer=tracer
+    )
+
+    # Luồng phụ: lưu các loại gói phụ (nếu được cấu hình)
+    threads: List[threading.Thread] = [reader_thread, decoder_thread]
+    if aux_queue is not None and aux_storage_managers:
+        threads.append(AuxPacketSinkThread(
+            data_decoder=data_decoder,
+            aux_queue=aux_queue,
+            running_flag=_running_flag,
+            storage_managers=aux_storage_managers,
+            sensor_id=sensor_id
+        ))
+
+    if metrics:
+        for stage, thread in zip(("read", "decode", "aux"), threads):
+            metrics.add_stage(stage, thread, sensor_id)
+        for q in queues:
+            metrics.add_queue(q)
+        metrics.add_decoder(sensor_id, data_decoder)
+
+    return SensorPipeline(sensor_id, connection_manager, threads, raw_capture, storage_managers, queues)
+
 def main():
     # 0. Phân tích tham số dòng lệnh
     args = parse_arguments()
@@ -81,6 +294,8 @@ def main():
         process_control_config["decoding"] = not args.no_decode
         process_control_config["processing"] = not args.no_process
         process_control_config["mqtt_sending"] = not args.no_mqtt
+        if args.execution:
+            process_control_config["execution"] = args.execution
         
         # Cập nhật chế độ MQTT theo argument
         if args.mode == 'realtime':
@@ -146,83 +361,102 @@ def main():
 
     # 4. Khởi tạo các thành phần cốt lõi
     sensor_config = app_config["sensor"]
-    
-    # ConnectionManager sẽ được quản lý bởi SerialReaderThread
-    connection_manager = SensorConnectionManager(
-        sensor_config=sensor_config,
-        debug=(logger.level <= logging.DEBUG)
-    )
-    
-    # DataDecoder không cần ser_instance lúc khởi tạo nữa, ReaderThread sẽ cung cấp sau
-    data_decoder = HWT905DataDecoder(debug=(logger.level <= logging.DEBUG))
+    multi_sensor = sensor_config.get("multi_sensor", False)
     
     target_output_rate = sensor_config["default_output_rate_hz"]
     app_config["processing"]["dt_sensor_actual"] = 1.0 / target_output_rate
 
-    # 5. Khởi tạo các trình quản lý lưu trữ (nếu được bật)
-    storage_config = app_config.get("data_storage", {"enabled": False})
-    decoded_storage_manager: Optional[StorageManager] = None
-    if decoding_enabled and storage_config.get("enabled", False):
-        logger.info("Khởi tạo StorageManager cho dữ liệu DECODED.")
-        decoded_storage_manager = StorageManager(
-            storage_config,
-            data_type="decoded",
-            fields_to_write=['acc_x', 'acc_y', 'acc_z']
-        )
+    # Chế độ nhiều cảm biến: mỗi cổng khớp uart_port_pattern là một cảm biến,
+    # mã cảm biến là tên cổng (dùng /dev/serial/by-id/* để mã không đổi khi cắm lại)
+    sensor_ports = [None]
+    if multi_sensor:
+        port_pattern = sensor_config.get("uart_port_pattern", "/dev/ttyUSB*")
+        sensor_ports = discover_sensor_ports(port_pattern, sensor_config.get("max_sensors"))
+        while not sensor_ports and _running_flag.is_set():
+            logger.error(f"Không có cổng nào khớp với mẫu {port_pattern}. "
+                         f"Sẽ thử lại sau {sensor_config.get('reconnect_delay_s', 5)} giây.")
+            time.sleep(sensor_config.get("reconnect_delay_s", 5))
+            sensor_ports = discover_sensor_ports(port_pattern, sensor_config.get("max_sensors"))
+        logger.info(f"Chế độ nhiều cảm biến: {sensor_ports}")
+
+    # Chế độ nhiều tiến trình: xử lý và gửi MQTT chạy ở tiến trình riêng, nối bằng vòng shared_memory
+    execution = process_control_config.get("execution", "threads")
+    if execution not in SUPPORTED_EXECUTION_MODES:
+        raise ValueError(f"execution không hợp lệ: {execution}. Hỗ trợ: {SUPPORTED_EXECUTION_MODES}")
+    use_processes = execution == "processes" and processing_enabled
+    if execution == "processes" and not processing_enabled:
+        logger.warning("Xử lý dữ liệu đang tắt, chạy pipeline trong một tiến trình (execution=threads).")
+    monitor_interval_s = process_control_config.get("monitor_interval_s", 0.0)
+    metrics_config = app_config.get("metrics", {})
+    metrics = PipelineMetrics() if metrics_config.get("enabled", False) else None
+    tracer = create_sample_tracer(app_config.get("tracing"))
+    if tracer:
+        # Xử lý/gửi MQTT ở tiến trình khác: vết kết thúc sau mốc decoded/stored
+        tracer.downstream = not use_processes
+        logger.info(f"Truy vết 1/{tracer.sample_every} gói đọc được.")
 
-    sensor_data_processor: Optional[SensorDataProcessor] = None
+    # 5. Khởi tạo bộ xử lý và trình quản lý lưu trữ dữ liệu đã xử lý (dùng chung cho mọi cảm biến)
+    storage_config = app_config.get("data_storage", {"enabled": False})
+    sensor_data_processor = None
     processed_storage_manager: Optional[StorageManager] = None
-    if processing_enabled:
+    if processing_enabled and not use_processes:
         logger.info("Khởi tạo SensorDataProcessor.")
-        processing_config = app_config["processing"]
-        sensor_data_processor = SensorDataProcessor(
-            dt_sensor=processing_config["dt_sensor_actual"],
-            gravity_g=processing_config["gravity_g"],
-            acc_filter_type=processing_config.get("acc_filter_type"),
-            acc_filter_param=processing_config.get("acc_filter_param"),
-            rls_sample_frame_size=processing_config["rls_sample_frame_size"],
-            rls_calc_frame_multiplier=processing_config["rls_calc_frame_multiplier"],
-            rls_filter_q=processing_config["rls_filter_q"],
-            fft_n_points=processing_config["fft_n_points"],
-            fft_min_freq_hz=processing_config["fft_min_freq_hz"],
-            fft_max_freq_hz=processing_config["fft_max_freq_hz"]
-        )
-        if storage_config.get("enabled", False):
-            logger.info("Khởi tạo StorageManager cho dữ liệu PROCESSED.")
-            processed_fields_to_write = [
-                'vel_x', 'vel_y', 'vel_z', 'disp_x', 'disp_y', 'disp_z',
-                'dominant_freq_x', 'dominant_freq_y', 'dominant_freq_z'
-            ]
-            processed_storage_manager = StorageManager(
-                storage_config, data_type="processed", fields_to_write=processed_fields_to_write
-            )
+        sensor_data_processor, processed_storage_manager = create_processing_stage(app_config, multi_sensor)
 
     # 6. Thiết lập pipeline với các hàng đợi
-    raw_data_queue = Queue(maxsize=8192)
-    decoded_data_queue = Queue(maxsize=8192)
+    # Mỗi hàng đợi có chính sách chống nghẽn riêng (block, drop_oldest, drop_newest, decimate)
+    queues_config = app_config.get("queues", {})
+    decoded_data_queue = create_policy_queue(queues_config.get("decoded"), name="decoded")
     # Tạo mqtt_queue cho continuous, batch, và scheduled mode
-    mqtt_queue = Queue(maxsize=8192) if mqtt_sending_enabled else None
+    mqtt_queue = (create_policy_queue(queues_config.get("mqtt"), name="mqtt")
+                  if mqtt_sending_enabled and not use_processes else None)
 
-    # 7. Khởi tạo các luồng xử lý
-    
-    # Luồng 1: Tự quản lý kết nối và đọc dữ liệu
-    reader_thread = SerialReaderThread(
-        connection_manager=connection_manager,
-        data_decoder=data_decoder,
-        raw_data_queue=raw_data_queue,
-        running_flag=_running_flag
-    )
-    
-    # Luồng 2: Giải mã
-    decoder_thread = DecoderThread(
-        data_decoder=data_decoder,
-        raw_data_queue=raw_data_queue,
-        decoded_data_queue=decoded_data_queue,
-        running_flag=_running_flag,
-        decoded_storage_manager=decoded_storage_manager
-    )
+    # Vòng SPSC cấp phát sẵn cho mỗi cảm biến thay cho decoded_data_queue (nếu được cấu hình;
+    # luôn dùng ở chế độ nhiều tiến trình, khi đó vòng nằm trong shared_memory)
+    transport = process_control_config.get("transport", "queue")
+    if transport not in SUPPORTED_TRANSPORTS:
+        raise ValueError(f"transport không hợp lệ: {transport}. Hỗ trợ: {SUPPORTED_TRANSPORTS}")
+    ring_capacity = process_control_config.get("ring_capacity", 8192)
+    sensor_ids = [os.path.basename(port) if port else "" for port in sensor_ports]
+    ring_signal: Optional[RingSignal] = None
+    sample_rings: List[Optional[SampleRing]] = [None] * len(sensor_ports)
+    processed_ring: Optional[SharedRing] = None
+    if use_processes:
+        ring_signal = SharedRingSignal()
+        sample_rings = [SharedRing(ring_capacity, sensor_id=sensor_id, read_signal=ring_signal)
+                        for sensor_id in sensor_ids]
+        if mqtt_sending_enabled:
+            processed_ring = SharedRing(ring_capacity, width=PROCESSED_ROW_WIDTH)
+        logger.info(f"Chế độ nhiều tiến trình: vòng shared_memory ({len(sample_rings)} x {ring_capacity} mẫu) "
+                    f"giữa giải mã và xử lý.")
+    elif transport == "ring" and processing_enabled:
+        ring_signal = RingSignal()
+        sample_rings = [SampleRing(ring_capacity, sensor_id=sensor_id, read_signal=ring_signal)
+                        for sensor_id in sensor_ids]
+        logger.info(f"Dùng vòng SPSC ({len(sample_rings)} x {sample_rings[0].capacity} mẫu) giữa giải mã và xử lý.")
 
-    # Luồng 3: Xử lý (nếu được bật)
+    # 7. Khởi tạo các luồng đọc/giải mã cho từng cảm biến
+    sensor_pipelines = [
+        build_sensor_pipeline(port, app_config, storage_config, decoded_data_queue, logger, sample_ring, metrics,
+                              tracer)
+        for port, sample_ring in zip(sensor_ports, sample_rings)
+    ]
+
+    # Ưu tiên lưu trữ: khi hàng đợi phía trước bộ xử lý quá tải, kết quả chỉ được lưu, không gửi MQTT
+    pipeline_queues = [q for pipeline in sensor_pipelines for q in pipeline.queues] + [decoded_data_queue]
+    upstream_queues = [q for q in pipeline_queues if not q.name.startswith("aux")]
+    mqtt_shed_check = None
+    if queues_config.get("storage_priority", False) and mqtt_queue is not None:
+        def upstream_overloaded() -> bool:
+            return any(q.overloaded for q in upstream_queues)
+        mqtt_shed_check = upstream_overloaded
+    if mqtt_queue is not None:
+        pipeline_queues.append(mqtt_queue)
+
+    # Thống kê CPU/độ trễ của tiến trình chính (tiến trình con tự thống kê)
+    monitor = start_process_monitor("acquisition" if use_processes else "pipeline", monitor_interval_s)
+
+    # Luồng 3: Xử lý (nếu được bật), nhận mẫu của mọi cảm biến
     processor_thread: Optional[ProcessorThread] = None
     if processing_enabled and sensor_data_processor and decoded_data_queue:
         processor_thread = ProcessorThread(
@@ -230,7 +464,16 @@ def main():
             running_flag=_running_flag,
             sensor_data_processor=sensor_data_processor,
             processed_storage_manager=processed_storage_manager,
-            mqtt_queue=mqtt_queue
+            mqtt_queue=mqtt_queue,
+            producer_count=len(sensor_pipelines),
+            sample_rings=[ring for ring in sample_rings if ring is not None],
+            ring_signal=ring_signal,
+            ring_read_rows=process_control_config.get("block_size", 20),
+            # Một tiến trình: độ trễ được đo ở tầng cuối (gửi MQTT nếu bật)
+            latency_monitor=monitor if not mqtt_queue else None,
+            latency_histogram=metrics.latency_histogram("process") if metrics else None,
+            tracer=tracer,
+            mqtt_shed_check=mqtt_shed_check
         )
 
     # Luồng 4: Gửi MQTT (nếu được bật)
@@ -239,23 +482,72 @@ def main():
         mqtt_publisher_thread = MqttPublisherThread(
             mqtt_queue=mqtt_queue,
             running_flag=_running_flag,
-            mode=mqtt_mode  # Truyền mode để MqttPublisherThread biết sử dụng publisher nào
+            mode=mqtt_mode,  # Truyền mode để MqttPublisherThread biết sử dụng publisher nào
+            latency_monitor=monitor,
+            latency_histogram=metrics.latency_histogram("publish") if metrics else None,
+            tracer=tracer
         )
 
+    # Tiến trình xử lý và gửi MQTT (chế độ nhiều tiến trình); cờ riêng được tắt sau khi
+    # các luồng giải mã đã dừng và đóng vòng, để tiến trình con xử lý hết dữ liệu còn lại
+    processes: List[multiprocessing.Process] = []
+    process_running_flag = multiprocessing.Event()
+    if use_processes:
+        process_running_flag.set()
+        processes.append(ProcessingProcess(
+            app_config=app_config,
+            sample_rings=sample_rings,
+            ring_signal=ring_signal,
+            running_flag=process_running_flag,
+            processed_ring=processed_ring,
+            sensor_ids=sensor_ids,
+            multi_sensor=multi_sensor,
+            ring_read_rows=process_control_config.get("block_size", 20),
+            monitor_interval_s=monitor_interval_s
+        ))
+        if processed_ring is not None:
+            processes.append(PublisherProcess(
+                app_config=app_config,
+                processed_ring=processed_ring,
+                sensor_ids=sensor_ids,
+                running_flag=process_running_flag,
+                mode=mqtt_mode,
+                monitor_interval_s=monitor_interval_s
+            ))
+
     # Lưu ý: Scheduled mode sẽ được xử lý trong ScheduledPublisher
     # Publisher sẽ tự động đọc dữ liệu từ file và gửi theo lịch trình
 
-    # 8. Chạy các luồng
-    threads = [t for t in [reader_thread, decoder_thread, processor_thread, mqtt_publisher_thread] if t]
+    # 8. Chạy các tiến trình con (trước các luồng đọc, để fork không sao chép luồng đang chạy) và các luồng
+    for process in processes:
+        process.start()
+        logger.info(f"Đã khởi động tiến trình {process.name} (pid={process.pid}).")
+    threads = [t for pipeline in sensor_pipelines for t in pipeline.threads]
+    threads += [t for t in [processor_thread, mqtt_publisher_thread] if t]
+    if metrics:
+        # Ở chế độ nhiều tiến trình, tầng xử lý/gửi MQTT nằm ở tiến trình con: chỉ có độ sâu các vòng
+        for stage, thread in (("process", processor_thread), ("publish", mqtt_publisher_thread)):
+            if thread:
+                metrics.add_stage(stage, thread)
+        metrics.add_queue(decoded_data_queue)
+        if mqtt_queue is not None:
+            metrics.add_queue(mqtt_queue)
+        for sensor_id, ring in zip(sensor_ids, sample_rings):
+            if ring is not None:
+                metrics.add_ring(f"ring/{sensor_id}" if sensor_id else "ring", ring)
+        if processed_ring is not None:
+            metrics.add_ring("processed_ring", processed_ring)
+        start_metrics_server(metrics, metrics_config.get("port", 8001), metrics_config.get("addr", "0.0.0.0"))
     logger.info("Bắt đầu các luồng xử lý...")
     for thread in threads:
         thread.start()
+    workers = threads + processes
 
     # 9. Vòng lặp chính chỉ cần đợi cho đến khi ứng dụng được yêu cầu dừng
     try:
         while _running_flag.is_set():
             # Kiểm tra trạng thái của các luồng, nếu có luồng nào chết bất thường thì dừng ứng dụng
-            for thread in threads:
+            for thread in workers:
                 if not thread.is_alive():
                     logger.critical(f"Luồng {thread.name} đã dừng đột ngột! Dừng ứng dụng.")
                     _running_flag.clear()
@@ -275,15 +567,35 @@ def main():
         thread.join(timeout=5)
         if thread.is_alive():
             logger.warning(f"Luồng {thread.name} không kết thúc sau 5 giây.")
+    process_running_flag.clear()
+    for process in processes:
+        process.join(timeout=5)
+        if process.is_alive():
+            logger.warning(f"Tiến trình {process.name} không kết thúc sau 5 giây, buộc dừng.")
+            process.terminate()
+            process.join()
+    if monitor:
+        monitor.stop()
+    if tracer:
+        tracer.close()
 
     # 11. Dọn dẹp tài nguyên
     logger.info("Đang dọn dẹp tài nguyên...")
-    if connection_manager:
-        connection_manager.close_connection() # Đảm bảo kết nối cuối cùng được đóng
-    if decoded_storage_manager:
-        decoded_storage_manager.close()
+    for q in pipeline_queues:
+        stats = q.get_stats()
+        if not stats["put_items"] and not stats["dropped_items"]:
+            continue
+        logger.info(f"[Queue {q.name}] {stats['policy']}: bỏ {stats['dropped_samples']} mẫu "
+                    f"({stats['dropped_items']} phần tử), quá tải {stats['overload_episodes']} lần "
+                    f"({stats['overload_time_s']:.1f} s), chặn {stats['blocked_time_s']:.1f} s, "
+                    f"sâu nhất {stats['max_depth']}.")
+    for pipeline in sensor_pipelines:
+        pipeline.close()
     if processed_storage_manager:
         processed_storage_manager.close()
+    for ring in sample_rings + [processed_ring]:
+        if isinstance(ring, SharedRing):
+            ring.unlink()
     
     logger.info("Ứng dụng Backend IMU đã dừng.")
 
@@ -0,0 +1,77 @@
+"""
+Báo cáo từ file vết (TRACING_OUTPUT=file): phân vị thời gian của từng chặng giữa hai mốc
+liên tiếp và các vết chậm nhất, để biết mẫu chậm bị giữ lại ở tầng nào.
+
+Chạy từ thư mục gốc của dự án:
+    PYTHONPATH=. python scripts/trace_report.py logs/traces.bin --slowest 10
+"""
+import argparse
+import sys
+from typing import Dict, List
+
+from src.core.tracing import TRACE_HOPS, read_trace_file
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Phân vị (nearest-rank) của một danh sách đã sắp xếp."""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def hop_spans(trace: dict) -> Dict[str, float]:
+    """Thời gian (ms) của từng chặng "mốc trước -> mốc" mà vết đã đi qua, bắt đầu từ arrival."""
+    spans = {}
+    previous_name, previous_ms = "arrival", 0.0
+    for hop in TRACE_HOPS:
+        if hop not in trace["hops"]:
+            continue
+        offset = trace["hops"][hop]
+        spans[f"{previous_name}->{hop}"] = offset - previous_ms
+        previous_name, previous_ms = hop, offset
+    return spans
+
+
+def total_ms(trace: dict) -> float:
+    return max(trace["hops"].values(), default=0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Báo cáo độ trễ theo chặng từ file vết HWT905")
+    parser.add_argument("path", nargs="?", default="logs/traces.bin", help="File vết (TRACING_FILE)")
+    parser.add_argument("--slowest", type=int, default=10, help="Số vết chậm nhất cần in")
+    parser.add_argument("--sensor", default=None, help="Chỉ xét vết của một cảm biến")
+    parser.add_argument("--include-incomplete", action="store_true", help="Tính cả các vết bỏ dở")
+    args = parser.parse_args()
+
+    traces = read_trace_file(args.path)
+    if args.sensor is not None:
+        traces = [trace for trace in traces if trace["sensor_id"] == args.sensor]
+    incomplete = sum(1 for trace in traces if not trace["complete"])
+    if not args.include_incomplete:
+        traces = [trace for trace in traces if trace["complete"]]
+    print(f"{len(traces)} vết ({incomplete} vết bỏ dở {'đã tính' if args.include_incomplete else 'bị loại'}).")
+    if not traces:
+        sys.exit(0)
+
+    spans: Dict[str, List[float]] = {}
+    for trace in traces:
+        for name, value in hop_spans(trace).items():
+            spans.setdefault(name, []).append(value)
+    spans["total"] = [total_ms(trace) for trace in traces]
+
+    print(f"{'Chặng':<24}{'n':>7}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, values in spans.items():
+        values.sort()
+        print(f"{name:<24}{len(values):>7}{percentile(values, 0.5):>10.2f}"
+              f"{percentile(values, 0.99):>10.2f}{values[-1]:>10.2f}")
+
+    print(f"\n{args.slowest} vết chậm nhất:")
+    for trace in sorted(traces, key=total_ms, reverse=True)[:args.slowest]:
+        slowest_span = max(hop_spans(trace).items(), key=lambda item: item[1], default=("-", 0.0))
+        sensor = f" {trace['sensor_id']}" if trace["sensor_id"] else ""
+        print(f"  #{trace['trace_id']}{sensor} ts={trace['sample_ts']:.3f}: tổng {total_ms(trace):.2f} ms, "
+              f"chậm nhất {slowest_span[0]} {slowest_span[1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
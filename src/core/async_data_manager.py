@@ -3,18 +3,27 @@ import threading
 import logging
 import time
 from queue import Queue, Empty
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 import numpy as np
 import serial
 
 from ..sensors.hwt905_data_decoder import HWT905DataDecoder
 from ..storage.storage_manager import StorageManager
+from ..storage.raw_capture import RawCaptureWriter
 from ..processing.data_processor import SensorDataProcessor
-from ..sensors.hwt905_constants import PACKET_TYPE_ACC
+from ..sensors.hwt905_constants import PACKET_TYPE_ACC, PACKET_TYPE_TIME
+from ..sensors.packet_router import PacketRouter
+from ..sensors.decoders import PACKET_TYPE_NAMES
 from ..mqtt.publisher_factory import get_publisher
 from ..mqtt.batch_publisher import BatchPublisher
 from ..mqtt.scheduled_publisher import ScheduledPublisher
 from ..core.connection_manager import SensorConnectionManager
+from ..core.records import AccBlock, AccSample
+from ..core.timestamp_engine import HostTimestamper, TimestampEngine, sensor_time_seconds
+from ..core.sample_ring import RingSignal, SampleRing, wait_any
+from ..core.process_monitor import ProcessMonitor
+from ..core.metrics import LatencyHistogram
+from ..core.tracing import SampleTrace, SampleTracer
 
 logger = logging.getLogger(__name__)
 
@@ -42,13 +51,59 @@ class SerialReaderThread(threading.Thread):
                  connection_manager: SensorConnectionManager,
                  data_decoder: HWT905DataDecoder, 
                  raw_data_queue: Queue, 
-                 running_flag: threading.Event):
-        super().__init__(daemon=True, name="SerialReaderThread")
+                 running_flag: threading.Event,
+                 batch_mode: bool = False,
+                 packet_router: Optional[PacketRouter] = None,
+                 raw_capture: Optional[RawCaptureWriter] = None,
+                 sensor_id: str = "",
+                 stamp_arrival: bool = False,
+                 block_packets: int = 0,
+                 block_max_latency_s: float = 0.05,
+                 tracer: Optional[SampleTracer] = None):
+        """
+        Args:
+            batch_mode: Nếu True, mỗi lần đọc sẽ tách tất cả các gói tin hoàn chỉnh và
+                        đưa cả danh sách vào hàng đợi bằng một lần put() duy nhất,
+                        thay vì một put() cho mỗi gói 11 byte.
+            packet_router: Bảng định tuyến theo loại gói. Nếu có, framer bỏ các loại gói
+                           không được đăng ký và mỗi loại được chuyển tới hàng đợi riêng;
+                           nếu None, mọi gói được đưa vào raw_data_queue.
+            raw_capture: Nếu có, các gói đã xác thực (sau bộ lọc loại gói) được ghi
+                         nguyên dạng byte vào segment dữ liệu thô.
+            sensor_id: Mã cảm biến khi chạy nhiều cảm biến (mỗi cảm biến một luồng đọc).
+            stamp_arrival: Nếu True, mỗi phần tử đưa vào hàng đợi là (arrival_ts, gói hoặc list gói)
+                           với arrival_ts là thời điểm của lần đọc serial (cho TimestampEngine).
+            block_packets: Nếu > 0 (chế độ khối), các lần đọc được gom lại và chuyển đi theo khối
+                           đúng block_packets gói, hoặc khối thiếu khi gói cũ nhất đã chờ
+                           block_max_latency_s giây. Chế độ khối luôn đọc theo batch.
+            block_max_latency_s: Thời gian gom tối đa của một khối.
+            tracer: Nếu có (cần stamp_arrival), bắt đầu vết cho 1/N gói đọc được.
+        """
+        super().__init__(daemon=True, name=f"SerialReaderThread-{sensor_id}" if sensor_id else "SerialReaderThread")
+        self.sensor_id = sensor_id
         self.connection_manager = connection_manager
         self.data_decoder = data_decoder
         self.raw_data_queue = raw_data_queue
         self.running_flag = running_flag
+        self.batch_mode = batch_mode
+        self.packet_router = packet_router
+        self.raw_capture = raw_capture
+        self.stamp_arrival = stamp_arrival
+        self.block_packets = block_packets
+        self.block_max_latency_s = block_max_latency_s
+        self.tracer = tracer
+        # Số gói ACC đã đọc (chế độ từng gói chỉ truy vết gói ACC)
+        self._acc_packet_count = 0
+        if block_packets:
+            self.batch_mode = True
+        self._pending_packets: list = []
+        self._pending_since = 0.0
+        self._pending_arrival_ts: Optional[float] = None
+        if packet_router is not None:
+            self.data_decoder.set_packet_filter(packet_router.type_mask)
+        # Bộ đếm tăng dần (số liệu Prometheus đọc trực tiếp); log tính tốc độ theo chênh lệch
         self.raw_packet_count = 0
+        self._logged_count = 0
         self.last_log_time = time.time()
 
     def run(self):
@@ -79,29 +134,79 @@ class SerialReaderThread(threading.Thread):
             except Exception as e:
                 logger.warning(f"[Reader] Không thể xóa bộ đệm đầu vào: {e}")
 
-            logger.info("[Reader] Cảm biến đã sẵn sàng. Bắt đầu đọc dữ liệu...")
+            logger.info(f"[Reader] Cảm biến đã sẵn sàng. Bắt đầu đọc dữ liệu "
+                    f"(batch_mode={self.batch_mode}, read_mode={self.data_decoder.read_mode})...")
+            awaiting_first_sample = True
 
             # --- Vòng lặp đọc dữ liệu ---
             while self.running_flag.is_set():
                 try:
-                    raw_packet = self.data_decoder.read_raw_packet()
-                    if raw_packet:
-                        self.raw_data_queue.put(raw_packet)
-                        self.raw_packet_count += 1
+                    if self.batch_mode:
+                        # Một lần put() cho toàn bộ các gói tin đã tách được
+                        raw_packets = self.data_decoder.read_raw_packets()
+                        if raw_packets:
+                            arrival_ts = time.time() if (self.stamp_arrival or self.raw_capture) else None
+                            if self.tracer and self.stamp_arrival and \
+                                    self.tracer.should_trace(self.raw_packet_count, len(raw_packets)):
+                                self.tracer.start(self.sensor_id, arrival_ts, self.data_decoder.last_fill_time,
+                                                  time.monotonic())
+                            if self.raw_capture:
+                                self.raw_capture.write_packets(raw_packets, arrival_ts)
+                            routed_ts = arrival_ts if self.stamp_arrival else None
+                            if self.block_packets:
+                                if not self._pending_packets:
+                                    self._pending_since = time.monotonic()
+                                elif self.tracer and self.tracer.awaiting_decode:
+                                    # Khối được chuyển đi với arrival_ts của lần đọc mới nhất
+                                    self.tracer.rekey_arrival(self._pending_arrival_ts, routed_ts)
+                                self._pending_packets += raw_packets
+                                self._pending_arrival_ts = routed_ts
+                            else:
+                                self._dispatch_batch(raw_packets, routed_ts)
+                            self.raw_packet_count += len(raw_packets)
+                        if self._pending_packets:
+                            self._dispatch_blocks()
+                        has_data = bool(raw_packets)
                     else:
+                        raw_packet = self.data_decoder.read_raw_packet()
+                        if raw_packet:
+                            arrival_ts = time.time() if (self.stamp_arrival or self.raw_capture) else None
+                            if self.tracer and self.stamp_arrival and raw_packet[1] == PACKET_TYPE_ACC:
+                                self._acc_packet_count += 1
+                                if self.tracer.should_trace(self._acc_packet_count - 1, 1):
+                                    self.tracer.start(self.sensor_id, arrival_ts, self.data_decoder.last_fill_time,
+                                                      time.monotonic())
+                            if self.raw_capture:
+                                self.raw_capture.write(raw_packet, arrival_ts)
+                            routed_ts = arrival_ts if self.stamp_arrival else None
+                            if self.packet_router:
+                                self.packet_router.route(raw_packet, routed_ts)
+                            else:
+                                self.raw_data_queue.put(raw_packet if routed_ts is None else (routed_ts, raw_packet))
+                            self.raw_packet_count += 1
+                        has_data = raw_packet is not None
+
+                    if has_data and awaiting_first_sample:
+                        self.connection_manager.record_first_sample()
+                        awaiting_first_sample = False
+
+                    if not has_data:
                         # Kiểm tra xem có phải do mất kết nối không
                         if self.data_decoder.ser is None or not self.data_decoder.ser.is_open:
                             logger.warning("[Reader] Phát hiện mất kết nối serial. Bắt đầu quá trình kết nối lại...")
                             break # Thoát vòng lặp đọc, quay lại vòng lặp kết nối
 
-                        # Ngủ một chút nếu không có dữ liệu để tránh chiếm dụng CPU
-                        time.sleep(0.0001)
+                        if not self.data_decoder.is_event_driven:
+                            # Ngủ một chút nếu không có dữ liệu để tránh chiếm dụng CPU.
+                            # Ở chế độ "event", lệnh đọc đã chặn chờ trên cổng serial.
+                            time.sleep(0.0001)
 
                     current_time = time.time()
                     if current_time - self.last_log_time >= 5.0:
-                        rate = self.raw_packet_count / (current_time - self.last_log_time)
-                        logger.info(f"[Reader] Tốc độ đọc: {rate:.2f} packets/s. Queue size: {self.raw_data_queue.qsize()}")
-                        self.raw_packet_count = 0
+                        rate = (self.raw_packet_count - self._logged_count) / (current_time - self.last_log_time)
+                        logger.info(f"[Reader{' ' + self.sensor_id if self.sensor_id else ''}] Tốc độ đọc: {rate:.2f} packets/s. "
+                                    f"Queue size: {self.raw_data_queue.qsize()}")
+                        self._logged_count = self.raw_packet_count
                         self.last_log_time = current_time
 
                 except serial.SerialException as e:
@@ -112,12 +217,42 @@ class SerialReaderThread(threading.Thread):
                     break # Thoát vòng lặp đọc, quay lại vòng lặp kết nối
             
             # Dọn dẹp trước khi kết nối lại
+            self._flush_pending()
+            if self.raw_capture:
+                self.raw_capture.flush()
             logger.info("[Reader] Đang đóng kết nối hiện tại...")
             self.connection_manager.close_connection()
             # Vòng lặp chính (while self.running_flag.is_set()) sẽ lặp lại và bắt đầu kết nối lại
 
         logger.info("Luồng đọc Serial đã dừng.")
 
+    def _dispatch_batch(self, raw_packets: list, routed_ts: Optional[float]):
+        """Chuyển một batch gói tới bảng định tuyến (hoặc thẳng vào raw_data_queue)."""
+        if self.packet_router:
+            self.packet_router.route_batch(raw_packets, routed_ts)
+        else:
+            self.raw_data_queue.put(raw_packets if routed_ts is None else (routed_ts, raw_packets))
+
+    def _dispatch_blocks(self):
+        """Chuyển các khối đủ block_packets gói, và khối thiếu nếu gói cũ nhất đã quá hạn độ trễ."""
+        pending = self._pending_packets
+        block_packets = self.block_packets
+        if len(pending) >= block_packets:
+            full = len(pending) - len(pending) % block_packets
+            for start in range(0, full, block_packets):
+                self._dispatch_batch(pending[start:start + block_packets], self._pending_arrival_ts)
+            # Phần còn lại đến từ lần đọc mới nhất
+            self._pending_packets = pending[full:]
+            self._pending_since = time.monotonic()
+        elif time.monotonic() - self._pending_since >= self.block_max_latency_s:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        """Chuyển mọi gói đang gom (khối thiếu)."""
+        if self._pending_packets:
+            self._dispatch_batch(self._pending_packets, self._pending_arrival_ts)
+            self._pending_packets = []
+
 class DecoderThread(threading.Thread):
     """
     Luồng chuyên lấy dữ liệu thô từ hàng đợi, giải mã, lưu trữ dữ liệu đã giải mã
@@ -127,68 +262,224 @@ class DecoderThread(threading.Thread):
                  raw_data_queue: Queue, 
                  decoded_data_queue: Queue,
                  running_flag: threading.Event,
-                 decoded_storage_manager: Optional[StorageManager] = None):
-        super().__init__(daemon=True, name="DecoderThread")
+                 decoded_storage_manager: Optional[StorageManager] = None,
+                 sensor_id: str = "",
+                 timestamp_engine: Optional[TimestampEngine] = None,
+                 block_mode: bool = False,
+                 sample_ring: Optional[SampleRing] = None,
+                 latency_histogram: Optional[LatencyHistogram] = None,
+                 tracer: Optional[SampleTracer] = None,
+                 sample_rate_hz: float = 200.0):
+        """
+        Args:
+            sensor_id: Mã cảm biến được gắn vào mọi mẫu (mỗi cảm biến một luồng giải mã).
+            timestamp_engine: Nếu có (và luồng đọc gửi kèm arrival_ts), timestamp của mẫu được
+                              dựng theo chỉ số mẫu thay cho time.time() ở từng gói/batch.
+                              Khi gói TIME được định tuyến chung hàng đợi, giờ cảm biến được dùng.
+            sample_rate_hz: Tần số xuất danh định của cảm biến. Khi không có timestamp_engine,
+                            các mẫu của một batch được rải cách nhau 1/sample_rate_hz,
+                            kết thúc ở time.time() lúc giải mã (HostTimestamper).
+            block_mode: Chế độ khối: mỗi khối gói từ luồng đọc được giải mã thành một AccBlock
+                        (mảng (N, 4) gồm ts, acc_x, acc_y, acc_z) và đẩy đi bằng một lần put().
+            sample_ring: Nếu có, mẫu được ghi vào vòng SPSC cấp phát sẵn thay cho decoded_data_queue
+                         (không tạo bản ghi cho mỗi mẫu); vòng được đóng khi luồng dừng.
+            latency_histogram: Nếu có, ghi nhận độ trễ từ lần đọc serial (arrival_ts) tới lúc
+                               giải mã xong, cho mỗi phần tử có arrival_ts.
+            tracer: Nếu có, ghi mốc decoded/stored cho mẫu ACC đầu tiên của phần tử đang được truy vết.
+        """
+        super().__init__(daemon=True, name=f"DecoderThread-{sensor_id}" if sensor_id else "DecoderThread")
+        self.sensor_id = sensor_id
         self.data_decoder = data_decoder
         self.raw_data_queue = raw_data_queue
         self.decoded_data_queue = decoded_data_queue
         self.running_flag = running_flag
         self.decoded_storage_manager = decoded_storage_manager
+        self.timestamp_engine = timestamp_engine
+        self.host_timestamper = HostTimestamper(sample_rate_hz)
+        self.block_mode = block_mode
+        self.sample_ring = sample_ring
+        self.latency_histogram = latency_histogram
+        self.tracer = tracer
+        # Giây-trong-ngày của gói TIME gần nhất (chế độ sensor_time)
+        self._sensor_seconds: Optional[float] = None
         
         self.decoded_packet_count = 0
+        self._logged_count = 0
         self.last_log_time = time.time()
 
+    def _trace_handoff(self, trace: SampleTrace, sample_ts: float, decoded_at: float):
+        """Ghi mốc decoded/stored của vết, ngay trước khi mẫu được chuyển sang luồng xử lý."""
+        trace.mark("decoded", decoded_at)
+        if self.decoded_storage_manager:
+            trace.mark("stored")
+        self.tracer.await_processing(trace, sample_ts)
+
+    def _handle_raw_packet(self, raw_packet: bytes, arrival_ts: Optional[float] = None,
+                           trace: Optional[SampleTrace] = None):
+        """Giải mã một gói tin thô, lưu trữ và đẩy dữ liệu gia tốc sang luồng xử lý."""
+        # Chỉ xử lý các gói gia tốc: lọc theo byte TYPE trước khi giải mã
+        if raw_packet[1] != PACKET_TYPE_ACC:
+            if trace:
+                self.tracer.finish(trace, False)
+            if raw_packet[1] == PACKET_TYPE_TIME and self.timestamp_engine is not None:
+                record = self.data_decoder.decode_raw_packet_fast(raw_packet)
+                self._sensor_seconds = sensor_time_seconds(record.hour, record.minute,
+                                                           record.second, record.millisecond)
+            return
+
+        # 1. Decode bằng struct biên dịch sẵn (không tạo dict trung gian)
+        record = self.data_decoder.decode_raw_packet_fast(raw_packet)
+        if record is None:
+            logger.warning(f"[Decoder] Lỗi giải mã gói tin: {raw_packet.hex().upper()}")
+            if trace:
+                self.tracer.finish(trace, False)
+            return
+
+        self.decoded_packet_count += 1
+        engine = self.timestamp_engine
+        if engine is None or arrival_ts is None:
+            timestamp = time.time()
+        elif self._sensor_seconds is not None:
+            timestamp = float(engine.stamp_sensor_times((self._sensor_seconds,), arrival_ts)[0])
+            self._sensor_seconds = None
+        else:
+            timestamp = engine.stamp_one(arrival_ts)
+        decoded_at = time.monotonic() if trace else 0.0
+        if self.sample_ring is not None:
+            if self.decoded_storage_manager:
+                self.decoded_storage_manager.store_and_prepare_for_transmission(
+                    AccSample(timestamp, record.acc_x, record.acc_y, record.acc_z, self.sensor_id), timestamp)
+            if trace:
+                self._trace_handoff(trace, timestamp, decoded_at)
+            self.sample_ring.write_one(timestamp, record.acc_x, record.acc_y, record.acc_z)
+            return
+        sample = AccSample(timestamp, record.acc_x, record.acc_y, record.acc_z, self.sensor_id)
+
+        # 2. Lưu dữ liệu đã giải mã (nếu được cấu hình)
+        if self.decoded_storage_manager:
+            self.decoded_storage_manager.store_and_prepare_for_transmission(sample, sample.ts)
+        if trace:
+            self._trace_handoff(trace, timestamp, decoded_at)
+
+        # 3. Đẩy bản ghi vào hàng đợi để xử lý
+        if self.decoded_data_queue:
+            self.decoded_data_queue.put(sample)
+
+    def _handle_raw_batch(self, raw_packets: list, arrival_ts: Optional[float] = None,
+                          trace: Optional[SampleTrace] = None):
+        """Giải mã cả batch gói tin bằng NumPy, lưu trữ và đẩy từng mẫu gia tốc sang luồng xử lý."""
+        engine = self.timestamp_engine if arrival_ts is not None else None
+        blocks = self.data_decoder.decode_raw_packets(
+            raw_packets, (PACKET_TYPE_ACC, PACKET_TYPE_TIME) if engine is not None else (PACKET_TYPE_ACC,))
+        acc_block = blocks.get(PACKET_TYPE_ACC)
+        time_block = blocks.get(PACKET_TYPE_TIME)
+        if acc_block is None:
+            if time_block is not None:
+                self._sensor_seconds = float(self._time_block_seconds(time_block)[-1])
+            if trace:
+                self.tracer.finish(trace, False)
+            return
+
+        self.decoded_packet_count += len(acc_block)
+        sensor_id = self.sensor_id
+        if engine is None:
+            timestamps = self.host_timestamper.stamp(len(acc_block), time.time())
+        elif time_block is not None or self._sensor_seconds is not None:
+            timestamps = self._sensor_timestamps(raw_packets, time_block, arrival_ts)
+        else:
+            timestamps = engine.stamp(len(acc_block), arrival_ts)
+        decoded_at = time.monotonic() if trace else 0.0
+
+        if self.block_mode or self.sample_ring is not None:
+            data = np.empty((len(acc_block), 4), dtype=np.float64)
+            data[:, 0] = timestamps
+            data[:, 1] = acc_block['acc_x']
+            data[:, 2] = acc_block['acc_y']
+            data[:, 3] = acc_block['acc_z']
+            block = AccBlock(data, sensor_id)
+            if self.decoded_storage_manager:
+                self.decoded_storage_manager.store_records(block.samples())
+            if trace:
+                self._trace_handoff(trace, float(data[0, 0]), decoded_at)
+            if self.sample_ring is not None:
+                self.sample_ring.write(data)
+            elif self.decoded_data_queue:
+                self.decoded_data_queue.put(block)
+            return
+
+        for timestamp, acc_x, acc_y, acc_z in zip(timestamps.tolist(),
+                                                  acc_block['acc_x'].tolist(),
+                                                  acc_block['acc_y'].tolist(),
+                                                  acc_block['acc_z'].tolist()):
+            sample = AccSample(timestamp, acc_x, acc_y, acc_z, sensor_id)
+            if self.decoded_storage_manager:
+                self.decoded_storage_manager.store_and_prepare_for_transmission(sample, timestamp)
+            if trace:
+                self._trace_handoff(trace, timestamp, decoded_at)
+                trace = None
+            if self.decoded_data_queue:
+                self.decoded_data_queue.put(sample)
+
+    @staticmethod
+    def _time_block_seconds(time_block: np.ndarray) -> np.ndarray:
+        return sensor_time_seconds(time_block['hour'].astype(np.float64), time_block['minute'],
+                                   time_block['second'], time_block['millisecond'])
+
+    def _sensor_timestamps(self, raw_packets: list, time_block: Optional[np.ndarray],
+                           arrival_ts: float) -> np.ndarray:
+        """
+        Timestamp theo giờ cảm biến: mỗi gói ACC lấy giờ của gói TIME gần nhất đứng trước nó
+        (cùng chu kỳ xuất), kể cả gói TIME ở batch trước.
+        """
+        packet_types = np.frombuffer(bytes(packet[1] for packet in raw_packets), dtype=np.uint8)
+        acc_positions = np.flatnonzero(packet_types == PACKET_TYPE_ACC)
+        time_positions = np.flatnonzero(packet_types == PACKET_TYPE_TIME)
+        # Phần tử 0 là giờ của gói TIME ở batch trước (nếu có)
+        seconds = np.concatenate((
+            [np.nan if self._sensor_seconds is None else self._sensor_seconds],
+            self._time_block_seconds(time_block) if time_block is not None else []))
+        sample_seconds = seconds[np.searchsorted(time_positions, acc_positions, side='right')]
+        self._sensor_seconds = None if np.isnan(seconds[-1]) else float(seconds[-1])
+        if np.isnan(sample_seconds).any():
+            # Gói ACC đầu tiên chưa có gói TIME nào đi trước: dùng lưới chỉ số cho cả batch
+            return self.timestamp_engine.stamp(len(acc_positions), arrival_ts)
+        return self.timestamp_engine.stamp_sensor_times(sample_seconds, arrival_ts)
+
     def run(self):
         logger.info("Luồng Giải mã (DecoderThread) đã bắt đầu.")
         while self.running_flag.is_set() or not self.raw_data_queue.empty():
             try:
-                raw_packet = self.raw_data_queue.get(timeout=1)
-                
-                # 1. Decode
-                packet_info = self.data_decoder.decode_raw_packet(raw_packet)
-
-                if not packet_info or "error" in packet_info:
-                    if packet_info:
-                        logger.warning(f"[Decoder] Lỗi giải mã gói tin: {packet_info.get('message', 'Unknown')}")
-                    self.raw_data_queue.task_done()
-                    continue
-                
-                # Chỉ xử lý các gói gia tốc
-                if packet_info.get("type") != PACKET_TYPE_ACC:
-                    self.raw_data_queue.task_done()
-                    continue
-                
-                self.decoded_packet_count += 1
-
-                acc_data = {
-                    'acc_x': packet_info.get("acc_x"),
-                    'acc_y': packet_info.get("acc_y"),
-                    'acc_z': packet_info.get("acc_z")
-                }
-                current_timestamp = time.time()
-                
-                # Tạo một tuple chứa timestamp và dữ liệu để đưa vào hàng đợi
-                decoded_item = (current_timestamp, acc_data)
-
-                # 2. Lưu dữ liệu đã giải mã (nếu được cấu hình)
-                if self.decoded_storage_manager:
-                    self.decoded_storage_manager.store_and_prepare_for_transmission(acc_data, current_timestamp)
-
-                # 3. Đẩy dữ liệu đã giải mã vào hàng đợi để xử lý
-                if self.decoded_data_queue:
-                    self.decoded_data_queue.put(decoded_item)
+                raw_item = self.raw_data_queue.get(timeout=1)
+
+                # Phần tử trong hàng đợi có thể là một gói tin hoặc một batch (list) gói tin,
+                # kèm arrival_ts của lần đọc serial nếu luồng đọc bật stamp_arrival
+                arrival_ts = None
+                trace = None
+                if isinstance(raw_item, tuple):
+                    arrival_ts, raw_item = raw_item
+                    if self.tracer and self.tracer.awaiting_decode:
+                        trace = self.tracer.take_arrival(arrival_ts)
+                if isinstance(raw_item, list):
+                    self._handle_raw_batch(raw_item, arrival_ts, trace)
+                else:
+                    self._handle_raw_packet(raw_item, arrival_ts, trace)
+                if self.latency_histogram and arrival_ts is not None:
+                    self.latency_histogram.observe_since(arrival_ts)
 
                 self.raw_data_queue.task_done()
 
                 # Ghi log định kỳ
                 current_time = time.time()
                 if current_time - self.last_log_time >= 5.0:
-                    decode_rate = self.decoded_packet_count / (current_time - self.last_log_time)
+                    decode_rate = (self.decoded_packet_count - self._logged_count) / (current_time - self.last_log_time)
                     q_info = f"Queue raw: {self.raw_data_queue.qsize()}"
-                    if self.decoded_data_queue:
+                    if self.sample_ring is not None:
+                        q_info += f", ring: {len(self.sample_ring)}"
+                    elif self.decoded_data_queue:
                         q_info += f", decoded: {self.decoded_data_queue.qsize()}"
-                    logger.info(f"[Decoder] Tốc độ: {decode_rate:.2f} packets/s. {q_info}")
-                    self.decoded_packet_count = 0
+                    logger.info(f"[Decoder{' ' + self.sensor_id if self.sensor_id else ''}] "
+                                f"Tốc độ: {decode_rate:.2f} packets/s. {q_info}")
+                    self._logged_count = self.decoded_packet_count
                     self.last_log_time = current_time
 
             except Empty:
@@ -203,10 +494,82 @@ class DecoderThread(threading.Thread):
                 
         logger.info("Luồng Giải mã (DecoderThread) đã dừng.")
         # Báo hiệu cho luồng Processor rằng không còn dữ liệu mới
-        if self.decoded_data_queue:
+        if self.sample_ring is not None:
+            self.sample_ring.close()
+        elif self.decoded_data_queue:
             self.decoded_data_queue.put(None)
 
 
+class AuxPacketSinkThread(threading.Thread):
+    """
+    Luồng tiêu thụ các loại gói phụ (góc, vận tốc góc, quaternion, thời gian...) được
+    PacketRouter định tuyến tới: giải mã bằng struct và lưu vào StorageManager của từng loại.
+    """
+    def __init__(self, data_decoder: HWT905DataDecoder,
+                 aux_queue: Queue,
+                 running_flag: threading.Event,
+                 storage_managers: Dict[int, StorageManager],
+                 sensor_id: str = ""):
+        """
+        Args:
+            aux_queue: Hàng đợi nhận gói thô (từng gói hoặc list gói) từ PacketRouter.
+            storage_managers: packet_type -> StorageManager lưu dữ liệu của loại gói đó.
+            sensor_id: Mã cảm biến khi chạy nhiều cảm biến.
+        """
+        super().__init__(daemon=True, name=f"AuxPacketSinkThread-{sensor_id}" if sensor_id else "AuxPacketSinkThread")
+        self.data_decoder = data_decoder
+        self.aux_queue = aux_queue
+        self.running_flag = running_flag
+        self.storage_managers = storage_managers
+        self.stored_packet_count = 0
+        self._logged_count = 0
+        self.last_log_time = time.time()
+
+    def _handle_raw_packet(self, raw_packet: bytes, timestamp: float):
+        storage_manager = self.storage_managers.get(raw_packet[1])
+        if storage_manager is None:
+            return
+        record = self.data_decoder.decode_raw_packet_fast(raw_packet)
+        if record is None:
+            return
+        storage_manager.store_and_prepare_for_transmission(record, timestamp)
+        self.stored_packet_count += 1
+
+    def run(self):
+        logger.info(f"Luồng gói phụ đã bắt đầu cho: "
+                    f"{[PACKET_TYPE_NAMES[t] for t in self.storage_managers]}")
+        while self.running_flag.is_set() or not self.aux_queue.empty():
+            try:
+                raw_item = self.aux_queue.get(timeout=1)
+                if isinstance(raw_item, tuple):
+                    timestamp, raw_item = raw_item
+                else:
+                    timestamp = time.time()
+                if isinstance(raw_item, list):
+                    for raw_packet in raw_item:
+                        self._handle_raw_packet(raw_packet, timestamp)
+                else:
+                    self._handle_raw_packet(raw_item, timestamp)
+                self.aux_queue.task_done()
+
+                current_time = time.time()
+                if current_time - self.last_log_time >= 5.0:
+                    rate = (self.stored_packet_count - self._logged_count) / (current_time - self.last_log_time)
+                    logger.info(f"[Aux] Tốc độ lưu: {rate:.2f} packets/s. Queue aux: {self.aux_queue.qsize()}")
+                    self._logged_count = self.stored_packet_count
+                    self.last_log_time = current_time
+
+            except Empty:
+                if not self.running_flag.is_set():
+                    break
+                continue
+            except Exception as e:
+                logger.error(f"[Aux] Lỗi trong luồng gói phụ: {e}", exc_info=True)
+                break
+
+        logger.info("Luồng gói phụ đã dừng.")
+
+
 class ProcessorThread(threading.Thread):
     """
     Luồng chuyên lấy dữ liệu đã giải mã từ hàng đợi, xử lý,
@@ -217,19 +580,89 @@ class ProcessorThread(threading.Thread):
                  running_flag: threading.Event,
                  sensor_data_processor: SensorDataProcessor,
                  processed_storage_manager: Optional[StorageManager] = None,
-                 mqtt_queue: Optional[Queue] = None):
+                 mqtt_queue: Optional[Queue] = None,
+                 producer_count: int = 1,
+                 sample_rings: Optional[List[SampleRing]] = None,
+                 ring_signal: Optional[RingSignal] = None,
+                 ring_read_rows: int = 256,
+                 latency_monitor: Optional[ProcessMonitor] = None,
+                 latency_histogram: Optional[LatencyHistogram] = None,
+                 tracer: Optional[SampleTracer] = None,
+                 mqtt_shed_check: Optional[Callable[[], bool]] = None):
+        """
+        Args:
+            sensor_data_processor: SensorDataProcessor, hoặc SensorProcessorPool khi chạy nhiều cảm biến.
+            producer_count: Số luồng giải mã cùng đẩy vào decoded_data_queue; luồng chỉ dừng
+                            khi đã nhận tín hiệu kết thúc (None) từ tất cả.
+            sample_rings: Nếu có, đọc mẫu từ các vòng SPSC (mỗi cảm biến một vòng) thay cho
+                          decoded_data_queue; luồng dừng khi mọi vòng đã đóng và đọc hết.
+            ring_signal: read_signal dùng chung của các vòng, để chờ khi tất cả đều rỗng.
+            ring_read_rows: Số mẫu tối đa đọc từ một vòng mỗi lần (một khối xử lý).
+            latency_monitor: Nếu có, ghi nhận độ trễ từ timestamp mẫu tới lúc xử lý xong.
+            latency_histogram: Như latency_monitor, cho số liệu Prometheus.
+            tracer: Nếu có, ghi mốc processed cho các vết đang chờ xử lý.
+            mqtt_shed_check: Nếu có và trả về True (các hàng đợi phía trước đang quá tải),
+                             kết quả chỉ được lưu trữ, không đẩy sang MQTT (lưu trữ được ưu tiên).
+        """
         super().__init__(daemon=True, name="ProcessorThread")
+        self.producer_count = producer_count
         self.decoded_data_queue = decoded_data_queue
         self.running_flag = running_flag
         self.sensor_data_processor = sensor_data_processor
         self.processed_storage_manager = processed_storage_manager
         self.mqtt_queue = mqtt_queue
+        self.sample_rings = sample_rings
+        self.ring_signal = ring_signal if ring_signal is not None else RingSignal()
+        self.ring_read_rows = ring_read_rows
+        self.latency_monitor = latency_monitor
+        self.latency_histogram = latency_histogram
+        self.tracer = tracer
+        self.mqtt_shed_check = mqtt_shed_check
+        self.mqtt_shed_count = 0
         
         self.processed_packet_count = 0
+        self._logged_count = 0
         self.last_log_time = time.time()
 
     def run(self):
         logger.info("Luồng Xử lý (ProcessorThread) đã bắt đầu.")
+        if self.sample_rings:
+            self._run_rings()
+        else:
+            self._run_queue()
+
+        # Báo hiệu cho luồng MQTT rằng không còn dữ liệu mới
+        if self.mqtt_queue:
+            self.mqtt_queue.put(None)
+                
+        logger.info("Luồng Xử lý (ProcessorThread) đã dừng.")
+
+    def _run_rings(self):
+        """Đọc lần lượt các vòng SPSC, mỗi lần một khối; chờ trên ring_signal khi tất cả đều rỗng."""
+        rings = list(self.sample_rings)
+        while rings:
+            try:
+                has_data = False
+                for ring in rings:
+                    block = ring.read(self.ring_read_rows)
+                    if block is not None:
+                        has_data = True
+                        self._handle_block(block)
+                self._log_rate()
+                if has_data:
+                    continue
+                rings = [ring for ring in rings if not ring.exhausted]
+                if not rings:
+                    logger.info("[Processor] Mọi vòng mẫu đã đóng và được đọc hết.")
+                    break
+                if not wait_any(rings, self.ring_signal, 1.0) and not self.running_flag.is_set():
+                    logger.info("Các vòng mẫu trống và cờ đã tắt, thoát luồng Processor.")
+                    break
+            except Exception as e:
+                logger.error(f"[Processor] Lỗi trong luồng Processor: {e}", exc_info=True)
+                break
+
+    def _run_queue(self):
         while self.running_flag.is_set() or not self.decoded_data_queue.empty():
             try:
                 # Lấy dữ liệu từ hàng đợi đã giải mã
@@ -237,56 +670,41 @@ class ProcessorThread(threading.Thread):
 
                 # Kiểm tra tín hiệu kết thúc
                 if decoded_item is None:
+                    self.producer_count -= 1
+                    if self.producer_count > 0:
+                        continue
                     logger.info("[Processor] Nhận được tín hiệu kết thúc từ Decoder.")
                     break
                 
-                timestamp, acc_data = decoded_item
-                
-                # 1. Xử lý dữ liệu
-                processed_results = self.sensor_data_processor.process_new_sample(
-                    acc_data['acc_x'], acc_data['acc_y'], acc_data['acc_z']
-                )
+                if isinstance(decoded_item, AccBlock):
+                    self._handle_block(decoded_item)
+                    self.decoded_data_queue.task_done()
+                    self._log_rate()
+                    continue
+
+                # 1. Xử lý bản ghi AccSample, kết quả là ProcessedSample mang cùng timestamp
+                processed_sample = self.sensor_data_processor.process_sample(decoded_item)
 
                 # Nếu có kết quả, tiếp tục xử lý
-                if processed_results:
+                if processed_sample is not None:
                     self.processed_packet_count += 1
-                    
-                    # 2. Thêm timestamp vào kết quả
-                    processed_results['ts'] = timestamp
+                    if self.tracer and self.tracer.awaiting_process:
+                        self._trace_processed(processed_sample.sensor_id, processed_sample.ts)
 
-                    # 3. Lưu dữ liệu đã xử lý (nếu được cấu hình)
+                    # 2. Lưu dữ liệu đã xử lý (nếu được cấu hình)
                     if self.processed_storage_manager:
-                        self.processed_storage_manager.store_and_prepare_for_transmission(processed_results, timestamp)
+                        self.processed_storage_manager.store_and_prepare_for_transmission(processed_sample, processed_sample.ts)
 
-                    # 4. Đẩy vào hàng đợi MQTT (nếu được cấu hình)
+                    # 3. Đẩy bản ghi vào hàng đợi MQTT; publisher chỉ chọn trường khi tuần tự hóa
                     if self.mqtt_queue:
-                        # Chuyển đổi tất cả các giá trị numpy sang kiểu Python gốc
-                        native_data = convert_numpy_to_native(processed_results)
-                        
-                        # Tạo payload MQTT chỉ chứa các trường cần thiết
-                        mqtt_payload = {
-                            'ts': native_data.get('ts'),
-                            'disp_x': native_data.get('disp_x'),
-                            'disp_y': native_data.get('disp_y'),
-                            'disp_z': native_data.get('disp_z'),
-                            'dominant_freq_x': native_data.get('dominant_freq_x'),
-                            'dominant_freq_y': native_data.get('dominant_freq_y'),
-                            'dominant_freq_z': native_data.get('dominant_freq_z'),
-                        }
-                        self.mqtt_queue.put(mqtt_payload)
+                        self._put_mqtt(processed_sample, 1)
+                    if self.latency_monitor:
+                        self.latency_monitor.observe(processed_sample.ts)
+                    if self.latency_histogram:
+                        self.latency_histogram.observe_since(processed_sample.ts)
                 
                 self.decoded_data_queue.task_done()
-
-                # Ghi log định kỳ
-                current_time = time.time()
-                if current_time - self.last_log_time >= 5.0:
-                    process_rate = self.processed_packet_count / (current_time - self.last_log_time)
-                    q_info = f"Queue decoded: {self.decoded_data_queue.qsize()}"
-                    if self.mqtt_queue:
-                        q_info += f", mqtt: {self.mqtt_queue.qsize()}"
-                    logger.info(f"[Processor] Tốc độ: {process_rate:.2f} packets/s. {q_info}")
-                    self.processed_packet_count = 0
-                    self.last_log_time = current_time
+                self._log_rate()
 
             except Empty:
                 if not self.running_flag.is_set():
@@ -297,25 +715,82 @@ class ProcessorThread(threading.Thread):
                 logger.error(f"[Processor] Lỗi trong luồng Processor: {e}", exc_info=True)
                 # Không clear running_flag để main thread có thể xử lý reconnection
                 break
-        
-        # Báo hiệu cho luồng MQTT rằng không còn dữ liệu mới
+
+    def _handle_block(self, block: AccBlock):
+        """Xử lý cả khối mẫu; kết quả được lưu và đẩy sang MQTT dưới dạng một list."""
+        processed_samples = self.sensor_data_processor.process_block(block)
+        if not processed_samples:
+            return
+        self.processed_packet_count += len(processed_samples)
+        if self.tracer and self.tracer.awaiting_process:
+            self._trace_processed(block.sensor_id, processed_samples[-1].ts)
+        if self.processed_storage_manager:
+            self.processed_storage_manager.store_records(processed_samples)
         if self.mqtt_queue:
-            self.mqtt_queue.put(None)
-                
-        logger.info("Luồng Xử lý (ProcessorThread) đã dừng.")
+            self._put_mqtt(processed_samples, len(processed_samples))
+        if self.latency_monitor:
+            self.latency_monitor.observe(processed_samples[-1].ts)
+        if self.latency_histogram:
+            self.latency_histogram.observe_since(processed_samples[-1].ts)
+
+    def _trace_processed(self, sensor_id: str, last_ts: float):
+        """Ghi mốc processed cho các vết có timestamp <= last_ts, rồi chuyển chúng sang chờ gửi MQTT."""
+        processed_at = time.monotonic()
+        for trace in self.tracer.take_processed(sensor_id, last_ts):
+            trace.mark("processed", processed_at)
+            self.tracer.await_publishing(trace, forward=self.mqtt_queue is not None and self.tracer.publish_hops)
+
+    def _put_mqtt(self, item, count: int):
+        """Đẩy kết quả sang MQTT, trừ khi pipeline đang quá tải và lưu trữ được ưu tiên."""
+        if self.mqtt_shed_check and self.mqtt_shed_check():
+            self.mqtt_shed_count += count
+            return
+        self.mqtt_queue.put(item)
+
+    def _log_rate(self):
+        """Ghi log định kỳ."""
+        current_time = time.time()
+        if current_time - self.last_log_time >= 5.0:
+            process_rate = (self.processed_packet_count - self._logged_count) / (current_time - self.last_log_time)
+            if self.sample_rings:
+                q_info = f"Ring: {sum(len(ring) for ring in self.sample_rings)}"
+            else:
+                q_info = f"Queue decoded: {self.decoded_data_queue.qsize()}"
+            if self.mqtt_queue:
+                q_info += f", mqtt: {self.mqtt_queue.qsize()}"
+            if self.mqtt_shed_count:
+                q_info += f", bỏ gửi MQTT (ưu tiên lưu trữ): {self.mqtt_shed_count}"
+            logger.info(f"[Processor] Tốc độ: {process_rate:.2f} packets/s. {q_info}")
+            self._logged_count = self.processed_packet_count
+            self.last_log_time = current_time
 
 
 class MqttPublisherThread(threading.Thread):
     """
     Luồng chuyên lấy dữ liệu đã xử lý từ hàng đợi và gửi qua MQTT.
     """
-    def __init__(self, mqtt_queue: Queue, running_flag: threading.Event, mode: str = "continuous"):
+    def __init__(self, mqtt_queue: Queue, running_flag: threading.Event, mode: str = "continuous",
+                 latency_monitor: Optional[ProcessMonitor] = None,
+                 latency_histogram: Optional[LatencyHistogram] = None,
+                 tracer: Optional[SampleTracer] = None):
+        """
+        Args:
+            latency_monitor: Nếu có, ghi nhận độ trễ từ timestamp mẫu tới lúc gửi xong.
+            latency_histogram: Như latency_monitor, cho số liệu Prometheus.
+            tracer: Nếu có, publisher ghi mốc serialized/published/puback cho các vết.
+        """
         super().__init__(daemon=True, name="MqttPublisherThread")
         self.mqtt_queue = mqtt_queue
         self.running_flag = running_flag
         self.mode = mode
+        self.latency_monitor = latency_monitor
+        self.latency_histogram = latency_histogram
         self.publisher = get_publisher(mode=mode)
+        if self.publisher and tracer and self.publisher.supports_tracing:
+            self.publisher.tracer = tracer
+            tracer.publish_hops = True
         self.sent_packet_count = 0
+        self._logged_count = 0
         self.last_log_time = time.time()
 
     def run(self):
@@ -334,16 +809,30 @@ class MqttPublisherThread(threading.Thread):
                     logger.info("[MQTT Publisher] Nhận được tín hiệu kết thúc từ Processor.")
                     break
                 
-                self.publisher.publish(processed_data)
-                self.sent_packet_count += 1
+                if isinstance(processed_data, list):
+                    # Chế độ khối: một phần tử hàng đợi là cả khối kết quả
+                    for processed_sample in processed_data:
+                        self.publisher.publish(processed_sample)
+                    self.sent_packet_count += len(processed_data)
+                    if self.latency_monitor and processed_data:
+                        self.latency_monitor.observe(processed_data[-1].ts)
+                    if self.latency_histogram and processed_data:
+                        self.latency_histogram.observe_since(processed_data[-1].ts)
+                else:
+                    self.publisher.publish(processed_data)
+                    self.sent_packet_count += 1
+                    if self.latency_monitor:
+                        self.latency_monitor.observe(processed_data.ts)
+                    if self.latency_histogram:
+                        self.latency_histogram.observe_since(processed_data.ts)
                 self.mqtt_queue.task_done()
 
                 # Ghi log định kỳ
                 current_time = time.time()
                 if current_time - self.last_log_time >= 5.0:
-                    send_rate = self.sent_packet_count / (current_time - self.last_log_time)
+                    send_rate = (self.sent_packet_count - self._logged_count) / (current_time - self.last_log_time)
                     logger.info(f"[MQTT Publisher] Tốc độ gửi: {send_rate:.2f} packets/s. Queue size: {self.mqtt_queue.qsize()}")
-                    self.sent_packet_count = 0
+                    self._logged_count = self.sent_packet_count
                     self.last_log_time = current_time
 
             except Empty:
@@ -0,0 +1,233 @@
+# src/core/backpressure.py
+
+"""
+Hàng đợi có chính sách chống nghẽn cho các tầng của pipeline.
+Khi tầng sau chậm hơn tầng trước, Queue thường làm put() chặn: luồng đọc serial đứng lại,
+bộ đệm UART của hệ điều hành tràn và dữ liệu hỏng khung một cách ngẫu nhiên. PolicyQueue
+biến quá tải thành một trạng thái đo được: vào quá tải khi độ sâu chạm ngưỡng cao, ra khi
+xuống dưới ngưỡng thấp, và trong lúc quá tải bỏ dữ liệu theo chính sách đã chọn, có đếm.
+"""
+import logging
+import time
+from queue import Full, Queue
+from typing import Any, Dict, Optional
+
+from .records import AccBlock
+
+logger = logging.getLogger(__name__)
+
+# block: chặn khi đầy (như Queue); drop_oldest: bỏ phần tử cũ nhất; drop_newest: bỏ phần tử mới;
+# decimate: trong lúc quá tải chỉ giữ 1/N mẫu
+SUPPORTED_QUEUE_POLICIES = ("block", "drop_oldest", "drop_newest", "decimate")
+
+
+def item_sample_count(item: Any) -> int:
+    """Số mẫu/gói trong một phần tử hàng đợi (gói, list gói, AccBlock, (arrival_ts, ...))."""
+    if type(item) is tuple:
+        return item_sample_count(item[1])
+    if isinstance(item, list):
+        return len(item)
+    if isinstance(item, AccBlock):
+        return len(item.data)
+    return 1
+
+
+class PolicyQueue(Queue):
+    """
+    Queue có chính sách khi quá tải, ngưỡng cao/thấp và bộ đếm phần tử bị bỏ.
+    Chính sách block giữ hành vi của Queue nhưng vẫn đo trạng thái quá tải và thời gian chặn.
+    Các chính sách còn lại không bao giờ chặn bên put(), kể cả khi hàng đợi đầy.
+    """
+
+    def __init__(self, maxsize: int = 8192, policy: str = "block", high_watermark: float = 0.8,
+                 low_watermark: float = 0.5, decimate_n: int = 2, name: str = ""):
+        """
+        Args:
+            maxsize: Số phần tử tối đa (phải > 0 với các chính sách bỏ dữ liệu).
+            policy: Một trong SUPPORTED_QUEUE_POLICIES.
+            high_watermark: Tỉ lệ độ sâu/maxsize để vào trạng thái quá tải.
+            low_watermark: Tỉ lệ độ sâu/maxsize để ra khỏi trạng thái quá tải.
+            decimate_n: Với decimate, giữ 1 trên N mẫu trong lúc quá tải.
+            name: Tên hàng đợi trong log và thống kê.
+        """
+        if policy not in SUPPORTED_QUEUE_POLICIES:
+            raise ValueError(f"Chính sách hàng đợi không hợp lệ: {policy}. Hỗ trợ: {SUPPORTED_QUEUE_POLICIES}")
+        if policy != "block" and maxsize <= 0:
+            raise ValueError(f"Chính sách {policy} cần maxsize > 0")
+        if not 0.0 <= low_watermark <= high_watermark <= 1.0:
+            raise ValueError(f"Ngưỡng không hợp lệ: low={low_watermark}, high={high_watermark}")
+        super().__init__(maxsize)
+        self.policy = policy
+        self.name = name
+        self.high_level = max(1, int(maxsize * high_watermark)) if maxsize > 0 else 0
+        self.low_level = int(maxsize * low_watermark)
+        self.decimate_n = max(1, decimate_n)
+        self._decimate_phase = 0
+
+        self.overloaded = False
+        self._overload_since = 0.0
+        self._episode_dropped = 0
+
+        self.put_items = 0
+        self.dropped_items = 0
+        self.dropped_samples = 0
+        self.overload_episodes = 0
+        self.overload_time_s = 0.0
+        self.blocked_puts = 0
+        self.blocked_time_s = 0.0
+        self.max_depth = 0
+
+    def put(self, item, block: bool = True, timeout: Optional[float] = None):
+        with self.not_full:
+            depth = self._qsize()
+            self._update_overload(depth)
+            if self.policy != "block":
+                # None là tín hiệu kết thúc của tầng trước, không bao giờ bị bỏ
+                if item is not None and (self.overloaded or depth >= self.maxsize):
+                    item = self._shed(item)
+                    if item is None:
+                        return
+            elif 0 < self.maxsize <= depth:
+                self._wait_not_full(block, timeout)
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.put_items += 1
+            depth = self._qsize()
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self.not_empty.notify()
+
+    def _get(self):
+        # Gọi khi đang giữ mutex (Queue.get): ra khỏi quá tải ngay khi tầng sau rút xuống ngưỡng thấp,
+        # kể cả khi bên put() đã ngừng gửi
+        item = super()._get()
+        if self.overloaded:
+            self._update_overload(self._qsize())
+        return item
+
+    def _wait_not_full(self, block: bool, timeout: Optional[float]):
+        """Như Queue.put() khi đầy (gọi khi đang giữ not_full), có đo thời gian chặn."""
+        if not block:
+            raise Full
+        if timeout is not None and timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        started = time.monotonic()
+        self.blocked_puts += 1
+        try:
+            while self._qsize() >= self.maxsize:
+                if timeout is None:
+                    self.not_full.wait()
+                else:
+                    remaining = started + timeout - time.monotonic()
+                    if remaining <= 0.0:
+                        raise Full
+                    self.not_full.wait(remaining)
+        finally:
+            self.blocked_time_s += time.monotonic() - started
+
+    def _update_overload(self, depth: int):
+        if not self.overloaded:
+            if self.high_level and depth >= self.high_level:
+                self.overloaded = True
+                self.overload_episodes += 1
+                self._overload_since = time.monotonic()
+                self._episode_dropped = 0
+                logger.warning(f"[Queue {self.name}] Quá tải: {depth}/{self.maxsize} phần tử, "
+                               f"chính sách {self.policy}.")
+        elif depth <= self.low_level:
+            self.overloaded = False
+            duration = time.monotonic() - self._overload_since
+            self.overload_time_s += duration
+            logger.info(f"[Queue {self.name}] Hết quá tải sau {duration:.1f} s, "
+                        f"đã bỏ {self._episode_dropped} mẫu.")
+
+    def _count_drop(self, item, samples: Optional[int] = None):
+        samples = item_sample_count(item) if samples is None else samples
+        self.dropped_items += 1
+        self.dropped_samples += samples
+        self._episode_dropped += samples
+
+    def _shed(self, item):
+        """Áp dụng chính sách khi quá tải; trả về phần tử cần đưa vào hàng đợi, hoặc None."""
+        if self.policy == "drop_oldest":
+            # Bỏ phần tử cũ nhất tới khi dưới ngưỡng cao để phần tử mới luôn được nhận
+            sentinels = 0
+            while self._qsize() >= min(self.high_level, self.maxsize):
+                oldest = self.queue.popleft()
+                if oldest is None:
+                    sentinels += 1
+                    continue
+                self._count_drop(oldest)
+                self.unfinished_tasks -= 1
+            # Giữ lại tín hiệu kết thúc của các tầng trước ở đầu hàng đợi
+            self.queue.extendleft([None] * sentinels)
+            if self.unfinished_tasks == 0:
+                self.all_tasks_done.notify_all()
+            return item
+        if self.policy == "decimate":
+            item = self._decimate(item)
+            if item is None:
+                return None
+            if self._qsize() < self.maxsize:
+                return item
+        # drop_newest (và decimate khi hàng đợi đã đầy thật)
+        self._count_drop(item)
+        return None
+
+    def _decimate(self, item):
+        """Giữ 1 trên decimate_n mẫu, pha liên tục giữa các phần tử; None nếu không còn mẫu nào."""
+        if type(item) is tuple:
+            inner = self._decimate(item[1])
+            return None if inner is None else (item[0], inner)
+        total = item_sample_count(item)
+        start = (-self._decimate_phase) % self.decimate_n
+        self._decimate_phase = (self._decimate_phase + total) % self.decimate_n
+        if isinstance(item, list):
+            kept = item[start::self.decimate_n]
+        elif isinstance(item, AccBlock):
+            kept = AccBlock(item.data[start::self.decimate_n], item.sensor_id)
+        else:
+            kept = item if start == 0 else None
+        kept_count = item_sample_count(kept) if kept is not None else 0
+        if kept_count < total:
+            self.dropped_samples += total - kept_count
+            self._episode_dropped += total - kept_count
+        if kept_count == 0:
+            self.dropped_items += 1
+            return None
+        return kept
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.mutex:
+            overload_time_s = self.overload_time_s
+            if self.overloaded:
+                overload_time_s += time.monotonic() - self._overload_since
+            return {
+                "policy": self.policy,
+                "depth": self._qsize(),
+                "max_depth": self.max_depth,
+                "overloaded": self.overloaded,
+                "overload_episodes": self.overload_episodes,
+                "overload_time_s": overload_time_s,
+                "put_items": self.put_items,
+                "dropped_items": self.dropped_items,
+                "dropped_samples": self.dropped_samples,
+                "blocked_puts": self.blocked_puts,
+                "blocked_time_s": self.blocked_time_s,
+            }
+
+
+def create_policy_queue(queue_config: Optional[dict], name: str) -> PolicyQueue:
+    """
+    Tạo PolicyQueue từ một mục của cấu hình queues (policy, maxsize, high/low_watermark, decimate_n).
+    Không có cấu hình: Queue 8192 phần tử, chính sách block như trước.
+    """
+    queue_config = queue_config or {}
+    return PolicyQueue(
+        maxsize=queue_config.get("maxsize", 8192),
+        policy=queue_config.get("policy", "block"),
+        high_watermark=queue_config.get("high_watermark", 0.8),
+        low_watermark=queue_config.get("low_watermark", 0.5),
+        decimate_n=queue_config.get("decimate_n", 2),
+        name=name
+    )
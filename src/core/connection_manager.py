@@ -1,16 +1,55 @@
+import json
 import logging
+import os
+import threading
 import time
 import serial
 import glob
-from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Optional, List, Tuple
 
 from src.sensors.config.unified_config_manager import HWT905UnifiedConfigManager
-from src.sensors.hwt905_constants import (
-    BAUD_RATE_9600, BAUD_RATE_115200, BAUD_RATE_460800, BAUD_RATE_921600
-)
+from src.sensors.baud_detector import PassiveBaudDetector
+from src.sensors.hwt905_constants import BAUD_RATE_CODES
 
 logger = logging.getLogger(__name__)
 
+# Nhiều SensorConnectionManager (chế độ nhiều cảm biến) có thể dùng chung một file trạng thái
+_state_file_lock = threading.Lock()
+
+
+def _get_usb_identity(port: str) -> Dict[str, str]:
+    """Số serial và vị trí USB của cổng (nếu có), để nhận lại cảm biến khi tên cổng thay đổi."""
+    try:
+        from serial.tools import list_ports
+        device = os.path.realpath(port)
+        for info in list_ports.comports():
+            if os.path.realpath(info.device) == device:
+                return {key: value for key, value in (("serial_number", info.serial_number),
+                                                      ("location", info.location)) if value}
+    except Exception as e:
+        logger.debug(f"Không thể đọc thông tin USB của {port}: {e}")
+    return {}
+
+
+def discover_sensor_ports(port_pattern: str, max_ports: Optional[int] = None) -> List[str]:
+    """
+    Tìm các cổng serial khớp mẫu glob, dùng cho chế độ nhiều cảm biến (mỗi cổng một cảm biến).
+
+    Args:
+        port_pattern (str): Mẫu glob, ví dụ /dev/ttyUSB* hoặc /dev/serial/by-id/*.
+        max_ports (Optional[int]): Số cổng tối đa được trả về.
+
+    Returns:
+        Danh sách cổng đã sắp xếp.
+    """
+    ports = sorted(glob.glob(port_pattern))
+    if max_ports is not None and len(ports) > max_ports:
+        logger.warning(f"Tìm thấy {len(ports)} cổng, chỉ dùng {max_ports} cổng đầu tiên.")
+        ports = ports[:max_ports]
+    return ports
+
+
 class SensorConnectionManager:
     """
     Quản lý kết nối, cấu hình và tái kết nối với cảm biến HWT905.
@@ -27,20 +66,80 @@ class SensorConnectionManager:
         self.port_pattern = sensor_config.get("uart_port_pattern", "/dev/ttyUSB*")
         self.target_baudrate_val = sensor_config.get("baud_rate", 115200)
         self.reconnect_delay_s = sensor_config.get("reconnect_delay_s", 5)
+        self.parallel_probe = sensor_config.get("parallel_probe", False)
+        self.state_file = sensor_config.get("connection_state_file", "")
         self.debug = debug
         
-        # Các baudrate phổ biến để thử nếu kết nối thất bại
-        self.baudrate_candidates = [
+        # Các baudrate phổ biến (bps) để thử nếu kết nối thất bại
+        self.baudrate_candidates = list(dict.fromkeys([
             self.target_baudrate_val,
-            BAUD_RATE_115200,
-            BAUD_RATE_9600,
-            BAUD_RATE_460800,
-            BAUD_RATE_921600
-        ]
+            115200,
+            9600,
+            460800,
+            921600
+        ]))
+
+        # "passive": nghe luồng dữ liệu để dò baudrate trước, chỉ gửi lệnh đọc thanh ghi
+        # khi cảm biến không phát dữ liệu; "active": luôn gửi lệnh đọc thanh ghi như cũ
+        self.baud_detection = sensor_config.get("baud_detection", "active")
+        self.baud_detector = PassiveBaudDetector(
+            listen_s=sensor_config.get("baud_listen_s", 0.25),
+            expected_rate_hz=sensor_config.get("default_output_rate_hz")
+        ) if self.baud_detection == "passive" else None
         
+        self.port: Optional[str] = None
         self.ser: Optional[serial.Serial] = None
         self.config_manager: Optional[HWT905UnifiedConfigManager] = None
 
+        # Cổng/baudrate kết nối thành công gần nhất, được thử trước ở lần kết nối sau
+        self.last_good: Optional[Dict[str, Any]] = self._load_last_good()
+
+        # Thời gian từ lúc bắt đầu kết nối tới mẫu dữ liệu đầu tiên
+        self._connect_started: Optional[float] = None
+        self.connect_count = 0
+        self.last_connect_time_s: Optional[float] = None
+        self.last_time_to_first_sample_s: Optional[float] = None
+
+    def _load_last_good(self) -> Optional[Dict[str, Any]]:
+        """Đọc cổng/baudrate đã lưu cho port_pattern hiện tại từ file trạng thái."""
+        if not self.state_file:
+            return None
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Không thể đọc file trạng thái kết nối {self.state_file}: {e}")
+            return None
+        last_good = state.get(self.port_pattern)
+        if last_good:
+            logger.info(f"Kết nối tốt gần nhất: {last_good.get('port')} @ {last_good.get('baudrate')} bps.")
+        return last_good
+
+    def _save_last_good(self, port: str, baudrate: int):
+        """Lưu cổng/baudrate vừa kết nối thành công (ghi nguyên tử, dùng chung file cho nhiều cảm biến)."""
+        self.last_good = {"port": port, "baudrate": baudrate, **_get_usb_identity(port), "timestamp": time.time()}
+        if not self.state_file:
+            return
+        with _state_file_lock:
+            try:
+                try:
+                    with open(self.state_file, 'r', encoding='utf-8') as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                state[self.port_pattern] = self.last_good
+                state_dir = os.path.dirname(self.state_file)
+                if state_dir:
+                    os.makedirs(state_dir, exist_ok=True)
+                tmp_path = f"{self.state_file}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f, indent=2)
+                os.replace(tmp_path, self.state_file)
+            except OSError as e:
+                logger.warning(f"Không thể lưu file trạng thái kết nối {self.state_file}: {e}")
+
     def _find_available_ports(self) -> List[str]:
         """Tìm và trả về danh sách các cổng serial phù hợp với pattern."""
         ports = glob.glob(self.port_pattern)
@@ -50,6 +149,144 @@ class SensorConnectionManager:
             logger.info(f"Đã tìm thấy các cổng tiềm năng: {ports}")
         return sorted(ports)
 
+    def _order_candidates(self, ports: List[str]) -> List[Tuple[str, List[int]]]:
+        """
+        Sắp xếp (cổng, danh sách baudrate) cần thử: cổng/baudrate tốt gần nhất được thử trước.
+        Nếu tên cổng đã đổi (ví dụ ttyUSB0 -> ttyUSB1 sau khi cắm lại), cổng có cùng
+        số serial USB được coi là cổng tốt gần nhất.
+        """
+        last_port = last_baud = None
+        if self.last_good:
+            last_port, last_baud = self.last_good.get("port"), self.last_good.get("baudrate")
+            if last_port not in ports and self.last_good.get("serial_number"):
+                for port in ports:
+                    if _get_usb_identity(port).get("serial_number") == self.last_good["serial_number"]:
+                        logger.info(f"Cảm biến {self.last_good['serial_number']} đã chuyển sang cổng {port}.")
+                        last_port = port
+                        break
+
+        candidates = []
+        for port in ports:
+            bauds = list(dict.fromkeys(self.baudrate_candidates))
+            if port == last_port and last_baud in bauds:
+                bauds.remove(last_baud)
+                bauds.insert(0, last_baud)
+            candidates.append((port, bauds))
+        if last_port in ports:
+            candidates.sort(key=lambda candidate: candidate[0] != last_port)
+        return candidates
+
+    def _probe_port(self, port: str, bauds: List[int],
+                    cancel: Optional[threading.Event] = None) -> Optional[Tuple[serial.Serial, HWT905UnifiedConfigManager, int]]:
+        """
+        Thử lần lượt các baudrate trên một cổng.
+        Args:
+            cancel: Nếu được đặt (đã tìm thấy cảm biến ở cổng khác), dừng thử các baudrate còn lại.
+
+        Returns:
+            (serial, config_manager, baudrate) nếu cảm biến phản hồi, ngược lại None.
+        """
+        logger.info(f"Đang thử kết nối trên cổng {port}...")
+        if self.baud_detector:
+            result = self._detect_passive(port, bauds, cancel)
+            if result:
+                return result
+            if cancel is not None and cancel.is_set():
+                return None
+            logger.info(f"Không nghe thấy luồng dữ liệu trên {port}. Thử đọc thanh ghi BAUD.")
+
+        for baud in bauds:
+            if cancel is not None and cancel.is_set():
+                return None
+            logger.debug(f"Thử {port} với baudrate: {baud}...")
+            temp_ser = None
+            try:
+                temp_ser = serial.Serial(port, baud, timeout=0.1)
+                
+                # Tạo một config_manager tạm thời để xác minh kết nối
+                temp_cfg_manager = HWT905UnifiedConfigManager(
+                    port=port, baudrate=baud, debug=self.debug
+                )
+                temp_cfg_manager.set_ser_instance(temp_ser)
+
+                # Xác minh xem có thể giao tiếp ở baudrate này không
+                if temp_cfg_manager.verify_baudrate():
+                    return temp_ser, temp_cfg_manager, baud
+                logger.debug(f"Không nhận được phản hồi hợp lệ tại {baud} bps trên {port}.")
+                temp_ser.close()
+                    
+            except serial.SerialException as e:
+                logger.warning(f"Không thể mở cổng {port} tại {baud} bps: {e}")
+                # Lỗi này thường có nghĩa là cổng đang được sử dụng hoặc không tồn tại nữa
+                # Chuyển sang thử cổng tiếp theo
+                break 
+            except Exception as e:
+                logger.error(f"Lỗi không xác định khi thử kết nối trên {port}: {e}")
+                if temp_ser is not None and temp_ser.is_open:
+                    temp_ser.close()
+        return None
+
+    def _detect_passive(self, port: str, bauds: List[int],
+                        cancel: Optional[threading.Event] = None) -> Optional[Tuple[serial.Serial, HWT905UnifiedConfigManager, int]]:
+        """Dò baudrate bằng PassiveBaudDetector (không gửi lệnh tới cảm biến)."""
+        try:
+            temp_ser = serial.Serial(port, bauds[0], timeout=0.1)
+        except serial.SerialException as e:
+            logger.warning(f"Không thể mở cổng {port}: {e}")
+            return None
+        try:
+            score = self.baud_detector.detect(temp_ser, bauds, cancel)
+        except Exception as e:
+            logger.error(f"Lỗi khi nghe dữ liệu trên {port}: {e}")
+            score = None
+        if not score:
+            temp_ser.close()
+            return None
+        config_manager = HWT905UnifiedConfigManager(port=port, baudrate=score.baudrate, debug=self.debug)
+        config_manager.set_ser_instance(temp_ser)
+        return temp_ser, config_manager, score.baudrate
+
+    def _probe_candidates(self, candidates: List[Tuple[str, List[int]]]):
+        """
+        Thử các cổng: cổng tốt gần nhất trước, sau đó các cổng còn lại (song song nếu
+        parallel_probe bật). Trả về kết quả đầu tiên của _probe_port, hoặc None.
+        """
+        if self.last_good and candidates and candidates[0][0] == self.last_good.get("port"):
+            result = self._probe_port(*candidates[0])
+            if result:
+                return result
+            candidates = candidates[1:]
+
+        if not self.parallel_probe or len(candidates) < 2:
+            for port, bauds in candidates:
+                result = self._probe_port(port, bauds)
+                if result:
+                    return result
+            return None
+
+        # Mỗi cổng một luồng; trả về ngay khi có cảm biến trả lời, không đợi các cổng còn lại
+        cancel = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="PortProbe")
+        futures = [executor.submit(self._probe_port, port, bauds, cancel) for port, bauds in candidates]
+        executor.shutdown(wait=False)
+        found = None
+        for future in as_completed(futures):
+            result = future.result()
+            if result:
+                found = result
+                break
+        cancel.set()
+
+        def close_unused(future):
+            # Cổng khác cũng trả lời (kể cả sau khi đã chọn xong): đóng lại
+            result = future.result()
+            if result and result is not found:
+                result[1].close()
+
+        for future in futures:
+            future.add_done_callback(close_unused)
+        return found
+
     def establish_connection(self) -> Optional[serial.Serial]:
         """
         Quét các cổng có sẵn và cố gắng thiết lập kết nối, thử các baudrate khác nhau.
@@ -58,6 +295,7 @@ class SensorConnectionManager:
         Returns:
             Một instance serial.Serial đã kết nối thành công, hoặc None nếu không thể.
         """
+        self._connect_started = time.monotonic()
         while True: # Vòng lặp này sẽ chạy cho đến khi kết nối được thiết lập
             available_ports = self._find_available_ports()
             if not available_ports:
@@ -65,45 +303,36 @@ class SensorConnectionManager:
                 time.sleep(self.reconnect_delay_s)
                 continue
 
-            for port in available_ports:
-                logger.info(f"Đang thử kết nối trên cổng {port}...")
-                
-                # Cố gắng kết nối với các baudrate khác nhau
-                for baud in self.baudrate_candidates:
-                    logger.debug(f"Thử {port} với baudrate: {baud}...")
-                    try:
-                        temp_ser = serial.Serial(port, baud, timeout=0.1)
-                        
-                        # Tạo một config_manager tạm thời để xác minh kết nối
-                        temp_cfg_manager = HWT905UnifiedConfigManager(
-                            port=port, baudrate=baud, debug=self.debug
-                        )
-                        temp_cfg_manager.set_ser_instance(temp_ser)
-
-                        # Xác minh xem có thể giao tiếp ở baudrate này không
-                        if temp_cfg_manager.verify_baudrate():
-                            logger.info(f"Kết nối thành công với cảm biến tại {port} @ {baud} bps.")
-                            self.port = port # Cập nhật lại cổng đã kết nối thành công
-                            self.ser = temp_ser
-                            self.config_manager = temp_cfg_manager
-                            return self.ser
-                        else:
-                            logger.debug(f"Không nhận được phản hồi hợp lệ tại {baud} bps trên {port}.")
-                            temp_ser.close()
-                            
-                    except serial.SerialException as e:
-                        logger.warning(f"Không thể mở cổng {port} tại {baud} bps: {e}")
-                        # Lỗi này thường có nghĩa là cổng đang được sử dụng hoặc không tồn tại nữa
-                        # Chuyển sang thử cổng tiếp theo
-                        break 
-                    except Exception as e:
-                        logger.error(f"Lỗi không xác định khi thử kết nối trên {port}: {e}")
-                        if 'temp_ser' in locals() and temp_ser.is_open:
-                            temp_ser.close()
+            result = self._probe_candidates(self._order_candidates(available_ports))
+            if result:
+                self.ser, self.config_manager, baud = result
+                self.port = self.config_manager.port # Cập nhật lại cổng đã kết nối thành công
+                self.connect_count += 1
+                self.last_connect_time_s = time.monotonic() - self._connect_started
+                logger.info(f"Kết nối thành công với cảm biến tại {self.port} @ {baud} bps "
+                            f"sau {self.last_connect_time_s:.2f} s.")
+                self._save_last_good(self.port, baud)
+                return self.ser
 
             logger.error(f"Không tìm thấy cảm biến trên bất kỳ cổng nào. "
                          f"Sẽ quét lại sau {self.reconnect_delay_s} giây.")
             time.sleep(self.reconnect_delay_s)
+
+    def record_first_sample(self):
+        """Ghi nhận mẫu dữ liệu đầu tiên sau khi kết nối (gọi bởi luồng đọc)."""
+        if self._connect_started is None:
+            return
+        self.last_time_to_first_sample_s = time.monotonic() - self._connect_started
+        self._connect_started = None
+        logger.info(f"Thời gian từ lúc bắt đầu kết nối tới mẫu đầu tiên: {self.last_time_to_first_sample_s:.2f} s.")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "port": self.port,
+            "connect_count": self.connect_count,
+            "last_connect_time_s": self.last_connect_time_s,
+            "last_time_to_first_sample_s": self.last_time_to_first_sample_s,
+        }
             
     def get_serial_instance(self) -> Optional[serial.Serial]:
         return self.ser
@@ -139,13 +368,7 @@ class SensorConnectionManager:
                        f"Đang cố gắng cấu hình lại.")
         
         # Ánh xạ giá trị baudrate sang hằng số của cảm biến
-        baud_const_map = {
-            9600: BAUD_RATE_9600,
-            115200: BAUD_RATE_115200,
-            460800: BAUD_RATE_460800,
-            921600: BAUD_RATE_921600,
-        }
-        target_baud_const = baud_const_map.get(self.target_baudrate_val)
+        target_baud_const = BAUD_RATE_CODES.get(self.target_baudrate_val)
         
         if not target_baud_const:
             logger.error(f"Baudrate mục tiêu {self.target_baudrate_val} không được hỗ trợ để cấu hình.")
@@ -156,6 +379,8 @@ class SensorConnectionManager:
                 if self.config_manager.save_configuration():
                     logger.info(f"Đã gửi lệnh đổi baudrate sang {self.target_baudrate_val}. "
                                 f"Cần phải kết nối lại với baudrate mới.")
+                    # Lần kết nối lại sẽ thử baudrate mới trước
+                    self._save_last_good(self.port, self.target_baudrate_val)
                     # Đóng kết nối hiện tại để vòng lặp chính có thể kết nối lại
                     self.close_connection()
                     return False # Trả về False để báo hiệu cần kết nối lại
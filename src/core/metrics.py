@@ -0,0 +1,196 @@
+# src/core/metrics.py
+
+"""
+Số liệu Prometheus của pipeline trên thiết bị biên (METRICS_ENABLED=true).
+Đường nóng chỉ tăng các bộ đếm sẵn có của luồng và ghi LatencyHistogram (một bisect, hai phép
+cộng cho mỗi phần tử hàng đợi). Mọi số liệu khác (độ sâu hàng đợi, thống kê framer, CPU từng
+luồng) được đọc lúc Prometheus scrape, trong PipelineMetrics.collect().
+prometheus_client là phụ thuộc tùy chọn, chỉ được import khi bật số liệu.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Giới hạn trên (giây) của các bucket độ trễ
+LATENCY_BUCKETS_S = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Bộ đếm gói (tăng dần) của luồng ở từng tầng
+STAGE_COUNTERS = {
+    "read": "raw_packet_count",
+    "decode": "decoded_packet_count",
+    "aux": "stored_packet_count",
+    "process": "processed_packet_count",
+    "publish": "sent_packet_count",
+}
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class LatencyHistogram:
+    """
+    Histogram độ trễ với bucket cố định. Chỉ một luồng gọi observe(); luồng scrape đọc
+    bản sao các bộ đếm (số liệu có thể lệch nhau một quan sát, không cần khóa).
+    """
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS_S):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Phần tử cuối: lớn hơn mọi bound (+Inf)
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+
+    def observe_since(self, ts: float):
+        """Ghi nhận độ trễ từ timestamp Unix ts tới hiện tại."""
+        self.observe(time.time() - ts)
+
+    def snapshot(self) -> Tuple[List[Tuple[float, int]], float]:
+        """
+        Returns:
+            (các bucket tích lũy (bound, số quan sát <= bound) kết thúc bằng +Inf, tổng độ trễ).
+        """
+        counts = list(self.counts)
+        total = self.total
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return buckets, total
+
+
+def thread_cpu_seconds(thread: threading.Thread) -> Optional[float]:
+    """Thời gian CPU (user + system) của một luồng đang chạy, đọc từ /proc (Linux); None nếu không đọc được."""
+    native_id = getattr(thread, "native_id", None)
+    if native_id is None:
+        return None
+    try:
+        with open(f"/proc/self/task/{native_id}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+
+
+class PipelineMetrics:
+    """
+    Collector Prometheus của pipeline: các thành phần được đăng ký một lần khi khởi tạo,
+    giá trị được đọc trực tiếp từ chúng mỗi lần scrape.
+    """
+
+    def __init__(self):
+        self._stages: List[Tuple[str, str, threading.Thread]] = []
+        self._queues: List = []
+        self._rings: List[Tuple[str, object]] = []
+        self._decoders: List[Tuple[str, object]] = []
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+
+    def add_stage(self, stage: str, thread: threading.Thread, sensor_id: str = ""):
+        """Đăng ký luồng của một tầng (read, decode, aux, process, publish): số gói và CPU của luồng."""
+        self._stages.append((stage, sensor_id, thread))
+
+    def add_queue(self, queue):
+        """Đăng ký một PolicyQueue: độ sâu, trạng thái quá tải và số mẫu bị bỏ."""
+        self._queues.append(queue)
+
+    def add_ring(self, name: str, ring):
+        """Đăng ký một SampleRing/SharedRing: độ sâu."""
+        self._rings.append((name, ring))
+
+    def add_decoder(self, sensor_id: str, decoder):
+        """Đăng ký HWT905DataDecoder của một cảm biến: thống kê framer (lỗi checksum, byte rác)."""
+        self._decoders.append((sensor_id, decoder))
+
+    def latency_histogram(self, stage: str, sensor_id: str = "") -> LatencyHistogram:
+        """Histogram độ trễ của một tầng (mỗi luồng ghi một histogram riêng)."""
+        key = (stage, sensor_id)
+        if key not in self._histograms:
+            self._histograms[key] = LatencyHistogram()
+        return self._histograms[key]
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+        packets = CounterMetricFamily("hwt905_stage_packets", "Số gói/mẫu đã qua mỗi tầng pipeline",
+                                      labels=["stage", "sensor"])
+        cpu = CounterMetricFamily("hwt905_thread_cpu_seconds", "Thời gian CPU của từng luồng pipeline",
+                                  labels=["thread"])
+        for stage, sensor_id, thread in self._stages:
+            attribute = STAGE_COUNTERS.get(stage)
+            if attribute:
+                packets.add_metric([stage, sensor_id], getattr(thread, attribute))
+            cpu_seconds = thread_cpu_seconds(thread)
+            if cpu_seconds is not None:
+                cpu.add_metric([thread.name], cpu_seconds)
+        yield packets
+        yield cpu
+
+        depth = GaugeMetricFamily("hwt905_queue_depth", "Số phần tử đang chờ trong hàng đợi/vòng",
+                                  labels=["queue"])
+        overloaded = GaugeMetricFamily("hwt905_queue_overloaded", "1 nếu hàng đợi đang quá tải",
+                                       labels=["queue"])
+        dropped = CounterMetricFamily("hwt905_queue_dropped_samples", "Số mẫu/gói bị bỏ theo chính sách hàng đợi",
+                                      labels=["queue"])
+        for queue in self._queues:
+            depth.add_metric([queue.name], queue.qsize())
+            overloaded.add_metric([queue.name], int(queue.overloaded))
+            dropped.add_metric([queue.name], queue.dropped_samples)
+        for name, ring in self._rings:
+            depth.add_metric([name], len(ring))
+        yield depth
+        yield overloaded
+        yield dropped
+
+        checksum_errors = CounterMetricFamily("hwt905_framer_checksum_errors",
+                                              "Số header bị bỏ vì sai checksum", labels=["sensor"])
+        garbage_bytes = CounterMetricFamily("hwt905_framer_garbage_bytes",
+                                            "Số byte rác bị bỏ khi tách gói", labels=["sensor"])
+        for sensor_id, decoder in self._decoders:
+            stats = decoder.get_framer_stats()
+            checksum_errors.add_metric([sensor_id], stats["checksum_errors"])
+            garbage_bytes.add_metric([sensor_id], stats["garbage_bytes"])
+        yield checksum_errors
+        yield garbage_bytes
+
+        latency = HistogramMetricFamily(
+            "hwt905_stage_latency_seconds",
+            "Độ trễ khi mẫu rời mỗi tầng: decode tính từ lúc đọc serial, process/publish tính từ timestamp của mẫu",
+            labels=["stage", "sensor"])
+        for (stage, sensor_id), histogram in self._histograms.items():
+            buckets, total = histogram.snapshot()
+            latency.add_metric([stage, sensor_id], [(_format_bound(bound), count) for bound, count in buckets],
+                               total)
+        yield latency
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def start_metrics_server(metrics: PipelineMetrics, port: int = 8001, addr: str = "0.0.0.0") -> bool:
+    """
+    Đăng ký PipelineMetrics và mở endpoint HTTP /metrics (luồng nền của prometheus_client).
+    Returns:
+        False nếu chưa cài prometheus_client hoặc không mở được cổng (ứng dụng vẫn chạy tiếp).
+    """
+    try:
+        from prometheus_client import REGISTRY, start_http_server
+    except ImportError:
+        logger.error("METRICS_ENABLED=true nhưng chưa cài prometheus_client (pip install prometheus-client). "
+                     "Bỏ qua endpoint số liệu.")
+        return False
+    try:
+        REGISTRY.register(metrics)
+        start_http_server(port, addr=addr)
+    except (OSError, ValueError) as e:
+        logger.error(f"Không thể mở endpoint số liệu trên {addr}:{port}: {e}")
+        return False
+    logger.info(f"Endpoint số liệu Prometheus: http://{addr}:{port}/metrics")
+    return True
@@ -0,0 +1,70 @@
+# src/core/process_monitor.py
+
+"""
+Thống kê CPU và độ trễ của một tiến trình pipeline, ghi log định kỳ.
+CPU được tính từ time.process_time() (tổng mọi luồng của tiến trình), nên ở chế độ nhiều
+tiến trình mỗi tiến trình cho biết phần CPU của riêng nó; 100% là một lõi.
+"""
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessMonitor(threading.Thread):
+    """
+    Luồng nền ghi log CPU của tiến trình và độ trễ (p50/p99/max) từ timestamp của mẫu
+    tới lúc observe() được gọi, mỗi interval_s giây.
+    """
+
+    def __init__(self, name: str, interval_s: float = 5.0):
+        """
+        Args:
+            name: Tên tiến trình trong log (acquisition, processing, publishing).
+            interval_s: Chu kỳ ghi log.
+        """
+        super().__init__(daemon=True, name=f"ProcessMonitor-{name}")
+        self.process_name = name
+        self.interval_s = interval_s
+        self._latencies: List[float] = []
+        self._stop_event = threading.Event()
+
+    def observe(self, sample_ts: float):
+        """Ghi nhận độ trễ của một mẫu (timestamp Unix) tại thời điểm gọi."""
+        self._latencies.append(time.time() - sample_ts)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        last_wall = time.monotonic()
+        last_cpu = time.process_time()
+        while not self._stop_event.wait(self.interval_s):
+            now_wall = time.monotonic()
+            now_cpu = time.process_time()
+            cpu_percent = (now_cpu - last_cpu) / (now_wall - last_wall) * 100
+            last_wall, last_cpu = now_wall, now_cpu
+            latencies, self._latencies = self._latencies, []
+            logger.info(f"[{self.process_name} pid={os.getpid()}] CPU {cpu_percent:.1f}%"
+                        f"{self._format_latency(latencies)}")
+
+    @staticmethod
+    def _format_latency(latencies: List[float]) -> str:
+        if not latencies:
+            return ""
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        return f", độ trễ p50 {p50:.1f} ms, p99 {p99:.1f} ms, max {max(latencies) * 1000:.1f} ms"
+
+
+def start_process_monitor(name: str, interval_s: float = 5.0) -> Optional[ProcessMonitor]:
+    """Tạo và khởi động ProcessMonitor; interval_s <= 0 tắt thống kê."""
+    if interval_s <= 0:
+        return None
+    monitor = ProcessMonitor(name, interval_s)
+    monitor.start()
+    return monitor
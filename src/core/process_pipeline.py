@@ -0,0 +1,273 @@
+# src/core/process_pipeline.py
+
+"""
+Chế độ nhiều tiến trình (execution=processes): đọc/giải mã chạy trong tiến trình chính,
+xử lý (lọc, RLS, FFT) và gửi MQTT chạy trong hai tiến trình riêng, nên phần tính toán
+không còn tranh GIL với luồng đọc serial. Các tiến trình nối với nhau bằng SharedRing:
+mẫu đã giải mã (ts, acc_x, acc_y, acc_z) và kết quả xử lý (các trường số của ProcessedSample).
+Bên trong mỗi tiến trình vẫn dùng ProcessorThread / MqttPublisherThread như chế độ luồng.
+"""
+import logging
+import multiprocessing
+import signal
+from queue import Empty
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .async_data_manager import MqttPublisherThread, ProcessorThread
+from .process_monitor import start_process_monitor
+from .records import ProcessedSample
+from .shared_ring import SharedRing, SharedRingSignal
+from ..processing.data_processor import SensorDataProcessor, SensorProcessorPool
+from ..storage.storage_manager import StorageManager
+from ..utils.logger_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXECUTION_MODES = ("threads", "processes")
+
+# Một hàng kết quả: các trường số của ProcessedSample (bool thành 0/1) và chỉ số cảm biến
+PROCESSED_ROW_WIDTH = len(ProcessedSample._fields)
+_RLS_WARMED_UP_INDEX = ProcessedSample._fields.index('rls_warmed_up')
+
+PROCESSED_FIELDS_TO_WRITE = [
+    'vel_x', 'vel_y', 'vel_z', 'disp_x', 'disp_y', 'disp_z',
+    'dominant_freq_x', 'dominant_freq_y', 'dominant_freq_z'
+]
+
+
+def create_sensor_data_processor(processing_config: dict) -> SensorDataProcessor:
+    """Tạo SensorDataProcessor từ mục processing của cấu hình (cần dt_sensor_actual)."""
+    frame_size = processing_config["rls_sample_frame_size"]
+    integration_hop = processing_config.get("integration_hop", 1)
+    if not 1 <= integration_hop <= frame_size:
+        clamped_hop = min(max(integration_hop, 1), frame_size)
+        logger.warning(f"PROCESSING_INTEGRATION_HOP={integration_hop} nằm ngoài [1, {frame_size}] "
+                       f"(PROCESSING_RLS_SAMPLE_FRAME_SIZE), dùng {clamped_hop}.")
+        integration_hop = clamped_hop
+    return SensorDataProcessor(
+        dt_sensor=processing_config["dt_sensor_actual"],
+        gravity_g=processing_config["gravity_g"],
+        acc_filter_type=processing_config.get("acc_filter_type"),
+        acc_filter_param=processing_config.get("acc_filter_param"),
+        rls_sample_frame_size=frame_size,
+        rls_calc_frame_multiplier=processing_config["rls_calc_frame_multiplier"],
+        rls_filter_q=processing_config["rls_filter_q"],
+        fft_n_points=processing_config["fft_n_points"],
+        fft_min_freq_hz=processing_config["fft_min_freq_hz"],
+        fft_max_freq_hz=processing_config["fft_max_freq_hz"],
+        integration_hop=integration_hop,
+        # fft_hop_s = 0: tính FFT ở mọi mẫu như trước
+        fft_hop=max(1, round(processing_config.get("fft_hop_s", 0.0) / processing_config["dt_sensor_actual"])),
+        output_every=processing_config.get("output_every", 1)
+    )
+
+
+def create_processing_stage(app_config: dict, multi_sensor: bool
+                            ) -> Tuple[Union[SensorDataProcessor, SensorProcessorPool], Optional[StorageManager]]:
+    """
+    Tạo bộ xử lý và trình quản lý lưu trữ dữ liệu đã xử lý (dùng chung cho mọi cảm biến).
+    Returns:
+        (bộ xử lý, StorageManager hoặc None nếu lưu trữ tắt).
+    """
+    processing_config = app_config["processing"]
+    storage_config = app_config.get("data_storage", {"enabled": False})
+
+    # Mỗi cảm biến cần trạng thái lọc/RLS/FFT riêng
+    if multi_sensor:
+        processor = SensorProcessorPool(lambda: create_sensor_data_processor(processing_config))
+    else:
+        processor = create_sensor_data_processor(processing_config)
+
+    processed_storage_manager: Optional[StorageManager] = None
+    if storage_config.get("enabled", False):
+        logger.info("Khởi tạo StorageManager cho dữ liệu PROCESSED.")
+        processed_storage_manager = StorageManager(
+            storage_config, data_type="processed", fields_to_write=PROCESSED_FIELDS_TO_WRITE,
+            per_sensor=multi_sensor
+        )
+    return processor, processed_storage_manager
+
+
+class ProcessedRingQueue:
+    """
+    Giao diện hàng đợi (put/get/empty/qsize/task_done) trên SharedRing của kết quả xử lý,
+    để ProcessorThread và MqttPublisherThread dùng như mqtt_queue ở hai tiến trình khác nhau.
+    """
+
+    def __init__(self, ring: SharedRing, sensor_ids: List[str], max_rows: int = 256,
+                 drop_when_full: bool = False):
+        """
+        Args:
+            ring: Vòng kết quả, width PROCESSED_ROW_WIDTH.
+            sensor_ids: Danh sách mã cảm biến; hàng lưu chỉ số trong danh sách này.
+            max_rows: Số hàng tối đa trả về mỗi lần get().
+            drop_when_full: Bỏ kết quả mới (có đếm) thay vì chặn put() khi vòng không đủ chỗ,
+                            để tiến trình gửi MQTT chậm không làm chậm xử lý và lưu trữ.
+        """
+        self.ring = ring
+        self.sensor_ids = sensor_ids
+        self.max_rows = max_rows
+        self.drop_when_full = drop_when_full
+        self.dropped_samples = 0
+        self._sensor_index: Dict[str, int] = {sensor_id: i for i, sensor_id in enumerate(sensor_ids)}
+
+    def put(self, item: Union[ProcessedSample, List[ProcessedSample], None]):
+        if item is None:
+            self.ring.close()
+            return
+        samples = item if isinstance(item, list) else [item]
+        if not samples:
+            return
+        if self.drop_when_full and len(self.ring) + len(samples) > self.ring.capacity:
+            self.dropped_samples += len(samples)
+            return
+        sensor_index = self._sensor_index
+        self.ring.write(np.array([sample[:-1] + (sensor_index.get(sample.sensor_id, 0),)
+                                  for sample in samples], dtype=np.float64))
+
+    def get(self, timeout: Optional[float] = None) -> Optional[List[ProcessedSample]]:
+        """
+        Returns:
+            List ProcessedSample, hoặc None khi vòng đã đóng và đọc hết (tín hiệu kết thúc).
+        Raises:
+            Empty: Hết timeout mà vòng vẫn rỗng.
+        """
+        rows = self.ring.read_rows(self.max_rows, timeout)
+        if rows is None:
+            if self.ring.exhausted:
+                return None
+            raise Empty
+        sensor_ids = self.sensor_ids
+        samples = []
+        for row in rows.tolist():
+            row[_RLS_WARMED_UP_INDEX] = bool(row[_RLS_WARMED_UP_INDEX])
+            samples.append(ProcessedSample(*row[:-1], sensor_ids[int(row[-1])]))
+        return samples
+
+    def empty(self) -> bool:
+        return len(self.ring) == 0
+
+    def qsize(self) -> int:
+        return len(self.ring)
+
+    def task_done(self):
+        pass
+
+
+def _prepare_child_process(app_config: dict):
+    """
+    Tiến trình con bỏ qua SIGINT/SIGTERM: tiến trình chính điều phối việc dừng
+    (đóng vòng, xóa running_flag) để dữ liệu trong vòng được xử lý hết.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # Khởi động kiểu spawn không kế thừa cấu hình logging
+    if not logging.getLogger().handlers:
+        log_config = app_config.get("logging", {})
+        setup_logging(
+            log_file_path=log_config.get("log_file_path", "logs/application.log"),
+            log_level=log_config.get("log_level", "INFO"),
+            max_bytes=log_config.get("max_bytes", 10485760),
+            backup_count=log_config.get("backup_count", 5)
+        )
+
+
+class ProcessingProcess(multiprocessing.Process):
+    """
+    Tiến trình xử lý: đọc các vòng mẫu đã giải mã, chạy ProcessorThread (trên luồng chính
+    của tiến trình), lưu dữ liệu đã xử lý và ghi kết quả vào vòng của tiến trình gửi MQTT.
+    """
+
+    def __init__(self, app_config: dict, sample_rings: List[SharedRing], ring_signal: SharedRingSignal,
+                 running_flag, processed_ring: Optional[SharedRing] = None,
+                 sensor_ids: Optional[List[str]] = None, multi_sensor: bool = False,
+                 ring_read_rows: int = 256, monitor_interval_s: float = 0.0):
+        """
+        Args:
+            app_config: Cấu hình ứng dụng (processing, data_storage, logging).
+            sample_rings: Vòng mẫu của từng cảm biến (luồng giải mã ở tiến trình chính ghi vào).
+            ring_signal: read_signal dùng chung của sample_rings.
+            running_flag: multiprocessing.Event; tiến trình dừng khi cờ tắt và các vòng rỗng.
+            processed_ring: Vòng kết quả sang tiến trình gửi MQTT (None nếu MQTT tắt).
+            sensor_ids: Mã cảm biến theo chỉ số dùng trong processed_ring.
+            ring_read_rows: Số mẫu tối đa đọc từ một vòng mỗi lần.
+            monitor_interval_s: Chu kỳ log CPU/độ trễ của tiến trình (0 = tắt).
+        """
+        super().__init__(name="ProcessingProcess", daemon=True)
+        self.app_config = app_config
+        self.sample_rings = sample_rings
+        self.ring_signal = ring_signal
+        self.running_flag = running_flag
+        self.processed_ring = processed_ring
+        self.sensor_ids = sensor_ids or [ring.sensor_id for ring in sample_rings]
+        self.multi_sensor = multi_sensor
+        self.ring_read_rows = ring_read_rows
+        self.monitor_interval_s = monitor_interval_s
+
+    def run(self):
+        _prepare_child_process(self.app_config)
+        monitor = start_process_monitor("processing", self.monitor_interval_s)
+        processor, processed_storage_manager = create_processing_stage(self.app_config, self.multi_sensor)
+        mqtt_queue = None
+        if self.processed_ring is not None:
+            mqtt_policy = self.app_config.get("queues", {}).get("mqtt", {}).get("policy", "block")
+            mqtt_queue = ProcessedRingQueue(self.processed_ring, self.sensor_ids,
+                                            drop_when_full=mqtt_policy != "block")
+        processor_thread = ProcessorThread(
+            decoded_data_queue=None,
+            running_flag=self.running_flag,
+            sensor_data_processor=processor,
+            processed_storage_manager=processed_storage_manager,
+            mqtt_queue=mqtt_queue,
+            sample_rings=self.sample_rings,
+            ring_signal=self.ring_signal,
+            ring_read_rows=self.ring_read_rows,
+            latency_monitor=monitor
+        )
+        try:
+            processor_thread.run()
+            if mqtt_queue is not None and mqtt_queue.dropped_samples:
+                logger.warning(f"[Processing] Đã bỏ {mqtt_queue.dropped_samples} kết quả do vòng MQTT đầy.")
+        finally:
+            if processed_storage_manager:
+                processed_storage_manager.close()
+            if monitor:
+                monitor.stop()
+
+
+class PublisherProcess(multiprocessing.Process):
+    """Tiến trình gửi MQTT: đọc vòng kết quả và chạy MqttPublisherThread trên luồng chính của tiến trình."""
+
+    def __init__(self, app_config: dict, processed_ring: SharedRing, sensor_ids: List[str],
+                 running_flag, mode: str = "continuous", monitor_interval_s: float = 0.0):
+        """
+        Args:
+            processed_ring: Vòng kết quả do ProcessingProcess ghi.
+            sensor_ids: Mã cảm biến theo chỉ số dùng trong processed_ring.
+            running_flag: multiprocessing.Event; tiến trình dừng khi cờ tắt và vòng rỗng.
+            mode: Chế độ gửi MQTT (continuous, batch, scheduled).
+            monitor_interval_s: Chu kỳ log CPU/độ trễ (tới lúc gửi xong) của tiến trình (0 = tắt).
+        """
+        super().__init__(name="PublisherProcess", daemon=True)
+        self.app_config = app_config
+        self.processed_ring = processed_ring
+        self.sensor_ids = sensor_ids
+        self.running_flag = running_flag
+        self.mode = mode
+        self.monitor_interval_s = monitor_interval_s
+
+    def run(self):
+        _prepare_child_process(self.app_config)
+        monitor = start_process_monitor("publishing", self.monitor_interval_s)
+        try:
+            MqttPublisherThread(
+                mqtt_queue=ProcessedRingQueue(self.processed_ring, self.sensor_ids),
+                running_flag=self.running_flag,
+                mode=self.mode,
+                latency_monitor=monitor
+            ).run()
+        finally:
+            if monitor:
+                monitor.stop()
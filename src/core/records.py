@@ -0,0 +1,104 @@
+# src/core/records.py
+
+"""
+Các kiểu bản ghi gọn (NamedTuple) cho mẫu dữ liệu đi qua pipeline.
+Thay cho nhiều dict trung gian cho mỗi mẫu: không có __dict__ riêng cho từng
+bản ghi, truy cập trường theo chỉ số cố định và ghi thẳng ra CSV/JSON/MQTT.
+"""
+from typing import Any, Dict, List, NamedTuple
+
+import numpy as np
+
+
+class AccSample(NamedTuple):
+    """Mẫu gia tốc đã giải mã (đơn vị g) kèm timestamp Unix và mã cảm biến (rỗng khi chỉ có một cảm biến)."""
+    ts: float
+    acc_x: float
+    acc_y: float
+    acc_z: float
+    sensor_id: str = ''
+
+
+# Các cột của mảng trong AccBlock
+ACC_BLOCK_COLUMNS = ('ts', 'acc_x', 'acc_y', 'acc_z')
+
+
+class AccBlock(NamedTuple):
+    """
+    Khối mẫu gia tốc liên tiếp của một cảm biến, chuyển giữa các luồng bằng một lần put().
+    data là mảng float64 (N, 4) với các cột ACC_BLOCK_COLUMNS.
+    """
+    data: np.ndarray
+    sensor_id: str = ''
+
+    def samples(self) -> List[AccSample]:
+        """Tách khối thành các bản ghi AccSample (ví dụ để ghi CSV)."""
+        sensor_id = self.sensor_id
+        return [AccSample(ts, acc_x, acc_y, acc_z, sensor_id)
+                for ts, acc_x, acc_y, acc_z in self.data.tolist()]
+
+
+class ProcessedSample(NamedTuple):
+    """Kết quả xử lý một mẫu: gia tốc gốc/đã lọc, vận tốc, li độ và tần số chủ đạo."""
+    ts: float
+    acc_x: float
+    acc_y: float
+    acc_z: float
+    acc_x_filtered: float
+    acc_y_filtered: float
+    acc_z_filtered: float
+    vel_x: float
+    vel_y: float
+    vel_z: float
+    disp_x: float
+    disp_y: float
+    disp_z: float
+    dominant_freq_x: float
+    dominant_freq_y: float
+    dominant_freq_z: float
+    rls_warmed_up: bool
+    displacement_magnitude: float
+    overall_dominant_frequency: float
+    sensor_id: str = ''
+
+
+# Các cột của mảng trong ProcessedBlock: các trường số của ProcessedSample (rls_warmed_up là 0/1)
+PROCESSED_BLOCK_COLUMNS = ProcessedSample._fields[:-1]
+_RLS_WARMED_UP_COLUMN = PROCESSED_BLOCK_COLUMNS.index('rls_warmed_up')
+
+
+class ProcessedBlock(NamedTuple):
+    """
+    Kết quả xử lý một khối mẫu, theo đúng thứ tự mẫu đầu vào.
+    data là mảng float64 (N, len(PROCESSED_BLOCK_COLUMNS)); valid[i] là False (và hàng i là NaN)
+    với mẫu không có kết quả (chưa đủ dữ liệu, hoặc bị bỏ qua theo output_every).
+    """
+    data: np.ndarray
+    valid: np.ndarray
+    sensor_id: str = ''
+
+    def samples(self) -> List[ProcessedSample]:
+        """Các bản ghi ProcessedSample của những mẫu có kết quả."""
+        sensor_id = self.sensor_id
+        samples = []
+        for row in self.data[self.valid].tolist():
+            row[_RLS_WARMED_UP_COLUMN] = bool(row[_RLS_WARMED_UP_COLUMN])
+            samples.append(ProcessedSample(*row, sensor_id))
+        return samples
+
+
+# Các trường được gửi qua MQTT cho mỗi điểm dữ liệu
+MQTT_POINT_FIELDS = ('ts', 'disp_x', 'disp_y', 'disp_z',
+                     'dominant_freq_x', 'dominant_freq_y', 'dominant_freq_z')
+_MQTT_POINT_INDICES = tuple(ProcessedSample._fields.index(name) for name in MQTT_POINT_FIELDS)
+
+
+def to_mqtt_point(sample: ProcessedSample) -> Dict[str, Any]:
+    """
+    Tạo dict điểm dữ liệu MQTT từ bản ghi, chỉ khi tuần tự hóa message.
+    Args:
+        sample: Bản ghi ProcessedSample.
+    Returns:
+        Dict chỉ gồm các trường trong MQTT_POINT_FIELDS.
+    """
+    return {name: sample[index] for name, index in zip(MQTT_POINT_FIELDS, _MQTT_POINT_INDICES)}
@@ -0,0 +1,182 @@
+# src/core/sample_ring.py
+
+"""
+Bộ đệm vòng một bên ghi / một bên đọc (SPSC) cho mẫu gia tốc giữa luồng giải mã và luồng xử lý.
+Dữ liệu nằm trong một mảng NumPy cấp phát sẵn (capacity, 4) gồm ts, acc_x, acc_y, acc_z,
+nên không có đối tượng Python nào được tạo cho mỗi mẫu và bộ nhớ dùng là cố định.
+
+Chỉ số head (chỉ bên ghi thay đổi) và tail (chỉ bên đọc thay đổi) là số nguyên tăng dần;
+phép gán số nguyên là nguyên tử trong CPython nên đường đi chính không cần khóa.
+Condition chỉ được dùng khi một bên phải chờ (vòng rỗng hoặc đầy).
+"""
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .records import ACC_BLOCK_COLUMNS, AccBlock
+
+# Cách chuyển mẫu đã giải mã sang luồng xử lý: Queue các bản ghi, hoặc SampleRing
+SUPPORTED_TRANSPORTS = ("queue", "ring")
+
+
+class RingSignal:
+    """
+    Tín hiệu chờ dùng cho vòng rỗng/đầy. Bên thông báo chỉ lấy khóa khi có bên đang chờ.
+    Một RingSignal có thể dùng chung cho nhiều vòng (một luồng đọc nhiều cảm biến).
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.waiting = False
+
+    def notify(self):
+        if self.waiting:
+            with self.condition:
+                self.condition.notify_all()
+
+    def wait(self, is_ready: Callable[[], bool], timeout: Optional[float]) -> bool:
+        """
+        Chờ tới khi is_ready() đúng hoặc hết timeout.
+        Returns:
+            Giá trị của is_ready() sau khi chờ.
+        """
+        with self.condition:
+            self.waiting = True
+            try:
+                # Kiểm tra lại sau khi đặt cờ: bên ghi luôn thấy cờ nếu ghi sau lần kiểm tra này
+                if not is_ready():
+                    self.condition.wait(timeout)
+            finally:
+                self.waiting = False
+        return is_ready()
+
+
+class SampleRing:
+    """
+    Vòng SPSC các hàng (ts, acc_x, acc_y, acc_z) float64 của một cảm biến.
+    Bên ghi gọi write()/write_one() rồi close() khi kết thúc; bên đọc gọi read().
+    """
+
+    def __init__(self, capacity: int = 8192, sensor_id: str = "",
+                 read_signal: Optional[RingSignal] = None):
+        """
+        Args:
+            capacity: Số mẫu tối đa trong vòng.
+            sensor_id: Mã cảm biến của mọi mẫu trong vòng.
+            read_signal: Tín hiệu "có dữ liệu" (dùng chung khi một luồng đọc nhiều vòng).
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity không hợp lệ: {capacity}")
+        self.capacity = capacity
+        self.sensor_id = sensor_id
+        self._buffer = np.zeros((capacity, len(ACC_BLOCK_COLUMNS)), dtype=np.float64)
+        self._head = 0  # Tổng số mẫu đã ghi
+        self._tail = 0  # Tổng số mẫu đã đọc
+        self._closed = False
+        self._read_signal = read_signal if read_signal is not None else RingSignal()
+        self._write_signal = RingSignal()
+
+        self.full_waits = 0
+
+    def __len__(self) -> int:
+        return self._head - self._tail
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def ready(self) -> bool:
+        """Có mẫu để đọc, hoặc vòng đã đóng."""
+        return self._head != self._tail or self._closed
+
+    @property
+    def exhausted(self) -> bool:
+        """Bên ghi đã đóng vòng và mọi mẫu đã được đọc."""
+        return self._closed and self._head == self._tail
+
+    # ------------------------------------------------------------------
+    # Bên ghi
+    # ------------------------------------------------------------------
+    def _wait_for_space(self, needed: int) -> int:
+        free = self.capacity - (self._head - self._tail)
+        while free < needed:
+            self.full_waits += 1
+            self._write_signal.wait(lambda: self.capacity - (self._head - self._tail) >= needed, 1.0)
+            free = self.capacity - (self._head - self._tail)
+        return free
+
+    def write(self, rows: np.ndarray):
+        """
+        Ghi các hàng (N, 4); chặn khi vòng đầy giống Queue.put().
+        Args:
+            rows: Mảng (N, 4) theo thứ tự cột ts, acc_x, acc_y, acc_z.
+        """
+        position = 0
+        total = len(rows)
+        while position < total:
+            count = min(total - position, self.capacity)
+            self._wait_for_space(count)
+            start = self._head % self.capacity
+            first = min(count, self.capacity - start)
+            self._buffer[start:start + first] = rows[position:position + first]
+            if first < count:
+                self._buffer[:count - first] = rows[position + first:position + count]
+            self._head += count
+            position += count
+            self._read_signal.notify()
+
+    def write_one(self, ts: float, acc_x: float, acc_y: float, acc_z: float):
+        """Ghi một mẫu (đường đi từng gói), không tạo mảng trung gian."""
+        self._wait_for_space(1)
+        row = self._buffer[self._head % self.capacity]
+        row[0] = ts
+        row[1] = acc_x
+        row[2] = acc_y
+        row[3] = acc_z
+        self._head += 1
+        self._read_signal.notify()
+
+    def close(self):
+        """Báo cho bên đọc rằng không còn dữ liệu mới (thay cho phần tử None của hàng đợi)."""
+        self._closed = True
+        self._read_signal.notify()
+
+    # ------------------------------------------------------------------
+    # Bên đọc
+    # ------------------------------------------------------------------
+    def read(self, max_rows: int, timeout: Optional[float] = 0.0) -> Optional[AccBlock]:
+        """
+        Đọc tối đa max_rows mẫu thành một AccBlock (bản sao, vùng nhớ của vòng được giải phóng ngay).
+        Args:
+            max_rows: Số mẫu tối đa.
+            timeout: Thời gian chờ khi vòng rỗng (0 = không chờ, None = chờ tới khi có dữ liệu/đóng).
+        Returns:
+            AccBlock, hoặc None nếu vòng rỗng.
+        """
+        available = self._head - self._tail
+        if not available and timeout != 0:
+            self._read_signal.wait(lambda: self.ready, timeout)
+            available = self._head - self._tail
+        if not available:
+            return None
+        count = min(available, max_rows)
+        start = self._tail % self.capacity
+        first = min(count, self.capacity - start)
+        if first == count:
+            data = self._buffer[start:start + count].copy()
+        else:
+            data = np.concatenate((self._buffer[start:], self._buffer[:count - first]))
+        self._tail += count
+        self._write_signal.notify()
+        return AccBlock(data, self.sensor_id)
+
+
+def wait_any(rings: List[SampleRing], signal: RingSignal, timeout: float) -> bool:
+    """
+    Chờ tới khi một trong các vòng (dùng chung read_signal) có dữ liệu hoặc bị đóng.
+    Returns:
+        True nếu có vòng sẵn sàng.
+    """
+    return signal.wait(lambda: any(ring.ready for ring in rings), timeout)
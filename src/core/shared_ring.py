@@ -0,0 +1,246 @@
+# src/core/shared_ring.py
+
+"""
+Bộ đệm vòng SPSC trong multiprocessing.shared_memory, dùng giữa các tiến trình của chế độ
+nhiều tiến trình (execution=processes). Giao diện giống SampleRing (write/write_one/close/read,
+ready/exhausted) nên DecoderThread và ProcessorThread dùng được mà không cần sửa.
+
+Khác với SampleRing trong một tiến trình, việc công bố chỉ số giữa các tiến trình cần rào
+bộ nhớ (ARM của Pi 4 không đảm bảo thứ tự ghi giữa các lõi). Mỗi bên chỉ lấy khóa một lần
+cho mỗi khối để công bố chỉ số của mình; chỉ số của bên kia được nhớ đệm và chỉ đọc lại
+(dưới khóa) khi giá trị đã nhớ không đủ. Không có pickle hay cấp phát nào cho mỗi mẫu.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Callable, Optional
+
+import numpy as np
+
+from .records import ACC_BLOCK_COLUMNS, AccBlock
+
+# Phần đầu vùng nhớ chung: head, tail, closed (int64)
+_HEAD, _TAIL, _CLOSED = 0, 1, 2
+_HEADER_SLOTS = 4
+_HEADER_BYTES = _HEADER_SLOTS * 8
+
+
+class SharedRingSignal:
+    """
+    Tín hiệu chờ giữa các tiến trình (multiprocessing.Condition). Khóa của nó cũng là rào
+    bộ nhớ khi công bố chỉ số; notify_all() chỉ được gọi khi có bên đang chờ.
+    Một SharedRingSignal có thể dùng chung cho nhiều vòng (một tiến trình đọc nhiều cảm biến).
+    """
+
+    def __init__(self, ctx=None):
+        ctx = ctx or multiprocessing.get_context()
+        self.condition = ctx.Condition()  # RLock: ready/exhausted có thể được gọi khi đã giữ khóa
+        self._waiters = ctx.RawValue('i', 0)
+
+    def notify_locked(self):
+        """Đánh thức bên đang chờ; người gọi phải đang giữ condition."""
+        if self._waiters.value:
+            self.condition.notify_all()
+
+    def notify(self):
+        with self.condition:
+            self.notify_locked()
+
+    def wait(self, is_ready: Callable[[], bool], timeout: Optional[float]) -> bool:
+        """
+        Chờ tới khi is_ready() đúng hoặc hết timeout.
+        Returns:
+            Giá trị của is_ready() sau khi chờ.
+        """
+        with self.condition:
+            if is_ready():
+                return True
+            self._waiters.value += 1
+            try:
+                self.condition.wait(timeout)
+            finally:
+                self._waiters.value -= 1
+            return is_ready()
+
+
+class SharedRing:
+    """
+    Vòng SPSC các hàng float64 có width cột, nằm trong một khối shared_memory.
+    Tiến trình tạo vòng là chủ sở hữu và gọi unlink() khi kết thúc; tiến trình con nhận vòng
+    qua tham số của Process (fork: kế thừa trực tiếp, spawn: gắn lại theo tên).
+    """
+
+    def __init__(self, capacity: int = 8192, width: int = len(ACC_BLOCK_COLUMNS), sensor_id: str = "",
+                 read_signal: Optional[SharedRingSignal] = None, ctx=None):
+        """
+        Args:
+            capacity: Số hàng tối đa trong vòng.
+            width: Số cột của mỗi hàng (mặc định ts, acc_x, acc_y, acc_z).
+            sensor_id: Mã cảm biến của mọi mẫu trong vòng (dùng cho read()).
+            read_signal: Tín hiệu "có dữ liệu" (dùng chung khi một tiến trình đọc nhiều vòng).
+            ctx: Context multiprocessing dùng để tạo khóa.
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity không hợp lệ: {capacity}")
+        self.capacity = capacity
+        self.width = width
+        self.sensor_id = sensor_id
+        self.read_signal = read_signal if read_signal is not None else SharedRingSignal(ctx)
+        self.write_signal = SharedRingSignal(ctx)
+        self._shm = shared_memory.SharedMemory(create=True, size=_HEADER_BYTES + capacity * width * 8)
+        self._owner = True
+        self._attach()
+        self._header[:] = 0
+
+        self.full_waits = 0
+
+    def _attach(self):
+        self._header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=self._shm.buf)
+        self._buffer = np.ndarray((self.capacity, self.width), dtype=np.float64,
+                                  buffer=self._shm.buf, offset=_HEADER_BYTES)
+        # Chỉ số của bên kia đã biết; chỉ đọc lại dưới khóa khi không đủ
+        self._known_tail = int(self._header[_TAIL])
+        self._known_head = int(self._header[_HEAD])
+
+    def __getstate__(self):
+        return {"name": self._shm.name, "capacity": self.capacity, "width": self.width,
+                "sensor_id": self.sensor_id, "read_signal": self.read_signal,
+                "write_signal": self.write_signal, "full_waits": self.full_waits}
+
+    def __setstate__(self, state):
+        name = state.pop("name")
+        self.__dict__.update(state)
+        self._shm = shared_memory.SharedMemory(name=name)
+        self._owner = False
+        self._attach()
+
+    def __len__(self) -> int:
+        return int(self._header[_HEAD]) - int(self._header[_TAIL])
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._header[_CLOSED])
+
+    @property
+    def ready(self) -> bool:
+        """Có hàng để đọc, hoặc vòng đã đóng."""
+        with self.read_signal.condition:
+            return self._header[_HEAD] != self._header[_TAIL] or bool(self._header[_CLOSED])
+
+    @property
+    def exhausted(self) -> bool:
+        """Bên ghi đã đóng vòng và mọi hàng đã được đọc."""
+        with self.read_signal.condition:
+            return bool(self._header[_CLOSED]) and self._header[_HEAD] == self._header[_TAIL]
+
+    # ------------------------------------------------------------------
+    # Bên ghi
+    # ------------------------------------------------------------------
+    def _free(self, head: int) -> int:
+        return self.capacity - (head - self._known_tail)
+
+    def _refresh_tail(self) -> bool:
+        with self.write_signal.condition:
+            self._known_tail = int(self._header[_TAIL])
+        return True
+
+    def _wait_for_space(self, head: int, needed: int):
+        if self._free(head) >= needed:
+            return
+        self._refresh_tail()
+        while self._free(head) < needed:
+            self.full_waits += 1
+            self.write_signal.wait(
+                lambda: self._refresh_tail() and self._free(head) >= needed, 1.0)
+
+    def _publish_head(self, head: int):
+        with self.read_signal.condition:
+            self._header[_HEAD] = head
+            self.read_signal.notify_locked()
+
+    def write(self, rows: np.ndarray):
+        """
+        Ghi các hàng (N, width); chặn khi vòng đầy giống Queue.put().
+        Args:
+            rows: Mảng (N, width).
+        """
+        position = 0
+        total = len(rows)
+        head = int(self._header[_HEAD])
+        while position < total:
+            count = min(total - position, self.capacity)
+            self._wait_for_space(head, count)
+            start = head % self.capacity
+            first = min(count, self.capacity - start)
+            self._buffer[start:start + first] = rows[position:position + first]
+            if first < count:
+                self._buffer[:count - first] = rows[position + first:position + count]
+            head += count
+            position += count
+            self._publish_head(head)
+
+    def write_one(self, *values: float):
+        """Ghi một hàng (đường đi từng gói), không tạo mảng trung gian."""
+        head = int(self._header[_HEAD])
+        self._wait_for_space(head, 1)
+        self._buffer[head % self.capacity] = values
+        self._publish_head(head + 1)
+
+    def close(self):
+        """Báo cho bên đọc rằng không còn dữ liệu mới."""
+        with self.read_signal.condition:
+            self._header[_CLOSED] = 1
+            self.read_signal.notify_locked()
+
+    # ------------------------------------------------------------------
+    # Bên đọc
+    # ------------------------------------------------------------------
+    def _refresh_head(self):
+        with self.read_signal.condition:
+            self._known_head = int(self._header[_HEAD])
+
+    def read_rows(self, max_rows: int, timeout: Optional[float] = 0.0) -> Optional[np.ndarray]:
+        """
+        Đọc tối đa max_rows hàng (bản sao, vùng nhớ của vòng được giải phóng ngay).
+        Args:
+            max_rows: Số hàng tối đa.
+            timeout: Thời gian chờ khi vòng rỗng (0 = không chờ, None = chờ tới khi có dữ liệu/đóng).
+        Returns:
+            Mảng (n, width), hoặc None nếu vòng rỗng.
+        """
+        tail = int(self._header[_TAIL])
+        if self._known_head == tail:
+            self._refresh_head()
+            if self._known_head == tail and timeout != 0:
+                self.read_signal.wait(lambda: self.ready, timeout)
+                self._refresh_head()
+        available = self._known_head - tail
+        if not available:
+            return None
+        count = min(available, max_rows)
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        if first == count:
+            data = self._buffer[start:start + count].copy()
+        else:
+            data = np.concatenate((self._buffer[start:], self._buffer[:count - first]))
+        with self.write_signal.condition:
+            self._header[_TAIL] = tail + count
+            self.write_signal.notify_locked()
+        return data
+
+    def read(self, max_rows: int, timeout: Optional[float] = 0.0) -> Optional[AccBlock]:
+        """Đọc tối đa max_rows mẫu thành một AccBlock (giống SampleRing.read())."""
+        data = self.read_rows(max_rows, timeout)
+        return AccBlock(data, self.sensor_id) if data is not None else None
+
+    # ------------------------------------------------------------------
+    def unlink(self):
+        """Giải phóng vùng nhớ chung (chỉ tiến trình tạo vòng)."""
+        self._header = self._buffer = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
@@ -0,0 +1,260 @@
+# src/core/timestamp_engine.py
+
+"""
+Dựng lại timestamp của mẫu từ chỉ số mẫu thay cho time.time() ở từng gói.
+Mẫu thứ n nhận t0 + n·dt (dt = 1 / tần số xuất của cảm biến), nên khoảng cách giữa các
+mẫu không chứa jitter của hàng đợi/luồng. Lưới thời gian được hiệu chỉnh chậm theo
+đồng hồ máy chủ ở mỗi lần đọc serial (arrival_ts), hoặc theo đồng hồ của chính cảm biến
+(gói TIME 0x50) nếu có. Mất mẫu được phát hiện tường minh thay vì bị nén vào lưới thời gian.
+"""
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_TIMESTAMP_MODES = ("host", "index", "sensor_time")
+
+# Nửa ngày: bước lùi lớn hơn mức này của giây-trong-ngày là qua nửa đêm, không phải lỗi
+_HALF_DAY_S = 43200.0
+_DAY_S = 86400.0
+
+
+class TimestampGap(NamedTuple):
+    """Một khoảng mất mẫu đã phát hiện."""
+    ts: float               # Timestamp của mẫu đầu tiên sau khoảng mất
+    duration_s: float       # Độ dài khoảng mất
+    missing_samples: int    # Số mẫu ước tính đã mất
+
+
+def sensor_time_seconds(hour, minute, second, millisecond):
+    """
+    Giây-trong-ngày theo đồng hồ cảm biến từ các trường của gói TIME.
+    Nhận số hoặc mảng NumPy (cột của decode_packet_block()); ngày tháng không cần thiết
+    vì độ lệch so với đồng hồ máy chủ được học riêng.
+    """
+    return hour * 3600.0 + minute * 60.0 + second + millisecond / 1000.0
+
+
+class HostTimestamper:
+    """
+    Timestamp theo đồng hồ máy chủ (timestamp_mode=host) cho các mẫu đọc được trong một batch.
+    Mẫu cuối mang giờ nhận, các mẫu trước lùi dần một chu kỳ lấy mẫu danh định, nên các mẫu
+    của cùng batch không trùng timestamp. Nếu batch chứa nhiều mẫu hơn thời gian đã trôi qua
+    kể từ batch trước, các mẫu được chia đều khoảng thời gian đó để timestamp không đi lùi.
+    """
+
+    def __init__(self, rate_hz: float):
+        """
+        Args:
+            rate_hz: Tần số xuất danh định của cảm biến (default_output_rate_hz).
+        """
+        if rate_hz <= 0:
+            raise ValueError(f"Tần số mẫu không hợp lệ: {rate_hz}")
+        self.dt = 1.0 / rate_hz
+        self._last_ts: Optional[float] = None
+
+    def stamp(self, count: int, arrival_ts: float) -> np.ndarray:
+        """
+        Args:
+            count: Số mẫu của batch.
+            arrival_ts: Timestamp Unix lúc nhận batch (giờ của mẫu cuối).
+        Returns:
+            Mảng float64 count timestamp tăng dần, kết thúc ở arrival_ts.
+        """
+        step = self.dt
+        first_ts = arrival_ts - (count - 1) * step
+        last_ts = self._last_ts
+        if last_ts is not None and first_ts <= last_ts < arrival_ts:
+            step = (arrival_ts - last_ts) / count
+            first_ts = last_ts + step
+        if count > 0:
+            self._last_ts = arrival_ts
+        return first_ts + np.arange(count) * step
+
+
+class TimestampEngine:
+    """
+    Gán timestamp theo chỉ số mẫu cho một cảm biến.
+
+    Hiệu chỉnh theo máy chủ (stamp/stamp_one): arrival_ts là thời điểm đọc được đoạn dữ liệu
+    chứa mẫu cuối cùng, nên mẫu đó được lấy trước arrival_ts. Nếu lưới dự đoán muộn hơn
+    arrival_ts thì lùi lưới ngay (bao dưới); nếu sớm hơn thì chỉ dịch một phần nhỏ
+    (discipline_gain) để hấp thụ trôi đồng hồ mà không kéo jitter vào dữ liệu. Sai lệch lớn
+    hơn gap_threshold_s được coi là mất mẫu: ghi nhận khoảng mất và neo lại lưới.
+    dt được ước lượng lại sau mỗi rate_window_s giây, giới hạn trong ±max_rate_error.
+
+    Hiệu chỉnh theo cảm biến (stamp_sensor_times): timestamp = giờ cảm biến + độ lệch,
+    độ lệch được học theo bao dưới của (arrival_ts - giờ cảm biến).
+    """
+
+    def __init__(self, rate_hz: float, gap_threshold_s: float = 0.1,
+                 discipline_gain: float = 0.01, rate_window_s: float = 10.0,
+                 max_rate_error: float = 0.05, max_recent_gaps: int = 100,
+                 sensor_id: str = ""):
+        """
+        Args:
+            rate_hz: Tần số xuất danh định của cảm biến (default_output_rate_hz).
+            gap_threshold_s: Sai lệch so với lưới (giây) được coi là mất mẫu.
+            discipline_gain: Tỉ lệ sai lệch dương được bù ở mỗi lần đọc.
+            rate_window_s: Chu kỳ ước lượng lại dt từ đồng hồ máy chủ (0 = giữ dt danh định).
+            max_rate_error: Sai lệch tối đa của dt ước lượng so với danh định.
+            max_recent_gaps: Số khoảng mất gần nhất được giữ lại trong recent_gaps.
+            sensor_id: Mã cảm biến (chỉ dùng trong log).
+        """
+        if rate_hz <= 0:
+            raise ValueError(f"Tần số mẫu không hợp lệ: {rate_hz}")
+        self.nominal_dt = 1.0 / rate_hz
+        self.dt = self.nominal_dt
+        self.gap_threshold_s = max(gap_threshold_s, 2 * self.nominal_dt)
+        # Độ phân giải của gói TIME là 1 ms
+        self._sensor_gap_s = max(1.5 * self.nominal_dt, self.nominal_dt + 0.002)
+        self.discipline_gain = discipline_gain
+        self.rate_window_s = rate_window_s
+        self.max_rate_error = max_rate_error
+        self.sensor_id = sensor_id
+
+        self._next_ts: Optional[float] = None
+        self._window_start_ts: Optional[float] = None
+        self._window_samples = 0
+
+        self._sensor_offset: Optional[float] = None
+        self._last_sensor_s: Optional[float] = None
+        self._sensor_day_offset = 0.0
+
+        self.samples_stamped = 0
+        self.gap_count = 0
+        self.missing_samples = 0
+        self.anchor_count = 0
+        self.max_correction_s = 0.0
+        self.recent_gaps: Deque[TimestampGap] = deque(maxlen=max_recent_gaps)
+
+    # ------------------------------------------------------------------
+    # Hiệu chỉnh theo đồng hồ máy chủ
+    # ------------------------------------------------------------------
+    def stamp(self, count: int, arrival_ts: float) -> np.ndarray:
+        """
+        Timestamp cho count mẫu liên tiếp đọc được trong cùng một lần đọc.
+        Args:
+            count: Số mẫu.
+            arrival_ts: Timestamp Unix của lần đọc serial chứa các mẫu.
+        Returns:
+            Mảng float64 count timestamp cách đều dt.
+        """
+        first_ts = self._advance(count, arrival_ts)
+        return first_ts + np.arange(count) * self.dt
+
+    def stamp_one(self, arrival_ts: float) -> float:
+        """Timestamp cho một mẫu (đường đi từng gói, không tạo mảng NumPy)."""
+        return self._advance(1, arrival_ts)
+
+    def _advance(self, count: int, arrival_ts: float) -> float:
+        """Hiệu chỉnh lưới theo arrival_ts, trả về timestamp của mẫu đầu tiên và tiến lưới count mẫu."""
+        if count <= 0:
+            return self._next_ts if self._next_ts is not None else arrival_ts
+        span = (count - 1) * self.dt
+        if self._next_ts is None:
+            self._anchor(arrival_ts - span)
+        else:
+            error = arrival_ts - (self._next_ts + span)
+            if error > self.gap_threshold_s:
+                self._record_gap(error, arrival_ts - span)
+                self._anchor(arrival_ts - span)
+            else:
+                # error < 0: lưới đi trước thời điểm nhận, lùi lại toàn bộ
+                correction = error if error < 0 else error * self.discipline_gain
+                self._next_ts += correction
+                if abs(correction) > self.max_correction_s:
+                    self.max_correction_s = abs(correction)
+                self._update_rate(count, arrival_ts)
+
+        first_ts = self._next_ts
+        self._next_ts += count * self.dt
+        self.samples_stamped += count
+        return first_ts
+
+    def _anchor(self, first_ts: float):
+        self._next_ts = first_ts
+        self._window_start_ts = None
+        self._window_samples = 0
+        self.anchor_count += 1
+
+    def _update_rate(self, count: int, arrival_ts: float):
+        """Ước lượng lại dt từ số mẫu nhận được trong một cửa sổ thời gian máy chủ."""
+        if not self.rate_window_s:
+            return
+        if self._window_start_ts is None:
+            self._window_start_ts = arrival_ts
+            self._window_samples = 0
+            return
+        self._window_samples += count
+        elapsed = arrival_ts - self._window_start_ts
+        if elapsed >= self.rate_window_s and self._window_samples:
+            measured_dt = elapsed / self._window_samples
+            low = self.nominal_dt * (1 - self.max_rate_error)
+            high = self.nominal_dt * (1 + self.max_rate_error)
+            self.dt = min(max(measured_dt, low), high)
+            self._window_start_ts = arrival_ts
+            self._window_samples = 0
+
+    def _record_gap(self, duration_s: float, ts: float):
+        missing = max(1, int(round(duration_s / self.dt)))
+        self.gap_count += 1
+        self.missing_samples += missing
+        self.recent_gaps.append(TimestampGap(ts, duration_s, missing))
+        logger.warning(f"[Timestamp{' ' + self.sensor_id if self.sensor_id else ''}] Phát hiện mất mẫu: "
+                       f"{duration_s * 1000:.1f} ms (~{missing} mẫu).")
+
+    # ------------------------------------------------------------------
+    # Hiệu chỉnh theo đồng hồ cảm biến (gói TIME)
+    # ------------------------------------------------------------------
+    def stamp_sensor_times(self, sensor_seconds: np.ndarray, arrival_ts: float) -> np.ndarray:
+        """
+        Timestamp cho các mẫu đã biết giờ cảm biến (giây-trong-ngày của gói TIME đi kèm).
+        Args:
+            sensor_seconds: Giờ cảm biến của từng mẫu, theo thứ tự nhận.
+            arrival_ts: Timestamp Unix của lần đọc serial chứa các mẫu.
+        Returns:
+            Mảng float64 timestamp Unix.
+        """
+        sensor_seconds = np.asarray(sensor_seconds, dtype=np.float64)
+        if sensor_seconds.size == 0:
+            return sensor_seconds
+        # Nối tiếp qua nửa đêm: giây-trong-ngày lùi hơn nửa ngày
+        previous = np.concatenate((
+            [self._last_sensor_s - self._sensor_day_offset if self._last_sensor_s is not None
+             else sensor_seconds[0]],
+            sensor_seconds[:-1]))
+        wraps = np.cumsum(sensor_seconds - previous < -_HALF_DAY_S)
+        sensor_ts = sensor_seconds + self._sensor_day_offset + wraps * _DAY_S
+        self._sensor_day_offset += wraps[-1] * _DAY_S
+
+        steps = np.diff(sensor_ts, prepend=self._last_sensor_s if self._last_sensor_s is not None
+                        else sensor_ts[0])
+        # Giờ cảm biến không có jitter đọc: phát hiện được cả khi chỉ mất một mẫu
+        for index in np.flatnonzero(steps > self._sensor_gap_s):
+            self._record_gap(float(steps[index]) - self.dt, float(sensor_ts[index]))
+        self._last_sensor_s = float(sensor_ts[-1])
+
+        # Độ lệch giờ máy chủ - giờ cảm biến theo bao dưới
+        offset = arrival_ts - self._last_sensor_s
+        if self._sensor_offset is None or offset < self._sensor_offset:
+            self._sensor_offset = offset
+        else:
+            self._sensor_offset += (offset - self._sensor_offset) * self.discipline_gain
+        self.samples_stamped += sensor_ts.size
+        return sensor_ts + self._sensor_offset
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "samples_stamped": self.samples_stamped,
+            "dt": self.dt,
+            "gap_count": self.gap_count,
+            "missing_samples": self.missing_samples,
+            "anchor_count": self.anchor_count,
+            "max_correction_s": self.max_correction_s,
+            "sensor_offset_s": self._sensor_offset,
+        }
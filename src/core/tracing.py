@@ -0,0 +1,315 @@
+# src/core/tracing.py
+
+"""
+Truy vết lấy mẫu 1/N mẫu gia tốc qua toàn pipeline (TRACING_SAMPLE_EVERY).
+Luồng đọc gắn trace id cho gói ACC đầu tiên của lần đọc serial vượt qua mốc N gói; mỗi tầng ghi
+thời điểm time.monotonic() khi mẫu rời tầng đó: framed, decoded, stored, processed, serialized,
+published (đã giao cho paho) và puback (QoS > 0). Vết hoàn tất (hoặc bị bỏ dở, ví dụ mẫu bị
+hàng đợi bỏ) được ghi vào log hoặc file vòng nhị phân cố định kích thước.
+
+Vết được tìm lại ở mỗi tầng mà không thay đổi dữ liệu chuyển giữa các luồng: theo arrival_ts của
+phần tử hàng đợi raw ở luồng giải mã, rồi theo timestamp của mẫu ở các tầng sau. Khi không có vết
+nào đang chờ, chi phí ở mỗi tầng chỉ là một phép kiểm tra dict rỗng.
+"""
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_TRACE_OUTPUTS = ("log", "file")
+
+# Các mốc sau arrival (thời điểm đọc serial trả về), theo thứ tự trong pipeline
+TRACE_HOPS = ("framed", "decoded", "stored", "processed", "serialized", "published", "puback")
+
+# Bản ghi 64 byte: trace_id, cờ (bit 0: hoàn tất), sensor_id, timestamp mẫu, arrival (Unix),
+# độ lệch (ms) của từng mốc so với arrival (NaN nếu vết không đi qua mốc đó)
+_RECORD = struct.Struct(f"<II12sdd{len(TRACE_HOPS)}f")
+# Phần đầu file: magic, phiên bản, kích thước bản ghi, số bản ghi tối đa, tổng số bản ghi đã ghi
+_HEADER = struct.Struct("<8sHHIQ")
+_HEADER_BYTES = 64
+_MAGIC = b"HWTTRACE"
+_COMPLETE = 1
+
+
+class SampleTrace:
+    """Các mốc thời gian của một mẫu được truy vết."""
+    __slots__ = ("trace_id", "sensor_id", "arrival_ts", "arrival", "sample_ts", "hops")
+
+    def __init__(self, trace_id: int, sensor_id: str, arrival_ts: float, arrival: float):
+        self.trace_id = trace_id
+        self.sensor_id = sensor_id
+        self.arrival_ts = arrival_ts  # Unix, khóa tìm lại vết ở luồng giải mã
+        self.arrival = arrival        # time.monotonic() khi lần đọc serial trả về
+        self.sample_ts: Optional[float] = None
+        self.hops: Dict[str, float] = {}
+
+    def mark(self, hop: str, at: Optional[float] = None):
+        self.hops[hop] = time.monotonic() if at is None else at
+
+    def offsets_ms(self) -> List[float]:
+        """Độ lệch (ms) của từng mốc trong TRACE_HOPS so với arrival; NaN nếu chưa qua mốc."""
+        hops = self.hops
+        return [(hops[hop] - self.arrival) * 1000 if hop in hops else math.nan for hop in TRACE_HOPS]
+
+
+class TraceRingFile:
+    """File vòng các bản ghi 64 byte; bản ghi mới ghi đè bản cũ nhất khi đầy."""
+
+    def __init__(self, path: str, capacity: int = 4096):
+        """
+        Args:
+            path: Đường dẫn file (được tạo mới, nội dung cũ bị xóa).
+            capacity: Số bản ghi tối đa.
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity không hợp lệ: {capacity}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.capacity = capacity
+        self.written = 0
+        self._file = open(path, "w+b")
+        self._file.truncate(_HEADER_BYTES + capacity * _RECORD.size)
+        self._write_header()
+
+    def _write_header(self):
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(_MAGIC, 1, _RECORD.size, self.capacity, self.written))
+
+    def write(self, trace: SampleTrace, complete: bool):
+        sensor_id = trace.sensor_id.encode("utf-8")[-12:]
+        record = _RECORD.pack(trace.trace_id, _COMPLETE if complete else 0, sensor_id,
+                              trace.sample_ts if trace.sample_ts is not None else math.nan,
+                              trace.arrival_ts, *trace.offsets_ms())
+        self._file.seek(_HEADER_BYTES + (self.written % self.capacity) * _RECORD.size)
+        self._file.write(record)
+        self.written += 1
+        self._write_header()
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_trace_file(path: str) -> List[dict]:
+    """
+    Đọc file vòng của TraceRingFile.
+    Returns:
+        Các vết từ cũ tới mới: trace_id, sensor_id, sample_ts, arrival_ts, complete và
+        hops (dict mốc -> ms sau arrival, chỉ các mốc vết đã đi qua).
+    """
+    with open(path, "rb") as f:
+        magic, _version, record_size, capacity, written = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or record_size != _RECORD.size:
+            raise ValueError(f"{path} không phải file vết HWT905")
+        count = min(written, capacity)
+        first = written - count
+        traces = []
+        for index in range(first, written):
+            f.seek(_HEADER_BYTES + (index % capacity) * record_size)
+            trace_id, flags, sensor_id, sample_ts, arrival_ts, *offsets = _RECORD.unpack(f.read(record_size))
+            traces.append({
+                "trace_id": trace_id,
+                "sensor_id": sensor_id.rstrip(b"\0").decode("utf-8", "replace"),
+                "sample_ts": sample_ts,
+                "arrival_ts": arrival_ts,
+                "complete": bool(flags & _COMPLETE),
+                "hops": {hop: offset for hop, offset in zip(TRACE_HOPS, offsets) if not math.isnan(offset)},
+            })
+    return traces
+
+
+class SampleTracer:
+    """
+    Điều phối các vết đang đi qua pipeline. Các tầng gọi:
+    luồng đọc start(), luồng giải mã take_arrival()/await_processing(), luồng xử lý
+    take_processed()/await_publishing(), publisher take_published()/await_puback(), callback
+    on_publish của paho on_puback(). Vết quá timeout_s mà chưa hoàn tất được ghi là bỏ dở.
+    """
+
+    def __init__(self, sample_every: int, output: str = "log", file_path: str = "logs/traces.bin",
+                 file_records: int = 4096, timeout_s: float = 10.0, max_in_flight: int = 256):
+        """
+        Args:
+            sample_every: Truy vết 1 trên sample_every gói đọc được (mỗi cảm biến).
+            output: log (một dòng INFO mỗi vết) hoặc file (TraceRingFile).
+            file_path: Đường dẫn file vòng khi output=file.
+            file_records: Số bản ghi tối đa của file vòng.
+            timeout_s: Vết chưa hoàn tất sau thời gian này được ghi là bỏ dở.
+            max_in_flight: Số vết đang chờ tối đa ở mỗi tầng.
+        """
+        if sample_every < 1:
+            raise ValueError(f"sample_every không hợp lệ: {sample_every}")
+        if output not in SUPPORTED_TRACE_OUTPUTS:
+            raise ValueError(f"Đầu ra truy vết không hợp lệ: {output}. Hỗ trợ: {SUPPORTED_TRACE_OUTPUTS}")
+        self.sample_every = sample_every
+        self.timeout_s = timeout_s
+        self.max_in_flight = max_in_flight
+        # False khi xử lý/gửi MQTT chạy ở tiến trình khác: vết kết thúc sau khi giải mã
+        self.downstream = True
+        # True khi publisher ghi được mốc gửi MQTT (do MqttPublisherThread đặt)
+        self.publish_hops = False
+        self._ring_file = TraceRingFile(file_path, file_records) if output == "file" else None
+        self.lock = threading.RLock()
+        self._next_id = 1
+        # Vết đang chờ ở từng tầng; các tầng kiểm tra dict rỗng mà không cần khóa
+        self.awaiting_decode: Dict[float, SampleTrace] = {}
+        self.awaiting_process: Dict[float, SampleTrace] = {}
+        self.awaiting_publish: Dict[float, SampleTrace] = {}
+        self.awaiting_puback: Dict[int, SampleTrace] = {}
+        self.finished_count = 0
+        self.abandoned_count = 0
+
+    # ------------------------------------------------------------------
+    # Luồng đọc
+    # ------------------------------------------------------------------
+    def should_trace(self, count_before: int, count: int) -> bool:
+        """True nếu lần đọc count gói (sau count_before gói trước đó) vượt qua một mốc sample_every."""
+        return (count_before + count) // self.sample_every > count_before // self.sample_every
+
+    def start(self, sensor_id: str, arrival_ts: float, arrival: float, framed: float):
+        """Bắt đầu một vết cho lần đọc serial có arrival_ts (khóa của phần tử hàng đợi raw)."""
+        with self.lock:
+            trace = SampleTrace(self._next_id, sensor_id, arrival_ts, arrival)
+            self._next_id += 1
+            trace.hops["framed"] = framed
+            self._expire(arrival)
+            self.awaiting_decode[arrival_ts] = trace
+
+    def rekey_arrival(self, old_ts: float, new_ts: float):
+        """Khối gói đang gom được chuyển đi với arrival_ts mới: chuyển vết đang chờ sang khóa mới."""
+        with self.lock:
+            trace = self.awaiting_decode.pop(old_ts, None)
+            if trace is None:
+                return
+            if new_ts in self.awaiting_decode:
+                # Mỗi khối chỉ giữ một vết (vết mới nhất)
+                replaced = trace
+            else:
+                self.awaiting_decode[new_ts] = trace
+                replaced = None
+        if replaced is not None:
+            self.finish(replaced, False)
+
+    # ------------------------------------------------------------------
+    # Luồng giải mã
+    # ------------------------------------------------------------------
+    def take_arrival(self, arrival_ts: float) -> Optional[SampleTrace]:
+        with self.lock:
+            return self.awaiting_decode.pop(arrival_ts, None)
+
+    def await_processing(self, trace: SampleTrace, sample_ts: float):
+        """Vết đã giải mã (và lưu) xong; chờ luồng xử lý theo timestamp của mẫu."""
+        trace.sample_ts = sample_ts
+        if not self.downstream:
+            self.finish(trace, True)
+            return
+        with self.lock:
+            self.awaiting_process[sample_ts] = trace
+
+    # ------------------------------------------------------------------
+    # Luồng xử lý và publisher (so khớp theo timestamp: mẫu có thể không sinh kết quả riêng)
+    # ------------------------------------------------------------------
+    def _take_until(self, awaiting: Dict[float, SampleTrace], sensor_id: str,
+                    last_ts: float) -> List[SampleTrace]:
+        with self.lock:
+            keys = [ts for ts, trace in awaiting.items() if ts <= last_ts and trace.sensor_id == sensor_id]
+            return [awaiting.pop(ts) for ts in keys]
+
+    def take_processed(self, sensor_id: str, last_ts: float) -> List[SampleTrace]:
+        """Các vết của cảm biến có timestamp <= last_ts (timestamp mới nhất vừa xử lý xong)."""
+        return self._take_until(self.awaiting_process, sensor_id, last_ts)
+
+    def await_publishing(self, trace: SampleTrace, forward: bool):
+        """Vết đã xử lý xong; chờ publisher nếu kết quả được đẩy sang MQTT, nếu không thì kết thúc."""
+        if not forward:
+            self.finish(trace, True)
+            return
+        with self.lock:
+            self.awaiting_publish[trace.sample_ts] = trace
+
+    def take_published(self, sensor_id: str, last_ts: float) -> List[SampleTrace]:
+        return self._take_until(self.awaiting_publish, sensor_id, last_ts)
+
+    def await_puback(self, trace: SampleTrace, mid: int):
+        with self.lock:
+            self.awaiting_puback[mid] = trace
+
+    def on_puback(self, mid: int):
+        """Gọi từ callback on_publish của paho (luồng mạng MQTT)."""
+        with self.lock:
+            trace = self.awaiting_puback.pop(mid, None)
+        if trace is not None:
+            trace.mark("puback")
+            self.finish(trace, True)
+
+    # ------------------------------------------------------------------
+    def finish(self, trace: SampleTrace, complete: bool):
+        """Ghi một vết ra log hoặc file vòng."""
+        if complete:
+            self.finished_count += 1
+        else:
+            self.abandoned_count += 1
+        if self._ring_file is not None:
+            with self.lock:
+                self._ring_file.write(trace, complete)
+            return
+        hops = trace.hops
+        last = max(hops.values(), default=trace.arrival)
+        spans = ", ".join(f"{hop} +{(hops[hop] - trace.arrival) * 1000:.2f}" for hop in TRACE_HOPS if hop in hops)
+        status = "" if complete else " (bỏ dở)"
+        logger.info(f"[Trace {trace.trace_id}{' ' + trace.sensor_id if trace.sensor_id else ''}] "
+                    f"{spans} ms; tổng {(last - trace.arrival) * 1000:.2f} ms{status}")
+
+    def _expire(self, now: float):
+        """Ghi các vết quá timeout_s (hoặc vượt max_in_flight) là bỏ dở; gọi khi đang giữ khóa."""
+        expired = []
+        for awaiting in (self.awaiting_decode, self.awaiting_process, self.awaiting_publish, self.awaiting_puback):
+            while awaiting:
+                key, trace = next(iter(awaiting.items()))
+                if now - trace.arrival < self.timeout_s and len(awaiting) < self.max_in_flight:
+                    break
+                del awaiting[key]
+                expired.append(trace)
+        for trace in expired:
+            self.abandoned_count += 1
+            if self._ring_file is not None:
+                self._ring_file.write(trace, False)
+            else:
+                logger.info(f"[Trace {trace.trace_id}] Bỏ dở sau mốc "
+                            f"{max(trace.hops, key=trace.hops.get, default='arrival')}.")
+
+    def close(self):
+        """Ghi các vết còn dở và đóng file vòng."""
+        with self.lock:
+            pending = [trace for awaiting in (self.awaiting_decode, self.awaiting_process,
+                                              self.awaiting_publish, self.awaiting_puback)
+                       for trace in awaiting.values()]
+            for awaiting in (self.awaiting_decode, self.awaiting_process, self.awaiting_publish, self.awaiting_puback):
+                awaiting.clear()
+        for trace in pending:
+            self.finish(trace, False)
+        if self._ring_file is not None:
+            self._ring_file.close()
+        logger.info(f"[Trace] Đã ghi {self.finished_count} vết hoàn tất, {self.abandoned_count} vết bỏ dở.")
+
+
+def create_sample_tracer(tracing_config: Optional[dict]) -> Optional[SampleTracer]:
+    """Tạo SampleTracer từ cấu hình tracing; None nếu sample_every <= 0 (tắt truy vết)."""
+    tracing_config = tracing_config or {}
+    sample_every = tracing_config.get("sample_every", 0)
+    if sample_every <= 0:
+        return None
+    return SampleTracer(
+        sample_every=sample_every,
+        output=tracing_config.get("output", "log"),
+        file_path=tracing_config.get("file_path", "logs/traces.bin"),
+        file_records=tracing_config.get("file_records", 4096),
+        timeout_s=tracing_config.get("timeout_s", 10.0)
+    )
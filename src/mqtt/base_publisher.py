@@ -1,7 +1,8 @@
 # src/mqtt/base_publisher.py
 import paho.mqtt.client as mqtt
 import logging
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +10,9 @@ class BasePublisher:
     """
     Lớp cơ sở cho các MQTT publisher, quản lý kết nối và các cấu hình cơ bản.
     """
+    # Publisher gửi trực tiếp ProcessedSample nhận được (ghi được mốc serialized/published của vết)
+    supports_tracing = False
+
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.client = mqtt.Client(client_id=config.get("client_id", ""), protocol=mqtt.MQTTv311, transport="tcp")
@@ -22,6 +26,12 @@ class BasePublisher:
 
         self.client.on_connect = self.on_connect
         self.client.on_disconnect = self.on_disconnect
+        self.client.on_publish = self.on_publish
+
+        # QoS của dữ liệu (mosquitto.yaml qos.publish_data)
+        self.data_qos = config.get("publish_data_qos", 0)
+        # SampleTracer, do MqttPublisherThread gán khi bật truy vết
+        self.tracer = None
         
         self.broker_address = config["broker_address"]
         self.broker_port = config["broker_port"]
@@ -38,6 +48,47 @@ class BasePublisher:
         logger.warning(f"Đã ngắt kết nối khỏi MQTT Broker. Mã lỗi: {rc}. Đang thử kết nối lại...")
         # Paho-mqtt tự động xử lý việc kết nối lại
 
+    def on_publish(self, client, userdata, mid):
+        tracer = self.tracer
+        if tracer is not None and tracer.awaiting_puback:
+            tracer.on_puback(mid)
+
+    def take_traces(self, sensor_id: str, last_ts: float) -> List:
+        """Các vết đang chờ gửi có timestamp <= last_ts (rỗng nếu không truy vết)."""
+        tracer = self.tracer
+        if tracer is None or not tracer.awaiting_publish:
+            return []
+        return tracer.take_published(sensor_id, last_ts)
+
+    def publish_payload(self, topic: str, payload: bytes, traces: List):
+        """
+        Giao một message dữ liệu cho paho với data_qos, ghi mốc serialized/published cho các vết của nó.
+        Returns:
+            MQTTMessageInfo của paho.
+        """
+        if not traces:
+            return self.client.publish(topic, payload, qos=self.data_qos)
+        serialized_at = time.monotonic()
+        # Giữ khóa của tracer để on_publish (luồng mạng) không xử lý PUBACK trước khi vết được gắn với mid
+        with self.tracer.lock:
+            msg_info = self.client.publish(topic, payload, qos=self.data_qos)
+            self._trace_sent(traces, serialized_at, msg_info)
+        return msg_info
+
+    def _trace_sent(self, traces: List, serialized_at: float, msg_info):
+        """Với QoS > 0, vết đầu tiên của message chờ PUBACK; các vết còn lại kết thúc ở mốc published."""
+        published_at = time.monotonic()
+        for trace in traces:
+            trace.mark("serialized", serialized_at)
+            trace.mark("published", published_at)
+        first, rest = traces[0], traces[1:]
+        if self.data_qos > 0 and msg_info.rc == mqtt.MQTT_ERR_SUCCESS:
+            self.tracer.await_puback(first, msg_info.mid)
+        else:
+            rest = traces
+        for trace in rest:
+            self.tracer.finish(trace, True)
+
     def connect(self):
         """
         Thực hiện kết nối tới MQTT Broker.
@@ -62,6 +113,16 @@ class BasePublisher:
         self.client.disconnect()
         logger.info("Đã ngắt kết nối MQTT.")
 
+    def get_topic(self, sensor_id: str = "") -> str:
+        """
+        Topic gửi dữ liệu của một cảm biến.
+        Args:
+            sensor_id: Mã cảm biến (rỗng khi chỉ có một cảm biến).
+        Returns:
+            publish_topic, hoặc "{publish_topic}/{sensor_id}" khi chạy nhiều cảm biến.
+        """
+        return f"{self.publish_topic}/{sensor_id}" if sensor_id else self.publish_topic
+
     def publish(self, payload: bytes):
         """
         Gửi một payload tới topic đã cấu hình.
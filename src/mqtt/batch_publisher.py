@@ -4,6 +4,7 @@ import time
 from typing import Dict, Any, List
 from .base_publisher import BasePublisher
 from src.utils.common import load_config
+from src.core.records import ProcessedSample, to_mqtt_point
 import paho.mqtt.client as mqtt
 import copy
 
@@ -13,10 +14,13 @@ class BatchPublisher(BasePublisher):
     """
     Publisher thu thập dữ liệu và gửi đi theo từng lô (batch).
     """
+    supports_tracing = True
+
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.batch_size = config.get("send_strategy", {}).get("batch_size", 100)
-        self.buffer: List[Dict[str, Any]] = []
+        # sensor_id -> buffer; chỉ có khóa "" khi chạy một cảm biến
+        self.buffers: Dict[str, List[ProcessedSample]] = {}
         self.compressor = self.get_compressor()
         app_config = load_config()  # Sử dụng hệ thống cấu hình mới
         message_config = app_config.get('mqtt_message', {})
@@ -27,32 +31,40 @@ class BatchPublisher(BasePublisher):
         self._warning_log_delay = 5  # Chỉ log warning mỗi 5 giây
         self._unpublished_mids = []  # Lưu trữ các Mid chưa được publish
 
-    def publish(self, data_point: Dict[str, Any]):
+    def publish(self, data_point: ProcessedSample):
         """
         Thêm một điểm dữ liệu vào buffer. Nếu buffer đầy, gửi cả lô đi.
 
         Args:
-            data_point (Dict[str, Any]): Dữ liệu đã xử lý.
+            data_point (ProcessedSample): Bản ghi dữ liệu đã xử lý.
         """
-        self.buffer.append(data_point)
-        if len(self.buffer) >= self.batch_size:
-            self.send_batch()
+        buffer = self.buffers.setdefault(data_point.sensor_id, [])
+        buffer.append(data_point)
+        if len(buffer) >= self.batch_size:
+            self.send_batch(data_point.sensor_id)
 
-    def send_batch(self):
+    def send_batch(self, sensor_id: str = ""):
         """
-        Xây dựng, nén và gửi lô dữ liệu hiện tại trong buffer.
+        Xây dựng, nén và gửi lô dữ liệu hiện tại trong buffer của một cảm biến.
+
+        Args:
+            sensor_id (str): Mã cảm biến (rỗng khi chỉ có một cảm biến).
         """
-        if not self.buffer:
+        buffer = self.buffers.get(sensor_id)
+        if not buffer:
             return
 
-        logger.debug(f"Buffer đã đầy ({len(self.buffer)}/{self.batch_size}). Chuẩn bị gửi batch.")
+        logger.debug(f"Buffer đã đầy ({len(buffer)}/{self.batch_size}). Chuẩn bị gửi batch.")
         
         # Tạo message từ template, deepcopy để đảm bảo metadata không bị ảnh hưởng lẫn nhau
         message = copy.deepcopy(self.message_template)
-        message['metadata']['sample_count'] = len(self.buffer)
-        message['metadata']['start_time'] = self.buffer[0].get('ts', 0)
-        message['metadata']['end_time'] = self.buffer[-1].get('ts', 0)
-        message['data_points'] = self.buffer
+        message['metadata']['sample_count'] = len(buffer)
+        message['metadata']['start_time'] = buffer[0].ts
+        message['metadata']['end_time'] = buffer[-1].ts
+        if sensor_id:
+            message['metadata']['sensor_id'] = sensor_id
+        message['data_points'] = [to_mqtt_point(point) for point in buffer]
+        traces = self.take_traces(sensor_id, buffer[-1].ts)
 
         try:
             if self.compressor:
@@ -63,10 +75,10 @@ class BatchPublisher(BasePublisher):
                 payload = json.dumps(message).encode('utf-8')
 
             # Gửi tin nhắn
-            msg_info = self.client.publish(self.publish_topic, payload, qos=0)
+            msg_info = self.publish_payload(self.get_topic(sensor_id), payload, traces)
             
             if msg_info.rc == mqtt.MQTT_ERR_SUCCESS:
-                logger.info(f"Gửi thành công batch {len(self.buffer)} điểm dữ liệu, kích thước payload: {len(payload)} bytes.")
+                logger.info(f"Gửi thành công batch {len(buffer)} điểm dữ liệu, kích thước payload: {len(payload)} bytes.")
             
             # Xử lý warning về unpublished messages với throttling
             if not msg_info.is_published():
@@ -82,18 +94,19 @@ class BatchPublisher(BasePublisher):
                         self._unpublished_mids = self._unpublished_mids[-50:]
 
             # Xóa buffer sau khi gửi
-            self.buffer.clear()
+            buffer.clear()
         except Exception as e:
             logger.error(f"Lỗi khi gửi dữ liệu batch: {e}")
             # Cân nhắc: Có nên xóa buffer nếu gửi lỗi? 
             # Giữ lại có thể gây ra buffer lớn, xóa đi sẽ mất dữ liệu.
             # Hiện tại, chọn giải pháp xóa để tránh tràn bộ nhớ.
-            self.buffer.clear()
+            buffer.clear()
 
     def flush(self):
         """
         Gửi bất kỳ dữ liệu nào còn lại trong buffer.
         Hữu ích khi chương trình kết thúc.
         """
-        logger.info(f"Flushing {len(self.buffer)} điểm dữ liệu còn lại trong buffer.")
-        self.send_batch() 
\ No newline at end of file
+        logger.info(f"Flushing {sum(len(buffer) for buffer in self.buffers.values())} điểm dữ liệu còn lại trong buffer.")
+        for sensor_id in list(self.buffers):
+            self.send_batch(sensor_id) 
\ No newline at end of file
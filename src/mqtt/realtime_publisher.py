@@ -3,6 +3,7 @@ import time
 from typing import Dict, Any
 from .base_publisher import BasePublisher
 from src.utils.common import load_config
+from src.core.records import ProcessedSample, to_mqtt_point
 import copy
 import paho.mqtt.client as mqtt
 
@@ -12,6 +13,8 @@ class RealtimePublisher(BasePublisher):
     """
     Publisher gửi mỗi điểm dữ liệu ngay lập tức (real-time).
     """
+    supports_tracing = True
+
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.compressor = self.get_compressor()
@@ -24,20 +27,24 @@ class RealtimePublisher(BasePublisher):
         self._warning_log_delay = 5  # Chỉ log warning mỗi 5 giây
         self._unpublished_mids = []  # Lưu trữ các Mid chưa được publish
 
-    def publish(self, data_point: Dict[str, Any]):
+    def publish(self, data_point: ProcessedSample):
         """
         Xây dựng, nén và gửi một điểm dữ liệu.
 
         Args:
-            data_point (Dict[str, Any]): Dữ liệu đã xử lý.
+            data_point (ProcessedSample): Bản ghi dữ liệu đã xử lý.
         """
-        ts = data_point.get('ts', 0)
+        ts = data_point.ts
+        traces = self.take_traces(data_point.sensor_id, ts)
         
         # Tạo message từ template, deepcopy để đảm bảo an toàn
         message = copy.deepcopy(self.message_template)
         message['metadata']['start_time'] = ts
         message['metadata']['end_time'] = ts
-        message['data_points'] = [data_point]
+        if data_point.sensor_id:
+            message['metadata']['sensor_id'] = data_point.sensor_id
+        # Dict điểm dữ liệu chỉ được tạo ở đây, khi tuần tự hóa message
+        message['data_points'] = [to_mqtt_point(data_point)]
 
         try:
             if self.compressor:
@@ -48,7 +55,7 @@ class RealtimePublisher(BasePublisher):
                 payload = json.dumps(message).encode('utf-8')
 
             # Gửi tin nhắn
-            msg_info = self.client.publish(self.publish_topic, payload, qos=0)
+            msg_info = self.publish_payload(self.get_topic(data_point.sensor_id), payload, traces)
             
             if msg_info.rc == mqtt.MQTT_ERR_SUCCESS:
                 logger.debug(f"Gửi thành công 1 điểm dữ liệu, kích thước payload: {len(payload)} bytes.")
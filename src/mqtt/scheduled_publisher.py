@@ -109,8 +109,9 @@ class ScheduledPublisher(BasePublisher):
             logger.warning(f"Thư mục dữ liệu không tồn tại: {self.data_source_dir}")
             return
             
-        # Tìm tất cả file CSV trong thư mục
-        csv_files = glob.glob(os.path.join(self.data_source_dir, "*.csv"))
+        # Tìm tất cả file CSV trong thư mục và thư mục con của từng cảm biến (chế độ nhiều cảm biến)
+        csv_files = (glob.glob(os.path.join(self.data_source_dir, "*.csv"))
+                     + glob.glob(os.path.join(self.data_source_dir, "*", "*.csv")))
         
         if not csv_files:
             logger.debug("Không có file dữ liệu để gửi")
@@ -127,6 +128,9 @@ class ScheduledPublisher(BasePublisher):
     def _process_single_file(self, file_path: str):
         """Xử lý một file dữ liệu"""
         logger.info(f"Xử lý file: {file_path}")
+        # File trong thư mục con thuộc về cảm biến có mã là tên thư mục con
+        parent_dir = os.path.dirname(file_path)
+        sensor_id = "" if os.path.samefile(parent_dir, self.data_source_dir) else os.path.basename(parent_dir)
         
         try:
             # Đọc dữ liệu từ file CSV
@@ -161,6 +165,8 @@ class ScheduledPublisher(BasePublisher):
                 message['metadata']['start_time'] = batch[0].get('ts', 0) if batch else 0
                 message['metadata']['end_time'] = batch[-1].get('ts', 0) if batch else 0
                 message['metadata']['file_source'] = os.path.basename(file_path)
+                if sensor_id:
+                    message['metadata']['sensor_id'] = sensor_id
                 message['metadata']['batch_info'] = {
                     'batch_number': i // self.batch_size + 1,
                     'total_batches': (total_points + self.batch_size - 1) // self.batch_size,
@@ -175,7 +181,7 @@ class ScheduledPublisher(BasePublisher):
                     else:
                         payload = json.dumps(message).encode('utf-8')
                         
-                    msg_info = self.client.publish(self.publish_topic, payload, qos=0)
+                    msg_info = self.client.publish(self.get_topic(sensor_id), payload, qos=self.data_qos)
                     
                     if msg_info.rc == mqtt.MQTT_ERR_SUCCESS:
                         sent_count += len(batch)
@@ -2,6 +2,7 @@ import numpy as np
 from scipy.fft import rfft, rfftfreq
 from scipy.signal import windows
 import logging
+from typing import Union
 
 logger = logging.getLogger(__name__)
 
@@ -36,65 +37,58 @@ class FFTAnalyzer:
         if self.min_freq_hz >= self.max_freq_hz:
             logger.warning("min_freq_hz lớn hơn hoặc bằng max_freq_hz. Tần số đặc trưng có thể không chính xác.")
         
+        # Cửa sổ Hanning và trục tần số (bỏ DC) chỉ phụ thuộc N và dt nên được tính một lần
+        self._window = windows.hann(self.n_fft_points)
+        self._freq_axis = rfftfreq(self.n_fft_points, self.dt_sampling)[1:]
+        self._search_mask = (self._freq_axis >= self.min_freq_hz) & (self._freq_axis <= self.max_freq_hz)
+        self._search_freqs = self._freq_axis[self._search_mask]
+        
         logger.info(f"Đã khởi tạo FFTAnalyzer: N_FFT={n_fft_points}, Fs={self.sampling_rate:.2f} Hz, "
                    f"Dải tìm kiếm tần số: [{self.min_freq_hz:.2f} Hz, {self.max_freq_hz:.2f} Hz]")
 
-    def analyze(self, data_segment: np.ndarray) -> tuple[np.ndarray, np.ndarray, float]:
+    def analyze(self, data_segment: np.ndarray) -> tuple[np.ndarray, np.ndarray, Union[float, np.ndarray]]:
         """
         Thực hiện FFT trên một đoạn dữ liệu và tìm tần số đặc trưng.
+        Đoạn nhiều kênh (channels, L) được biến đổi bằng một lần rfft theo trục cuối.
         
         Args:
-            data_segment (np.ndarray): Đoạn dữ liệu gia tốc (1D array) để phân tích.
-                                       Kích thước nên >= self.n_fft_points.
+            data_segment (np.ndarray): Đoạn dữ liệu gia tốc (1D array, hoặc (channels, L)) để phân tích.
+                                       Kích thước (trục cuối) nên >= self.n_fft_points.
         Returns:
-            tuple[np.ndarray, np.ndarray, float]:
+            tuple[np.ndarray, np.ndarray, float | np.ndarray]:
                 - freqs: Mảng tần số tương ứng.
-                - amplitudes: Mảng biên độ phổ.
-                - dominant_freq_hz: Tần số có biên độ lớn nhất trong dải cho phép.
+                - amplitudes: Mảng biên độ phổ (mỗi kênh một hàng).
+                - dominant_freq_hz: Tần số có biên độ lớn nhất trong dải cho phép (mảng (channels,)
+                                    với đầu vào nhiều kênh).
                                     Trả về 0.0 nếu không tìm thấy hoặc không đủ dữ liệu.
         """
-        if len(data_segment) < self.n_fft_points:
-            logger.warning(f"Không đủ dữ liệu cho FFT: {len(data_segment)} mẫu, cần {self.n_fft_points}.")
-            return np.array([]), np.array([]), 0.0
+        data_segment = np.asarray(data_segment)
+        no_peak = 0.0 if data_segment.ndim == 1 else np.zeros(data_segment.shape[:-1])
+        if data_segment.shape[-1] < self.n_fft_points:
+            logger.warning(f"Không đủ dữ liệu cho FFT: {data_segment.shape[-1]} mẫu, cần {self.n_fft_points}.")
+            return np.array([]), np.array([]), no_peak
 
         # Lấy N_FFT_POINTS mẫu gần nhất
-        segment_for_fft = data_segment[-self.n_fft_points:]
+        segment_for_fft = data_segment[..., -self.n_fft_points:]
 
         # Áp dụng cửa sổ Hanning để giảm rò rỉ phổ (spectral leakage)
-        hanning_window = windows.hann(self.n_fft_points)
-        segment_windowed = segment_for_fft * hanning_window
+        segment_windowed = segment_for_fft * self._window
 
         # Tính FFT cho tín hiệu thực (Real FFT)
-        yf = rfft(segment_windowed)
-        # Tính các tần số tương ứng với các bin FFT
-        xf = rfftfreq(self.n_fft_points, self.dt_sampling)
+        yf = rfft(segment_windowed, axis=-1)
 
-        # Tính biên độ phổ (loại bỏ thành phần DC ở xf[0] = 0 Hz)
+        # Tính biên độ phổ (loại bỏ thành phần DC ở tần số 0 Hz)
         # Và chỉ xem xét các tần số dương
-        if len(xf) > 1 and len(yf) > 1:
-            amplitude_spectrum = np.abs(yf[1:])
-            freq_axis = xf[1:]
-        else:
-            return np.array([]), np.array([]), 0.0
+        if self._freq_axis.size == 0:
+            return np.array([]), np.array([]), no_peak
+        amplitude_spectrum = np.abs(yf[..., 1:])
 
-        dominant_freq_hz = 0.0
-        if amplitude_spectrum.size > 0:
-            # Lọc tần số trong dải cho phép
-            valid_indices = np.where((freq_axis >= self.min_freq_hz) & 
-                                     (freq_axis <= self.max_freq_hz))
-            
-            if valid_indices[0].size > 0:
-                filtered_amplitudes = amplitude_spectrum[valid_indices]
-                filtered_freqs = freq_axis[valid_indices]
-                
-                if filtered_amplitudes.size > 0:
-                    peak_idx_in_filtered = np.argmax(filtered_amplitudes)
-                    dominant_freq_hz = filtered_freqs[peak_idx_in_filtered]
-                else:
-                    logger.debug("Không tìm thấy biên độ nào trong dải tần số hợp lệ.")
-            else:
-                logger.debug("Không tìm thấy tần số nào trong dải tìm kiếm.")
+        dominant_freq_hz = no_peak
+        if self._search_freqs.size > 0:
+            # Đỉnh của phổ trong dải tần số cho phép, với mỗi kênh
+            peak_idx_in_filtered = np.argmax(amplitude_spectrum[..., self._search_mask], axis=-1)
+            dominant_freq_hz = self._search_freqs[peak_idx_in_filtered]
         else:
-            logger.debug("Phổ biên độ trống.")
+            logger.debug("Không tìm thấy tần số nào trong dải tìm kiếm.")
 
-        return freq_axis, amplitude_spectrum, dominant_freq_hz
\ No newline at end of file
+        return self._freq_axis.copy(), amplitude_spectrum, dominant_freq_hz
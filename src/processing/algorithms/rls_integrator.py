@@ -7,11 +7,12 @@ class RLSIntegrator:
     """
     Tích hợp gia tốc thành vận tốc và vị trí trong thời gian thực
     sử dụng bộ lọc recursive least squares (RLS) để khử nhiễu và trôi dữ liệu.
-    Lớp này được thiết kế để xử lý dữ liệu cho MỘT TRỤC.
+    Mỗi kênh (trục) được tích hợp độc lập; với channels > 1, mọi kênh được xử lý cùng lúc
+    trên một mảng (channels, N).
     """
     
     def __init__(self, sample_frame_size: int = 20, calc_frame_multiplier: int = 100,
-                 dt: float = 0.005, filter_q: float = 0.9825):
+                 dt: float = 0.005, filter_q: float = 0.9825, channels: int = 1):
         """
         Khởi tạo bộ tích hợp gia tốc RLS.
         
@@ -22,6 +23,7 @@ class RLSIntegrator:
         * dt: Khoảng thời gian giữa các mẫu gia tốc (giây).
         * filter_q: Hệ số quên (forgetting factor) cho bộ lọc RLS, giá trị gần 1 
                    sẽ giảm khả năng phản ứng nhưng tăng độ bền nhiễu.
+        * channels: Số kênh tích hợp cùng lúc (ví dụ 3 trục x, y, z).
         """
         if not (0 < filter_q <= 1):
             raise ValueError("filter_q (hệ số quên) phải nằm trong khoảng (0, 1].")
@@ -31,17 +33,18 @@ class RLSIntegrator:
             raise ValueError("sample_frame_size phải lớn hơn 0.")
         if calc_frame_multiplier <= 0:
             raise ValueError("calc_frame_multiplier phải lớn hơn 0.")
+        if channels <= 0:
+            raise ValueError("channels phải lớn hơn 0.")
 
         self.sample_frame_size = sample_frame_size
         self.calc_frame_multiplier = calc_frame_multiplier
         self.calc_frame_size = sample_frame_size * calc_frame_multiplier
         self.dt = dt
         self.filter_q = filter_q
+        self.channels = channels
         
-        # Khởi tạo các buffer tính toán chính 
-        self.acc_buffer = np.zeros(self.calc_frame_size)
-        self.vel_buffer = np.zeros(self.calc_frame_size)
-        self.disp_buffer = np.zeros(self.calc_frame_size)
+        # Trạng thái tích phân tăng dần trên cửa sổ calc_frame_size mẫu gần nhất (xem process_frame)
+        self._reset_window()
         
         # Các biến theo dõi trạng thái
         self.frame_count = 0
@@ -61,14 +64,41 @@ class RLSIntegrator:
     
     def reset(self):
         """Đặt lại trạng thái của bộ tích hợp về ban đầu."""
-        self.acc_buffer = np.zeros(self.calc_frame_size)
-        self.vel_buffer = np.zeros(self.calc_frame_size)
-        self.disp_buffer = np.zeros(self.calc_frame_size)
+        self._reset_window()
         self.frame_count = 0
         self.P = np.eye(2) * 1000
         self.theta = np.zeros(2)
         logger.info("RLSIntegrator đã được reset.")
         
+    def _reset_window(self):
+        """Cửa sổ ban đầu gồm calc_frame_size mẫu gia tốc 0 (như buffer 0 của bản tính lại toàn bộ)."""
+        n = self.calc_frame_size
+        # Vòng các giá trị V (tích phân hình thang của gia tốc) và W (tích phân hình thang của V),
+        # tích lũy từ một mốc chung, mỗi kênh một hàng; _pos là vị trí mẫu cũ nhất của cửa sổ
+        self._vel_cum = np.zeros((self.channels, n))
+        self._disp_cum = np.zeros((self.channels, n))
+        self._vel_cum_sum = np.zeros(self.channels)
+        self._pos = 0
+        self._last_acc = np.zeros(self.channels)
+        self._samples_since_rebase = 0
+        self._window_k = np.arange(n, dtype=np.float64)
+
+    def _rebase(self):
+        """
+        Đưa V và W về mốc là mẫu cũ nhất của cửa sổ (V = W = 0 tại đó), để giá trị tích lũy
+        không lớn dần theo thời gian chạy và mất độ chính xác. Kết quả của process_frame không đổi.
+        Tổng trượt của V cũng được tính lại từ đầu. Chi phí O(calc_frame_size), mỗi lần cửa sổ
+        trượt hết một vòng.
+        """
+        vel_offset = self._vel_cum[:, self._pos, None].copy()
+        disp_offset = self._disp_cum[:, self._pos, None].copy()
+        # Chỉ số của mỗi phần tử trong cửa sổ (0 = cũ nhất)
+        k = np.roll(self._window_k, self._pos)
+        self._vel_cum -= vel_offset
+        self._disp_cum -= disp_offset + vel_offset * self.dt * k
+        self._vel_cum_sum = np.sum(self._vel_cum, axis=-1)
+        self._samples_since_rebase = 0
+
     def _remove_linear_trend_rls(self, data: np.ndarray, t: np.ndarray) -> np.ndarray:
         """
         Áp dụng bộ lọc RLS để loại bỏ xu hướng tuyến tính khỏi mảng dữ liệu.
@@ -132,65 +162,80 @@ class RLSIntegrator:
         Dữ liệu trả về chỉ tương ứng với frame đầu vào.
 
         Args:
-            acc_frame (np.ndarray): Mảng gia tốc 1D cho frame hiện tại.
+            acc_frame (np.ndarray): Mảng gia tốc 1D cho frame hiện tại (khi channels = 1),
+                                    hoặc mảng (channels, frame_len).
 
         Returns:
             tuple[np.ndarray, np.ndarray, np.ndarray]: (disp_filtered, vel_filtered, acc_filtered)
             Các mảng numpy chứa li độ, vận tốc và gia tốc đã được lọc/tích hợp,
-            tương ứng với kích thước của acc_frame đầu vào.
+            cùng kích thước với acc_frame đầu vào.
         """
-        frame_len = len(acc_frame)
+        acc = np.asarray(acc_frame, dtype=np.float64)
+        single_channel = acc.ndim == 1
+        if single_channel:
+            acc = acc[None, :]
+        if acc.shape[0] != self.channels:
+            raise ValueError(f"Frame có {acc.shape[0]} kênh, bộ tích hợp có {self.channels} kênh.")
+        frame_len = acc.shape[1]
         if frame_len == 0:
-            return np.array([]), np.array([]), np.array([])
+            shape = (0,) if single_channel else acc.shape
+            return np.zeros(shape), np.zeros(shape), np.zeros(shape)
             
         if frame_len > self.sample_frame_size:
             logger.warning(f"Kích thước frame ({frame_len}) lớn hơn sample_frame_size ({self.sample_frame_size}). Sẽ cắt bớt.")
-            acc_frame = acc_frame[:self.sample_frame_size]
+            acc = acc[:, :self.sample_frame_size]
             frame_len = self.sample_frame_size
             
         self.frame_count += 1
             
-        # Cập nhật buffer gia tốc chung
-        self.acc_buffer = np.roll(self.acc_buffer, -frame_len) # Dịch buffer
-        self.acc_buffer[-frame_len:] = acc_frame # Thêm dữ liệu mới vào cuối
-        
+        # Bản tính lại toàn bộ cửa sổ a[0..N-1] mỗi frame cho kết quả (với V, W tích lũy từ một mốc chung,
+        # s là mẫu đầu cửa sổ, M là trung bình của V trên cửa sổ):
+        #   vận tốc[k] = V(s+k) - M,    li độ[k] = W(s+k) - W(s) - k*dt*M
+        # nên chỉ cần tích phân các mẫu mới và giữ tổng trượt của V: chi phí O(frame_len).
+        n = self.calc_frame_size
+        dt = self.dt
+        prev_acc = np.empty((self.channels, frame_len))
+        prev_acc[:, 0] = self._last_acc
+        prev_acc[:, 1:] = acc[:, :-1]
+        last = (self._pos - 1) % n
+        vel_new = self._vel_cum[:, last, None] + np.cumsum((prev_acc + acc) * (dt / 2), axis=1)
+        prev_vel = np.empty((self.channels, frame_len))
+        prev_vel[:, 0] = self._vel_cum[:, last]
+        prev_vel[:, 1:] = vel_new[:, :-1]
+        disp_new = self._disp_cum[:, last, None] + np.cumsum((prev_vel + vel_new) * (dt / 2), axis=1)
+        self._last_acc = acc[:, -1].copy()
+
+        # Ghi đè frame_len mẫu cũ nhất của vòng
+        pos = self._pos
+        head = min(frame_len, n - pos)
+        evicted = (np.sum(self._vel_cum[:, pos:pos + head], axis=1)
+                   + np.sum(self._vel_cum[:, :frame_len - head], axis=1))
+        self._vel_cum[:, pos:pos + head] = vel_new[:, :head]
+        self._disp_cum[:, pos:pos + head] = disp_new[:, :head]
+        self._vel_cum[:, :frame_len - head] = vel_new[:, head:]
+        self._disp_cum[:, :frame_len - head] = disp_new[:, head:]
+        self._pos = (pos + frame_len) % n
+        self._vel_cum_sum += np.sum(vel_new, axis=1) - evicted
+        self._samples_since_rebase += frame_len
+        if self._samples_since_rebase >= n:
+            self._rebase()
+
         # Chỉ xử lý khi có đủ dữ liệu để "làm ấm" bộ lọc RLS
         # Để đảm bảo P và theta hội tụ đủ tốt trước khi tin cậy kết quả
         if self.frame_count < self.warmup_frames:
             logger.debug(f"RLS Integrator đang làm ấm: Frame {self.frame_count}/{self.warmup_frames}")
             # Trong giai đoạn làm ấm, trả về 0 hoặc NaN
-            return np.zeros(frame_len), np.zeros(frame_len), np.zeros(frame_len) # Trả về 0 để không ảnh hưởng plot ban đầu
+            shape = (frame_len,) if single_channel else acc.shape
+            return np.zeros(shape), np.zeros(shape), np.zeros(shape) # Trả về 0 để không ảnh hưởng plot ban đầu
 
-        # Tính toán thời gian cho toàn bộ buffer tính toán
-        t_buffer = np.arange(0, self.calc_frame_size * self.dt, self.dt)
-        
-        # Tích phân gia tốc thô từ buffer thành vận tốc bằng NumPy (nhanh hơn vòng lặp Python)
-        integral_kernel_acc = (self.acc_buffer[:-1] + self.acc_buffer[1:]) * self.dt / 2
-        vel_raw_buffer = np.zeros_like(self.acc_buffer)
-        vel_raw_buffer[1:] = np.cumsum(integral_kernel_acc)
-        
-        # Tích phân gia tốc thô từ buffer thành vận tốc bằng NumPy (nhanh hơn vòng lặp Python)
-        integral_kernel_acc = (self.acc_buffer[:-1] + self.acc_buffer[1:]) * self.dt / 2
-        vel_raw_buffer = np.zeros_like(self.acc_buffer)
-        vel_raw_buffer[1:] = np.cumsum(integral_kernel_acc)
-        
-        # Tích phân gia tốc thô từ buffer thành vận tốc bằng NumPy (nhanh hơn vòng lặp Python)
-        integral_kernel_acc = (self.acc_buffer[:-1] + self.acc_buffer[1:]) * self.dt / 2
-        vel_raw_buffer = np.zeros_like(self.acc_buffer)
-        vel_raw_buffer[1:] = np.cumsum(integral_kernel_acc)
-        
         # Loại bỏ DC component từ velocity để tránh drift tích lũy
-        vel_mean = np.mean(vel_raw_buffer)
-        vel_detrended_buffer = vel_raw_buffer - vel_mean
-        
-        # Tích phân vận tốc đã khử DC thành vị trí bằng NumPy
-        integral_kernel_vel = (vel_detrended_buffer[:-1] + vel_detrended_buffer[1:]) * self.dt / 2
-        disp_raw_buffer = np.zeros_like(vel_detrended_buffer)
-        disp_raw_buffer[1:] = np.cumsum(integral_kernel_vel)
-
-        # Không loại bỏ DC từ displacement để giữ lại tín hiệu thực
-        # Chỉ zero-center để tránh offset lớn
-        disp_detrended_buffer = disp_raw_buffer - disp_raw_buffer[0]
+        vel_mean = (self._vel_cum_sum / n)[:, None]
+        # Các mẫu mới là frame_len phần tử cuối của cửa sổ (sau _rebase, lấy lại giá trị từ vòng)
+        new_index = (self._pos - frame_len + np.arange(frame_len)) % n
+        vel_detrended = self._vel_cum[:, new_index] - vel_mean
+        # Không loại bỏ DC từ displacement để giữ lại tín hiệu thực, chỉ lấy mốc đầu cửa sổ
+        disp_detrended = (self._disp_cum[:, new_index] - self._disp_cum[:, self._pos, None]
+                          - self._window_k[n - frame_len:] * dt * vel_mean)
         
         # Gia tốc đã lọc (nếu có cần) có thể là gia tốc đã khử DC/drift ban đầu
         # Trong RLS, gia tốc thường không được lọc trực tiếp mà thông qua việc khử xu hướng trên vel/disp
@@ -198,9 +243,9 @@ class RLSIntegrator:
         # Hoặc giữ acc_frame ban đầu là acc_filtered nếu không áp dụng lọc trực tiếp trên acc.
         # Ở đây, tôi sẽ trả về acc_frame ban đầu vì RLS tập trung vào vel/disp.
         # Nếu muốn lọc acc, cần thêm một bước lọc riêng biệt trước RLS.
-        acc_filtered = acc_frame # Coi gia tốc đầu vào là gia tốc đã "lọc"
+        acc_filtered = acc # Coi gia tốc đầu vào là gia tốc đã "lọc"
         
         # Trả về chỉ phần dữ liệu mới nhất tương ứng với frame đầu vào
-        return disp_detrended_buffer[-frame_len:], \
-               vel_detrended_buffer[-frame_len:], \
-               acc_filtered
\ No newline at end of file
+        if single_channel:
+            return disp_detrended[0], vel_detrended[0], acc_filtered[0]
+        return disp_detrended, vel_detrended, acc_filtered
@@ -5,11 +5,14 @@ import logging
 from collections import deque
 from typing import Union, List
 
+from scipy.signal import lfilter
+
 logger = logging.getLogger(__name__)
 
 class MovingAverageFilter:
     """
     Bộ lọc trung bình động (Moving Average Filter) để làm mịn dữ liệu.
+    Mẫu có thể là một số hoặc một mảng (channels,) lọc độc lập từng kênh.
     """
     def __init__(self, window_size: int):
         """
@@ -32,15 +35,37 @@ class MovingAverageFilter:
         Ở đây, ta sẽ trả về trung bình của các mẫu hiện có trong buffer.
 
         Args:
-            new_sample (float): Mẫu dữ liệu mới.
+            new_sample (float | np.ndarray): Mẫu dữ liệu mới.
 
         Returns:
-            float: Giá trị đã được lọc.
+            float | np.ndarray: Giá trị đã được lọc.
         """
         self.buffer.append(new_sample)
         # Tính trung bình của các phần tử hiện có trong buffer
         return sum(self.buffer) / len(self.buffer)
 
+    def process_block(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Lọc một mảng mẫu liên tiếp, cùng kết quả như gọi process() cho từng mẫu.
+
+        Args:
+            samples (np.ndarray): Mảng 1D các mẫu mới, hoặc (channels, N).
+
+        Returns:
+            np.ndarray: Giá trị đã lọc của từng mẫu (cùng kích thước với samples).
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        # Các mẫu cũ trong buffer theo trục cuối, trước các mẫu mới
+        history = np.zeros(samples.shape[:-1] + (len(self.buffer),))
+        for i, value in enumerate(self.buffer):
+            history[..., i] = value
+        values = np.concatenate((history, samples), axis=-1)
+        cumulative = np.concatenate((np.zeros(samples.shape[:-1] + (1,)), np.cumsum(values, axis=-1)), axis=-1)
+        end = np.arange(history.shape[-1] + 1, values.shape[-1] + 1)
+        start = np.maximum(end - self.window_size, 0)
+        self.buffer.extend(np.moveaxis(samples[..., -self.window_size:], -1, 0).copy())
+        return (cumulative[..., end] - cumulative[..., start]) / (end - start)
+
     def reset(self):
         """Xóa bộ đệm của bộ lọc."""
         self.buffer.clear()
@@ -50,6 +75,7 @@ class LowPassFilter:
     """
     Bộ lọc thông thấp đơn giản (RC Low Pass Filter).
     Thích hợp cho việc làm mịn dữ liệu cảm biến thời gian thực.
+    Mẫu có thể là một số hoặc một mảng (channels,) lọc độc lập từng kênh.
     """
     def __init__(self, alpha: float):
         """
@@ -74,10 +100,10 @@ class LowPassFilter:
         Thêm một mẫu mới và trả về giá trị đã lọc.
 
         Args:
-            new_sample (float): Mẫu dữ liệu mới.
+            new_sample (float | np.ndarray): Mẫu dữ liệu mới.
 
         Returns:
-            float: Giá trị đã được lọc.
+            float | np.ndarray: Giá trị đã được lọc.
         """
         if not self.is_initialized:
             self.last_filtered_value = new_sample
@@ -86,6 +112,35 @@ class LowPassFilter:
             self.last_filtered_value = self.alpha * new_sample + (1 - self.alpha) * self.last_filtered_value
         return self.last_filtered_value
 
+    def process_block(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Lọc một mảng mẫu liên tiếp bằng scipy.signal.lfilter, cùng kết quả như gọi process() cho từng mẫu.
+
+        Args:
+            samples (np.ndarray): Mảng 1D các mẫu mới, hoặc (channels, N).
+
+        Returns:
+            np.ndarray: Giá trị đã lọc của từng mẫu (cùng kích thước với samples).
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        if samples.shape[-1] == 0:
+            return samples.copy()
+        if not self.is_initialized:
+            # Mẫu đầu tiên là giá trị lọc ban đầu
+            self.last_filtered_value = self._last_value(samples[..., :1])
+            self.is_initialized = True
+            return np.concatenate((samples[..., :1], self.process_block(samples[..., 1:])), axis=-1)
+        zi = (1 - self.alpha) * np.asarray(self.last_filtered_value, dtype=np.float64)[..., None]
+        filtered, _ = lfilter([self.alpha], [1.0, self.alpha - 1.0], samples, axis=-1, zi=zi)
+        self.last_filtered_value = self._last_value(filtered)
+        return filtered
+
+    @staticmethod
+    def _last_value(filtered: np.ndarray) -> Union[float, np.ndarray]:
+        """Giá trị cuối theo trục mẫu: số với mảng 1D, mảng (channels,) với nhiều kênh."""
+        last = filtered[..., -1]
+        return float(last) if last.ndim == 0 else last.copy()
+
     def reset(self):
         """Đặt lại trạng thái của bộ lọc."""
         self.last_filtered_value = 0.0
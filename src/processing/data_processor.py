@@ -1,14 +1,16 @@
 # src/processing/data_processor.py
 
+import math
 import numpy as np
 import logging
 import time
-from collections import deque
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional
 
 from .algorithms.rls_integrator import RLSIntegrator
 from .algorithms.fft_analyzer import FFTAnalyzer
 from .data_filter import MovingAverageFilter, LowPassFilter
+from .ring_buffer import MultiChannelRingBuffer
+from ..core.records import PROCESSED_BLOCK_COLUMNS, AccBlock, AccSample, ProcessedBlock, ProcessedSample
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +26,8 @@ class SensorDataProcessor:
                  acc_filter_type: Optional[str] = None, acc_filter_param: Optional[Any] = None,
                  rls_sample_frame_size: int = 20, rls_calc_frame_multiplier: int = 100,
                  rls_filter_q: float = 0.9825,
-                 fft_n_points: int = 512, fft_min_freq_hz: float = 0.1, fft_max_freq_hz: float = None):
+                 fft_n_points: int = 512, fft_min_freq_hz: float = 0.1, fft_max_freq_hz: float = None,
+                 integration_hop: int = 1, fft_hop: int = 1, output_every: int = 1):
         """
         Khởi tạo SensorDataProcessor.
         
@@ -40,35 +43,30 @@ class SensorDataProcessor:
             fft_n_points (int): Số điểm cho mỗi lần tính FFT.
             fft_min_freq_hz (float): Tần số thấp nhất cho FFT.
             fft_max_freq_hz (float): Tần số cao nhất cho FFT.
+            integration_hop (int): Tích hợp RLS mỗi integration_hop mẫu (1..rls_sample_frame_size;
+                                   bằng rls_sample_frame_size thì các frame không chồng lấp).
+            fft_hop (int): Tính FFT mỗi fft_hop mẫu.
+            output_every (int): Chỉ trả về kết quả cho 1 trên output_every mẫu.
+            Giữa hai lần tính, kết quả trả về dùng vận tốc/li độ/tần số của lần tính gần nhất.
+            Mặc định (1, 1, 1) tính lại mọi thứ ở mỗi mẫu như trước.
         """
+        if not 1 <= integration_hop <= rls_sample_frame_size:
+            raise ValueError(f"integration_hop phải trong khoảng [1, {rls_sample_frame_size}]: {integration_hop}")
+        if fft_hop < 1 or output_every < 1:
+            raise ValueError(f"fft_hop và output_every phải >= 1: {fft_hop}, {output_every}")
         self.dt_sensor = dt_sensor
         self.gravity_g = gravity_g
 
-        # Khởi tạo bộ lọc gia tốc ban đầu (nếu có)
-        self.acc_filters = {
-            'x': self._create_acc_filter(acc_filter_type, acc_filter_param),
-            'y': self._create_acc_filter(acc_filter_type, acc_filter_param),
-            'z': self._create_acc_filter(acc_filter_type, acc_filter_param)
-        }
+        # Ba trục x, y, z được xử lý chung dưới dạng mảng (3, N): một bộ lọc sơ bộ (nếu có),
+        # một bộ tích hợp RLS và một lần FFT cho cả ba trục
+        self.acc_filter = self._create_acc_filter(acc_filter_type, acc_filter_param)
         
-        # Khởi tạo các bộ tích hợp RLS cho mỗi trục
-        self.integrator_x = RLSIntegrator(
+        self.integrator = RLSIntegrator(
             sample_frame_size=rls_sample_frame_size,
             calc_frame_multiplier=rls_calc_frame_multiplier,
             dt=self.dt_sensor,
-            filter_q=rls_filter_q
-        )
-        self.integrator_y = RLSIntegrator(
-            sample_frame_size=rls_sample_frame_size,
-            calc_frame_multiplier=rls_calc_frame_multiplier,
-            dt=self.dt_sensor,
-            filter_q=rls_filter_q
-        )
-        self.integrator_z = RLSIntegrator(
-            sample_frame_size=rls_sample_frame_size,
-            calc_frame_multiplier=rls_calc_frame_multiplier,
-            dt=self.dt_sensor,
-            filter_q=rls_filter_q
+            filter_q=rls_filter_q,
+            channels=3
         )
 
         # Khởi tạo bộ phân tích FFT
@@ -85,11 +83,15 @@ class SensorDataProcessor:
             fft_n_points * 2, # Cho FFT (thường cần 2*N_FFT để xử lý chồng lấp)
             rls_sample_frame_size * rls_calc_frame_multiplier # Cho RLS
         )
-        self.acc_raw_buffer_x = deque(maxlen=max_buffer_len)
-        self.acc_raw_buffer_y = deque(maxlen=max_buffer_len)
-        self.acc_raw_buffer_z = deque(maxlen=max_buffer_len)
+        # Một vòng (3, max_buffer_len) cấp phát sẵn; frame RLS và đoạn FFT là view liền mạch của nó
+        self.acc_raw_buffer = MultiChannelRingBuffer(3, max_buffer_len)
 
         self.rls_sample_frame_size = rls_sample_frame_size # Kích thước frame RLS cho process_new_sample
+
+        self.integration_hop = integration_hop
+        self.fft_hop = fft_hop
+        self.output_every = output_every
+        self._reset_hops()
         
         logger.info(f"SensorDataProcessor đã khởi tạo với dt_sensor={self.dt_sensor}, gravity_g={self.gravity_g}.")
 
@@ -103,20 +105,26 @@ class SensorDataProcessor:
 
     def reset(self):
         """Đặt lại tất cả các bộ tích hợp, bộ lọc và buffer."""
-        for filter_instance in self.acc_filters.values():
-            if filter_instance:
-                filter_instance.reset()
-        self.integrator_x.reset()
-        self.integrator_y.reset()
-        self.integrator_z.reset()
-        self.acc_raw_buffer_x.clear()
-        self.acc_raw_buffer_y.clear()
-        self.acc_raw_buffer_z.clear()
+        if self.acc_filter:
+            self.acc_filter.reset()
+        self.integrator.reset()
+        self.acc_raw_buffer.clear()
+        self._reset_hops()
         logger.info("SensorDataProcessor đã được reset.")
 
+    def _reset_hops(self):
+        # Số mẫu kể từ lần tích hợp / FFT gần nhất, và kể từ kết quả trả về gần nhất
+        self._samples_since_integration = 0
+        self._samples_since_fft = 0
+        self._samples_since_output = 0
+        # Kết quả gần nhất: (vel_x, vel_y, vel_z, disp_x, disp_y, disp_z) và tần số chủ đạo
+        self._latest_motion = (0.0,) * 6
+        self._latest_dom_freqs = (0.0, 0.0, 0.0)
+
     def process_new_sample(self, acc_x_g: float, acc_y_g: float, acc_z_g: float) -> Optional[Dict[str, Any]]:
         """
         Xử lý một mẫu gia tốc mới (đã nhận từ cảm biến) với khả năng lưu trữ.
+        Giữ giao diện dict cũ; pipeline dùng process_sample() để nhận bản ghi gọn.
         
         Args:
             acc_x_g (float): Gia tốc trục X (đơn vị g).
@@ -126,151 +134,251 @@ class SensorDataProcessor:
         Returns:
             Optional[Dict[str, Any]]: Một dictionary chứa dữ liệu đã xử lý
             (gia tốc lọc, vận tốc, li độ) và kết quả FFT nếu đủ dữ liệu.
-            Trả về dữ liệu để truyền ngay (nếu immediate_transmission=True),
-            None nếu chỉ lưu trữ mà không truyền ngay hoặc chưa đủ dữ liệu để xử lý.
+            None nếu chưa đủ dữ liệu để xử lý.
+        """
+        processed = self._process(0.0, acc_x_g, acc_y_g, acc_z_g)
+        if processed is None:
+            return None
+        processed_output = processed._asdict()
+        del processed_output['ts']
+        del processed_output['sensor_id']
+        return processed_output
+
+    def process_sample(self, sample: AccSample) -> Optional[ProcessedSample]:
+        """
+        Xử lý một mẫu gia tốc dạng bản ghi.
+        
+        Args:
+            sample (AccSample): Mẫu gia tốc (đơn vị g) kèm timestamp.
+            
+        Returns:
+            Optional[ProcessedSample]: Bản ghi kết quả mang cùng timestamp,
+            hoặc None nếu chưa đủ dữ liệu để xử lý hoặc mẫu không được trả về (output_every).
+        """
+        return self._process(sample.ts, sample.acc_x, sample.acc_y, sample.acc_z, sample.sensor_id)
+
+    def process_block(self, block: AccBlock) -> List[ProcessedSample]:
+        """
+        Xử lý một khối mẫu gia tốc liên tiếp.
+        
+        Args:
+            block (AccBlock): Khối mẫu (N, 4) của một cảm biến.
+            
+        Returns:
+            List[ProcessedSample]: Kết quả của các mẫu đã đủ dữ liệu để xử lý (1 trên output_every mẫu), theo thứ tự.
+        """
+        return self.process_arrays(block.data[:, 0], block.data[:, 1:4], block.sensor_id).samples()
+
+    def process_arrays(self, ts: np.ndarray, acc_xyz: np.ndarray, sensor_id: str = '') -> ProcessedBlock:
+        """
+        Xử lý một khối mẫu bằng các phép toán mảng, cùng kết quả như gọi process_sample() cho
+        từng mẫu theo thứ tự: tích hợp RLS và FFT vẫn chạy ở đúng các mẫu theo chu kỳ hop,
+        phần còn lại (chuyển đơn vị, lọc sơ bộ, điền kết quả gần nhất) tính trên cả khối.
+
+        Args:
+            ts (np.ndarray): Timestamp của N mẫu.
+            acc_xyz (np.ndarray): Gia tốc (N, 3), đơn vị g.
+            sensor_id (str): Mã cảm biến gắn vào kết quả.
+
+        Returns:
+            ProcessedBlock: Hàng i là kết quả của mẫu i (NaN, valid False nếu mẫu không có kết quả).
         """
+        ts = np.asarray(ts, dtype=np.float64)
+        acc_xyz = np.asarray(acc_xyz, dtype=np.float64)
+        n = len(acc_xyz)
+        data = np.full((n, len(PROCESSED_BLOCK_COLUMNS)), np.nan)
+        valid = np.zeros(n, dtype=bool)
+        if n == 0:
+            return ProcessedBlock(data, valid, sensor_id)
+
+        # 1. Chuyển sang m/s² (trừ 1g trên trục Z) và lọc sơ bộ, dạng (3, N)
+        acc_ms2 = acc_xyz.T * self.gravity_g
+        acc_ms2[2] = (acc_xyz[:, 2] - 1.0) * self.gravity_g
+        filtered = self.acc_filter.process_block(acc_ms2) if self.acc_filter else acc_ms2
+
+        # Phần cuối buffer thô trước khối (đủ cho một frame RLS / đoạn FFT) nối với khối mới:
+        # cửa sổ RLS/FFT của mẫu i kết thúc ở cột kept + i
+        previous = len(self.acc_raw_buffer)
+        maxlen = self.acc_raw_buffer.maxlen
+        n_fft = self.fft_analyzer.n_fft_points
+        kept = min(previous, max(self.rls_sample_frame_size, n_fft) - 1)
+        history = np.concatenate((self.acc_raw_buffer.latest(kept), filtered), axis=1)
+        self.acc_raw_buffer.extend(filtered)
+
+        # 2. Các mẫu đã đủ frame RLS, và trong số đó các mẫu được tích hợp / có kết quả
+        # (các bộ đếm giống _process: mẫu thứ k tới lượt khi bộ đếm + k + 1 chia hết cho hop)
+        first_ready = max(0, self.rls_sample_frame_size - previous - 1)
+        ready = np.arange(first_ready, n)
+        ready_count = len(ready)
+        k = np.arange(ready_count)
+        integrate_at = ready[(self._samples_since_integration + k + 1) % self.integration_hop == 0]
+        output_at = ready[(self._samples_since_output + k + 1) % self.output_every == 0]
+        self._samples_since_integration = (self._samples_since_integration + ready_count) % self.integration_hop
+        self._samples_since_output = (self._samples_since_output + ready_count) % self.output_every
+
+        # Kết quả sau mỗi lần tích hợp; hàng 0 là kết quả trước khối
+        frame = self.rls_sample_frame_size
+        motion = np.empty((len(integrate_at) + 1, 6))
+        warmed = np.empty(len(integrate_at) + 1, dtype=bool)
+        motion[0] = self._latest_motion
+        warmed[0] = self.integrator.frame_count >= self.integrator.warmup_frames
+        for row, i in enumerate(integrate_at.tolist(), 1):
+            end = kept + i + 1
+            self._integrate(history[:, end - frame:end])
+            motion[row] = self._latest_motion
+            warmed[row] = self.integrator.frame_count >= self.integrator.warmup_frames
+
+        # 3. FFT ở các mẫu có kết quả, khi đủ dữ liệu và đã qua fft_hop mẫu
+        dom_freqs = np.empty((len(output_at), 3))
+        samples_since_fft = self._samples_since_fft
+        previous_k = -1
+        for row, i in enumerate(output_at.tolist()):
+            samples_since_fft += i - first_ready - previous_k
+            previous_k = i - first_ready
+            end = kept + i + 1
+            if min(previous + i + 1, maxlen) >= n_fft and samples_since_fft >= self.fft_hop:
+                samples_since_fft = 0
+                self._analyze_fft(history[:, end - n_fft:end])
+            dom_freqs[row] = self._latest_dom_freqs
+        self._samples_since_fft = samples_since_fft + ready_count - 1 - previous_k
+
+        if len(output_at):
+            # Kết quả tích hợp gần nhất (tính cả lần tích hợp ở chính mẫu đó) của mỗi mẫu có kết quả
+            latest = np.searchsorted(integrate_at, output_at, side='right')
+            out_motion = motion[latest]
+            out_warmed = warmed[latest]
+            disp = out_motion[:, 3:6]
+            data[output_at] = np.column_stack((
+                ts[output_at],
+                acc_xyz[output_at],
+                np.where(out_warmed[:, None], filtered[:, output_at].T, 0.0),
+                out_motion,
+                dom_freqs,
+                out_warmed,
+                np.sqrt(disp[:, 0] * disp[:, 0] + disp[:, 1] * disp[:, 1] + disp[:, 2] * disp[:, 2]),
+                dom_freqs.max(axis=1),
+            ))
+            valid[output_at] = True
+        return ProcessedBlock(data, valid, sensor_id)
+
+    def _process(self, ts: float, acc_x_g: float, acc_y_g: float, acc_z_g: float,
+                 sensor_id: str = '') -> Optional[ProcessedSample]:
+        """Thực hiện lọc, tích hợp RLS và FFT cho một mẫu; trả về bản ghi kết quả."""
         # 1. Tiền xử lý dữ liệu gia tốc thô và áp dụng bộ lọc ban đầu
         # Dữ liệu từ cảm biến đã được decode về đơn vị g, cần chuyển sang m/s²
-        acc_x_ms2_raw = acc_x_g * self.gravity_g
-        acc_y_ms2_raw = acc_y_g * self.gravity_g
         # Hiệu chỉnh offset Z cơ bản (trừ đi 1g trọng lực khi cảm biến đứng yên)
         # Lưu ý: Chỉ trừ 1g chứ không phải 1*gravity_g vì đã tính trong phép nhân phía trên
-        acc_z_ms2_raw = (acc_z_g - 1.0) * self.gravity_g 
+        acc_ms2_raw = np.array((acc_x_g * self.gravity_g, acc_y_g * self.gravity_g,
+                                (acc_z_g - 1.0) * self.gravity_g))
 
         # Áp dụng bộ lọc sơ bộ nếu có
-        acc_x_filtered_pre = self.acc_filters['x'].process(acc_x_ms2_raw) if self.acc_filters['x'] else acc_x_ms2_raw
-        acc_y_filtered_pre = self.acc_filters['y'].process(acc_y_ms2_raw) if self.acc_filters['y'] else acc_y_ms2_raw
-        acc_z_filtered_pre = self.acc_filters['z'].process(acc_z_ms2_raw) if self.acc_filters['z'] else acc_z_ms2_raw
-
-        # Thêm mẫu đã lọc sơ bộ vào các buffer thô để cấp cho RLS và FFT
-        self.acc_raw_buffer_x.append(acc_x_filtered_pre)
-        self.acc_raw_buffer_y.append(acc_y_filtered_pre)
-        self.acc_raw_buffer_z.append(acc_z_filtered_pre)
-        
-        processed_output = None
+        acc_filtered_pre = self.acc_filter.process(acc_ms2_raw) if self.acc_filter else acc_ms2_raw
+
+        # Thêm mẫu đã lọc sơ bộ vào buffer thô để cấp cho RLS và FFT
+        self.acc_raw_buffer.append(acc_filtered_pre)
         
         # 2. Xử lý tích hợp RLS khi đủ một frame (batch) gia tốc
-        if len(self.acc_raw_buffer_x) >= self.rls_sample_frame_size:
+        if len(self.acc_raw_buffer) < self.rls_sample_frame_size:
+            logger.debug(f"Chưa đủ dữ liệu cho RLS Integrator ({len(self.acc_raw_buffer)}/{self.rls_sample_frame_size} mẫu).")
+            return None
+
+        self._samples_since_integration += 1
+        if self._samples_since_integration >= self.integration_hop:
+            self._samples_since_integration = 0
             # Lấy một frame gia tốc để xử lý (chính xác là từ cuối buffer)
-            frame_x = np.array(list(self.acc_raw_buffer_x)[-self.rls_sample_frame_size:])
-            frame_y = np.array(list(self.acc_raw_buffer_y)[-self.rls_sample_frame_size:])
-            frame_z = np.array(list(self.acc_raw_buffer_z)[-self.rls_sample_frame_size:])
-            
-            # Xử lý frame gia tốc qua các bộ tích hợp RLS
-            disp_x_array, vel_x_array, acc_x_rls_output = self.integrator_x.process_frame(frame_x)
-            disp_y_array, vel_y_array, acc_y_rls_output = self.integrator_y.process_frame(frame_y)
-            disp_z_array, vel_z_array, acc_z_rls_output = self.integrator_z.process_frame(frame_z)
-
-            # Lấy giá trị cuối cùng (scalar) từ arrays để lưu trữ
-            disp_x = float(disp_x_array[-1]) if len(disp_x_array) > 0 else 0.0
-            disp_y = float(disp_y_array[-1]) if len(disp_y_array) > 0 else 0.0
-            disp_z = float(disp_z_array[-1]) if len(disp_z_array) > 0 else 0.0
-            
-            vel_x = float(vel_x_array[-1]) if len(vel_x_array) > 0 else 0.0
-            vel_y = float(vel_y_array[-1]) if len(vel_y_array) > 0 else 0.0
-            vel_z = float(vel_z_array[-1]) if len(vel_z_array) > 0 else 0.0
-
-            # Kiểm tra xem RLS đã đủ làm ấm chưa
-            rls_warmed_up = self.integrator_x.frame_count >= self.integrator_x.warmup_frames
-
-            processed_output = {
-                # Chỉ lấy giá trị gia tốc cuối cùng tương ứng với thời điểm tính toán
-                "acc_x_filtered": float(acc_x_rls_output[-1]) if len(acc_x_rls_output) > 0 else 0.0,
-                "acc_y_filtered": float(acc_y_rls_output[-1]) if len(acc_y_rls_output) > 0 else 0.0,
-                "acc_z_filtered": float(acc_z_rls_output[-1]) if len(acc_z_rls_output) > 0 else 0.0,
-                "vel_x": vel_x,
-                "vel_y": vel_y,
-                "vel_z": vel_z,
-                "disp_x": disp_x,
-                "disp_y": disp_y,
-                "disp_z": disp_z,
-                "rls_warmed_up": rls_warmed_up
-            }
-
-            # 3. Phân tích FFT khi có đủ dữ liệu trong buffer thô
-            # acc_raw_buffer_x.maxlen là đủ lớn cho FFT (ví dụ 2*N_FFT_POINTS)
-            if len(self.acc_raw_buffer_x) >= self.fft_analyzer.n_fft_points:
-                # Lấy dữ liệu để tính FFT (toàn bộ buffer hiện có)
-                fft_segment_x = np.array(list(self.acc_raw_buffer_x))
-                fft_segment_y = np.array(list(self.acc_raw_buffer_y))
-                fft_segment_z = np.array(list(self.acc_raw_buffer_z))
-
-                # Thực hiện phân tích FFT
-                freqs_x, amps_x, dom_freq_x = self.fft_analyzer.analyze(fft_segment_x)
-                freqs_y, amps_y, dom_freq_y = self.fft_analyzer.analyze(fft_segment_y)
-                freqs_z, amps_z, dom_freq_z = self.fft_analyzer.analyze(fft_segment_z)
-
-                # Chỉ cập nhật các giá trị tần số chủ đạo, không gửi toàn bộ mảng FFT
-                processed_output.update({
-                    "dominant_freq_x": dom_freq_x,
-                    "dominant_freq_y": dom_freq_y,
-                    "dominant_freq_z": dom_freq_z
-                })
-            else:
-                # Nếu không đủ dữ liệu FFT, trả về giá trị mặc định
-                processed_output.update({
-                    "dominant_freq_x": 0.0,
-                    "dominant_freq_y": 0.0,
-                    "dominant_freq_z": 0.0
-                })
-                logger.debug(f"Chưa đủ dữ liệu cho FFT ({len(self.acc_raw_buffer_x)}/{self.fft_analyzer.n_fft_points} mẫu).")
-        else:
-            logger.debug(f"Chưa đủ dữ liệu cho RLS Integrator ({len(self.acc_raw_buffer_x)}/{self.rls_sample_frame_size} mẫu).")
-
-        # Enhanced processing: Add storage capabilities and prepare for transmission
-        if processed_output is not None:
-            # Thêm thông tin gia tốc gốc vào kết quả
-            processed_output.update({
-                'acc_x': acc_x_g,
-                'acc_y': acc_y_g,
-                'acc_z': acc_z_g,
-                'displacement_magnitude': self._calculate_displacement_magnitude(processed_output),
-                'overall_dominant_frequency': self._calculate_overall_dominant_frequency(processed_output)
-            })
-            
-            return processed_output
+            self._integrate(self.acc_raw_buffer.latest(self.rls_sample_frame_size))
+        self._samples_since_fft += 1
+        self._samples_since_output += 1
+        if self._samples_since_output < self.output_every:
+            return None
+        self._samples_since_output = 0
 
-        return None
+        vel_x, vel_y, vel_z, disp_x, disp_y, disp_z = self._latest_motion
+        # Kiểm tra xem RLS đã đủ làm ấm chưa
+        rls_warmed_up = self.integrator.frame_count >= self.integrator.warmup_frames
+        # Gia tốc "lọc" của RLS là mẫu mới nhất của frame (gia tốc đã lọc sơ bộ của mẫu này), 0 khi đang làm ấm
+        acc_rls_output = tuple(acc_filtered_pre.tolist()) if rls_warmed_up else (0.0, 0.0, 0.0)
 
-    def _calculate_displacement_magnitude(self, processed_data: Dict[str, Any]) -> float:
-        """Tính độ lớn tổng hợp của displacement."""
-        disp_x = processed_data.get('disp_x', 0)
-        disp_y = processed_data.get('disp_y', 0)
-        disp_z = processed_data.get('disp_z', 0)
-        
-        # Đảm bảo là scalar values
-        if hasattr(disp_x, '__len__') and len(disp_x) > 0:
-            disp_x = float(disp_x[-1]) if len(disp_x) > 0 else 0.0
-        elif hasattr(disp_x, '__len__'):
-            disp_x = 0.0
-        else:
-            disp_x = float(disp_x)
-            
-        if hasattr(disp_y, '__len__') and len(disp_y) > 0:
-            disp_y = float(disp_y[-1]) if len(disp_y) > 0 else 0.0
-        elif hasattr(disp_y, '__len__'):
-            disp_y = 0.0
-        else:
-            disp_y = float(disp_y)
-            
-        if hasattr(disp_z, '__len__') and len(disp_z) > 0:
-            disp_z = float(disp_z[-1]) if len(disp_z) > 0 else 0.0
-        elif hasattr(disp_z, '__len__'):
-            disp_z = 0.0
+        # 3. Phân tích FFT khi có đủ dữ liệu trong buffer thô (chỉ cho mẫu được trả về)
+        # acc_raw_buffer.maxlen là đủ lớn cho FFT (ví dụ 2*N_FFT_POINTS)
+        if len(self.acc_raw_buffer) >= self.fft_analyzer.n_fft_points:
+            if self._samples_since_fft >= self.fft_hop:
+                self._samples_since_fft = 0
+                self._analyze_fft(self.acc_raw_buffer.latest(self.fft_analyzer.n_fft_points))
         else:
-            disp_z = float(disp_z)
-        
-        return np.sqrt(disp_x**2 + disp_y**2 + disp_z**2)
-    
-    def _calculate_overall_dominant_frequency(self, processed_data: Dict[str, Any]) -> float:
-        """Tính tần số trội chung."""
-        dom_freq_x = processed_data.get('dominant_freq_x', 0)
-        dom_freq_y = processed_data.get('dominant_freq_y', 0)
-        dom_freq_z = processed_data.get('dominant_freq_z', 0)
-        return max(dom_freq_x, dom_freq_y, dom_freq_z)
+            logger.debug(f"Chưa đủ dữ liệu cho FFT ({len(self.acc_raw_buffer)}/{self.fft_analyzer.n_fft_points} mẫu).")
+        dom_freq_x, dom_freq_y, dom_freq_z = self._latest_dom_freqs
+
+        return ProcessedSample(
+            ts,
+            acc_x_g, acc_y_g, acc_z_g,
+            *acc_rls_output,
+            vel_x, vel_y, vel_z,
+            disp_x, disp_y, disp_z,
+            dom_freq_x, dom_freq_y, dom_freq_z,
+            rls_warmed_up,
+            math.sqrt(disp_x * disp_x + disp_y * disp_y + disp_z * disp_z),
+            max(dom_freq_x, dom_freq_y, dom_freq_z),
+            sensor_id
+        )
 
+    def _integrate(self, frames: np.ndarray):
+        """Tích hợp RLS frame (3, rls_sample_frame_size) mẫu mới nhất của các trục, lưu vận tốc/li độ cuối."""
+        disp, vel, _ = self.integrator.process_frame(frames)
+
+        # Lấy giá trị cuối cùng (scalar) của mỗi trục để lưu trữ
+        self._latest_motion = tuple(vel[:, -1].tolist() + disp[:, -1].tolist())
+
+    def _analyze_fft(self, segments: np.ndarray):
+        """Tính tần số chủ đạo của mỗi trục trên buffer thô (3, L) (không giữ toàn bộ mảng FFT)."""
+        _, _, dom_freqs = self.fft_analyzer.analyze(segments)
+        self._latest_dom_freqs = tuple(dom_freqs.tolist())
     def close(self):
         """Dọn dẹp tài nguyên khi đóng."""
         logger.info("Closing SensorDataProcessor.")
         # Không cần làm gì thêm ở đây trừ khi có tài nguyên cần giải phóng
-        pass
\ No newline at end of file
+        pass
+
+
+class SensorProcessorPool:
+    """
+    Giữ một SensorDataProcessor (trạng thái lọc, RLS, FFT riêng) cho mỗi cảm biến.
+    Dùng thay cho SensorDataProcessor trong ProcessorThread khi chạy nhiều cảm biến:
+    mẫu được chuyển tới bộ xử lý theo sensor_id của bản ghi.
+    """
+
+    def __init__(self, processor_factory: Callable[[], SensorDataProcessor]):
+        """
+        Args:
+            processor_factory: Hàm tạo SensorDataProcessor mới cho một cảm biến.
+        """
+        self.processor_factory = processor_factory
+        self.processors: Dict[str, SensorDataProcessor] = {}
+
+    def get(self, sensor_id: str) -> SensorDataProcessor:
+        """Bộ xử lý của một cảm biến, tạo mới ở mẫu đầu tiên."""
+        processor = self.processors.get(sensor_id)
+        if processor is None:
+            logger.info(f"Tạo SensorDataProcessor cho cảm biến '{sensor_id}'.")
+            processor = self.processors[sensor_id] = self.processor_factory()
+        return processor
+
+    def process_sample(self, sample: AccSample) -> Optional[ProcessedSample]:
+        """Xử lý mẫu bằng bộ xử lý của cảm biến tương ứng."""
+        return self.get(sample.sensor_id).process_sample(sample)
+
+    def process_block(self, block: AccBlock) -> List[ProcessedSample]:
+        """Xử lý khối mẫu bằng bộ xử lý của cảm biến tương ứng."""
+        return self.get(block.sensor_id).process_block(block)
+
+    def process_arrays(self, ts: np.ndarray, acc_xyz: np.ndarray, sensor_id: str = '') -> ProcessedBlock:
+        """Xử lý khối mẫu dạng mảng bằng bộ xử lý của cảm biến tương ứng."""
+        return self.get(sensor_id).process_arrays(ts, acc_xyz, sensor_id)
+
+    def reset(self):
+        for processor in self.processors.values():
+            processor.reset()
+
+    def close(self):
+        for processor in self.processors.values():
+            processor.close()
@@ -0,0 +1,74 @@
+# src/processing/ring_buffer.py
+
+"""
+Bộ đệm vòng nhiều kênh cấp phát sẵn cho dữ liệu gia tốc của SensorDataProcessor.
+Mỗi giá trị được ghi hai lần (ở vị trí p và p + maxlen của mảng (channels, 2 * maxlen)),
+nên N mẫu mới nhất luôn là một lát liền mạch: latest(N) trả về view, không sao chép,
+dù cửa sổ vắt qua điểm quay vòng.
+"""
+from typing import Sequence
+
+import numpy as np
+
+
+class MultiChannelRingBuffer:
+    """
+    Vòng float64 (channels, maxlen) giữ maxlen mẫu mới nhất của mỗi kênh.
+    View trả về từ latest() chỉ hợp lệ tới lần ghi kế tiếp.
+    """
+
+    def __init__(self, channels: int, maxlen: int):
+        """
+        Args:
+            channels (int): Số kênh (ví dụ 3 trục x, y, z).
+            maxlen (int): Số mẫu tối đa giữ lại của mỗi kênh.
+        """
+        if channels < 1 or maxlen < 1:
+            raise ValueError(f"channels/maxlen không hợp lệ: {channels}, {maxlen}")
+        self.channels = channels
+        self.maxlen = maxlen
+        self._data = np.zeros((channels, 2 * maxlen))
+        self._pos = 0  # Vị trí ghi kế tiếp trong [0, maxlen)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, values: Sequence[float]):
+        """Ghi một mẫu (một giá trị cho mỗi kênh)."""
+        pos = self._pos
+        self._data[:, pos] = values
+        self._data[:, pos + self.maxlen] = values
+        self._pos = pos + 1 if pos + 1 < self.maxlen else 0
+        if self._count < self.maxlen:
+            self._count += 1
+
+    def extend(self, block: np.ndarray):
+        """Ghi một khối (channels, N) mẫu; chỉ maxlen mẫu cuối được giữ lại nếu N > maxlen."""
+        n = block.shape[1]
+        if n > self.maxlen:
+            block = block[:, n - self.maxlen:]
+            n = self.maxlen
+        maxlen = self.maxlen
+        pos = self._pos
+        head = min(n, maxlen - pos)
+        self._data[:, pos:pos + head] = block[:, :head]
+        self._data[:, pos + maxlen:pos + maxlen + head] = block[:, :head]
+        self._data[:, :n - head] = block[:, head:]
+        self._data[:, maxlen:maxlen + n - head] = block[:, head:]
+        self._pos = (pos + n) % maxlen
+        self._count = min(self._count + n, maxlen)
+
+    def latest(self, n: int) -> np.ndarray:
+        """
+        Returns:
+            View (channels, n) của n mẫu mới nhất theo thứ tự thời gian (n <= len(self)).
+        """
+        if not 0 <= n <= self._count:
+            raise ValueError(f"Chỉ có {self._count} mẫu trong vòng, yêu cầu {n}")
+        end = self._pos + self.maxlen
+        return self._data[:, end - n:end]
+
+    def clear(self):
+        self._pos = 0
+        self._count = 0
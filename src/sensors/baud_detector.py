@@ -0,0 +1,130 @@
+# src/sensors/baud_detector.py
+
+"""
+Dò baudrate thụ động: chỉ nghe luồng byte cảm biến đang phát, không gửi lệnh nào.
+Ở đúng baudrate, hầu hết byte nhận được nằm trong các gói 11 byte hợp lệ
+(header 0x55 cách nhau đúng 11 byte, checksum đúng); ở sai baudrate byte bị vỡ khung
+và gần như không có gói nào qua được checksum.
+"""
+import logging
+import threading
+import time
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+import serial
+
+from src.sensors.hwt905_constants import DATA_HEADER_BYTE, DATA_PACKET_LENGTH
+from src.sensors.hwt905_protocol import find_valid_packet_offsets
+
+logger = logging.getLogger(__name__)
+
+
+class BaudScore(NamedTuple):
+    """Điểm khung dữ liệu của một baudrate."""
+    baudrate: int
+    bytes_read: int
+    valid_packets: int
+    valid_ratio: float   # Tỉ lệ byte nằm trong gói có checksum đúng
+    header_ratio: float  # Tỉ lệ byte 0x55 có byte 0x55 khác cách đúng 11 byte phía sau
+
+
+def score_stream(data: bytes, baudrate: int = 0) -> BaudScore:
+    """
+    Chấm điểm một đoạn byte nhận được ở một baudrate.
+    Args:
+        data: Các byte đọc được.
+        baudrate: Baudrate đã dùng khi đọc (chỉ để ghi vào kết quả).
+    Returns:
+        BaudScore của đoạn byte.
+    """
+    if not data:
+        return BaudScore(baudrate, 0, 0, 0.0, 0.0)
+    offsets, consumed, _, _ = find_valid_packet_offsets(data)
+    valid_ratio = len(offsets) * DATA_PACKET_LENGTH / consumed if consumed else 0.0
+
+    values = np.frombuffer(data, dtype=np.uint8)
+    headers = np.flatnonzero(values[:-DATA_PACKET_LENGTH] == DATA_HEADER_BYTE)
+    header_ratio = (float(np.mean(values[headers + DATA_PACKET_LENGTH] == DATA_HEADER_BYTE))
+                    if headers.size else 0.0)
+    return BaudScore(baudrate, len(data), len(offsets), valid_ratio, header_ratio)
+
+
+class PassiveBaudDetector:
+    """
+    Nghe cổng serial lần lượt ở từng baudrate ứng viên và chọn baudrate có luồng gói hợp lệ.
+    Chỉ đổi baudrate của cổng đang mở và đọc; không ghi byte nào ra cảm biến, nên không có
+    lệnh mở khóa/đọc thanh ghi nào bị gửi đi khi kết nối lại liên tục.
+    Cần cảm biến đang phát dữ liệu (RSW khác 0, RRATE không phải single/no return).
+    """
+
+    def __init__(self, listen_s: float = 0.25, min_packets: int = 5, min_valid_ratio: float = 0.7,
+                 expected_rate_hz: Optional[float] = None):
+        """
+        Args:
+            listen_s: Thời gian nghe tối đa ở mỗi baudrate.
+            min_packets: Số gói hợp lệ tối thiểu để chấp nhận một baudrate.
+            min_valid_ratio: Tỉ lệ byte nằm trong gói hợp lệ tối thiểu.
+            expected_rate_hz: Tần số gói dự kiến; listen_s được kéo dài nếu không đủ
+                              thời gian để nhận min_packets gói ở tần số này.
+        """
+        if expected_rate_hz:
+            listen_s = max(listen_s, 1.5 * (min_packets + 1) / expected_rate_hz)
+        self.listen_s = listen_s
+        self.min_packets = min_packets
+        self.min_valid_ratio = min_valid_ratio
+
+    def is_match(self, score: BaudScore) -> bool:
+        return score.valid_packets >= self.min_packets and score.valid_ratio >= self.min_valid_ratio
+
+    def listen(self, ser: serial.Serial, baudrate: int) -> BaudScore:
+        """
+        Đặt baudrate cho cổng, bỏ dữ liệu cũ và nghe tối đa listen_s giây
+        (dừng sớm khi đã đủ gói hợp lệ).
+        """
+        ser.baudrate = baudrate
+        ser.reset_input_buffer()
+        data = bytearray()
+        # Đủ byte cho min_packets gói kể cả khi byte đầu tiên rơi giữa một gói
+        target_bytes = (self.min_packets + 1) * DATA_PACKET_LENGTH
+        deadline = time.monotonic() + self.listen_s
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ser.timeout = min(remaining, 0.05)
+            data += ser.read(max(ser.in_waiting, 1))
+            if len(data) >= target_bytes:
+                score = score_stream(bytes(data), baudrate)
+                if self.is_match(score) or score.valid_packets == 0:
+                    # Đủ gói hợp lệ, hoặc đã đủ byte mà không có gói nào: sai baudrate
+                    return score
+        return score_stream(bytes(data), baudrate)
+
+    def detect(self, ser: serial.Serial, candidates: Iterable[int],
+               cancel: Optional[threading.Event] = None) -> Optional[BaudScore]:
+        """
+        Nghe lần lượt các baudrate ứng viên trên cổng đã mở.
+        Args:
+            ser: Cổng serial đã mở (baudrate sẽ bị thay đổi).
+            candidates: Các baudrate (bps) cần thử, theo thứ tự ưu tiên.
+            cancel: Dừng sớm nếu được đặt.
+        Returns:
+            BaudScore của baudrate khớp đầu tiên (cổng được để ở baudrate đó), hoặc None.
+        """
+        original_timeout = ser.timeout
+        try:
+            for baudrate in candidates:
+                if cancel is not None and cancel.is_set():
+                    return None
+                score = self.listen(ser, baudrate)
+                logger.debug(f"[BaudDetector] {ser.port} @ {baudrate}: {score.bytes_read} bytes, "
+                             f"{score.valid_packets} gói hợp lệ, tỉ lệ {score.valid_ratio:.2f}, "
+                             f"header {score.header_ratio:.2f}")
+                if self.is_match(score):
+                    logger.info(f"[BaudDetector] Phát hiện baudrate {baudrate} trên {ser.port} "
+                                f"({score.valid_packets} gói hợp lệ, tỉ lệ {score.valid_ratio:.2f}).")
+                    return score
+            return None
+        finally:
+            ser.timeout = original_timeout
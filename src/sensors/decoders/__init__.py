@@ -11,6 +11,8 @@ from .magnetic_field_decoder import MagneticFieldPacketDecoder
 from .quaternion_decoder import QuaternionPacketDecoder
 from .gps_decoder import GPSLonLatPacketDecoder, GPSSpeedPacketDecoder, GPSAccuracyPacketDecoder
 from .misc_decoder import PortStatusPacketDecoder, PressureHeightPacketDecoder, ReadRegisterPacketDecoder
+from .batch_decoder import decode_packet_block, decode_packet_list, BLOCK_DTYPES
+from .fast_decoder import decode_packet_fast, PACKET_TYPE_NAMES, PACKET_RECORDS, PACKET_UNPACKERS
 
 __all__ = [
     'BasePacketDecoder',
@@ -26,5 +28,12 @@ __all__ = [
     'GPSAccuracyPacketDecoder',
     'PortStatusPacketDecoder',
     'PressureHeightPacketDecoder',
-    'ReadRegisterPacketDecoder'
+    'ReadRegisterPacketDecoder',
+    'decode_packet_block',
+    'decode_packet_list',
+    'BLOCK_DTYPES',
+    'decode_packet_fast',
+    'PACKET_TYPE_NAMES',
+    'PACKET_RECORDS',
+    'PACKET_UNPACKERS'
 ]
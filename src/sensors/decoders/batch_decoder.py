@@ -0,0 +1,102 @@
+"""
+Bộ giải mã theo lô (batch) cho các gói dữ liệu HWT905 bằng NumPy.
+Nhận một buffer liên tục gồm N gói 11 byte đã được xác thực checksum và trả về
+một mảng structured cho mỗi loại gói, không tạo đối tượng Python cho từng gói.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.sensors.hwt905_constants import DATA_PACKET_LENGTH
+from .packet_layouts import PACKET_LAYOUTS
+
+logger = logging.getLogger(__name__)
+
+# Vị trí payload trong gói: 0x55 TYPE [8 byte payload] CHECKSUM
+_PAYLOAD_OFFSET = 2
+
+# dtype structured của kết quả cho từng loại gói, ví dụ ACC: acc_x/acc_y/acc_z/temperature (float32)
+BLOCK_DTYPES: Dict[int, np.dtype] = {
+    packet_type: np.dtype([(name, out_dtype) for name, _, _, _, _, out_dtype in layout])
+    for packet_type, layout in PACKET_LAYOUTS.items()
+}
+
+
+def _decode_frames(frames: np.ndarray, packet_type: int) -> np.ndarray:
+    """
+    Giải mã các gói cùng loại thành mảng structured.
+    Args:
+        frames: Mảng uint8 liên tục, shape (N, 11).
+        packet_type: Loại gói tin của tất cả các hàng.
+    Returns:
+        Mảng structured shape (N,) với dtype BLOCK_DTYPES[packet_type].
+    """
+    n = frames.shape[0]
+    out = np.empty(n, dtype=BLOCK_DTYPES[packet_type])
+    for name, raw_dtype, offset, scale, bias, _ in PACKET_LAYOUTS[packet_type]:
+        # View có stride 11 byte lên đúng trường trong mỗi gói, không sao chép
+        raw = np.ndarray((n,), dtype=raw_dtype, buffer=frames,
+                         offset=_PAYLOAD_OFFSET + offset, strides=(DATA_PACKET_LENGTH,))
+        if scale:
+            out[name] = raw / scale
+        elif bias:
+            out[name] = raw.astype(out.dtype[name]) + bias
+        else:
+            out[name] = raw
+    return out
+
+
+def decode_packet_block(block, packet_types: Optional[Iterable[int]] = None) -> Dict[int, np.ndarray]:
+    """
+    Giải mã một khối gồm N gói dữ liệu hợp lệ nằm liên tiếp nhau.
+    Args:
+        block: bytes/bytearray/memoryview có độ dài N*11, hoặc mảng uint8 shape (N, 11).
+        packet_types: Chỉ giải mã các loại gói này (None = tất cả loại được hỗ trợ).
+    Returns:
+        Dict packet_type -> mảng structured (theo thứ tự xuất hiện trong khối).
+    Raises:
+        ValueError: Nếu độ dài khối không phải bội số của 11.
+    """
+    if isinstance(block, np.ndarray):
+        data = block.reshape(-1)
+    else:
+        data = np.frombuffer(block, dtype=np.uint8)
+    if data.size % DATA_PACKET_LENGTH:
+        raise ValueError(f"Độ dài khối ({data.size}) không phải bội số của {DATA_PACKET_LENGTH} bytes.")
+    if data.size == 0:
+        return {}
+
+    frames = np.ascontiguousarray(data.reshape(-1, DATA_PACKET_LENGTH))
+    types = frames[:, 1]
+    first_type = int(types[0])
+    if (types == first_type).all():
+        present = [first_type]
+        single_type = True
+    else:
+        present = np.unique(types).tolist()
+        single_type = False
+
+    wanted = set(PACKET_LAYOUTS) if packet_types is None else set(packet_types)
+    result: Dict[int, np.ndarray] = {}
+    for packet_type in present:
+        if packet_type not in wanted:
+            continue
+        if packet_type not in PACKET_LAYOUTS:
+            logger.warning(f"Không có bố cục giải mã cho packet type 0x{packet_type:02X}, bỏ qua.")
+            continue
+        selected = frames if single_type else np.ascontiguousarray(frames[types == packet_type])
+        result[packet_type] = _decode_frames(selected, packet_type)
+    return result
+
+
+def decode_packet_list(packets: List[bytes], packet_types: Optional[Iterable[int]] = None) -> Dict[int, np.ndarray]:
+    """
+    Giải mã danh sách gói tin (ví dụ kết quả của read_raw_packets()) theo lô.
+    Args:
+        packets: Danh sách các gói 11 byte đã xác thực.
+        packet_types: Chỉ giải mã các loại gói này (None = tất cả).
+    Returns:
+        Dict packet_type -> mảng structured.
+    """
+    return decode_packet_block(b''.join(packets), packet_types)
@@ -0,0 +1,71 @@
+"""
+Bộ giải mã từng gói tin dạng bảng cho đường xử lý độ trễ thấp.
+Mỗi loại gói có một struct.Struct biên dịch sẵn, tra trực tiếp theo byte TYPE
+trong danh sách 256 phần tử, kết quả là namedtuple thay vì dict.
+"""
+import struct
+from collections import namedtuple
+from operator import truediv
+from typing import Callable, List, Optional
+
+from src.sensors.hwt905_constants import DATA_PACKET_LENGTH
+from .decoder_factory import PacketDecoderFactory
+from .packet_layouts import PACKET_LAYOUTS
+
+# Ký tự định dạng struct tương ứng với kiểu raw trong PACKET_LAYOUTS
+_STRUCT_CODES = {'u1': 'B', '<i2': 'h', '<u4': 'I'}
+
+# Tên loại gói theo byte TYPE (giống PacketDecoderFactory.get_packet_type_name)
+PACKET_TYPE_NAMES: List[str] = ["UNKNOWN"] * 256
+for _packet_type, _name in PacketDecoderFactory().list_supported_types().items():
+    PACKET_TYPE_NAMES[_packet_type] = _name
+
+# Kiểu bản ghi (namedtuple) cho từng loại gói, ví dụ PACKET_RECORDS[0x51] có acc_x, acc_y, acc_z, temperature
+PACKET_RECORDS = {}
+
+# Hàm giải mã theo byte TYPE: PACKET_UNPACKERS[packet[1]](packet) -> bản ghi, None nếu không hỗ trợ
+PACKET_UNPACKERS: List[Optional[Callable[[bytes], tuple]]] = [None] * 256
+
+
+def _build_unpacker(record_cls, layout) -> Callable[[bytes], tuple]:
+    """Tạo hàm giải mã một gói (11 byte) thành bản ghi từ bố cục payload."""
+    fmt = '<' + ''.join(_STRUCT_CODES[raw_dtype] for _, raw_dtype, _, _, _, _ in layout)
+    unpack_from = struct.Struct(fmt).unpack_from
+    scales = tuple(scale for _, _, _, scale, _, _ in layout)
+    biases = tuple(bias for _, _, _, _, bias, _ in layout)
+    make = record_cls._make
+
+    if all(scales):
+        # Tất cả trường đều chia hệ số (ACC, GYRO, ANGLE, QUATERNION...)
+        return lambda packet: make(map(truediv, unpack_from(packet, 2), scales))
+    if not any(scales) and not any(biases):
+        # Giữ nguyên giá trị nguyên (MAG raw, PORT_STATUS, READ_REGISTER)
+        return lambda packet: make(unpack_from(packet, 2))
+
+    def unpack_mixed(packet: bytes) -> tuple:
+        return make([value / scale if scale else value + bias
+                     for value, scale, bias in zip(unpack_from(packet, 2), scales, biases)])
+    return unpack_mixed
+
+
+for _packet_type, _layout in PACKET_LAYOUTS.items():
+    _record_name = PACKET_TYPE_NAMES[_packet_type].title().replace('_', '') + 'Record'
+    _record_cls = namedtuple(_record_name, [name for name, _, _, _, _, _ in _layout])
+    _record_cls.packet_type = _packet_type
+    PACKET_RECORDS[_packet_type] = _record_cls
+    PACKET_UNPACKERS[_packet_type] = _build_unpacker(_record_cls, _layout)
+
+
+def decode_packet_fast(packet: bytes) -> Optional[tuple]:
+    """
+    Giải mã một gói 11 byte đã xác thực checksum thành bản ghi namedtuple.
+    Args:
+        packet: Gói dữ liệu 11 byte (0x55 TYPE payload CHECKSUM).
+    Returns:
+        Bản ghi của loại gói tương ứng (thuộc tính `packet_type` cho biết loại),
+        hoặc None nếu gói không đúng độ dài hay loại gói không được hỗ trợ.
+    """
+    if len(packet) != DATA_PACKET_LENGTH:
+        return None
+    unpack = PACKET_UNPACKERS[packet[1]]
+    return unpack(packet) if unpack else None
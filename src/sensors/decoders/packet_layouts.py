@@ -0,0 +1,70 @@
+"""
+Bảng mô tả bố cục payload 8 byte của các loại gói dữ liệu HWT905.
+Dùng chung cho các bộ giải mã theo lô (NumPy), giữ đúng tên trường và hệ số
+chia như các decoder trong package này.
+"""
+from typing import Dict, Optional, Tuple
+
+from src.sensors.hwt905_constants import (
+    PACKET_TYPE_TIME, PACKET_TYPE_ACC, PACKET_TYPE_GYRO, PACKET_TYPE_ANGLE,
+    PACKET_TYPE_MAG, PACKET_TYPE_PORT_STATUS, PACKET_TYPE_PRESSURE,
+    PACKET_TYPE_GPS_LONLAT, PACKET_TYPE_GPS_SPEED, PACKET_TYPE_QUATERNION,
+    PACKET_TYPE_GPS_ACCURACY, PACKET_TYPE_READ_REGISTER,
+    SCALE_ACCELERATION, SCALE_ANGULAR_VELOCITY, SCALE_ANGLE, SCALE_TEMPERATURE,
+    SCALE_QUATERNION, SCALE_GPS_ALTITUDE, SCALE_GPS_SPEED, SCALE_GPS_ACCURACY
+)
+
+# Mỗi trường: (tên, kiểu raw little-endian, offset trong payload, hệ số chia, giá trị cộng thêm, kiểu output)
+# Hệ số chia None nghĩa là giữ nguyên giá trị nguyên (không scale).
+FieldSpec = Tuple[str, str, int, Optional[float], int, str]
+
+
+_TEMPERATURE_FIELD: FieldSpec = ("temperature", '<i2', 6, SCALE_TEMPERATURE, 0, '<f4')
+
+
+def _int16_fields(names, scale: Optional[float], first_offset: int = 0) -> Tuple[FieldSpec, ...]:
+    """Tạo các trường int16 liên tiếp bắt đầu từ first_offset; có scale thì output float32."""
+    return tuple((name, '<i2', first_offset + 2 * i, scale, 0, '<f4' if scale else '<i2')
+                 for i, name in enumerate(names))
+
+
+def _xyz_temperature(prefix: str, scale: Optional[float]) -> Tuple[FieldSpec, ...]:
+    """Ba trục int16 (x, y, z) cộng nhiệt độ int16/100."""
+    return _int16_fields((f"{prefix}_x", f"{prefix}_y", f"{prefix}_z"), scale) + (_TEMPERATURE_FIELD,)
+
+
+PACKET_LAYOUTS: Dict[int, Tuple[FieldSpec, ...]] = {
+    PACKET_TYPE_TIME: (
+        ("year", 'u1', 0, None, 2000, '<i2'),
+        ("month", 'u1', 1, None, 0, 'u1'),
+        ("day", 'u1', 2, None, 0, 'u1'),
+        ("hour", 'u1', 3, None, 0, 'u1'),
+        ("minute", 'u1', 4, None, 0, 'u1'),
+        ("second", 'u1', 5, None, 0, 'u1'),
+        ("millisecond", '<i2', 6, None, 0, '<i2'),
+    ),
+    PACKET_TYPE_ACC: _xyz_temperature("acc", SCALE_ACCELERATION),
+    PACKET_TYPE_GYRO: _xyz_temperature("gyro", SCALE_ANGULAR_VELOCITY),
+    PACKET_TYPE_ANGLE: _int16_fields(("angle_roll", "angle_pitch", "angle_yaw"), SCALE_ANGLE)
+        + (_TEMPERATURE_FIELD,),
+    PACKET_TYPE_MAG: _xyz_temperature("mag", None),
+    PACKET_TYPE_PORT_STATUS: _int16_fields(("d0_status", "d1_status", "d2_status", "d3_status"), None),
+    PACKET_TYPE_PRESSURE: (
+        ("pressure", '<u4', 0, None, 0, '<u4'),
+        ("height", '<u4', 4, SCALE_GPS_ALTITUDE, 0, '<f8'),
+    ),
+    # Kinh độ/vĩ độ cần float64: float32 chỉ có ~7 chữ số có nghĩa
+    PACKET_TYPE_GPS_LONLAT: (
+        ("gps_longitude", '<u4', 0, 10_000_000.0, 0, '<f8'),
+        ("gps_latitude", '<u4', 4, 10_000_000.0, 0, '<f8'),
+    ),
+    PACKET_TYPE_GPS_SPEED: (
+        ("gps_ground_speed", '<u4', 0, SCALE_GPS_SPEED, 0, '<f8'),
+        ("gps_altitude", '<i2', 4, SCALE_GPS_ALTITUDE, 0, '<f4'),
+        ("gps_heading", '<i2', 6, 100.0, 0, '<f4'),
+    ),
+    PACKET_TYPE_QUATERNION: _int16_fields(("q0", "q1", "q2", "q3"), SCALE_QUATERNION),
+    PACKET_TYPE_GPS_ACCURACY: _int16_fields(("gps_num_satellites",), None)
+        + _int16_fields(("gps_pdop", "gps_hdop", "gps_vdop"), SCALE_GPS_ACCURACY, first_offset=2),
+    PACKET_TYPE_READ_REGISTER: _int16_fields(("reg1_value", "reg2_value", "reg3_value", "reg4_value"), None),
+}
@@ -178,6 +178,19 @@ BAUD_RATE_230400 = 0x0007
 BAUD_RATE_460800 = 0x0008 # Chỉ hỗ trợ trên WT931/JY931/HWT606/HWT906
 BAUD_RATE_921600 = 0x0009 # Chỉ hỗ trợ trên WT931/JY931/HWT606/HWT906
 
+# Tốc độ baud (bps) -> mã ghi vào thanh ghi BAUD
+BAUD_RATE_CODES = {
+    4800: BAUD_RATE_4800,
+    9600: BAUD_RATE_9600,
+    19200: BAUD_RATE_19200,
+    38400: BAUD_RATE_38400,
+    57600: BAUD_RATE_57600,
+    115200: BAUD_RATE_115200,
+    230400: BAUD_RATE_230400,
+    460800: BAUD_RATE_460800,
+    921600: BAUD_RATE_921600,
+}
+
 # ==============================================================================
 # 5. MÃ CÀI ĐẶT TỐC ĐỘ OUTPUT (Giá trị 16-bit để ghi vào thanh ghi RRATE, REG_RRATE 0x03)
 # Giá trị thực tế được ghi là phần [3:0] của dữ liệu 16-bit.
@@ -8,7 +8,9 @@ và chuyển đổi raw data thành giá trị có ý nghĩa.
 import serial
 import time
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Iterable
+
+import numpy as np
 
 from src.sensors.hwt905_constants import (
     DATA_HEADER_BYTE,
@@ -16,24 +18,45 @@ from src.sensors.hwt905_constants import (
     DEFAULT_SERIAL_TIMEOUT, DEFAULT_BAUDRATE
 )
 from src.sensors.hwt905_protocol import calculate_checksum, is_valid_data_packet
-from src.sensors.decoders import PacketDecoderFactory
+from src.sensors.decoders import PacketDecoderFactory, decode_packet_list, decode_packet_fast, PACKET_TYPE_NAMES
+from src.sensors.packet_framer import PacketFramer
 
 logger = logging.getLogger(__name__)
 
+# Chế độ đọc serial
+READ_MODE_POLL = "poll"    # Kiểm tra in_waiting liên tục, luồng đọc tự ngủ 0.1 ms khi không có dữ liệu
+READ_MODE_EVENT = "event"  # Chặn trong select() của pyserial cho đến khi có byte đến
+SUPPORTED_READ_MODES = (READ_MODE_POLL, READ_MODE_EVENT)
+
+DEFAULT_READ_MIN_CHUNK_BYTES = DATA_PACKET_LENGTH
+DEFAULT_READ_LATENCY_MS = 20.0
+
 class HWT905DataDecoder:
     """
     Lớp để đọc và giải mã các gói dữ liệu từ cảm biến Witmotion HWT905.
     Lớp này không quản lý kết nối serial, nó chỉ sử dụng một instance đã có.
     """
 
-    def __init__(self, debug: bool = False, ser_instance: Optional[serial.Serial] = None):
+    def __init__(self, debug: bool = False, ser_instance: Optional[serial.Serial] = None,
+                 read_mode: str = READ_MODE_POLL,
+                 read_min_chunk_bytes: int = DEFAULT_READ_MIN_CHUNK_BYTES,
+                 read_latency_ms: float = DEFAULT_READ_LATENCY_MS):
         """
         Khởi tạo bộ giải mã dữ liệu HWT905.
         Args:
             debug: Kích hoạt logging ở mức DEBUG nếu True.
             ser_instance: Một instance serial.Serial đã được khởi tạo và kết nối.
+            read_mode: "poll" (mặc định) hoặc "event". Ở chế độ "event", lệnh đọc chặn
+                       trên file descriptor của cổng serial cho đến khi có dữ liệu.
+            read_min_chunk_bytes: Số byte tối thiểu mỗi lần đọc ở chế độ "event".
+            read_latency_ms: Thời gian chờ tối đa (ms) của một lần đọc ở chế độ "event".
         """
-        self.ser = ser_instance
+        if read_mode not in SUPPORTED_READ_MODES:
+            raise ValueError(f"read_mode không hợp lệ: {read_mode}. Hỗ trợ: {SUPPORTED_READ_MODES}")
+        self.read_mode = read_mode
+        self.read_min_chunk_bytes = max(1, int(read_min_chunk_bytes))
+        self.read_timeout_s = max(0.001, read_latency_ms / 1000.0)
+
         self.decoder_factory = PacketDecoderFactory()
 
         if debug:
@@ -42,10 +65,21 @@ class HWT905DataDecoder:
             if logger.level > logging.INFO:
                  logger.setLevel(logging.INFO)
 
-        self._packet_buffer = b''
+        self._framer = PacketFramer()
+        # time.monotonic() khi lần đọc serial gần nhất trả về (mốc arrival của truy vết)
+        self.last_fill_time = 0.0
         self._last_serial_error_time = 0
         self._serial_error_log_delay = 5  # Chỉ log lỗi serial mỗi 5 giây
 
+        self.ser = ser_instance
+        if ser_instance is not None and self.is_event_driven:
+            ser_instance.timeout = self.read_timeout_s
+
+    @property
+    def is_event_driven(self) -> bool:
+        """True nếu lệnh đọc tự chặn chờ dữ liệu (luồng gọi không cần ngủ)."""
+        return self.read_mode == READ_MODE_EVENT
+
     def set_ser_instance(self, ser_instance: Optional[serial.Serial]):
         """
         Thiết lập hoặc cập nhật instance serial được sử dụng bởi decoder.
@@ -53,24 +87,31 @@ class HWT905DataDecoder:
             ser_instance: Instance serial mới, hoặc None để ngắt kết nối.
         """
         self.ser = ser_instance
-        self._packet_buffer = b'' # Xóa buffer khi có kết nối mới
+        self._framer.reset() # Xóa buffer khi có kết nối mới
+        if ser_instance is not None and self.is_event_driven:
+            # Timeout của read() chính là độ trễ tối đa khi dữ liệu đến ít hơn min chunk
+            ser_instance.timeout = self.read_timeout_s
         logger.info(f"Data Decoder đã được cập nhật với instance serial mới: {'kết nối' if ser_instance else 'ngắt kết nối'}")
 
-    def read_raw_packet(self) -> Optional[bytes]:
+    def _fill_buffer(self) -> bool:
         """
-        Đọc cho đến khi tìm thấy một gói dữ liệu 11-byte hoàn chỉnh từ cổng serial.
-        Sử dụng buffer để xử lý các byte nhận được không theo gói hoàn chỉnh.
+        Đọc các byte đang chờ từ cổng serial vào buffer của framer.
+        Khi gặp lỗi serial/I-O, cổng được đóng và self.ser bị xóa để lớp quản lý kết nối lại.
         Returns:
-            Một gói dữ liệu 11-byte thô, hoặc None nếu không có dữ liệu mới hoặc có lỗi.
+            False nếu không có kết nối hoặc gặp lỗi khi đọc, True nếu ngược lại.
         """
         if not self.ser or not self.ser.is_open:
             # Không log lỗi ở đây để tránh spam, ConnectionManager sẽ xử lý
-            return None
+            return False
 
         try:
-            if self.ser.in_waiting > 0:
-                new_bytes = self.ser.read(self.ser.in_waiting)
-                self._packet_buffer += new_bytes
+            # Đọc vào ring buffer của framer (readinto), không nối bytes mỗi lần đọc
+            if self.is_event_driven and self._framer.buffered() < DATA_PACKET_LENGTH:
+                # Chưa đủ một gói tin: chặn chờ dữ liệu. Rút phích cắm sẽ làm pyserial
+                # ném SerialException ("device reports readiness to read but returned no data")
+                self._framer.fill_blocking(self.ser, self.read_min_chunk_bytes)
+            else:
+                self._framer.fill_from(self.ser)
         except serial.SerialException as e:
             # Chỉ log lỗi định kỳ để tránh spam
             current_time = time.time()
@@ -83,8 +124,8 @@ class HWT905DataDecoder:
             except Exception:
                 pass # Bỏ qua lỗi khi đóng cổng đã lỗi
             self.ser = None 
-            self._packet_buffer = b''
-            return None
+            self._framer.reset()
+            return False
         except OSError as e:
             # Xử lý lỗi I/O (bao gồm Errno 5) với throttling tương tự như SerialException
             current_time = time.time()
@@ -97,50 +138,54 @@ class HWT905DataDecoder:
             except Exception:
                 pass # Bỏ qua lỗi khi đóng cổng đã lỗi
             self.ser = None 
-            self._packet_buffer = b''
-            return None
+            self._framer.reset()
+            return False
         except Exception as e:
             # Chỉ log lỗi không xác định với throttling
             current_time = time.time()
             if current_time - self._last_serial_error_time > self._serial_error_log_delay:
                 logger.error(f"Lỗi không xác định khi đọc dữ liệu: {e}")
                 self._last_serial_error_time = current_time
+            return False
+        self.last_fill_time = time.monotonic()
+        return True
+
+    def read_raw_packet(self) -> Optional[bytes]:
+        """
+        Đọc cho đến khi tìm thấy một gói dữ liệu 11-byte hoàn chỉnh từ cổng serial.
+        Các byte được đọc vào ring buffer của PacketFramer để xử lý các byte
+        nhận được không theo gói hoàn chỉnh mà không phải sao chép lại buffer.
+        Returns:
+            Một gói dữ liệu 11-byte thô, hoặc None nếu không có dữ liệu mới hoặc có lỗi.
+        """
+        if not self._fill_buffer():
             return None
-        
-        # Xử lý buffer để tìm một gói tin hoàn chỉnh
-        while True:
-            if len(self._packet_buffer) < DATA_PACKET_LENGTH:
-                # Không đủ dữ liệu trong buffer để tạo thành một gói tin, thoát ra và chờ thêm
-                return None
-
-            header_index = self._packet_buffer.find(bytes([DATA_HEADER_BYTE]))
-            if header_index == -1:
-                # Không tìm thấy header, buffer này là vô giá trị
-                logger.debug(f"Không tìm thấy header trong buffer. Đã xóa {len(self._packet_buffer)} bytes.")
-                self._packet_buffer = b''
-                return None
-            
-            if header_index > 0:
-                # Dọn dẹp các byte rác trước header
-                garbage_bytes = self._packet_buffer[:header_index]
-                self._packet_buffer = self._packet_buffer[header_index:]
-                logger.warning(f"Tìm thấy {len(garbage_bytes)} byte rác trước header: {garbage_bytes.hex().upper()}. Đã xóa.")
-                continue # Bắt đầu lại vòng lặp với buffer đã được dọn dẹp
-
-            # Tại đây, buffer bắt đầu bằng một header và đủ dài
-            potential_packet = self._packet_buffer[:DATA_PACKET_LENGTH]
-            
-            # Kiểm tra checksum ngay tại đây để loại bỏ gói tin không hợp lệ sớm
-            if is_valid_data_packet(potential_packet):
-                self._packet_buffer = self._packet_buffer[DATA_PACKET_LENGTH:] # Xóa gói tin đã xử lý
-                return potential_packet # Trả về gói tin hợp lệ
-            else:
-                # Gói tin không hợp lệ, xóa header bị lỗi và thử lại
-                logger.debug(f"Gói tin không hợp lệ (checksum sai): {potential_packet.hex().upper()}. Bỏ qua.")
-                self._packet_buffer = self._packet_buffer[1:]
-                continue
-        
-        return None
+        # Tách gói tin hoàn chỉnh tiếp theo trong buffer
+        return self._framer.next_packet()
+
+    def read_raw_packets(self) -> List[bytes]:
+        """
+        Đọc các byte đang chờ và tách TẤT CẢ các gói tin hoàn chỉnh, hợp lệ checksum
+        trong buffer trong một lần gọi.
+        Returns:
+            Danh sách các gói dữ liệu 11-byte thô (rỗng nếu chưa có gói nào hoặc có lỗi).
+        """
+        if not self._fill_buffer():
+            return []
+        return self._framer.drain()
+
+    def set_packet_filter(self, type_mask: Optional[bytes]):
+        """
+        Chỉ nhận các loại gói được đánh dấu trong type_mask (256 byte, xem PacketRouter.type_mask).
+        Các gói khác bị framer đếm và bỏ qua trước khi sao chép hay giải mã.
+        """
+        self._framer.set_type_filter(type_mask)
+
+    def get_framer_stats(self) -> Dict[str, int]:
+        """
+        Trả về thống kê của framer (số gói hợp lệ, byte rác, lỗi checksum).
+        """
+        return self._framer.get_stats()
 
     def decode_raw_packet(self, raw_packet: bytes) -> Dict[str, Any]:
         """
@@ -159,6 +204,32 @@ class HWT905DataDecoder:
             }
         return self._decode_packet(raw_packet)
 
+    def decode_raw_packet_fast(self, raw_packet: bytes) -> Optional[tuple]:
+        """
+        Giải mã nhanh một gói đã xác thực bằng struct biên dịch sẵn.
+        Args:
+            raw_packet (bytes): Gói dữ liệu 11 byte thô đã được xác thực.
+        Returns:
+            Bản ghi namedtuple (ví dụ AccelerationRecord(acc_x, acc_y, acc_z, temperature)),
+            hoặc None nếu loại gói không được hỗ trợ.
+        """
+        return decode_packet_fast(raw_packet)
+
+    def decode_raw_packets(self, raw_packets: List[bytes],
+                           packet_types: Optional[Iterable[int]] = None) -> Dict[int, np.ndarray]:
+        """
+        Giải mã theo lô nhiều gói tin đã xác thực (ví dụ kết quả của read_raw_packets()).
+        Args:
+            raw_packets: Danh sách các gói dữ liệu 11-byte thô.
+            packet_types: Chỉ giải mã các loại gói này (None = tất cả).
+        Returns:
+            Dict packet_type -> mảng NumPy structured (ví dụ ACC có các cột float32
+            acc_x, acc_y, acc_z, temperature), theo thứ tự nhận được.
+        """
+        if not raw_packets:
+            return {}
+        return decode_packet_list(raw_packets, packet_types)
+
     def _decode_packet(self, packet_bytes: bytes) -> Dict[str, Any]:
         """
         Giải mã một gói dữ liệu hoàn chỉnh và hợp lệ.
@@ -174,7 +245,7 @@ class HWT905DataDecoder:
             "raw_packet": packet_bytes,
             "header": packet_bytes[0],
             "type": packet_type,
-            "type_name": self.decoder_factory.get_packet_type_name(packet_type),
+            "type_name": PACKET_TYPE_NAMES[packet_type],
             "payload": payload,
             "checksum": packet_bytes[-1]
         }
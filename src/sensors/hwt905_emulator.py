@@ -0,0 +1,403 @@
+# src/sensors/hwt905_emulator.py
+
+"""
+Bộ giả lập cảm biến HWT905 trên một pseudo-terminal (pty).
+Phát các gói dữ liệu đúng định dạng (0x55 TYPE payload CHECKSUM) với tần số cấu hình được,
+có thể chèn nhiễu, byte rác và lỗi checksum, hoặc phát lại file dữ liệu thô đã ghi.
+Trả lời các lệnh đọc/ghi thanh ghi và mở khóa (FF AA ADDR DATAL DATAH) giống cảm biến thật,
+nên SensorConnectionManager và HWT905UnifiedConfigManager dùng được mà không cần phần cứng.
+"""
+import errno
+import logging
+import math
+import os
+import random
+import select
+import struct
+import termios
+import threading
+import time
+import tty
+from typing import Dict, Iterable, Optional
+
+from src.sensors.hwt905_constants import (
+    COMMAND_HEADER_BYTE1, COMMAND_HEADER_BYTE2, DATA_PACKET_LENGTH,
+    PACKET_TYPE_TIME, PACKET_TYPE_ACC, PACKET_TYPE_GYRO, PACKET_TYPE_ANGLE,
+    PACKET_TYPE_MAG, PACKET_TYPE_QUATERNION, PACKET_TYPE_READ_REGISTER,
+    REG_SAVE, REG_RSW, REG_RRATE, REG_BAUD, REG_READADDR, REG_KEY, REG_VERSION,
+    UNLOCK_KEY_VALUE_DATAL, UNLOCK_KEY_VALUE_DATAH,
+    SAVE_CONFIG_VALUE, FACTORY_RESET_VALUE, RESTART_SENSOR_VALUE,
+    DEFAULT_RSW_VALUE, RATE_OUTPUT_10HZ, BAUD_RATE_9600, BAUD_RATE_CODES,
+    SCALE_ACCELERATION, SCALE_ANGULAR_VELOCITY, SCALE_ANGLE, SCALE_TEMPERATURE,
+    SCALE_QUATERNION
+)
+from src.sensors.hwt905_protocol import create_data_packet
+from src.storage.raw_capture import SEGMENT_MAGIC, RawCaptureReader
+
+logger = logging.getLogger(__name__)
+
+# Mã RRATE -> tần số output (Hz); 0x0C (single) và 0x0D (no return) dừng phát dữ liệu
+RRATE_CODE_TO_HZ: Dict[int, float] = {
+    0x01: 0.1, 0x02: 0.5, 0x03: 1.0, 0x04: 2.0, 0x05: 5.0, 0x06: 10.0,
+    0x07: 20.0, 0x08: 50.0, 0x09: 100.0, 0x0A: 125.0, 0x0B: 200.0,
+    0x0C: 0.0, 0x0D: 0.0,
+}
+
+# Cảm biến tự khóa lại sau 10 giây kể từ lệnh mở khóa
+UNLOCK_TIMEOUT_S = 10.0
+# Số gói tối đa ghi vào pty trong một lần (giữ độ trễ lệnh đọc thanh ghi thấp ở tần số cao)
+MAX_FRAMES_PER_WRITE = 256
+
+# Hằng số tốc độ của termios -> bps (baudrate bên đọc đặt cho pty)
+TERMIOS_SPEED_TO_BPS: Dict[int, int] = {
+    getattr(termios, f"B{bps}"): bps for bps in BAUD_RATE_CODES if hasattr(termios, f"B{bps}")
+}
+
+
+def rsw_for_packet_types(packet_types: Iterable[int]) -> int:
+    """Giá trị thanh ghi RSW tương ứng với các loại gói (bit i <-> loại 0x50 + i)."""
+    rsw = 0
+    for packet_type in packet_types:
+        rsw |= 1 << (packet_type - PACKET_TYPE_TIME)
+    return rsw
+
+
+def packet_types_for_rsw(rsw: int) -> list:
+    """Các loại gói được bật trong giá trị RSW."""
+    return [PACKET_TYPE_TIME + bit for bit in range(11) if rsw & (1 << bit)]
+
+
+def _clip_int16(value: float) -> int:
+    return max(-32768, min(32767, int(round(value))))
+
+
+class HWT905Emulator:
+    """
+    Cảm biến HWT905 giả lập trên pty.
+    Cổng phía "slave" (ví dụ /dev/pts/5) được tạo symlink tại link_path để
+    SensorConnectionManager tìm thấy qua uart_port_pattern (ví dụ /tmp/ttyHWT905*).
+    Tốc độ baud của pty không có ý nghĩa vật lý: mặc định bộ giả lập trả lời ở mọi baudrate;
+    với emulate_baud=True, khi baudrate bên đọc đặt cho cổng khác thanh ghi BAUD thì dữ liệu
+    phát ra bị vỡ khung (byte ngẫu nhiên) và lệnh nhận được bị bỏ qua, giống UART thật.
+    """
+
+    def __init__(self, link_path: Optional[str] = None, rate_hz: float = 200.0,
+                 packet_types: Iterable[int] = (PACKET_TYPE_ACC,),
+                 noise_g: float = 0.01, signal_amplitude_g: float = 0.05,
+                 signal_freq_hz: float = 2.0, garbage_ratio: float = 0.0,
+                 checksum_error_ratio: float = 0.0, replay_path: Optional[str] = None,
+                 replay_loop: bool = True, seed: Optional[int] = None,
+                 baudrate: int = 115200, emulate_baud: bool = False):
+        """
+        Args:
+            link_path: Đường dẫn symlink tới pty (None = không tạo symlink).
+            rate_hz: Số gói dữ liệu mỗi giây cho mỗi loại gói (10 Hz đến vài kHz).
+            packet_types: Các loại gói được phát (byte TYPE).
+            noise_g: Độ lệch chuẩn nhiễu Gauss cộng vào gia tốc (g).
+            signal_amplitude_g: Biên độ dao động hình sin của gia tốc (g).
+            signal_freq_hz: Tần số dao động hình sin (Hz).
+            garbage_ratio: Xác suất chèn 1-10 byte rác trước mỗi gói.
+            checksum_error_ratio: Xác suất làm sai checksum của một gói.
+            replay_path: File dữ liệu thô (byte nhận từ cảm biến, hoặc segment .hwtraw của RawCaptureWriter)
+                         để phát lại thay cho tín hiệu tổng hợp.
+            replay_loop: Phát lại từ đầu khi hết file.
+            seed: Hạt giống ngẫu nhiên để luồng dữ liệu tái lập được.
+            baudrate: Baudrate ban đầu của cảm biến (bps, giá trị thanh ghi BAUD).
+            emulate_baud: Giả lập sai baudrate khi bên đọc mở cổng ở baudrate khác.
+        """
+        self.link_path = link_path
+        self.rate_hz = float(rate_hz)
+        self.noise_g = noise_g
+        self.signal_amplitude_g = signal_amplitude_g
+        self.signal_freq_hz = signal_freq_hz
+        self.garbage_ratio = garbage_ratio
+        self.checksum_error_ratio = checksum_error_ratio
+        self.replay_loop = replay_loop
+        self._rng = random.Random(seed)
+
+        self.replay_data = b''
+        if replay_path:
+            with open(replay_path, 'rb') as f:
+                self.replay_data = f.read()
+            if self.replay_data.startswith(SEGMENT_MAGIC):
+                # Segment của RawCaptureWriter: chỉ lấy các gói, bỏ header của block
+                self.replay_data = RawCaptureReader(replay_path).read_bytes()
+            if not self.replay_data:
+                raise ValueError(f"File phát lại rỗng: {replay_path}")
+        self._replay_pos = 0
+
+        self.registers: Dict[int, int] = {}
+        self._factory_defaults()
+        self.registers[REG_RSW] = rsw_for_packet_types(packet_types)
+        self.registers[REG_BAUD] = BAUD_RATE_CODES[baudrate]
+        self.emulate_baud = emulate_baud
+        self._code_to_bps = {code: bps for bps, code in BAUD_RATE_CODES.items()}
+        self.registers[REG_RRATE] = min(RRATE_CODE_TO_HZ, key=lambda code: abs(RRATE_CODE_TO_HZ[code] - rate_hz))
+        self.output_types = packet_types_for_rsw(self.registers[REG_RSW])
+        self._unlocked_until = 0.0
+        # Giờ đồng hồ cảm biến tại chu kỳ 0 (gói TIME = mốc này + chỉ số chu kỳ / tần số)
+        self._clock_origin = time.time()
+
+        self.master_fd: Optional[int] = None
+        self.slave_fd: Optional[int] = None
+        self.port: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = threading.Event()
+        self._command_buffer = bytearray()
+
+        self.frames_sent = 0
+        self.bytes_dropped = 0
+        self.commands_received = 0
+
+    def _factory_defaults(self):
+        """Giá trị thanh ghi sau Factory Reset (RSW 0x001E, 10 Hz, 9600 bps)."""
+        self.registers = {REG_RSW: DEFAULT_RSW_VALUE, REG_RRATE: RATE_OUTPUT_10HZ,
+                          REG_BAUD: BAUD_RATE_9600, REG_VERSION: 0x1234}
+
+    # ------------------------------------------------------------------
+    # Vòng đời
+    # ------------------------------------------------------------------
+    def start(self) -> str:
+        """
+        Tạo pty, symlink và luồng phát dữ liệu.
+        Returns:
+            Đường dẫn cổng để mở bằng serial.Serial (symlink nếu có, ngược lại /dev/pts/N).
+        """
+        self.master_fd, self.slave_fd = os.openpty()
+        # Chế độ raw: không echo lệnh, không xử lý dòng
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port = os.ttyname(self.slave_fd)
+
+        if self.link_path:
+            if os.path.islink(self.link_path):
+                os.unlink(self.link_path)
+            os.symlink(self.port, self.link_path)
+
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="HWT905Emulator")
+        self._thread.start()
+        logger.info(f"Bộ giả lập HWT905 đang chạy tại {self.link_path or self.port} "
+                    f"({self.port}), {self.rate_hz:g} Hz, loại gói "
+                    f"{[hex(t) for t in self.output_types]}"
+                    f"{', phát lại ' + str(len(self.replay_data)) + ' bytes' if self.replay_data else ''}.")
+        return self.link_path or self.port
+
+    def stop(self):
+        """Dừng luồng phát, đóng pty và xóa symlink."""
+        self._running.clear()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self.link_path and os.path.islink(self.link_path):
+            os.unlink(self.link_path)
+        for fd in (self.master_fd, self.slave_fd):
+            if fd is not None:
+                os.close(fd)
+        self.master_fd = self.slave_fd = None
+        logger.info(f"Đã dừng bộ giả lập HWT905 ({self.frames_sent} gói đã gửi, "
+                    f"{self.bytes_dropped} bytes bị bỏ do bên đọc không kịp).")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "frames_sent": self.frames_sent,
+            "bytes_dropped": self.bytes_dropped,
+            "commands_received": self.commands_received,
+        }
+
+    # ------------------------------------------------------------------
+    # Tạo dữ liệu
+    # ------------------------------------------------------------------
+    def _payload(self, packet_type: int, t: float) -> bytes:
+        """Payload 8 byte của một loại gói tại thời điểm t (giây kể từ khi bắt đầu)."""
+        gauss = self._rng.gauss
+        temperature = _clip_int16(25.0 * SCALE_TEMPERATURE)
+        if packet_type == PACKET_TYPE_ACC:
+            wave = self.signal_amplitude_g * math.sin(2 * math.pi * self.signal_freq_hz * t)
+            acc = (wave + gauss(0, self.noise_g), 0.5 * wave + gauss(0, self.noise_g),
+                   1.0 + gauss(0, self.noise_g))
+            return struct.pack('<hhhh', *(_clip_int16(a * SCALE_ACCELERATION) for a in acc), temperature)
+        if packet_type == PACKET_TYPE_GYRO:
+            return struct.pack('<hhhh', *(_clip_int16(gauss(0, 0.5) * SCALE_ANGULAR_VELOCITY) for _ in range(3)),
+                               temperature)
+        if packet_type == PACKET_TYPE_ANGLE:
+            roll = 2.0 * math.sin(2 * math.pi * 0.1 * t)
+            return struct.pack('<hhhh', _clip_int16(roll * SCALE_ANGLE), 0, 0, temperature)
+        if packet_type == PACKET_TYPE_MAG:
+            return struct.pack('<hhhh', *(_clip_int16(gauss(0, 20)) for _ in range(3)), temperature)
+        if packet_type == PACKET_TYPE_QUATERNION:
+            return struct.pack('<hhhh', _clip_int16(SCALE_QUATERNION), 0, 0, 0)
+        if packet_type == PACKET_TYPE_TIME:
+            now = self._clock_origin + t
+            tm = time.localtime(now)
+            return struct.pack('<BBBBBBH', tm.tm_year - 2000, tm.tm_mon, tm.tm_mday, tm.tm_hour,
+                               tm.tm_min, tm.tm_sec, int((now % 1) * 1000))
+        return bytes(8)
+
+    def _frame(self, packet_type: int, t: float) -> bytes:
+        """Một gói hoàn chỉnh, có thể kèm byte rác phía trước hoặc checksum sai."""
+        packet = create_data_packet(packet_type, self._payload(packet_type, t))
+        if self.checksum_error_ratio and self._rng.random() < self.checksum_error_ratio:
+            packet = packet[:-1] + bytes([(packet[-1] + 1) & 0xFF])
+        if self.garbage_ratio and self._rng.random() < self.garbage_ratio:
+            garbage = bytes(self._rng.randrange(256) for _ in range(self._rng.randint(1, 10)))
+            packet = garbage + packet
+        return packet
+
+    def _generate(self, first_index: int, count: int) -> bytes:
+        """Dữ liệu cho các chu kỳ first_index .. first_index + count - 1."""
+        if self.replay_data:
+            return self._next_replay_bytes(count * len(self.output_types or (0,)) * DATA_PACKET_LENGTH)
+        out = bytearray()
+        for index in range(first_index, first_index + count):
+            t = index / self.rate_hz
+            for packet_type in self.output_types:
+                out += self._frame(packet_type, t)
+        return bytes(out)
+
+    def _next_replay_bytes(self, size: int) -> bytes:
+        """Lấy size byte tiếp theo từ file phát lại (quay vòng nếu replay_loop)."""
+        out = bytearray()
+        while len(out) < size:
+            if self._replay_pos >= len(self.replay_data):
+                if not self.replay_loop:
+                    break
+                self._replay_pos = 0
+            end = min(len(self.replay_data), self._replay_pos + size - len(out))
+            out += self.replay_data[self._replay_pos:end]
+            self._replay_pos = end
+        return bytes(out)
+
+    # ------------------------------------------------------------------
+    # Lệnh cấu hình
+    # ------------------------------------------------------------------
+    def _baud_matches(self) -> bool:
+        """Baudrate bên đọc đặt cho pty có khớp thanh ghi BAUD không (luôn True nếu không giả lập baud)."""
+        if not self.emulate_baud:
+            return True
+        host_bps = TERMIOS_SPEED_TO_BPS.get(termios.tcgetattr(self.master_fd)[5])
+        return host_bps == self._code_to_bps.get(self.registers[REG_BAUD])
+
+    def _handle_commands(self, data: bytes):
+        """Tách các lệnh 5 byte FF AA ADDR DATAL DATAH từ dữ liệu nhận được và thực thi."""
+        if not self._baud_matches():
+            # Sai baudrate: cảm biến không nhận ra lệnh nào
+            self._command_buffer.clear()
+            return
+        buf = self._command_buffer
+        buf += data
+        while len(buf) >= 5:
+            start = buf.find(bytes([COMMAND_HEADER_BYTE1, COMMAND_HEADER_BYTE2]))
+            if start < 0:
+                # Giữ lại byte cuối phòng khi đó là 0xFF của lệnh tiếp theo
+                del buf[:-1]
+                return
+            if start:
+                del buf[:start]
+                continue
+            if len(buf) < 5:
+                return
+            _, _, register, data_low, data_high = buf[:5]
+            del buf[:5]
+            self.commands_received += 1
+            self._execute(register, (data_high << 8) | data_low)
+
+    def _execute(self, register: int, value: int):
+        if register == REG_READADDR:
+            # Trả về 4 thanh ghi liên tiếp bắt đầu từ địa chỉ yêu cầu
+            address = value & 0xFF
+            payload = struct.pack('<HHHH', *(self.registers.get(address + i, 0) for i in range(4)))
+            self._write(create_data_packet(PACKET_TYPE_READ_REGISTER, payload), force=True)
+            logger.debug(f"[Emulator] Đọc thanh ghi 0x{address:02X} = 0x{self.registers.get(address, 0):04X}")
+            return
+
+        if register == REG_KEY:
+            if value == (UNLOCK_KEY_VALUE_DATAH << 8) | UNLOCK_KEY_VALUE_DATAL:
+                self._unlocked_until = time.monotonic() + UNLOCK_TIMEOUT_S
+                logger.debug("[Emulator] Đã mở khóa cấu hình.")
+            return
+
+        if time.monotonic() > self._unlocked_until:
+            logger.debug(f"[Emulator] Bỏ qua lệnh ghi 0x{register:02X} vì cảm biến đang khóa.")
+            return
+
+        if register == REG_SAVE:
+            if value == FACTORY_RESET_VALUE:
+                self._factory_defaults()
+                self.output_types = packet_types_for_rsw(self.registers[REG_RSW])
+                self.rate_hz = RRATE_CODE_TO_HZ[self.registers[REG_RRATE]]
+            elif value not in (SAVE_CONFIG_VALUE, RESTART_SENSOR_VALUE):
+                return
+            self._unlocked_until = 0.0
+            logger.debug(f"[Emulator] Lệnh SAVE 0x{value:04X}.")
+            return
+
+        self.registers[register] = value
+        if register == REG_RSW:
+            self.output_types = packet_types_for_rsw(value)
+        elif register == REG_RRATE and value in RRATE_CODE_TO_HZ:
+            self.rate_hz = RRATE_CODE_TO_HZ[value]
+        logger.debug(f"[Emulator] Ghi thanh ghi 0x{register:02X} = 0x{value:04X}")
+
+    # ------------------------------------------------------------------
+    # Vòng lặp phát
+    # ------------------------------------------------------------------
+    def _write(self, data: bytes, force: bool = False):
+        """Ghi vào pty; nếu bên đọc không kịp lấy dữ liệu, phần thừa bị bỏ như UART thật bị tràn."""
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self.master_fd, view)
+            except BlockingIOError:
+                if not force:
+                    self.bytes_dropped += len(view)
+                    return
+                select.select([], [self.master_fd], [], 0.01)
+                continue
+            view = view[written:]
+
+    def _run(self):
+        start_time = time.monotonic()
+        self._clock_origin = time.time()
+        rate_hz = self.rate_hz
+        index = 0
+        while self._running.is_set():
+            if self.rate_hz != rate_hz:
+                # Tần số thay đổi qua thanh ghi RRATE: bắt đầu lại lịch phát từ thời điểm hiện tại
+                rate_hz, start_time, index = self.rate_hz, time.monotonic(), 0
+                self._clock_origin = time.time()
+
+            now = time.monotonic()
+            if rate_hz > 0 and self.output_types:
+                due = min(int((now - start_time) * rate_hz) + 1 - index, MAX_FRAMES_PER_WRITE)
+                if due > 0:
+                    data = self._generate(index, due)
+                    if not self._baud_matches():
+                        data = self._rng.randbytes(len(data))
+                    self._write(data)
+                    self.frames_sent += len(data) // DATA_PACKET_LENGTH if self.replay_data \
+                        else due * len(self.output_types)
+                    index += due
+                timeout = max(0.0, start_time + index / rate_hz - time.monotonic())
+            else:
+                timeout = 0.05
+
+            try:
+                readable, _, _ = select.select([self.master_fd], [], [], timeout)
+                if readable:
+                    self._handle_commands(os.read(self.master_fd, 256))
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                # EIO: chưa có ai mở phía slave, hoặc bên đọc vừa đóng cổng
+                if e.errno != errno.EIO:
+                    logger.error(f"[Emulator] Lỗi pty: {e}")
+                    break
+                time.sleep(timeout)
@@ -3,6 +3,9 @@ Chứa các hàm để mã hóa (tạo) các gói lệnh gửi đến cảm bi
 và xử lý checksum cho cả gói lệnh và gói dữ liệu.
 """
 import logging
+from typing import Tuple
+
+import numpy as np
 
 from src.sensors.hwt905_constants import (
     COMMAND_HEADER_BYTE1, COMMAND_HEADER_BYTE2,
@@ -78,4 +81,86 @@ def is_valid_data_packet(packet_bytes: bytes) -> bool:
         logger.debug(f"Lỗi checksum: Tính toán {hex(calculated_checksum)}, nhận được {hex(packet_bytes[-1])}. Gói: {packet_bytes.hex()}")
         return False
         
-    return True
\ No newline at end of file
+    return True
+
+def create_data_packet(packet_type: int, payload: bytes) -> bytes:
+    """
+    Tạo một gói dữ liệu 11-byte (55 TYPE PAYLOAD CHECKSUM) giống như cảm biến gửi lên.
+    Hữu ích cho việc giả lập cảm biến và benchmark.
+    Args:
+        packet_type (int): Mã loại gói tin (ví dụ PACKET_TYPE_ACC).
+        payload (bytes): 8 byte payload.
+    Returns:
+        bytes: Gói dữ liệu hoàn chỉnh đã có checksum.
+    """
+    if len(payload) != DATA_PACKET_LENGTH - 3:
+        raise ValueError(f"Payload phải có {DATA_PACKET_LENGTH - 3} bytes, nhận được {len(payload)}.")
+    body = bytes([DATA_HEADER_BYTE, packet_type & 0xFF]) + bytes(payload)
+    return body + bytes([calculate_checksum(body)])
+
+def find_valid_packet_offsets(chunk) -> Tuple[np.ndarray, int, int, int]:
+    """
+    Tìm tất cả các gói dữ liệu hợp lệ trong một đoạn byte bằng NumPy, trong một lần gọi.
+    Kết quả giống hệt việc quét tuần tự từng header: byte rác trước header bị bỏ,
+    header sai checksum bị bỏ từng byte một, gói hợp lệ không được chồng lên nhau.
+    Checksum của mọi vị trí 0x55 được tính cùng lúc từ tổng tích lũy (cumsum) modulo 256.
+
+    Args:
+        chunk: Đoạn byte (bytes, bytearray, memoryview hoặc mảng uint8).
+    Returns:
+        Tuple (offsets, consumed, garbage_bytes, checksum_failures):
+            offsets: Mảng int64 các vị trí bắt đầu của gói hợp lệ, tăng dần.
+            consumed: Số byte đầu đoạn đã xử lý xong; phần còn lại (chưa đủ một gói)
+                      cần được giữ lại để ghép với dữ liệu đến sau.
+            garbage_bytes: Số byte rác đã bị bỏ qua.
+            checksum_failures: Số header 0x55 có checksum sai đã bị bỏ qua.
+    """
+    data = np.frombuffer(chunk, dtype=np.uint8) if not isinstance(chunk, np.ndarray) else chunk
+    n = data.size
+    last_start = n - DATA_PACKET_LENGTH  # Vị trí cuối cùng còn đủ chỗ cho một gói
+
+    headers = np.flatnonzero(data == DATA_HEADER_BYTE)
+    candidates = headers[headers <= last_start]
+
+    if candidates.size:
+        # cs[i] = tổng data[:i] (mod 256); uint8 tự tràn đúng theo quy tắc checksum
+        cs = np.zeros(n + 1, dtype=np.uint8)
+        np.cumsum(data, dtype=np.uint8, out=cs[1:])
+        end = candidates + (DATA_PACKET_LENGTH - 1)
+        valid = (cs[end] - cs[candidates]) == data[end]
+        starts = candidates[valid]
+    else:
+        starts = candidates
+
+    # Chọn gói tham lam từ trái sang phải, bỏ các gói chồng lên gói đã chọn
+    if starts.size > 1 and np.any(np.diff(starts) < DATA_PACKET_LENGTH):
+        chosen = []
+        next_free = -1
+        for start in starts.tolist():
+            if start >= next_free:
+                chosen.append(start)
+                next_free = start + DATA_PACKET_LENGTH
+        offsets = np.asarray(chosen, dtype=np.int64)
+    else:
+        offsets = starts.astype(np.int64, copy=False)
+
+    # Header đầy đủ nằm ngoài mọi gói đã chọn là header lỗi checksum
+    if offsets.size and candidates.size:
+        idx = np.searchsorted(offsets, candidates, side='right') - 1
+        inside = (idx >= 0) & (candidates < offsets[np.maximum(idx, 0)] + DATA_PACKET_LENGTH)
+        failed = candidates[~inside]
+    else:
+        failed = candidates
+    checksum_failures = int(failed.size)
+
+    # Xác định điểm dừng giống vòng lặp tuần tự sau gói hợp lệ cuối cùng
+    tail_start = int(offsets[-1]) + DATA_PACKET_LENGTH if offsets.size else 0
+    position = int(failed[-1]) + 1 if failed.size and failed[-1] >= tail_start else tail_start
+    if n - position < DATA_PACKET_LENGTH:
+        consumed = position
+    else:
+        next_header = np.searchsorted(headers, position)
+        consumed = int(headers[next_header]) if next_header < headers.size else n
+
+    garbage_bytes = consumed - offsets.size * DATA_PACKET_LENGTH - checksum_failures
+    return offsets, consumed, garbage_bytes, checksum_failures
@@ -0,0 +1,269 @@
+# src/sensors/packet_framer.py
+
+"""
+Bộ tách gói (framer) cho luồng byte từ cảm biến HWT905.
+Dùng một bytearray cấp phát trước cùng memoryview và hai chỉ số đọc/ghi,
+thay vì nối và cắt lại đối tượng bytes cho mỗi gói tin.
+"""
+import logging
+from typing import Optional, Dict, List
+
+import numpy as np
+
+from src.sensors.hwt905_constants import DATA_HEADER_BYTE, DATA_PACKET_LENGTH
+from src.sensors.hwt905_protocol import find_valid_packet_offsets
+
+logger = logging.getLogger(__name__)
+
+# Dung lượng mặc định của buffer: đủ cho vài trăm gói tin ở 921600 baud
+DEFAULT_FRAMER_CAPACITY = 8192
+
+# Từ số byte đang chờ này trở lên, drain() dùng đường kiểm tra checksum bằng NumPy
+VECTORIZED_DRAIN_MIN_BYTES = 512
+
+
+class PacketFramer:
+    """
+    Buffer vòng (ring buffer) cấp phát trước để tách các gói dữ liệu 11-byte.
+
+    Dữ liệu được ghi vào buffer bằng `readinto`, sau đó chỉ số đọc
+    được dịch chuyển khi tách gói, bỏ byte rác hoặc bỏ header lỗi checksum.
+    Lưu ý: Serial.readinto() của pyserial gọi read() rồi sao chép vào buffer, nên mỗi lần
+    đọc vẫn tạo một bytes tạm; framer chỉ tránh việc nối và cắt lại bytes ở phía mình.
+    Khi vùng trống ở cuối buffer không đủ, phần dữ liệu chưa xử lý (thường
+    ít hơn một gói tin) được dời về đầu buffer.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_FRAMER_CAPACITY):
+        """
+        Khởi tạo framer.
+        Args:
+            capacity: Kích thước buffer (bytes). Phải lớn hơn độ dài một gói tin.
+        """
+        if capacity <= DATA_PACKET_LENGTH:
+            raise ValueError(f"capacity phải lớn hơn {DATA_PACKET_LENGTH} bytes.")
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._read_pos = 0
+        self._write_pos = 0
+
+        # Bảng lọc theo byte TYPE (256 phần tử, khác 0 = nhận). None = nhận tất cả.
+        self._type_mask: Optional[bytes] = None
+        self._type_mask_np: Optional[np.ndarray] = None
+
+        # Bộ đếm thống kê
+        self.packet_count = 0
+        self.garbage_byte_count = 0
+        self.checksum_error_count = 0
+        self.filtered_counts = [0] * 256  # Số gói hợp lệ bị bỏ vì loại gói không được đăng ký
+
+    def set_type_filter(self, type_mask: Optional[bytes]):
+        """
+        Chỉ trả về các gói có byte TYPE được đánh dấu trong type_mask; các gói còn lại
+        được đếm vào filtered_counts và bỏ qua ngay trong framer (không sao chép, không giải mã).
+        Args:
+            type_mask: 256 byte, type_mask[packet_type] != 0 nghĩa là nhận. None để nhận tất cả.
+        """
+        if type_mask is not None and len(type_mask) != 256:
+            raise ValueError("type_mask phải có đúng 256 phần tử.")
+        self._type_mask = bytes(type_mask) if type_mask is not None else None
+        self._type_mask_np = (np.frombuffer(self._type_mask, dtype=np.uint8).astype(bool)
+                              if type_mask is not None else None)
+
+    def reset(self):
+        """Xóa dữ liệu đang chờ trong buffer (giữ nguyên bộ đếm)."""
+        self._read_pos = 0
+        self._write_pos = 0
+
+    def buffered(self) -> int:
+        """Số byte đang chờ xử lý trong buffer."""
+        return self._write_pos - self._read_pos
+
+    def _make_room(self, needed: int) -> int:
+        """
+        Đảm bảo có chỗ trống ở cuối buffer, dời dữ liệu chưa xử lý về đầu nếu cần.
+        Returns:
+            Số byte trống có thể ghi.
+        """
+        free = self.capacity - self._write_pos
+        if free >= needed or self._read_pos == 0:
+            return free
+        pending = self._write_pos - self._read_pos
+        self._buf[:pending] = self._view[self._read_pos:self._write_pos]
+        self._read_pos = 0
+        self._write_pos = pending
+        return self.capacity - pending
+
+    def fill_from(self, ser) -> int:
+        """
+        Đọc các byte đang chờ từ cổng serial vào buffer (qua ser.readinto).
+        Args:
+            ser: Instance serial.Serial (hoặc đối tượng có in_waiting/readinto).
+        Returns:
+            Số byte đã đọc được.
+        Raises:
+            serial.SerialException, OSError: Truyền lên cho lớp gọi xử lý mất kết nối.
+        """
+        waiting = ser.in_waiting
+        if waiting <= 0:
+            return 0
+        free = self._make_room(waiting)
+        if free <= 0:
+            # Buffer đầy toàn bộ dữ liệu chưa xử lý, để lần sau đọc tiếp
+            return 0
+        n = min(waiting, free)
+        read = ser.readinto(self._view[self._write_pos:self._write_pos + n])
+        if read:
+            self._write_pos += read
+            return read
+        return 0
+
+    def fill_blocking(self, ser, min_bytes: int) -> int:
+        """
+        Đọc ít nhất `min_bytes` (hoặc toàn bộ số byte đang chờ nếu nhiều hơn) vào buffer,
+        chặn trong select() của pyserial cho đến khi đủ dữ liệu hoặc hết `ser.timeout`.
+        Luồng gọi chỉ được đánh thức khi có byte đến, không cần vòng lặp sleep/poll.
+        Args:
+            ser: Instance serial.Serial đã đặt timeout (giây) bằng độ trễ mục tiêu.
+            min_bytes: Số byte tối thiểu cần đọc trong một lần gọi.
+        Returns:
+            Số byte đã đọc được (0 nếu hết timeout mà không có dữ liệu).
+        Raises:
+            serial.SerialException, OSError: Truyền lên cho lớp gọi xử lý mất kết nối.
+        """
+        wanted = max(ser.in_waiting, min_bytes)
+        free = self._make_room(wanted)
+        if free <= 0:
+            return 0
+        n = min(wanted, free)
+        read = ser.readinto(self._view[self._write_pos:self._write_pos + n])
+        if read:
+            self._write_pos += read
+            return read
+        return 0
+
+    def feed(self, data: bytes) -> int:
+        """
+        Nạp dữ liệu từ nguồn không phải serial (ví dụ file ghi lại) vào buffer.
+        Returns:
+            Số byte đã nạp (có thể nhỏ hơn len(data) nếu buffer đầy).
+        """
+        free = self._make_room(len(data))
+        n = min(len(data), free)
+        self._view[self._write_pos:self._write_pos + n] = data[:n]
+        self._write_pos += n
+        return n
+
+    def next_packet(self) -> Optional[bytes]:
+        """
+        Tách gói tin hợp lệ tiếp theo trong buffer.
+        Byte rác trước header bị bỏ qua, header có checksum sai bị bỏ từng byte một
+        (giống hành vi resync cũ).
+        Returns:
+            Bản sao 11 byte của gói tin hợp lệ, hoặc None nếu chưa đủ dữ liệu.
+        """
+        buf = self._buf
+        view = self._view
+        read_pos = self._read_pos
+        write_pos = self._write_pos
+
+        while write_pos - read_pos >= DATA_PACKET_LENGTH:
+            if buf[read_pos] != DATA_HEADER_BYTE:
+                header_index = buf.find(DATA_HEADER_BYTE, read_pos, write_pos)
+                if header_index == -1:
+                    # Không tìm thấy header, toàn bộ dữ liệu đang chờ là vô giá trị
+                    logger.debug(f"Không tìm thấy header trong buffer. Đã xóa {write_pos - read_pos} bytes.")
+                    self.garbage_byte_count += write_pos - read_pos
+                    self._read_pos = self._write_pos = 0
+                    return None
+                garbage = view[read_pos:header_index]
+                logger.warning(f"Tìm thấy {len(garbage)} byte rác trước header: {garbage.hex().upper()}. Đã xóa.")
+                self.garbage_byte_count += header_index - read_pos
+                read_pos = header_index
+                continue
+
+            end = read_pos + DATA_PACKET_LENGTH
+            if (sum(view[read_pos:end - 1]) & 0xFF) == buf[end - 1]:
+                self.packet_count += 1
+                type_mask = self._type_mask
+                if type_mask is not None and not type_mask[buf[read_pos + 1]]:
+                    # Loại gói không được đăng ký: đếm và bỏ qua
+                    self.filtered_counts[buf[read_pos + 1]] += 1
+                    read_pos = end
+                    continue
+                self._read_pos = end
+                return bytes(view[read_pos:end])
+
+            # Header lỗi checksum, bỏ qua header và thử lại
+            logger.debug(f"Gói tin không hợp lệ (checksum sai): {view[read_pos:end].hex().upper()}. Bỏ qua.")
+            self.checksum_error_count += 1
+            read_pos += 1
+
+        self._read_pos = read_pos
+        return None
+
+    def drain(self, max_packets: Optional[int] = None) -> List[bytes]:
+        """
+        Tách tất cả các gói tin hợp lệ, đầy đủ đang có trong buffer trong một lần gọi.
+        Args:
+            max_packets: Số gói tối đa cần lấy (None = không giới hạn).
+        Returns:
+            Danh sách các gói 11 byte theo đúng thứ tự nhận được (có thể rỗng).
+        """
+        if max_packets is None and self.buffered() >= VECTORIZED_DRAIN_MIN_BYTES:
+            return self._drain_vectorized()
+
+        packets = []
+        next_packet = self.next_packet
+        while max_packets is None or len(packets) < max_packets:
+            packet = next_packet()
+            if packet is None:
+                break
+            packets.append(packet)
+        return packets
+
+    def _drain_vectorized(self) -> List[bytes]:
+        """
+        Tách tất cả các gói tin bằng find_valid_packet_offsets (NumPy) trên toàn bộ
+        vùng dữ liệu đang chờ. Kết quả và bộ đếm giống hệt vòng lặp next_packet().
+        """
+        read_pos = self._read_pos
+        chunk = np.frombuffer(self._buf, dtype=np.uint8, count=self._write_pos - read_pos, offset=read_pos)
+        offsets, consumed, garbage, checksum_failures = find_valid_packet_offsets(chunk)
+        types = chunk[offsets + 1] if self._type_mask_np is not None and len(offsets) else None
+        del chunk  # Không giữ view NumPy trỏ vào buffer sau khi đã có offsets
+
+        self.packet_count += len(offsets)
+        if types is not None:
+            accepted = self._type_mask_np[types]
+            if not accepted.all():
+                for packet_type, count in enumerate(np.bincount(types[~accepted], minlength=256).tolist()):
+                    if count:
+                        self.filtered_counts[packet_type] += count
+                offsets = offsets[accepted]
+
+        view = self._view
+        packets = [bytes(view[start:start + DATA_PACKET_LENGTH]) for start in (offsets + read_pos).tolist()]
+
+        if garbage:
+            logger.warning(f"Đã bỏ {garbage} byte rác khi tách {len(packets)} gói tin.")
+        if checksum_failures:
+            logger.debug(f"Đã bỏ qua {checksum_failures} header có checksum sai.")
+        self.garbage_byte_count += garbage
+        self.checksum_error_count += checksum_failures
+
+        self._read_pos = read_pos + consumed
+        if self._read_pos == self._write_pos:
+            self._read_pos = self._write_pos = 0
+        return packets
+
+    def get_stats(self) -> Dict[str, int]:
+        """Trả về các bộ đếm thống kê của framer."""
+        return {
+            "packets": self.packet_count,
+            "garbage_bytes": self.garbage_byte_count,
+            "checksum_errors": self.checksum_error_count,
+            "filtered_packets": sum(self.filtered_counts),
+            "buffered_bytes": self.buffered(),
+        }
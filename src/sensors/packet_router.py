@@ -0,0 +1,179 @@
+# src/sensors/packet_router.py
+
+"""
+Bảng định tuyến gói tin theo byte TYPE.
+Chỉ các loại gói đã đăng ký mới được framer trả về và chuyển tới hàng đợi của
+bên tiêu thụ; các loại còn lại bị đếm và bỏ trước khi có bất kỳ bước giải mã nào.
+"""
+import logging
+from queue import Queue, Full
+from typing import Dict, List, Optional
+
+from src.sensors.hwt905_constants import (
+    PACKET_TYPE_TIME, PACKET_TYPE_ACC, PACKET_TYPE_GYRO, PACKET_TYPE_ANGLE,
+    PACKET_TYPE_MAG, PACKET_TYPE_PORT_STATUS, PACKET_TYPE_PRESSURE,
+    PACKET_TYPE_GPS_LONLAT, PACKET_TYPE_GPS_SPEED, PACKET_TYPE_QUATERNION,
+    PACKET_TYPE_GPS_ACCURACY
+)
+from src.sensors.decoders import PACKET_TYPE_NAMES
+
+logger = logging.getLogger(__name__)
+
+# Tên dùng trong cấu hình (PROCESS_CONTROL_AUX_PACKET_TYPES) -> byte TYPE
+PACKET_TYPE_KEYS: Dict[str, int] = {
+    "time": PACKET_TYPE_TIME,
+    "acc": PACKET_TYPE_ACC,
+    "gyro": PACKET_TYPE_GYRO,
+    "angle": PACKET_TYPE_ANGLE,
+    "mag": PACKET_TYPE_MAG,
+    "port_status": PACKET_TYPE_PORT_STATUS,
+    "pressure": PACKET_TYPE_PRESSURE,
+    "gps_lonlat": PACKET_TYPE_GPS_LONLAT,
+    "gps_speed": PACKET_TYPE_GPS_SPEED,
+    "quaternion": PACKET_TYPE_QUATERNION,
+    "gps_accuracy": PACKET_TYPE_GPS_ACCURACY,
+}
+
+
+def parse_packet_type_keys(keys: List[str]) -> List[int]:
+    """
+    Chuyển danh sách tên loại gói trong cấu hình thành byte TYPE.
+    Tên không hợp lệ bị bỏ qua và ghi cảnh báo.
+    """
+    packet_types = []
+    for key in keys:
+        key = key.strip().lower()
+        if not key:
+            continue
+        if key not in PACKET_TYPE_KEYS:
+            logger.warning(f"Loại gói tin không hợp lệ trong cấu hình: '{key}'. Hỗ trợ: {list(PACKET_TYPE_KEYS)}")
+            continue
+        packet_types.append(PACKET_TYPE_KEYS[key])
+    return packet_types
+
+
+class PacketRouter:
+    """
+    Bảng định tuyến 256 phần tử: byte TYPE -> hàng đợi của bên tiêu thụ.
+    Hàng đợi "chính" (blocking=True, ví dụ gia tốc) chặn khi đầy giống hành vi cũ;
+    các hàng đợi phụ dùng put_nowait và đếm số gói bị bỏ khi đầy để không làm chậm luồng đọc.
+    """
+
+    def __init__(self):
+        self._routes: List[Optional[Queue]] = [None] * 256
+        self._blocking = [False] * 256
+        self.routed_counts = [0] * 256
+        self.overflow_counts = [0] * 256
+
+    def subscribe(self, packet_type: int, target_queue: Queue, blocking: bool = False):
+        """
+        Đăng ký hàng đợi nhận một loại gói.
+        Args:
+            packet_type: Byte TYPE (ví dụ PACKET_TYPE_ACC).
+            target_queue: Hàng đợi nhận gói thô (từng gói hoặc list gói).
+            blocking: True để chặn khi hàng đợi đầy, False để bỏ gói và đếm.
+        """
+        self._routes[packet_type] = target_queue
+        self._blocking[packet_type] = blocking
+        logger.info(f"Định tuyến gói {PACKET_TYPE_NAMES[packet_type]} (0x{packet_type:02X}) "
+                    f"tới hàng đợi {'chính' if blocking else 'phụ'}.")
+
+    def unsubscribe(self, packet_type: int):
+        """Hủy đăng ký một loại gói; gói loại này sẽ bị framer bỏ qua."""
+        self._routes[packet_type] = None
+        self._blocking[packet_type] = False
+
+    @property
+    def type_mask(self) -> bytes:
+        """256 byte, khác 0 tại các loại gói đã đăng ký (dùng cho PacketFramer.set_type_filter)."""
+        return bytes(1 if target is not None else 0 for target in self._routes)
+
+    def _put(self, packet_type: int, target: Queue, item, count: int):
+        if self._blocking[packet_type]:
+            target.put(item)
+        else:
+            try:
+                target.put_nowait(item)
+            except Full:
+                self.overflow_counts[packet_type] += count
+                return
+        self.routed_counts[packet_type] += count
+
+    def route(self, packet: bytes, arrival_ts: Optional[float] = None) -> bool:
+        """
+        Chuyển một gói tới hàng đợi đã đăng ký cho loại của nó.
+        Args:
+            arrival_ts: Nếu có, phần tử đưa vào hàng đợi là (arrival_ts, packet).
+        Returns:
+            True nếu gói được chuyển đi.
+        """
+        packet_type = packet[1]
+        target = self._routes[packet_type]
+        if target is None:
+            return False
+        self._put(packet_type, target, packet if arrival_ts is None else (arrival_ts, packet), 1)
+        return True
+
+    def route_batch(self, packets: List[bytes], arrival_ts: Optional[float] = None):
+        """
+        Chuyển một batch gói tin: mỗi hàng đợi nhận một list bằng một lần put().
+        Các loại gói cùng đăng ký vào một hàng đợi giữ nguyên thứ tự xen kẽ ban đầu
+        (ví dụ gói TIME đứng trước gói ACC của cùng chu kỳ).
+        Args:
+            arrival_ts: Nếu có, phần tử đưa vào hàng đợi là (arrival_ts, list gói).
+        """
+        if not packets:
+            return
+        first_type = packets[0][1]
+        if all(packet[1] == first_type for packet in packets):
+            # Trường hợp phổ biến: chỉ một loại gói được đăng ký
+            target = self._routes[first_type]
+            if target is not None:
+                self._put(first_type, target, packets if arrival_ts is None else (arrival_ts, packets),
+                          len(packets))
+            return
+
+        groups: Dict[int, List[bytes]] = {}
+        for packet in packets:
+            groups.setdefault(packet[1], []).append(packet)
+        targets: Dict[int, List[int]] = {}
+        for packet_type in groups:
+            target = self._routes[packet_type]
+            if target is not None:
+                targets.setdefault(id(target), []).append(packet_type)
+        for packet_types in targets.values():
+            if len(packet_types) == 1:
+                group = groups[packet_types[0]]
+            else:
+                wanted = set(packet_types)
+                group = [packet for packet in packets if packet[1] in wanted]
+            self._put_group(packet_types, group if arrival_ts is None else (arrival_ts, group),
+                            [len(groups[packet_type]) for packet_type in packet_types])
+
+    def _put_group(self, packet_types: List[int], item, counts: List[int]):
+        """Đưa một list gói (có thể gồm nhiều loại) vào hàng đợi chung của các loại đó."""
+        if len(packet_types) == 1:
+            self._put(packet_types[0], self._routes[packet_types[0]], item, counts[0])
+            return
+        target = self._routes[packet_types[0]]
+        if any(self._blocking[packet_type] for packet_type in packet_types):
+            target.put(item)
+        else:
+            try:
+                target.put_nowait(item)
+            except Full:
+                for packet_type, count in zip(packet_types, counts):
+                    self.overflow_counts[packet_type] += count
+                return
+        for packet_type, count in zip(packet_types, counts):
+            self.routed_counts[packet_type] += count
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Số gói đã chuyển và bị bỏ do hàng đợi đầy, theo tên loại gói."""
+        return {
+            PACKET_TYPE_NAMES[packet_type]: {
+                "routed": self.routed_counts[packet_type],
+                "overflow": self.overflow_counts[packet_type],
+            }
+            for packet_type, target in enumerate(self._routes) if target is not None
+        }
@@ -4,11 +4,14 @@ from .data_storage import DataStorage
 from .file_handlers import (
     BaseFileHandler, CSVFileHandler, JSONFileHandler, create_file_handler
 )
+from .raw_capture import RawCaptureWriter, RawCaptureReader
 
 __all__ = [
     'DataStorage',
     'BaseFileHandler',
     'CSVFileHandler',
     'JSONFileHandler',
-    'create_file_handler'
+    'create_file_handler',
+    'RawCaptureWriter',
+    'RawCaptureReader'
 ]
@@ -7,7 +7,7 @@ from pathlib import Path
 from typing import Dict, Any, List, Optional
 
 from .session_manager import SessionManager
-from .file_handlers import create_file_handler, BaseFileHandler
+from .file_handlers import create_file_handler, BaseFileHandler, RecordOrDict
 
 logger = logging.getLogger(__name__)
 
@@ -107,12 +107,12 @@ class DataStorage:
         except OSError:
             return True
     
-    def store_data(self, data: Dict[str, Any], timestamp: float = None):
+    def store_data(self, data: RecordOrDict, timestamp: float = None):
         """
         Lưu trữ dữ liệu vào file.
         
         Args:
-            data: Dữ liệu cần lưu
+            data: Dữ liệu cần lưu (dict hoặc bản ghi NamedTuple)
             timestamp: Timestamp Unix (sử dụng thời gian hiện tại nếu None)
         """
         if timestamp is None:
@@ -132,6 +132,27 @@ class DataStorage:
                 
         except Exception as e:
             logger.error(f"Error storing data: {e}")
+
+    def store_records(self, records: List[RecordOrDict]):
+        """
+        Lưu một khối bản ghi (mỗi bản ghi mang timestamp ở trường 'ts'), flush một lần cho cả khối.
+        
+        Args:
+            records: Các bản ghi NamedTuple có trường 'ts'
+        """
+        if not records:
+            return
+        if self._should_create_new_file():
+            self._create_new_file()
+        
+        try:
+            write_data = self.current_file_handler.write_data
+            for record in records:
+                write_data(record, record.ts)
+            self.data_count_in_current_file += len(records)
+            self.current_file_handler.flush()
+        except Exception as e:
+            logger.error(f"Error storing data block: {e}")
     
     def get_stored_data_files(self, session: str = None) -> List[Path]:
         """
@@ -5,11 +5,20 @@ import json
 import logging
 import numpy as np
 from abc import ABC, abstractmethod
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# Dữ liệu ghi vào file: dict, hoặc bản ghi NamedTuple (có thuộc tính _fields) như AccSample/ProcessedSample
+RecordOrDict = Union[Dict[str, Any], tuple]
+
+
+def is_record(data: Any) -> bool:
+    """True nếu data là bản ghi NamedTuple (tuple có _fields)."""
+    return isinstance(data, tuple) and hasattr(data, '_fields')
+
 class BaseFileHandler(ABC):
     """
     Lớp cơ sở cho các file handler.
@@ -31,8 +40,8 @@ class BaseFileHandler(ABC):
         pass
     
     @abstractmethod
-    def write_data(self, data: Dict[str, Any], timestamp: float):
-        """Ghi dữ liệu vào file."""
+    def write_data(self, data: RecordOrDict, timestamp: float):
+        """Ghi dữ liệu (dict hoặc bản ghi NamedTuple) vào file."""
         pass
     
     @abstractmethod
@@ -68,6 +77,9 @@ class CSVFileHandler(BaseFileHandler):
         else:
             self.fields_to_write = None
         self.header_written = False
+        # Ghi bản ghi trực tiếp: csv.writer + itemgetter theo chỉ số trường, không tạo dict
+        self.row_writer = None
+        self.record_getter = None
     
     def open_for_writing(self):
         """Mở file CSV để ghi."""
@@ -78,11 +90,36 @@ class CSVFileHandler(BaseFileHandler):
             logger.error(f"Failed to open CSV file for writing {self.file_path}: {e}")
             raise
     
-    def write_data(self, data: Dict[str, Any], timestamp: float):
+    def _write_record(self, record: tuple, timestamp: float):
+        """Ghi một bản ghi NamedTuple: các cột được tra theo chỉ số tính sẵn ở dòng đầu tiên."""
+        if not self.header_written:
+            fields = record._fields
+            # 'ts' của bản ghi trùng với cột 'timestamp' nên không ghi lại
+            header = self.fields_to_write if self.fields_to_write else \
+                ['timestamp'] + [name for name in fields if name != 'ts']
+            # Trường không có trong bản ghi được ghi rỗng, giống restval của DictWriter
+            indices = [fields.index(name) if name in fields else None for name in header[1:]]
+            self.record_getter = lambda r: [r[i] if i is not None else '' for i in indices]
+            if indices and all(i is not None for i in indices):
+                self.record_getter = itemgetter(*indices) if len(indices) > 1 else \
+                    (lambda r, i=indices[0]: (r[i],))
+            self.row_writer = csv.writer(self.file_handle)
+            self.row_writer.writerow(header)
+            self.header_written = True
+        self.row_writer.writerow((timestamp, *self.record_getter(record)))
+
+    def write_data(self, data: RecordOrDict, timestamp: float):
         """Ghi dữ liệu vào file CSV."""
         if not self.file_handle:
             logger.warning("Attempted to write to a closed or non-existent CSV file.")
             return
+
+        if is_record(data):
+            try:
+                self._write_record(data, timestamp)
+            except Exception as e:
+                logger.error(f"Error writing record to CSV file {self.file_path}: {e}")
+            return
         
         full_data = {'timestamp': timestamp, **data}
 
@@ -151,14 +188,14 @@ class JSONFileHandler(BaseFileHandler):
         self.file_handle = open(self.file_path, 'w', encoding='utf-8')
         logger.debug(f"Opened JSON file for writing: {self.file_path}")
     
-    def write_data(self, data: Dict[str, Any], timestamp: float):
+    def write_data(self, data: RecordOrDict, timestamp: float):
         """Ghi dữ liệu vào file JSON."""
         if not self.file_handle:
             raise RuntimeError("File not opened for writing")
         
         data_entry = {
             'timestamp': timestamp,
-            'data': data
+            'data': data._asdict() if is_record(data) else data
         }
         json.dump(data_entry, self.file_handle)
         self.file_handle.write('\n')  # Mỗi entry trên một dòng
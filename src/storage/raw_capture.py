@@ -0,0 +1,271 @@
+# src/storage/raw_capture.py
+
+"""
+Ghi và đọc luồng byte thô (các gói đã xác thực checksum) của cảm biến.
+Dữ liệu được ghi nối tiếp vào các file segment nhị phân, theo từng block có timestamp
+của máy chủ, kèm file chỉ mục thưa (.idx) để tìm một mốc thời gian bằng một lần seek.
+
+Định dạng segment (<session>_seg0001.hwtraw):
+    SEGMENT_MAGIC (8 byte), sau đó lặp lại các block:
+    BLOCK_HEADER '<dI' (timestamp Unix của gói đầu tiên, số byte) + các gói 11 byte liền nhau.
+Định dạng chỉ mục (<session>_seg0001.hwtraw.idx):
+    Các cặp INDEX_ENTRY '<dQ' (timestamp của block, offset của block trong segment),
+    tối đa một mục cho mỗi index_interval_s giây dữ liệu.
+"""
+import logging
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .session_manager import SessionManager
+from ..sensors.decoders import decode_packet_block
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAGIC = b'HWTRAW01'
+SEGMENT_SUFFIX = '.hwtraw'
+INDEX_SUFFIX = '.idx'
+BLOCK_HEADER = struct.Struct('<dI')
+INDEX_ENTRY = struct.Struct('<dQ')
+INDEX_DTYPE = np.dtype([('ts', '<f8'), ('offset', '<u8')])
+
+
+class RawCaptureWriter:
+    """
+    Ghi nối tiếp các gói thô vào segment nhị phân.
+    Các lần ghi liên tiếp được gom thành một block (tối đa block_interval_s giây hoặc
+    max_block_bytes byte), nên chi phí cho mỗi gói chỉ là một lần nối bytes.
+    """
+
+    def __init__(self, base_data_dir: str = "data",
+                 sub_dir: str = "raw_data",
+                 session_prefix: str = "session",
+                 max_segment_mb: float = 64.0,
+                 index_interval_s: float = 1.0,
+                 block_interval_s: float = 0.1,
+                 max_block_bytes: int = 65536,
+                 flush_interval_s: float = 1.0):
+        """
+        Args:
+            base_data_dir: Thư mục gốc để lưu dữ liệu.
+            sub_dir: Thư mục con chứa các segment.
+            session_prefix: Tiền tố cho tên session.
+            max_segment_mb: Kích thước tối đa của một segment trước khi tạo segment mới.
+            index_interval_s: Khoảng thời gian dữ liệu giữa hai mục chỉ mục.
+            block_interval_s: Thời gian gom dữ liệu tối đa cho một block.
+            max_block_bytes: Số byte tối đa của một block.
+            flush_interval_s: Chu kỳ đẩy dữ liệu xuống đĩa.
+        """
+        self.data_dir = Path(base_data_dir) / sub_dir
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.session_manager = SessionManager(session_prefix)
+        self.max_segment_bytes = int(max_segment_mb * 1024 * 1024)
+        self.index_interval_s = index_interval_s
+        self.block_interval_s = block_interval_s
+        self.max_block_bytes = max_block_bytes
+        self.flush_interval_s = flush_interval_s
+
+        self._lock = threading.Lock()
+        self._segment_file = None
+        self._index_file = None
+        self.segment_path: Optional[Path] = None
+        self._segment_number = 0
+        self._segment_size = 0
+        self._last_index_ts: Optional[float] = None
+        self._last_flush = time.monotonic()
+
+        self._pending = bytearray()
+        self._pending_ts = 0.0
+
+        self.blocks_written = 0
+        self.bytes_written = 0
+
+        logger.info(f"RawCaptureWriter initialized - Dir: {self.data_dir}, "
+                    f"Session: {self.session_manager.get_current_session()}")
+
+    def _open_segment(self):
+        """Đóng segment hiện tại (nếu có) và mở segment mới cùng file chỉ mục."""
+        self._close_segment()
+        self._segment_number += 1
+        session = self.session_manager.get_current_session()
+        self.segment_path = self.data_dir / f"{session}_seg{self._segment_number:04d}{SEGMENT_SUFFIX}"
+        self._segment_file = open(self.segment_path, 'wb')
+        self._segment_file.write(SEGMENT_MAGIC)
+        self._index_file = open(str(self.segment_path) + INDEX_SUFFIX, 'wb')
+        self._segment_size = len(SEGMENT_MAGIC)
+        self._last_index_ts = None
+        logger.info(f"Created new raw capture segment: {self.segment_path}")
+
+    def _close_segment(self):
+        for f in (self._segment_file, self._index_file):
+            if f:
+                f.close()
+        self._segment_file = self._index_file = None
+
+    def _write_block(self):
+        """Ghi block đang gom (header + dữ liệu) và mục chỉ mục nếu cần."""
+        if not self._pending:
+            return
+        if self._segment_file is None or self._segment_size >= self.max_segment_bytes:
+            self._open_segment()
+
+        offset = self._segment_size
+        self._segment_file.write(BLOCK_HEADER.pack(self._pending_ts, len(self._pending)))
+        self._segment_file.write(self._pending)
+        if self._last_index_ts is None or self._pending_ts - self._last_index_ts >= self.index_interval_s:
+            self._index_file.write(INDEX_ENTRY.pack(self._pending_ts, offset))
+            self._last_index_ts = self._pending_ts
+
+        size = BLOCK_HEADER.size + len(self._pending)
+        self._segment_size += size
+        self.bytes_written += size
+        self.blocks_written += 1
+        self._pending.clear()
+
+    def write(self, data: bytes, timestamp: float):
+        """
+        Thêm các byte của gói đã xác thực vào block hiện tại.
+        Args:
+            data: Một hoặc nhiều gói 11 byte nối liền nhau.
+            timestamp: Timestamp Unix lúc nhận dữ liệu.
+        """
+        with self._lock:
+            if not self._pending:
+                self._pending_ts = timestamp
+            self._pending += data
+            if (timestamp - self._pending_ts >= self.block_interval_s
+                    or len(self._pending) >= self.max_block_bytes):
+                self._write_block()
+                now = time.monotonic()
+                if now - self._last_flush >= self.flush_interval_s:
+                    self._flush_files()
+                    self._last_flush = now
+
+    def write_packets(self, packets: List[bytes], timestamp: float):
+        """Thêm danh sách gói (kết quả của read_raw_packets()) vào block hiện tại."""
+        self.write(b''.join(packets), timestamp)
+
+    def _flush_files(self):
+        for f in (self._segment_file, self._index_file):
+            if f:
+                f.flush()
+
+    def flush(self):
+        """Ghi block đang gom và đẩy dữ liệu xuống đĩa."""
+        with self._lock:
+            self._write_block()
+            self._flush_files()
+
+    def close(self):
+        """Ghi nốt dữ liệu và đóng segment."""
+        with self._lock:
+            self._write_block()
+            self._close_segment()
+        logger.info(f"Closed raw capture ({self.blocks_written} blocks, {self.bytes_written} bytes).")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "blocks_written": self.blocks_written,
+            "bytes_written": self.bytes_written,
+            "segments": self._segment_number,
+        }
+
+
+class RawCaptureReader:
+    """
+    Đọc các segment đã ghi bởi RawCaptureWriter theo khoảng thời gian.
+    Block đầu tiên được tìm bằng chỉ mục thưa (tìm nhị phân + một lần seek), không quét từ đầu file.
+    Độ phân giải lọc thời gian là một block (timestamp của gói đầu tiên trong block).
+    """
+
+    def __init__(self, path: str, session: Optional[str] = None):
+        """
+        Args:
+            path: Thư mục chứa các segment (ví dụ data/raw_data) hoặc đường dẫn một segment.
+            session: Chỉ đọc các segment của session này (None = tất cả).
+        """
+        path = Path(path)
+        if path.is_file():
+            self.segments: List[Path] = [path]
+        else:
+            pattern = f"{session}_seg*{SEGMENT_SUFFIX}" if session else f"*{SEGMENT_SUFFIX}"
+            self.segments = sorted(path.glob(pattern))
+        self._indexes: Dict[Path, np.ndarray] = {}
+
+    def _load_index(self, segment: Path) -> np.ndarray:
+        """Chỉ mục của segment; bỏ qua mục cuối bị ghi dở."""
+        if segment not in self._indexes:
+            index_path = Path(str(segment) + INDEX_SUFFIX)
+            raw = index_path.read_bytes() if index_path.exists() else b''
+            usable = len(raw) - len(raw) % INDEX_DTYPE.itemsize
+            self._indexes[segment] = np.frombuffer(raw[:usable], dtype=INDEX_DTYPE)
+        return self._indexes[segment]
+
+    def _segment_start(self, segment: Path) -> Optional[float]:
+        index = self._load_index(segment)
+        return float(index['ts'][0]) if len(index) else None
+
+    def iter_blocks(self, start_ts: Optional[float] = None,
+                    end_ts: Optional[float] = None) -> Iterator[Tuple[float, bytes]]:
+        """
+        Duyệt các block có timestamp trong [start_ts, end_ts].
+        Yields:
+            (timestamp, bytes gồm các gói 11 byte liền nhau)
+        """
+        for i, segment in enumerate(self.segments):
+            if start_ts is not None and i + 1 < len(self.segments):
+                # Segment sau bắt đầu trước start_ts: toàn bộ segment này nằm trước khoảng cần đọc
+                next_start = self._segment_start(self.segments[i + 1])
+                if next_start is not None and next_start <= start_ts:
+                    continue
+            segment_start = self._segment_start(segment)
+            if end_ts is not None and segment_start is not None and segment_start > end_ts:
+                return
+            for ts, data in self._iter_segment(segment, start_ts):
+                if end_ts is not None and ts > end_ts:
+                    return
+                if start_ts is None or ts >= start_ts:
+                    yield ts, data
+
+    def _iter_segment(self, segment: Path, start_ts: Optional[float]) -> Iterator[Tuple[float, bytes]]:
+        offset = len(SEGMENT_MAGIC)
+        index = self._load_index(segment)
+        if start_ts is not None and len(index):
+            position = int(np.searchsorted(index['ts'], start_ts, side='right')) - 1
+            if position >= 0:
+                offset = int(index['offset'][position])
+
+        with open(segment, 'rb') as f:
+            if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+                logger.warning(f"Bỏ qua file không phải segment dữ liệu thô: {segment}")
+                return
+            f.seek(offset)
+            while True:
+                header = f.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size:
+                    return
+                ts, size = BLOCK_HEADER.unpack(header)
+                data = f.read(size)
+                if len(data) < size:
+                    # Block cuối bị ghi dở (ví dụ mất điện)
+                    logger.warning(f"Block cuối của {segment.name} không đầy đủ, bỏ qua.")
+                    return
+                yield ts, data
+
+    def iter_decoded(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None,
+                     packet_types: Optional[Iterable[int]] = None) -> Iterator[Tuple[float, Dict[int, np.ndarray]]]:
+        """
+        Duyệt các block trong khoảng thời gian, giải mã bằng decode_packet_block().
+        Yields:
+            (timestamp, dict packet_type -> mảng structured)
+        """
+        for ts, data in self.iter_blocks(start_ts, end_ts):
+            yield ts, decode_packet_block(data, packet_types)
+
+    def read_bytes(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> bytes:
+        """Toàn bộ byte thô trong khoảng thời gian (ví dụ để phát lại qua bộ giả lập)."""
+        return b''.join(data for _, data in self.iter_blocks(start_ts, end_ts))
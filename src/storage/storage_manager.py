@@ -4,6 +4,7 @@ import logging
 from typing import Dict, Any, List, Optional
 
 from .data_storage import DataStorage
+from .file_handlers import RecordOrDict, is_record
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +16,9 @@ class StorageManager:
     
     def __init__(self, storage_config: Dict[str, Any], 
                  data_type: str = "processed",
-                 fields_to_write: Optional[List[str]] = None):
+                 fields_to_write: Optional[List[str]] = None,
+                 per_sensor: bool = False,
+                 sensor_id: str = ""):
         """
         Khởi tạo StorageManager.
         
@@ -23,43 +26,72 @@ class StorageManager:
             storage_config: Cấu hình cho storage system
             data_type: Loại dữ liệu ('processed' hoặc 'decoded') để xác định thư mục con.
             fields_to_write: Danh sách các cột cụ thể để ghi (cho CSV).
+            per_sensor: True khi chạy nhiều cảm biến: mỗi sensor_id của bản ghi được lưu
+                        vào thư mục con riêng ({data_type}_data/{sensor_id}).
+            sensor_id: Lưu toàn bộ dữ liệu vào thư mục con của một cảm biến
+                       (cho các luồng riêng của từng cảm biến).
         """
         self.storage_enabled = storage_config.get("enabled", True)
         self.immediate_transmission = storage_config.get("immediate_transmission", True)
         self.batch_transmission_size = storage_config.get("batch_transmission_size", 50)
         self.data_type = data_type
+        self.storage_config = storage_config
+        self.fields_to_write = fields_to_write
+        self.per_sensor = per_sensor
+        # sensor_id -> DataStorage, tạo khi gặp cảm biến lần đầu
+        self.sensor_storages: Dict[str, DataStorage] = {}
         
-        if self.storage_enabled:
+        if self.storage_enabled and not self.per_sensor:
             # Tạo thư mục con dựa trên data_type
-            sub_dir = f"{self.data_type}_data"
-            
-            self.data_storage = DataStorage(
-                base_data_dir=storage_config.get("base_dir", "data"),
-                sub_dir=sub_dir,
-                storage_format=storage_config.get("format", "csv"),
-                max_file_size_mb=storage_config.get("max_file_size_mb", 10.0),
-                session_prefix=storage_config.get("session_prefix", "session"),
-                fields_to_write=fields_to_write
-            )
+            sub_dir = f"{self.data_type}_data/{sensor_id}" if sensor_id else f"{self.data_type}_data"
+            self.data_storage = self._create_data_storage(sub_dir)
         else:
             self.data_storage = None
         
         logger.info(f"StorageManager initialized for '{self.data_type}' - Enabled: {self.storage_enabled}, Immediate transmission: {self.immediate_transmission}")
     
-    def store_and_prepare_for_transmission(self, data: Dict[str, Any], timestamp: float = None) -> Optional[Dict[str, Any]]:
+    def _create_data_storage(self, sub_dir: str) -> DataStorage:
+        return DataStorage(
+            base_data_dir=self.storage_config.get("base_dir", "data"),
+            sub_dir=sub_dir,
+            storage_format=self.storage_config.get("format", "csv"),
+            max_file_size_mb=self.storage_config.get("max_file_size_mb", 10.0),
+            session_prefix=self.storage_config.get("session_prefix", "session"),
+            fields_to_write=self.fields_to_write
+        )
+    
+    def _get_sensor_storage(self, sensor_id: str) -> DataStorage:
+        """DataStorage của một cảm biến (tạo mới nếu chưa có)."""
+        storage = self.sensor_storages.get(sensor_id)
+        if storage is None:
+            sub_dir = f"{self.data_type}_data/{sensor_id}" if sensor_id else f"{self.data_type}_data"
+            storage = self._create_data_storage(sub_dir)
+            self.sensor_storages[sensor_id] = storage
+        return storage
+    
+    def _all_storages(self) -> List[DataStorage]:
+        if self.data_storage:
+            return [self.data_storage]
+        return list(self.sensor_storages.values())
+    
+    def store_and_prepare_for_transmission(self, data: RecordOrDict, timestamp: float = None) -> Optional[RecordOrDict]:
         """
         Lưu trữ dữ liệu và chuẩn bị cho việc truyền.
         
         Args:
-            data: Dữ liệu (đã xử lý hoặc đã giải mã)
+            data: Dữ liệu (đã xử lý hoặc đã giải mã), dạng dict hoặc bản ghi NamedTuple
             timestamp: Timestamp (sử dụng thời gian hiện tại nếu None)
             
         Returns:
             Dữ liệu để truyền ngay (nếu immediate_transmission=True), None nếu chỉ lưu trữ
         """
         # Luôn lưu trữ nếu storage được bật
-        if self.storage_enabled and self.data_storage:
-            self.data_storage.store_data(data, timestamp)
+        if self.storage_enabled:
+            if self.data_storage:
+                self.data_storage.store_data(data, timestamp)
+            elif self.per_sensor:
+                sensor_id = data.sensor_id if is_record(data) else data.get('sensor_id', '')
+                self._get_sensor_storage(sensor_id).store_data(data, timestamp)
         
         # Trả về dữ liệu để truyền ngay nếu được cấu hình
         if self.immediate_transmission:
@@ -67,6 +99,20 @@ class StorageManager:
         
         return None
     
+    def store_records(self, records: List[RecordOrDict]):
+        """
+        Lưu một khối bản ghi của cùng một cảm biến (chế độ khối), timestamp lấy từ trường 'ts'.
+        
+        Args:
+            records: Các bản ghi NamedTuple liên tiếp (ví dụ AccBlock.samples())
+        """
+        if not self.storage_enabled or not records:
+            return
+        if self.data_storage:
+            self.data_storage.store_records(records)
+        elif self.per_sensor:
+            self._get_sensor_storage(records[0].sensor_id).store_records(records)
+    
     def get_batch_for_transmission(self) -> List[Dict[str, Any]]:
         """
         Lấy một batch dữ liệu từ storage để truyền đi.
@@ -74,22 +120,27 @@ class StorageManager:
         Returns:
             Danh sách dữ liệu cần truyền
         """
-        if not self.storage_enabled or not self.data_storage:
+        if not self.storage_enabled:
             return []
         
-        return self.data_storage.get_pending_data_for_transmission(self.batch_transmission_size)
+        batch = []
+        for storage in self._all_storages():
+            batch.extend(storage.get_pending_data_for_transmission(self.batch_transmission_size - len(batch)))
+            if len(batch) >= self.batch_transmission_size:
+                break
+        return batch
     
     def get_current_session(self) -> Optional[str]:
         """Lấy session hiện tại."""
-        if self.data_storage:
-            return self.data_storage.get_current_session()
+        storages = self._all_storages()
+        if storages:
+            return storages[0].get_current_session()
         return None
     
     def create_new_session(self) -> Optional[str]:
         """Tạo session mới."""
-        if self.data_storage:
-            return self.data_storage.create_new_session()
-        return None
+        sessions = [storage.create_new_session() for storage in self._all_storages()]
+        return sessions[0] if sessions else None
     
     def is_enabled(self) -> bool:
         """Kiểm tra xem storage có được bật không."""
@@ -97,5 +148,5 @@ class StorageManager:
     
     def close(self):
         """Đóng storage manager."""
-        if self.data_storage:
-            self.data_storage.close()
+        for storage in self._all_storages():
+            storage.close()
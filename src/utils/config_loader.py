@@ -7,7 +7,7 @@ import os
 import yaml
 import json
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union
 from dotenv import load_dotenv
 import logging
 
@@ -72,9 +72,22 @@ class ConfigLoader:
         # Sensor configuration
         config["sensor"] = {
             "uart_port": os.getenv("SENSOR_UART_PORT", "/dev/ttyUSB0"),
+            "uart_port_pattern": os.getenv("SENSOR_UART_PORT_PATTERN", "/dev/ttyUSB*"),
+            "multi_sensor": self._parse_bool(os.getenv("SENSOR_MULTI_SENSOR", "false")),
+            "max_sensors": int(os.getenv("SENSOR_MAX_SENSORS", "8")),
+            "parallel_probe": self._parse_bool(os.getenv("SENSOR_PARALLEL_PROBE", "false")),
+            "connection_state_file": os.getenv("SENSOR_CONNECTION_STATE_FILE", ""),
+            "baud_detection": os.getenv("SENSOR_BAUD_DETECTION", "active").strip().lower(),
+            "baud_listen_s": float(os.getenv("SENSOR_BAUD_LISTEN_S", "0.25")),
             "baud_rate": int(os.getenv("SENSOR_BAUD_RATE", "115200")),
             "reconnect_delay_s": int(os.getenv("SENSOR_RECONNECT_DELAY_S", "5")),
             "default_output_rate_hz": int(os.getenv("SENSOR_DEFAULT_OUTPUT_RATE_HZ", "200")),
+            "batch_read": self._parse_bool(os.getenv("SENSOR_BATCH_READ", "false")),
+            "read_mode": os.getenv("SENSOR_READ_MODE", "poll").strip().lower(),
+            "read_min_chunk_bytes": int(os.getenv("SENSOR_READ_MIN_CHUNK_BYTES", "11")),
+            "read_latency_ms": float(os.getenv("SENSOR_READ_LATENCY_MS", "20")),
+            "timestamp_mode": os.getenv("SENSOR_TIMESTAMP_MODE", "host").strip().lower(),
+            "timestamp_gap_s": float(os.getenv("SENSOR_TIMESTAMP_GAP_S", "0.1")),
             "default_output_content": {
                 "time": self._parse_bool(os.getenv("SENSOR_OUTPUT_TIME", "true")),
                 "acceleration": self._parse_bool(os.getenv("SENSOR_OUTPUT_ACCELERATION", "true")),
@@ -102,7 +115,11 @@ class ConfigLoader:
             "rls_filter_q": float(os.getenv("PROCESSING_RLS_FILTER_Q", "0.9875")),
             "fft_n_points": int(os.getenv("PROCESSING_FFT_N_POINTS", "512")),
             "fft_min_freq_hz": float(os.getenv("PROCESSING_FFT_MIN_FREQ_HZ", "0.1")),
-            "fft_max_freq_hz": self._parse_float_or_none(os.getenv("PROCESSING_FFT_MAX_FREQ_HZ", "null"))
+            "fft_max_freq_hz": self._parse_float_or_none(os.getenv("PROCESSING_FFT_MAX_FREQ_HZ", "null")),
+            # Chu kỳ tính lại: tích hợp RLS (mẫu), FFT (giây) và tỉ lệ mẫu có kết quả xử lý
+            "integration_hop": int(os.getenv("PROCESSING_INTEGRATION_HOP", "1")),
+            "fft_hop_s": float(os.getenv("PROCESSING_FFT_HOP_S", "0")),
+            "output_every": int(os.getenv("PROCESSING_OUTPUT_EVERY", "1"))
         }
         
         # Process control configuration
@@ -110,7 +127,40 @@ class ConfigLoader:
             "decoding": self._parse_bool(os.getenv("PROCESS_CONTROL_DECODING", "true")),
             "processing": self._parse_bool(os.getenv("PROCESS_CONTROL_PROCESSING", "true")),
             "mqtt_sending": self._parse_bool(os.getenv("PROCESS_CONTROL_MQTT_SENDING", "true")),
-            "mqtt_mode": os.getenv("PROCESS_CONTROL_MQTT_MODE", "continuous")  # continuous or scheduled
+            "mqtt_mode": os.getenv("PROCESS_CONTROL_MQTT_MODE", "continuous"),  # continuous or scheduled
+            # Các loại gói phụ được định tuyến tới luồng lưu riêng, ví dụ "angle,gyro,quaternion,time"
+            "aux_packet_types": self._parse_list(os.getenv("PROCESS_CONTROL_AUX_PACKET_TYPES", "")),
+            # Chế độ khối: chuyển khối mẫu giữa các luồng (đủ block_size gói hoặc quá block_max_latency_ms)
+            "block_mode": self._parse_bool(os.getenv("PROCESS_CONTROL_BLOCK_MODE", "false")),
+            "block_size": int(os.getenv("PROCESS_CONTROL_BLOCK_SIZE", "20")),
+            "block_max_latency_ms": float(os.getenv("PROCESS_CONTROL_BLOCK_MAX_LATENCY_MS", "50")),
+            # Chuyển mẫu đã giải mã sang luồng xử lý: queue (Queue các bản ghi) hoặc ring (SampleRing cấp phát sẵn)
+            "transport": os.getenv("PROCESS_CONTROL_TRANSPORT", "queue").strip().lower(),
+            "ring_capacity": int(os.getenv("PROCESS_CONTROL_RING_CAPACITY", "8192")),
+            # threads (mọi tầng trong một tiến trình) hoặc processes (xử lý và gửi MQTT ở tiến trình riêng)
+            "execution": os.getenv("PROCESS_CONTROL_EXECUTION", "threads").strip().lower(),
+            # Chu kỳ log CPU/độ trễ của từng tiến trình (0 = tắt)
+            "monitor_interval_s": float(os.getenv("PROCESS_CONTROL_MONITOR_INTERVAL_S", "0"))
+        }
+        
+        # Chính sách chống nghẽn của các hàng đợi pipeline (raw, decoded, mqtt, aux)
+        config["queues"] = {name: self._parse_queue_config(name) for name in ("raw", "decoded", "mqtt", "aux")}
+        config["queues"]["storage_priority"] = self._parse_bool(os.getenv("QUEUE_STORAGE_PRIORITY", "false"))
+        
+        # Endpoint số liệu Prometheus của pipeline (cần prometheus_client)
+        config["metrics"] = {
+            "enabled": self._parse_bool(os.getenv("METRICS_ENABLED", "false")),
+            "port": int(os.getenv("METRICS_PORT", "8001")),
+            "addr": os.getenv("METRICS_ADDR", "0.0.0.0")
+        }
+        
+        # Truy vết mẫu qua các tầng pipeline (0 = tắt)
+        config["tracing"] = {
+            "sample_every": int(os.getenv("TRACING_SAMPLE_EVERY", "0")),
+            "output": os.getenv("TRACING_OUTPUT", "log"),
+            "file_path": os.getenv("TRACING_FILE", "logs/traces.bin"),
+            "file_records": int(os.getenv("TRACING_FILE_RECORDS", "4096")),
+            "timeout_s": float(os.getenv("TRACING_TIMEOUT_S", "10"))
         }
         
         # Data compression configuration
@@ -127,7 +177,13 @@ class ConfigLoader:
             "base_dir": os.getenv("DATA_STORAGE_BASE_DIR", "data"),
             "format": os.getenv("DATA_STORAGE_FORMAT", "csv"),
             "max_file_size_mb": float(os.getenv("DATA_STORAGE_MAX_FILE_SIZE_MB", "10.0")),
-            "session_prefix": os.getenv("DATA_STORAGE_SESSION_PREFIX", "session")
+            "session_prefix": os.getenv("DATA_STORAGE_SESSION_PREFIX", "session"),
+            # Ghi luồng byte thô vào segment nhị phân có chỉ mục thời gian (data/raw_data)
+            "raw_capture": self._parse_bool(os.getenv("DATA_STORAGE_RAW_CAPTURE", "false")),
+            "raw_segment_mb": float(os.getenv("DATA_STORAGE_RAW_SEGMENT_MB", "64.0")),
+            "raw_index_interval_s": float(os.getenv("DATA_STORAGE_RAW_INDEX_INTERVAL_S", "1.0")),
+            # Tắt để chỉ giữ dữ liệu thô thay cho CSV gia tốc đã giải mã
+            "decoded_csv": self._parse_bool(os.getenv("DATA_STORAGE_DECODED_CSV", "true"))
         }
         
         # Cleanup configuration
@@ -274,6 +330,10 @@ class ConfigLoader:
         transformed["publish_status_topic"] = topics.get("publish_status", "sensor/hwt905/status")
         transformed["publish_response_topic"] = topics.get("publish_response", "sensor/hwt905/config_response")
         
+        # QoS settings
+        qos = yaml_mqtt.get("qos", {})
+        transformed["publish_data_qos"] = qos.get("publish_data", 0)
+        
         # Send strategy settings
         send_strategy = yaml_mqtt.get("send_strategy", {})
         transformed["send_strategy"] = {
@@ -284,12 +344,30 @@ class ConfigLoader:
         
         return transformed
     
+    def _parse_queue_config(self, name: str) -> Dict[str, Any]:
+        """
+        Cấu hình một hàng đợi từ QUEUE_<NAME>_*; ngưỡng và decimate_n mặc định lấy từ
+        QUEUE_HIGH_WATERMARK / QUEUE_LOW_WATERMARK / QUEUE_DECIMATE_N.
+        """
+        prefix = f"QUEUE_{name.upper()}_"
+        return {
+            "policy": os.getenv(prefix + "POLICY", "block").strip().lower(),
+            "maxsize": int(os.getenv(prefix + "MAXSIZE", "8192")),
+            "high_watermark": float(os.getenv(prefix + "HIGH_WATERMARK", os.getenv("QUEUE_HIGH_WATERMARK", "0.8"))),
+            "low_watermark": float(os.getenv(prefix + "LOW_WATERMARK", os.getenv("QUEUE_LOW_WATERMARK", "0.5"))),
+            "decimate_n": int(os.getenv(prefix + "DECIMATE_N", os.getenv("QUEUE_DECIMATE_N", "2"))),
+        }
+    
     def _parse_bool(self, value: str) -> bool:
         """Parse string to boolean."""
         if isinstance(value, bool):
             return value
         return value.lower() in ("true", "1", "yes", "on")
     
+    def _parse_list(self, value: str) -> List[str]:
+        """Parse chuỗi phân tách bằng dấu phẩy thành danh sách (bỏ phần tử rỗng)."""
+        return [item.strip() for item in value.split(",") if item.strip()]
+
     def _parse_float_or_none(self, value: str) -> Optional[float]:
         """Parse string to float or None."""
         if value.lower() in ("null", "none", ""):